@@ -8,6 +8,7 @@ from flask_session import Session
 from flask_login import LoginManager, login_required, current_user
 from dotenv import load_dotenv
 import os
+import click
 import db
 from datetime import datetime
 import logging
@@ -48,7 +49,8 @@ LOGGING_CONFIG = {
             'formatter': 'detailed',
             'filename': 'logs/app.log',
             'maxBytes': 10485760,  # 10MB
-            'backupCount': 5
+            'backupCount': 5,
+            'delay': True  # abrir el archivo en la primera escritura, no al arrancar
         },
         'error_file': {
             'level': 'ERROR',
@@ -56,7 +58,8 @@ LOGGING_CONFIG = {
             'formatter': 'json',
             'filename': 'logs/errors.log',
             'maxBytes': 10485760,  # 10MB
-            'backupCount': 3
+            'backupCount': 3,
+            'delay': True
         }
     },
     'loggers': {
@@ -95,6 +98,9 @@ def create_app():
     # Configurar manejo de errores
     configure_error_handlers(app)
     
+    # Registrar comandos de mantenimiento
+    configure_cli_commands(app)
+    
     logger.info("Aplicación Flask inicializada correctamente")
     return app
 
@@ -112,6 +118,47 @@ def configure_app(app):
     app.config['MYSQL_CURSORCLASS'] = 'DictCursor'
     app.config['MYSQL_CHARSET'] = 'utf8mb4'
     
+    # Pool de conexiones por worker
+    app.config['MYSQL_POOL_SIZE'] = int(os.getenv('MYSQL_POOL_SIZE', 5))
+    app.config['MYSQL_POOL_TIMEOUT'] = float(os.getenv('MYSQL_POOL_TIMEOUT', 10))
+    app.config['MYSQL_POOL_MAX_LIFETIME'] = int(os.getenv('MYSQL_POOL_MAX_LIFETIME', 1800))
+    app.config['MYSQL_POOL_PRE_PING'] = os.getenv('MYSQL_POOL_PRE_PING', 'true').lower() == 'true'
+    # mysqlclient o pymysql (el perfil gevent de gunicorn_config.py fija pymysql)
+    app.config['MYSQL_DRIVER'] = os.getenv('MYSQL_DRIVER', 'mysqlclient')
+    
+    # Caché de contadores de los dashboards (Redis opcional, compartido entre workers)
+    app.config['CACHE_CONTADORES_TTL'] = int(os.getenv('CACHE_CONTADORES_TTL', 60))
+    app.config['CACHE_RESPUESTAS_TTL'] = int(os.getenv('CACHE_RESPUESTAS_TTL', 300))
+    app.config['CACHE_REDIS_URL'] = os.getenv('CACHE_REDIS_URL')
+    # Identidad del usuario autenticado (user_loader): TTL y copia en la sesión
+    app.config['USUARIOS_CACHE_TTL'] = int(os.getenv('USUARIOS_CACHE_TTL', 60))
+    app.config['USUARIOS_CACHE_SESION'] = os.getenv('USUARIOS_CACHE_SESION', 'true').lower() == 'true'
+    # Segundos entre verificaciones de la versión del catálogo de potreros
+    app.config['CATALOGO_POTREROS_INTERVALO'] = int(os.getenv('CATALOGO_POTREROS_INTERVALO', 30))
+    
+    # Puntos máximos por serie en las APIs de gráficos (?max_points=0 desactiva la reducción)
+    app.config['CHART_MAX_POINTS'] = int(os.getenv('CHART_MAX_POINTS', 500))
+    
+    # Instrumentación SQL (resumen por request y detección de N+1)
+    app.config['SQL_PROFILING'] = os.getenv('SQL_PROFILING', 'true').lower() == 'true'
+    app.config['SQL_N1_UMBRAL'] = int(os.getenv('SQL_N1_UMBRAL', 5))
+    
+    # Métricas Prometheus (token opcional para proteger /metrics)
+    app.config['METRICS_ENABLED'] = os.getenv('METRICS_ENABLED', 'true').lower() == 'true'
+    app.config['METRICS_TOKEN'] = os.getenv('METRICS_TOKEN')
+    
+    # Cola de trabajos en segundo plano (flask trabajos-worker)
+    app.config['TRABAJOS_INTERVALO'] = float(os.getenv('TRABAJOS_INTERVALO', 2))
+    app.config['TRABAJOS_TIMEOUT'] = int(os.getenv('TRABAJOS_TIMEOUT', 1800))
+    app.config['TRABAJOS_RETENCION_DIAS'] = int(os.getenv('TRABAJOS_RETENCION_DIAS', 7))
+    
+    # Auditoría de escrituras (audit_log, escrita en lotes por un hilo de cada worker)
+    app.config['AUDITORIA_ENABLED'] = os.getenv('AUDITORIA_ENABLED', 'true').lower() == 'true'
+    app.config['AUDITORIA_INTERVALO_MS'] = int(os.getenv('AUDITORIA_INTERVALO_MS', 500))
+    app.config['AUDITORIA_LOTE'] = int(os.getenv('AUDITORIA_LOTE', 200))
+    app.config['AUDITORIA_CAPACIDAD'] = int(os.getenv('AUDITORIA_CAPACIDAD', 10000))
+    app.config['AUDITORIA_RETENCION_MESES'] = int(os.getenv('AUDITORIA_RETENCION_MESES', 12))
+    
     # Configuración de sesiones
     if os.getenv('FLASK_ENV') == 'production':
         app.config['SESSION_TYPE'] = 'redis'
@@ -140,7 +187,8 @@ def initialize_extensions(app):
     def load_user(user_id):
         from proyecto.models.models import User
         try:
-            return User.get_by_id(user_id)
+            # Sesión o caché de usuarios: sin consultas en el caso común
+            return User.get_cached(user_id)
         except Exception as e:
             logger.error(f"Error cargando usuario {user_id}: {str(e)}")
             return None
@@ -154,6 +202,28 @@ def initialize_extensions(app):
     
     # Inicializar base de datos
     db.init_app(app)
+    
+    # Caché de contadores
+    from proyecto.utils.cache import cache_respuestas, cache_usuarios, contadores
+    contadores.init_app(app)
+    cache_respuestas.init_app(app)
+    cache_usuarios.init_app(app)
+    
+    # Catálogo de potreros para los selectores de los formularios
+    from proyecto.utils.catalogo import catalogo_potreros
+    catalogo_potreros.init_app(app)
+    
+    # Auditoría de escrituras de los modelos
+    from proyecto.utils.auditoria import auditoria
+    auditoria.init_app(app, db.mysql)
+    
+    # Instrumentación de consultas SQL por request
+    from proyecto.utils.profiler import perfil_sql
+    perfil_sql.init_app(app, db.mysql)
+    
+    # Métricas Prometheus (/metrics)
+    from proyecto.utils.metrics import metricas
+    metricas.init_app(app, db.mysql)
 
 def register_blueprints(app):
     """Registrar blueprints principales"""
@@ -171,6 +241,7 @@ def register_blueprints(app):
         from proyecto.routes.recorridos import recorridos_bp
         from proyecto.routes.admin import admin_bp
         from proyecto.routes.ganado import ganado_bp
+        from proyecto.routes.trabajos import trabajos_bp
         
         # Registrar blueprints esenciales
         app.register_blueprint(auth_bp, url_prefix='/auth')
@@ -185,6 +256,7 @@ def register_blueprints(app):
         app.register_blueprint(recorridos_bp, url_prefix='/recorridos')
         app.register_blueprint(admin_bp, url_prefix='/admin')
         app.register_blueprint(ganado_bp, url_prefix='/ganado')
+        app.register_blueprint(trabajos_bp, url_prefix='/jobs')
         
         logger.info("Todos los blueprints registrados exitosamente")
         
@@ -210,6 +282,12 @@ def configure_context_processors(app):
             return True
         
         return {'usuario_puede': usuario_puede}
+    
+    @app.context_processor
+    def inject_catalogos():
+        """Catálogos de referencia cacheados (se consultan sólo si la plantilla los usa)"""
+        from proyecto.utils.catalogo import catalogo_potreros
+        return {'catalogo_potreros': catalogo_potreros.listar}
 
 def configure_main_routes(app):
     """Configurar rutas principales"""
@@ -242,6 +320,108 @@ def configure_error_handlers(app):
         logger.error(f"Error interno: {str(error)}")
         return render_template('errors/500.html'), 500
 
+def configure_cli_commands(app):
+    """Registrar comandos CLI de mantenimiento (flask <comando>)"""
+    @app.cli.command('recalcular-resumen-potreros')
+    def recalcular_resumen_potreros():
+        """Reconstruir potrero_resumen a partir del histórico de aforos"""
+        from proyecto.models.models import Potrero
+        Potrero.refrescar_resumen()
+        print("Resumen de potreros recalculado")
+
+    @app.cli.command('recalcular-tasas-crecimiento')
+    @click.option('--potrero', 'potrero_id', type=int, help='Sólo este potrero')
+    @click.option('--desde', type=click.DateTime(formats=['%Y-%m-%d']), help='Sólo recorridos desde AAAA-MM-DD')
+    def recalcular_tasas_crecimiento(potrero_id, desde):
+        """Recalcular las tasas de crecimiento de los recorridos en un único UPDATE"""
+        from proyecto.models.models import Recorrido
+        filas = Recorrido.recompute_growth_rates(potrero_id, since=desde.date() if desde else None)
+        print(f"Tasas de crecimiento recalculadas ({filas} recorridos modificados)")
+
+    @app.cli.command('reconstruir-rollups-clima')
+    def reconstruir_rollups_clima():
+        """Reconstruir los rollups mensual y semanal de clima desde el histórico"""
+        from proyecto.models.models import Clima
+        periodos = Clima.reconstruir_rollups()
+        print("Rollups de clima reconstruidos (" + ", ".join(f"{t}: {n} períodos" for t, n in periodos.items()) + ")")
+
+    @app.cli.command('trabajos-worker')
+    @click.option('--tipo', 'tipos', multiple=True, help='Sólo trabajos de este tipo (repetible)')
+    @click.option('--una-vez', is_flag=True, help='Salir cuando la cola quede vacía')
+    def trabajos_worker(tipos, una_vez):
+        """Ejecutar los trabajos en segundo plano de la cola (hasta SIGTERM)"""
+        from db import mysql
+        from proyecto.utils import tareas  # noqa: F401  (registra las tareas)
+        from proyecto.utils.trabajos import Worker
+        worker = Worker(
+            app, mysql, tipos=tipos or None,
+            intervalo=app.config['TRABAJOS_INTERVALO'],
+            timeout=app.config['TRABAJOS_TIMEOUT'],
+            retencion_dias=app.config['TRABAJOS_RETENCION_DIAS'],
+        )
+        print(f"Worker {worker.nombre} esperando trabajos")
+        procesados = worker.ejecutar(una_vez=una_vez)
+        print(f"Worker {worker.nombre} detenido ({procesados} trabajos procesados)")
+
+    @app.cli.command('auditoria-retencion')
+    @click.option('--meses', type=int, help='Meses completos a conservar (por defecto AUDITORIA_RETENCION_MESES)')
+    @click.option('--adelante', default=2, show_default=True, help='Meses futuros con partición creada')
+    def auditoria_retencion(meses, adelante):
+        """Crear las particiones mensuales de audit_log y eliminar las vencidas"""
+        from db import mysql
+        from proyecto.utils.auditoria import mantener_particiones
+        resultado = mantener_particiones(
+            mysql.connection, meses if meses is not None else app.config['AUDITORIA_RETENCION_MESES'], adelante)
+        if resultado['particionada']:
+            print(f"Particiones creadas: {', '.join(resultado['creadas']) or 'ninguna'}; "
+                  f"eliminadas: {', '.join(resultado['eliminadas']) or 'ninguna'} (corte {resultado['corte']})")
+        else:
+            print(f"audit_log sin particiones: {resultado['filas_borradas']} filas anteriores a "
+                  f"{resultado['corte']} borradas")
+
+    @app.cli.command('perfil-arranque')
+    @click.option('--modulo', default='app', show_default=True, help='Módulo a importar (app o wsgi)')
+    @click.option('--top', default=20, show_default=True, help='Módulos más costosos a mostrar')
+    @click.option('--presupuesto', type=float, help='Falla si el arranque supera estos milisegundos')
+    def perfil_arranque(modulo, top, presupuesto):
+        """Costo de importación por módulo (-X importtime) con y sin importación perezosa"""
+        from proyecto.utils.arranque import por_paquete, perfil_importacion
+        directorio = os.path.dirname(os.path.abspath(__file__))
+        totales = {}
+        for modo in ('true', 'false'):
+            total, modulos = perfil_importacion(modulo, {'LAZY_IMPORTS': modo}, directorio)
+            totales[modo] = total
+            print(f"\nLAZY_IMPORTS={modo}: {total:.0f} ms para importar {modulo}")
+            print(f"  {'módulo':<48} {'propio ms':>10} {'acumulado ms':>13}")
+            for m in sorted(modulos, key=lambda m: -m['propio_ms'])[:top]:
+                print(f"  {m['modulo']:<48} {m['propio_ms']:>10.1f} {m['acumulado_ms']:>13.1f}")
+            print("  Por paquete: " + ", ".join(f"{p} {ms:.0f} ms" for p, ms in por_paquete(modulos)[:8]))
+        if presupuesto is not None and totales['true'] > presupuesto:
+            raise click.ClickException(
+                f"Arranque de {totales['true']:.0f} ms por encima del presupuesto de {presupuesto:.0f} ms")
+
+    @app.cli.command('importar-aforos')
+    @click.argument('ruta', type=click.Path(exists=True, dir_okay=False))
+    @click.option('--solo-validar', is_flag=True, help='Validar sin insertar')
+    @click.option('--omitir-errores', is_flag=True, help='Insertar las filas válidas aunque haya errores')
+    @click.option('--lote', default=1000, show_default=True, help='Filas por executemany')
+    def importar_aforos(ruta, solo_validar, omitir_errores, lote):
+        """Importar aforos con sus muestras desde un archivo CSV o XLSX"""
+        from db import mysql
+        from proyecto.utils.importacion import ErrorImportacion, ImportadorAforos, leer_filas
+        try:
+            with open(ruta, 'rb') as archivo:
+                resultado = ImportadorAforos(mysql, tamano_lote=lote).importar(
+                    leer_filas(archivo, ruta), solo_validar=solo_validar, omitir_errores=omitir_errores
+                )
+        except ErrorImportacion as e:
+            raise click.ClickException(str(e))
+        for fila, error in resultado.errores:
+            print(f"Fila {fila}: {error}")
+        estado = 'importados' if resultado.insertado else 'NO importados'
+        print(f"{resultado.filas} filas, {resultado.aforos} aforos y {resultado.muestras} muestras {estado} "
+              f"({resultado.total_errores} errores, {resultado.filas_por_segundo:.0f} filas/s)")
+
 # Crear instancia de la aplicación
 app = create_app()
 
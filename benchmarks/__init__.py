@@ -0,0 +1 @@
+"""Benchmarks reproducibles contra la base de datos configurada"""
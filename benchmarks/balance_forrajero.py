@@ -0,0 +1,95 @@
+"""
+Balance forrajero: bucle por lote con diccionarios vs BalanceForrajero (NumPy).
+
+Genera fincas sintéticas (por defecto 5000 lotes en 2000 potreros) y mide el
+tiempo de cada forma sin base de datos, más la proyección a ``--dias`` días:
+
+    python -m benchmarks.balance_forrajero --lotes 5000 --potreros 2000 --dias 90
+"""
+
+import argparse
+import os
+import sys
+import time
+from datetime import date, timedelta
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from proyecto.utils.balance import BalanceForrajero  # noqa: E402
+from proyecto.utils.proyeccion import ProyeccionForrajera  # noqa: E402
+
+
+def generar(lotes, potreros, semilla=7):
+    rng = np.random.default_rng(semilla)
+    filas_potreros = [{'id': i, 'nombre': f'Potrero {i}', 'hectareas': float(h)}
+                      for i, h in enumerate(rng.uniform(1, 20, potreros).round(1), start=1)]
+    filas_aforos = [{'potrero_id': p['id'], 'ms_promedio': float(ms), 'ultima_medicion': None}
+                    for p, ms in zip(filas_potreros, rng.uniform(800, 4000, potreros)) if ms > 1000]
+    filas_lotes = [{'id': i, 'nombre': f'Lote {i}', 'numero_animales': int(n), 'peso_promedio': float(w),
+                    'potrero_actual_id': int(p)}
+                   for i, (n, w, p) in enumerate(zip(rng.integers(5, 80, lotes), rng.uniform(200, 550, lotes),
+                                                     rng.integers(1, potreros + 1, lotes)), start=1)]
+    return filas_lotes, filas_potreros, filas_aforos
+
+
+def bucle(lotes, potreros, aforos, consumo_animal):
+    """La forma anterior de la ruta: un lote por vuelta y búsquedas en dicts"""
+    potreros_dict = {p['id']: p for p in potreros}
+    aforos_dict = {a['potrero_id']: a for a in aforos}
+    balances = []
+    for lote in lotes:
+        potrero = potreros_dict.get(lote['potrero_actual_id'])
+        aforo = aforos_dict.get(lote['potrero_actual_id'])
+        if aforo and potrero and potrero['hectareas']:
+            consumo_diario = lote['numero_animales'] * consumo_animal
+            ms_disponible = aforo['ms_promedio'] * potrero['hectareas']
+            dias = ms_disponible / consumo_diario if consumo_diario > 0 else 0
+            balances.append({'lote_nombre': lote['nombre'], 'potrero_nombre': potrero['nombre'],
+                             'consumo_diario': consumo_diario, 'ms_disponible': ms_disponible,
+                             'dias_disponibles': dias,
+                             'estado': 'Crítico' if dias < 7 else 'Atención' if dias < 15 else 'Bueno'})
+    return balances
+
+
+def medir(funcion, repeticiones):
+    inicio = time.perf_counter()
+    for _ in range(repeticiones):
+        resultado = funcion()
+    return (time.perf_counter() - inicio) * 1000 / repeticiones, resultado
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--lotes', type=int, default=5000)
+    parser.add_argument('--potreros', type=int, default=2000)
+    parser.add_argument('--consumo', type=float, default=15)
+    parser.add_argument('--dias', type=int, default=90)
+    parser.add_argument('--repeticiones', type=int, default=20)
+    args = parser.parse_args()
+
+    lotes, potreros, aforos = generar(args.lotes, args.potreros)
+    ms, filas = medir(lambda: bucle(lotes, potreros, aforos, args.consumo), args.repeticiones)
+    print(f"bucle por lote:        {ms:8.2f} ms  ({len(filas)} balances)")
+
+    ms, balance = medir(lambda: BalanceForrajero(lotes, potreros, aforos, consumo_animal=args.consumo),
+                        args.repeticiones)
+    print(f"BalanceForrajero:      {ms:8.2f} ms  (cálculo {balance.segundos * 1000:.2f} ms)")
+    ms, filas = medir(balance.filas, args.repeticiones)
+    print(f"  + filas():           {ms:8.2f} ms  ({len(filas)} balances)")
+    ms, _ = medir(lambda: (balance.kpis(), balance.alertas()), args.repeticiones)
+    print(f"  + kpis() y alertas(): {ms:7.2f} ms")
+
+    rng = np.random.default_rng(11)
+    tasas = [{'potrero_id': p['id'], 'tasa': float(t)} for p, t in zip(potreros, rng.uniform(0.1, 1.2, len(potreros)))]
+    clima = [{'fecha': date.today() - timedelta(days=d), 'temperatura_promedio': float(t), 'lluvia': float(l)}
+             for d, t, l in zip(range(1, 15), rng.uniform(12, 26, 14), rng.exponential(3, 14))]
+    ms, proyeccion = medir(lambda: ProyeccionForrajera(balance, tasas, [], clima, dias=args.dias), args.repeticiones)
+    print(f"proyección {args.dias} días:  {ms:8.2f} ms  ({proyeccion.ms.shape[1]} potreros)")
+    ms, _ = medir(proyeccion.to_dict, args.repeticiones)
+    print(f"  + to_dict():         {ms:8.2f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,166 @@
+"""
+Prueba de carga de los perfiles de gunicorn contra las páginas de listado.
+
+Levanta gunicorn con cada perfil (gunicorn_config.py, GUNICORN_PROFILE), inicia
+sesión con ``--clientes`` usuarios concurrentes y recorre las páginas de
+listado durante ``--duracion`` segundos. Informa requests por segundo, errores
+y latencias p50/p99 por perfil y por página. Usa la base de datos del entorno
+(.env), así que conviene una copia con datos reales:
+
+    python -m benchmarks.carga --email admin@finca.com --password secreto \\
+        --perfiles sync gthread gevent --clientes 32 --duracion 30
+
+Con ``--url`` mide un servidor ya levantado en lugar de arrancar gunicorn.
+"""
+
+import argparse
+import http.cookiejar
+import os
+import signal
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+
+import numpy as np
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PAGINAS = ('/potreros/', '/aforos/', '/actividades/', '/recorridos/', '/ph/', '/clima/', '/ganado/')
+
+
+def sesion(base, email, password):
+    """Opener con cookies y sesión iniciada"""
+    opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()))
+    datos = urllib.parse.urlencode({'email': email, 'password': password}).encode()
+    opener.open(base + '/auth/login', datos, timeout=30).read()
+    return opener
+
+
+def cliente(base, opener, paginas, fin, inicio_medicion, resultados, desfase):
+    """Recorrer las páginas en ronda hasta ``fin``; sólo se registra desde ``inicio_medicion``"""
+    i = desfase
+    while time.monotonic() < fin:
+        pagina = paginas[i % len(paginas)]
+        i += 1
+        inicio = time.monotonic()
+        try:
+            respuesta = opener.open(base + pagina, timeout=60)
+            respuesta.read()
+            # Un redirect al login significa que la sesión no es válida
+            ok = respuesta.status == 200 and '/auth/login' not in respuesta.geturl()
+        except (urllib.error.URLError, OSError):
+            ok = False
+        if inicio >= inicio_medicion:
+            resultados.append((pagina, time.monotonic() - inicio, ok))
+
+
+def medir(base, args):
+    openers = [sesion(base, args.email, args.password) for _ in range(args.clientes)]
+    resultados = []
+    inicio_medicion = time.monotonic() + args.calentamiento
+    fin = inicio_medicion + args.duracion
+    hilos = [
+        threading.Thread(target=cliente, args=(base, o, args.paginas, fin, inicio_medicion, resultados, n))
+        for n, o in enumerate(openers)
+    ]
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join()
+    return resultados
+
+
+def esperar(base, proceso, limite=60):
+    fin = time.monotonic() + limite
+    while time.monotonic() < fin:
+        if proceso.poll() is not None:
+            raise RuntimeError(f"gunicorn terminó con código {proceso.returncode}")
+        try:
+            urllib.request.urlopen(base + '/health', timeout=2).read()
+            return
+        except urllib.error.HTTPError:
+            return  # responde, aunque el health check no sea 200
+        except (urllib.error.URLError, OSError):
+            time.sleep(0.5)
+    raise RuntimeError("gunicorn no respondió a tiempo")
+
+
+def levantar(perfil, args):
+    entorno = dict(os.environ, GUNICORN_PROFILE=perfil,
+                   GUNICORN_ACCESS_LOG='/dev/null', GUNICORN_ERROR_LOG='-')
+    if args.workers:
+        entorno['GUNICORN_WORKERS'] = str(args.workers)
+    if args.threads:
+        entorno['GUNICORN_THREADS'] = str(args.threads)
+    os.makedirs(os.path.join(RAIZ, 'logs'), exist_ok=True)
+    return subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn_config.py',
+         '--bind', f'127.0.0.1:{args.puerto}', 'wsgi:app'],
+        cwd=RAIZ, env=entorno, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE if args.silencioso else None,
+    )
+
+
+def informe(nombre, resultados, duracion):
+    if not resultados:
+        print(f"{nombre:<10} sin resultados")
+        return
+    latencias = np.array([r[1] for r in resultados]) * 1000
+    errores = sum(1 for r in resultados if not r[2])
+    p50, p99 = np.percentile(latencias, [50, 99])
+    print(f"{nombre:<10} {len(resultados):>9} {len(resultados) / duracion:>9.1f} {errores:>8} {p50:>9.1f} {p99:>9.1f}")
+
+
+def informe_paginas(resultados):
+    for pagina in sorted({r[0] for r in resultados}):
+        latencias = np.array([r[1] for r in resultados if r[0] == pagina]) * 1000
+        p50, p99 = np.percentile(latencias, [50, 99])
+        print(f"    {pagina:<16} {len(latencias):>7} {p50:>9.1f} {p99:>9.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--email', required=True)
+    parser.add_argument('--password', required=True)
+    parser.add_argument('--perfiles', nargs='+', default=['sync', 'gthread', 'gevent'],
+                        choices=['sync', 'gthread', 'gevent'])
+    parser.add_argument('--url', help='Medir este servidor (ya levantado) en lugar de arrancar gunicorn')
+    parser.add_argument('--puerto', type=int, default=5055)
+    parser.add_argument('--workers', type=int, help='GUNICORN_WORKERS (por defecto el del perfil)')
+    parser.add_argument('--threads', type=int, help='GUNICORN_THREADS del perfil gthread')
+    parser.add_argument('--clientes', type=int, default=32, help='Usuarios concurrentes')
+    parser.add_argument('--duracion', type=float, default=20, help='Segundos medidos por perfil')
+    parser.add_argument('--calentamiento', type=float, default=3, help='Segundos iniciales sin medir')
+    parser.add_argument('--paginas', nargs='+', default=list(PAGINAS))
+    parser.add_argument('--silencioso', action='store_true', help='Ocultar el log de gunicorn')
+    args = parser.parse_args()
+
+    objetivos = [('externo', args.url.rstrip('/'))] if args.url else \
+        [(perfil, f'http://127.0.0.1:{args.puerto}') for perfil in args.perfiles]
+
+    medidos = []
+    for perfil, base in objetivos:
+        proceso = None if args.url else levantar(perfil, args)
+        try:
+            if proceso:
+                esperar(base, proceso)
+            print(f"Midiendo {perfil} ({args.clientes} clientes, {args.duracion:.0f} s)...", file=sys.stderr)
+            medidos.append((perfil, medir(base, args)))
+        finally:
+            if proceso:
+                proceso.send_signal(signal.SIGTERM)
+                proceso.wait(timeout=60)
+
+    print(f"\n{'perfil':<10} {'requests':>9} {'req/s':>9} {'errores':>8} {'p50 ms':>9} {'p99 ms':>9}")
+    for perfil, resultados in medidos:
+        informe(perfil, resultados, args.duracion)
+    for perfil, resultados in medidos:
+        print(f"\n{perfil}: {'página':<16} {'requests':>7} {'p50 ms':>9} {'p99 ms':>9}")
+        informe_paginas(resultados)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+"""
+Plan de rotación sobre fincas sintéticas: plan completo vs re-plan incremental.
+
+Para cada tamaño de finca (potreros x lotes) mide el plan completo, el re-plan
+tras cambiar el aforo de un potrero al azar (comparado con rehacer todo el plan)
+y cuenta lotes sin destino y potreros que quedan bajo el residuo:
+
+    python -m benchmarks.rotacion --dias 90 --cambios 20
+    python -m benchmarks.rotacion --fincas 1000x300
+"""
+
+import argparse
+import copy
+import os
+import sys
+import time
+from datetime import date
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from proyecto.utils.balance import BalanceForrajero  # noqa: E402
+from proyecto.utils.proyeccion import ProyeccionForrajera  # noqa: E402
+from proyecto.utils.rotacion import PlanRotacion  # noqa: E402
+
+FINCAS = ('20x5', '100x25', '300x80', '600x150')
+
+
+def generar(potreros, lotes, dias, semilla=7, ms_ha=None):
+    """Proyección de una finca: un lote por potrero en los primeros ``lotes`` potreros"""
+    rng = np.random.default_rng(semilla)
+    filas_potreros = [{'id': i, 'nombre': f'Potrero {i}', 'hectareas': float(h)}
+                      for i, h in enumerate(rng.uniform(2, 15, potreros).round(1), start=1)]
+    sorteado = rng.uniform(1200, 4000, potreros)
+    ms_ha = sorteado if ms_ha is None else ms_ha
+    aforos = [{'potrero_id': p['id'], 'ms_promedio': float(m), 'ultima_medicion': None}
+              for p, m in zip(filas_potreros, ms_ha)]
+    filas_lotes = [{'id': i, 'nombre': f'Lote {i}', 'numero_animales': int(n), 'peso_promedio': 420.0,
+                    'potrero_actual_id': i}
+                   for i, n in enumerate(rng.integers(20, 90, lotes), start=1)]
+    tasas = [{'potrero_id': p['id'], 'tasa': float(t)}
+             for p, t in zip(filas_potreros, rng.uniform(0.15, 0.8, potreros))]
+    balance = BalanceForrajero(filas_lotes, filas_potreros, aforos, consumo_animal=12)
+    return ProyeccionForrajera(balance, tasas, [], [], dias=dias, hoy=date.today()), ms_ha
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--fincas', nargs='*', default=list(FINCAS), help='Tamaños POTREROSxLOTES')
+    parser.add_argument('--dias', type=int, default=90)
+    parser.add_argument('--cambios', type=int, default=10, help='Re-planes por finca')
+    parser.add_argument('--descanso', type=int, default=21)
+    args = parser.parse_args()
+
+    print(f"{'finca':<10} {'plan':>9} {'movs':>6} {'sin dest.':>9} {'bajo res.':>9} "
+          f"{'re-plan':>9} {'completo':>9} {'día medio':>9} {'iguales':>8}")
+    for finca in args.fincas:
+        potreros, lotes = (int(v) for v in finca.lower().split('x'))
+        proyeccion, ms_ha = generar(potreros, lotes, args.dias)
+
+        inicio = time.perf_counter()
+        plan = PlanRotacion(proyeccion, descanso_minimo=args.descanso)
+        ms_plan = (time.perf_counter() - inicio) * 1000
+        datos = plan.to_dict()
+
+        rng = np.random.default_rng(1)
+        t_incremental = t_completo = 0.0
+        dias_replan, iguales = [], 0
+        for _ in range(args.cambios):
+            cambiado = ms_ha.copy()
+            cambiado[rng.integers(lotes, potreros)] = rng.uniform(800, 4500)
+            nueva, _ = generar(potreros, lotes, args.dias, ms_ha=cambiado)
+
+            copia = copy.deepcopy(plan)
+            inicio = time.perf_counter()
+            dias_replan.append(copia.replanificar(copia.cambios(nueva)))
+            t_incremental += time.perf_counter() - inicio
+
+            inicio = time.perf_counter()
+            completo = PlanRotacion(nueva, descanso_minimo=args.descanso)
+            t_completo += time.perf_counter() - inicio
+            iguales += copia.movimientos == completo.movimientos
+
+        print(f"{finca:<10} {ms_plan:>7.1f}ms {len(datos['movimientos']):>6} {len(datos['alertas']):>9} "
+              f"{datos['potreros_bajo_residuo']:>9} {t_incremental * 1000 / args.cambios:>7.1f}ms "
+              f"{t_completo * 1000 / args.cambios:>7.1f}ms {np.mean(dias_replan):>9.1f} "
+              f"{iguales:>4}/{args.cambios}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,102 @@
+"""
+Tamaño de payload y tiempo de dibujo de series largas, con y sin reducción.
+
+Genera una serie diaria sintética por potrero (por defecto 20 potreros x 5 años),
+mide el JSON resultante (plano y gzip) y el tiempo de reducción con LTTB y
+min/max. Con ``--html`` escribe además una página que dibuja ambas versiones con
+Chart.js y muestra el tiempo de render de cada una (abrirla en el navegador):
+
+    python -m benchmarks.series_temporales --potreros 20 --anios 5 --max-points 500 --html /tmp/series.html
+"""
+
+import argparse
+import gzip
+import json
+import os
+import sys
+import time
+from datetime import date, timedelta
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from proyecto.utils.series import reducir_filas  # noqa: E402
+
+
+def generar(potreros, dias, semilla=7):
+    """Filas como las de Aforo.get_timeline_data: estacionalidad, ruido y pastoreos"""
+    rng = np.random.default_rng(semilla)
+    inicio = date.today() - timedelta(days=dias)
+    fechas = [(inicio + timedelta(days=d)).isoformat() for d in range(dias)]
+    filas = []
+    for potrero in range(1, potreros + 1):
+        t = np.arange(dias)
+        seca = 2500 + 900 * np.sin(2 * np.pi * t / 365 + potrero) + rng.normal(0, 150, dias)
+        seca[rng.integers(0, dias, dias // 35)] *= 0.35  # caídas por pastoreo
+        for d in range(dias):
+            filas.append({
+                'fecha': fechas[d], 'potrero_id': potrero, 'potrero_nombre': f'Potrero {potrero}',
+                'materia_verde': round(float(seca[d]) * 4.2, 1), 'materia_seca': round(float(seca[d]), 1),
+                'porcentaje_ms': 23.8,
+            })
+    return filas
+
+
+def medir(filas):
+    cuerpo = json.dumps({'success': True, 'data': filas}).encode()
+    return len(filas), len(cuerpo), len(gzip.compress(cuerpo))
+
+
+def pagina_html(series):
+    """Página que dibuja cada variante en su canvas y reporta el tiempo de render"""
+    return """<!doctype html><meta charset="utf-8"><title>Render de series</title>
+<script src="https://cdn.jsdelivr.net/npm/chart.js"></script>
+<body style="font-family:sans-serif"><div id="res"></div><script>
+const series = %s;
+const res = document.getElementById('res');
+for (const [nombre, filas] of Object.entries(series)) {
+  const porPotrero = {};
+  for (const f of filas) (porPotrero[f.potrero_id] ||= []).push({x: Date.parse(f.fecha), y: f.materia_seca});
+  const canvas = document.createElement('canvas'); canvas.width = 1200; canvas.height = 300;
+  document.body.appendChild(canvas);
+  const t0 = performance.now();
+  new Chart(canvas, {type: 'line', options: {animation: false, responsive: false, parsing: false,
+    scales: {x: {type: 'linear'}}, plugins: {legend: {display: false}}},
+    data: {datasets: Object.values(porPotrero).map(d => ({data: d, pointRadius: 0, borderWidth: 1}))}});
+  res.innerHTML += `<p>${nombre}: ${filas.length} puntos, ${(performance.now() - t0).toFixed(1)} ms</p>`;
+}
+</script>""" % json.dumps(series)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--potreros', type=int, default=20)
+    parser.add_argument('--anios', type=int, default=5)
+    parser.add_argument('--max-points', type=int, default=500)
+    parser.add_argument('--html', help='Ruta de la página de render con Chart.js')
+    args = parser.parse_args()
+
+    filas = generar(args.potreros, args.anios * 365)
+    variantes = {'sin reducir': filas}
+    print(f"{'variante':<14} {'puntos':>9} {'JSON':>12} {'gzip':>10} {'reducción':>11}")
+    for metodo in ('lttb', 'minmax'):
+        inicio = time.perf_counter()
+        variantes[metodo] = reducir_filas(filas, args.max_points, 'fecha', 'materia_seca',
+                                          grupo='potrero_id', metodo=metodo)
+        variantes[metodo + '_ms'] = (time.perf_counter() - inicio) * 1000
+
+    for nombre in ('sin reducir', 'lttb', 'minmax'):
+        puntos, crudo, comprimido = medir(variantes[nombre])
+        ms = variantes.get(nombre + '_ms')
+        print(f"{nombre:<14} {puntos:>9} {crudo / 1024:>9.0f} KB {comprimido / 1024:>7.0f} KB "
+              f"{(f'{ms:.1f} ms' if ms is not None else '-'):>11}")
+
+    if args.html:
+        with open(args.html, 'w', encoding='utf-8') as archivo:
+            archivo.write(pagina_html({n: variantes[n] for n in ('sin reducir', 'lttb', 'minmax')}))
+        print(f"\nPágina de render: {args.html}")
+
+
+if __name__ == '__main__':
+    main()
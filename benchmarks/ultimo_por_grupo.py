@@ -0,0 +1,87 @@
+"""
+Comparar "último registro por potrero": subconsulta MAX(fecha) vs ROW_NUMBER().
+
+Muestra el plan (EXPLAIN) de ambas formas y el tiempo medio de ejecución contra
+la base de datos configurada en el entorno (.env):
+
+    python -m benchmarks.ultimo_por_grupo --repeticiones 50
+
+Con la forma anterior MySQL suele reportar un DEPENDENT SUBQUERY sobre la tabla;
+con ROW_NUMBER() y el índice (potrero_id, fecha) aparece un único DERIVED que lee
+el índice en orden.
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from proyecto.utils.consultas import ultimo_por_grupo  # noqa: E402
+
+CONSULTAS = {
+    'aforos': (
+        """SELECT potrero_id, fecha, materia_verde FROM aforos
+           WHERE (potrero_id, fecha) IN (
+               SELECT potrero_id, MAX(fecha) FROM aforos GROUP BY potrero_id
+           )""",
+        ultimo_por_grupo('aforos', 'id, potrero_id, fecha, materia_verde'),
+    ),
+    'recorridos': (
+        """SELECT potrero_id, fecha, altura_promedio FROM recorridos
+           WHERE (potrero_id, fecha) IN (
+               SELECT potrero_id, MAX(fecha) FROM recorridos GROUP BY potrero_id
+           )""",
+        ultimo_por_grupo('recorridos', 'id, potrero_id, fecha, altura_promedio'),
+    ),
+    'ph': (
+        """SELECT potrero_id, fecha, valor FROM ph
+           WHERE (potrero_id, fecha) IN (
+               SELECT potrero_id, MAX(fecha) FROM ph GROUP BY potrero_id
+           )""",
+        ultimo_por_grupo('ph', 'id, potrero_id, fecha, valor'),
+    ),
+}
+
+
+def imprimir_plan(cursor, sql):
+    cursor.execute("EXPLAIN " + sql)
+    for fila in cursor.fetchall():
+        print(f"    {fila.get('select_type', ''):<20} {str(fila.get('table')):<22} "
+              f"{str(fila.get('type')):<8} {str(fila.get('key')):<30} "
+              f"{str(fila.get('rows')):>8}  {fila.get('Extra') or ''}")
+
+
+def medir(cursor, sql, repeticiones):
+    filas = 0
+    inicio = time.perf_counter()
+    for _ in range(repeticiones):
+        cursor.execute(sql)
+        filas = len(cursor.fetchall())
+    return (time.perf_counter() - inicio) * 1000 / repeticiones, filas
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--repeticiones', type=int, default=20)
+    parser.add_argument('--tablas', nargs='*', default=list(CONSULTAS))
+    args = parser.parse_args()
+
+    from app import app
+    from db import mysql
+
+    with app.app_context():
+        cursor = mysql.connection.cursor()
+        for tabla in args.tablas:
+            anterior, nueva = CONSULTAS[tabla]
+            print(f"\n== {tabla}")
+            for nombre, sql in (('MAX(fecha) IN', anterior), ('ROW_NUMBER()', nueva)):
+                ms, filas = medir(cursor, sql, args.repeticiones)
+                print(f"  {nombre}: {ms:.2f} ms/consulta, {filas} filas")
+                imprimir_plan(cursor, sql)
+        cursor.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -26,6 +26,44 @@ class Config:
                     os.environ.get('MYSQLPORT', 3306))
     MYSQL_CURSORCLASS = 'DictCursor'
     
+    # Pool de conexiones por worker
+    MYSQL_POOL_SIZE = int(os.environ.get('MYSQL_POOL_SIZE', 5))
+    MYSQL_POOL_TIMEOUT = float(os.environ.get('MYSQL_POOL_TIMEOUT', 10))
+    MYSQL_POOL_MAX_LIFETIME = int(os.environ.get('MYSQL_POOL_MAX_LIFETIME', 1800))
+    MYSQL_POOL_PRE_PING = os.environ.get('MYSQL_POOL_PRE_PING', 'true').lower() == 'true'
+    MYSQL_DRIVER = os.environ.get('MYSQL_DRIVER', 'mysqlclient')
+    
+    # Caché de contadores de los dashboards
+    CACHE_CONTADORES_TTL = int(os.environ.get('CACHE_CONTADORES_TTL', 60))
+    CACHE_RESPUESTAS_TTL = int(os.environ.get('CACHE_RESPUESTAS_TTL', 300))
+    CACHE_REDIS_URL = os.environ.get('CACHE_REDIS_URL')
+    USUARIOS_CACHE_TTL = int(os.environ.get('USUARIOS_CACHE_TTL', 60))
+    USUARIOS_CACHE_SESION = os.environ.get('USUARIOS_CACHE_SESION', 'true').lower() == 'true'
+    CATALOGO_POTREROS_INTERVALO = int(os.environ.get('CATALOGO_POTREROS_INTERVALO', 30))
+    
+    # Puntos máximos por serie en las APIs de gráficos
+    CHART_MAX_POINTS = int(os.environ.get('CHART_MAX_POINTS', 500))
+    
+    # Instrumentación SQL
+    SQL_PROFILING = os.environ.get('SQL_PROFILING', 'true').lower() == 'true'
+    SQL_N1_UMBRAL = int(os.environ.get('SQL_N1_UMBRAL', 5))
+    
+    # Métricas Prometheus
+    METRICS_ENABLED = os.environ.get('METRICS_ENABLED', 'true').lower() == 'true'
+    METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+    
+    # Cola de trabajos en segundo plano
+    TRABAJOS_INTERVALO = float(os.environ.get('TRABAJOS_INTERVALO', 2))
+    TRABAJOS_TIMEOUT = int(os.environ.get('TRABAJOS_TIMEOUT', 1800))
+    TRABAJOS_RETENCION_DIAS = int(os.environ.get('TRABAJOS_RETENCION_DIAS', 7))
+    
+    # Auditoría de escrituras (audit_log)
+    AUDITORIA_ENABLED = os.environ.get('AUDITORIA_ENABLED', 'true').lower() == 'true'
+    AUDITORIA_INTERVALO_MS = int(os.environ.get('AUDITORIA_INTERVALO_MS', 500))
+    AUDITORIA_LOTE = int(os.environ.get('AUDITORIA_LOTE', 200))
+    AUDITORIA_CAPACIDAD = int(os.environ.get('AUDITORIA_CAPACIDAD', 10000))
+    AUDITORIA_RETENCION_MESES = int(os.environ.get('AUDITORIA_RETENCION_MESES', 12))
+    
     # Sesiones
     SESSION_TYPE = 'filesystem'
     SESSION_PERMANENT = False
@@ -0,0 +1,328 @@
+-- =====================================================
+-- MIGRACIÓN DE BASE DE DATOS - PASTOREO v2.1
+-- Tablas derivadas e índices para rendimiento
+-- Se puede ejecutar más de una vez: las tablas usan IF NOT EXISTS y las
+-- columnas, índices y particiones se crean sólo si faltan (information_schema).
+-- =====================================================
+
+-- =====================================================
+-- 1. RESUMEN DE ROTACIÓN POR POTRERO
+-- =====================================================
+
+-- Resumen mantenido por Aforo.create y, a través de la cola de trabajos (tarea
+-- resumen_potreros), por la edición, eliminación e importación de aforos.
+-- Reemplaza las subconsultas correlacionadas del listado de potreros.
+-- Poblar con: flask recalcular-resumen-potreros
+CREATE TABLE IF NOT EXISTS potrero_resumen (
+    potrero_id INT PRIMARY KEY,
+    ultimo_aforo_id INT NULL,
+    ultima_fecha DATE NULL,
+    dias_rotacion INT NOT NULL DEFAULT 0, -- días entre los dos últimos aforos
+    promedio_rotacion DECIMAL(7,2) NOT NULL DEFAULT 0, -- promedio de intervalos entre aforos
+    total_aforos INT NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+
+    INDEX idx_ultima_fecha (ultima_fecha),
+
+    FOREIGN KEY (potrero_id) REFERENCES potreros(id) ON DELETE CASCADE
+);
+
+-- =====================================================
+-- 2. SUMAS ACUMULADAS DE MUESTRAS POR AFORO
+-- =====================================================
+
+-- MuestraAforo aplica diferencias sobre estas sumas (junto con num_muestras y
+-- muestras_con_peso_seco) en lugar de releer todas las muestras del aforo.
+-- MySQL no admite ADD COLUMN IF NOT EXISTS: se consulta information_schema
+SET @sql = IF(
+    (SELECT COUNT(*) FROM information_schema.COLUMNS
+     WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'aforos' AND COLUMN_NAME = 'suma_peso_verde') = 0,
+    'ALTER TABLE aforos
+        ADD COLUMN suma_peso_verde DECIMAL(12,3) NOT NULL DEFAULT 0,
+        ADD COLUMN suma_peso_seco DECIMAL(12,3) NOT NULL DEFAULT 0',
+    'DO 0'
+);
+PREPARE stmt FROM @sql;
+EXECUTE stmt;
+DEALLOCATE PREPARE stmt;
+
+-- Poblar sumas y conteos a partir de las muestras existentes
+UPDATE aforos a
+LEFT JOIN (
+    SELECT aforo_id,
+           SUM(peso_verde) AS suma_verde,
+           COALESCE(SUM(peso_seco), 0) AS suma_seco,
+           COUNT(*) AS n,
+           COUNT(peso_seco) AS n_seco
+    FROM muestras_aforo
+    GROUP BY aforo_id
+) m ON m.aforo_id = a.id
+SET a.suma_peso_verde = COALESCE(m.suma_verde, 0),
+    a.suma_peso_seco = COALESCE(m.suma_seco, 0),
+    a.num_muestras = COALESCE(m.n, 0),
+    a.muestras_con_peso_seco = COALESCE(m.n_seco, 0);
+
+-- =====================================================
+-- 3. ÍNDICES DE ACTIVIDADES
+-- =====================================================
+
+-- Conteo por estado (Actividad.get_stats) con filtro de fechas en una sola pasada
+SET @sql = IF((SELECT COUNT(*) FROM information_schema.STATISTICS
+    WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'actividades' AND INDEX_NAME = 'idx_actividades_fecha_estado') = 0,
+    'CREATE INDEX idx_actividades_fecha_estado ON actividades (fecha, estado)', 'DO 0');
+PREPARE stmt FROM @sql;
+EXECUTE stmt;
+DEALLOCATE PREPARE stmt;
+
+-- =====================================================
+-- 4. ÍNDICES PARA PAGINACIÓN POR CURSOR
+-- =====================================================
+
+-- Los listados paginan por (fecha, id). InnoDB agrega la clave primaria a cada
+-- índice secundario, así que un índice sobre fecha cubre el orden (fecha, id).
+SET @sql = IF((SELECT COUNT(*) FROM information_schema.STATISTICS
+    WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'aforos' AND INDEX_NAME = 'idx_aforos_fecha') = 0,
+    'CREATE INDEX idx_aforos_fecha ON aforos (fecha)', 'DO 0');
+PREPARE stmt FROM @sql;
+EXECUTE stmt;
+DEALLOCATE PREPARE stmt;
+SET @sql = IF((SELECT COUNT(*) FROM information_schema.STATISTICS
+    WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'ph' AND INDEX_NAME = 'idx_ph_fecha') = 0,
+    'CREATE INDEX idx_ph_fecha ON ph (fecha)', 'DO 0');
+PREPARE stmt FROM @sql;
+EXECUTE stmt;
+DEALLOCATE PREPARE stmt;
+SET @sql = IF((SELECT COUNT(*) FROM information_schema.STATISTICS
+    WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'clima' AND INDEX_NAME = 'idx_clima_fecha') = 0,
+    'CREATE INDEX idx_clima_fecha ON clima (fecha)', 'DO 0');
+PREPARE stmt FROM @sql;
+EXECUTE stmt;
+DEALLOCATE PREPARE stmt;
+SET @sql = IF((SELECT COUNT(*) FROM information_schema.STATISTICS
+    WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'recorridos' AND INDEX_NAME = 'idx_recorridos_fecha') = 0,
+    'CREATE INDEX idx_recorridos_fecha ON recorridos (fecha)', 'DO 0');
+PREPARE stmt FROM @sql;
+EXECUTE stmt;
+DEALLOCATE PREPARE stmt;
+
+-- =====================================================
+-- 5. VERSIONES DE TABLAS PARA LA CACHÉ DE RESPUESTAS
+-- =====================================================
+
+-- Cada escritura incrementa la versión de su tabla en la misma transacción.
+-- Las APIs de gráficos incluyen las versiones en su clave de caché y usan
+-- updated_at como Last-Modified.
+CREATE TABLE IF NOT EXISTS tabla_version (
+    tabla VARCHAR(64) PRIMARY KEY,
+    version BIGINT NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP(3) NOT NULL DEFAULT CURRENT_TIMESTAMP(3) ON UPDATE CURRENT_TIMESTAMP(3)
+);
+
+-- =====================================================
+-- 6. ÍNDICES PARA "ÚLTIMO REGISTRO POR POTRERO"
+-- =====================================================
+
+-- ROW_NUMBER() OVER (PARTITION BY potrero_id ORDER BY fecha DESC, id DESC)
+-- recorre estos índices en orden sin ordenar en memoria (ver
+-- proyecto/utils/consultas.py y benchmarks/ultimo_por_grupo.py).
+SET @sql = IF((SELECT COUNT(*) FROM information_schema.STATISTICS
+    WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'aforos' AND INDEX_NAME = 'idx_aforos_potrero_fecha') = 0,
+    'CREATE INDEX idx_aforos_potrero_fecha ON aforos (potrero_id, fecha)', 'DO 0');
+PREPARE stmt FROM @sql;
+EXECUTE stmt;
+DEALLOCATE PREPARE stmt;
+SET @sql = IF((SELECT COUNT(*) FROM information_schema.STATISTICS
+    WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'recorridos' AND INDEX_NAME = 'idx_recorridos_potrero_fecha') = 0,
+    'CREATE INDEX idx_recorridos_potrero_fecha ON recorridos (potrero_id, fecha)', 'DO 0');
+PREPARE stmt FROM @sql;
+EXECUTE stmt;
+DEALLOCATE PREPARE stmt;
+SET @sql = IF((SELECT COUNT(*) FROM information_schema.STATISTICS
+    WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'ph' AND INDEX_NAME = 'idx_ph_potrero_fecha') = 0,
+    'CREATE INDEX idx_ph_potrero_fecha ON ph (potrero_id, fecha)', 'DO 0');
+PREPARE stmt FROM @sql;
+EXECUTE stmt;
+DEALLOCATE PREPARE stmt;
+
+-- =====================================================
+-- 7. BALANCE FORRAJERO CON EL CONSUMO CONFIGURADO
+-- =====================================================
+
+-- La vista usaba 15 kg MS por animal fijo en el SQL. Ahora lee
+-- consumo_animal_diario de configuracion_sistema, el mismo valor que usa
+-- proyecto/utils/balance.py (BalanceForrajero).
+CREATE OR REPLACE VIEW vista_balance_forrajero AS
+SELECT 
+    DATE(fecha) as fecha,
+    SUM(produccion_ms) as produccion_total_ms,
+    SUM(consumo_estimado) as consumo_total_estimado,
+    SUM(produccion_ms) - SUM(consumo_estimado) as balance_ms,
+    AVG(carga_animal) as carga_animal_promedio,
+    COUNT(DISTINCT potrero_id) as potreros_evaluados
+FROM (
+    SELECT 
+        a.fecha,
+        a.potrero_id,
+        p.hectareas,
+        a.materia_seca * p.hectareas as produccion_ms,
+        COALESCE(mg.numero_animales * (
+            SELECT CAST(cs.valor AS DECIMAL(8,2))
+            FROM configuracion_sistema cs
+            WHERE cs.clave = 'consumo_animal_diario' AND cs.activo = TRUE
+        ), 0) as consumo_estimado,
+        COALESCE(mg.numero_animales / p.hectareas, 0) as carga_animal
+    FROM aforos_v2 a
+    JOIN potreros_v2 p ON a.potrero_id = p.id
+    LEFT JOIN (
+        SELECT 
+            potrero_destino_id,
+            fecha_entrada,
+            fecha_salida,
+            numero_animales,
+            ROW_NUMBER() OVER (PARTITION BY potrero_destino_id ORDER BY fecha_entrada DESC) as rn
+        FROM movimientos_ganado_v2
+        WHERE fecha_salida IS NULL OR fecha_salida >= CURDATE()
+    ) mg ON a.potrero_id = mg.potrero_destino_id AND mg.rn = 1
+    WHERE a.fecha >= DATE_SUB(CURDATE(), INTERVAL 30 DAY)
+) balance_data
+GROUP BY DATE(fecha)
+ORDER BY fecha DESC;
+
+-- =====================================================
+-- 8. COLA DE TRABAJOS EN SEGUNDO PLANO
+-- =====================================================
+
+-- Recálculos y exportaciones largas que ejecuta "flask trabajos-worker"
+-- (ver proyecto/utils/trabajos.py). clave_pendiente sólo tiene valor mientras
+-- el trabajo espera: el índice único impide dos pendientes con la misma clave
+-- y deja encolar uno nuevo mientras otro igual se ejecuta.
+CREATE TABLE IF NOT EXISTS trabajos (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    tipo VARCHAR(50) NOT NULL,
+    clave VARCHAR(100) NOT NULL,
+    parametros JSON,
+    estado ENUM('pendiente', 'en_proceso', 'completado', 'error') NOT NULL DEFAULT 'pendiente',
+    progreso TINYINT UNSIGNED NOT NULL DEFAULT 0,
+    mensaje VARCHAR(255),
+    resultado JSON,
+    error TEXT,
+    intentos INT NOT NULL DEFAULT 0,
+    max_intentos INT NOT NULL DEFAULT 3,
+    worker VARCHAR(100),
+    usuario_id INT,
+    disponible_en TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    creado_en TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    iniciado_en TIMESTAMP NULL,
+    terminado_en TIMESTAMP NULL,
+    actualizado_en TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    clave_pendiente VARCHAR(100) AS (CASE WHEN estado = 'pendiente' THEN clave END) STORED,
+    UNIQUE KEY uk_trabajos_clave_pendiente (clave_pendiente),
+    INDEX idx_trabajos_estado_disponible (estado, disponible_en),
+    INDEX idx_trabajos_terminado (estado, terminado_en),
+    FOREIGN KEY (usuario_id) REFERENCES users(id) ON DELETE SET NULL
+);
+
+-- Archivos generados por los trabajos (CSV comprimido con gzip). Se guardan en
+-- la base porque el worker puede ser otro servicio sin disco compartido con la
+-- web; se borran junto con el trabajo al purgarlo.
+CREATE TABLE IF NOT EXISTS trabajos_archivos (
+    trabajo_id INT PRIMARY KEY,
+    nombre VARCHAR(255) NOT NULL,
+    contenido LONGBLOB NOT NULL,
+    creado_en TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (trabajo_id) REFERENCES trabajos(id) ON DELETE CASCADE
+);
+
+-- =====================================================
+-- 9. AUDITORÍA PARTICIONADA POR MES
+-- =====================================================
+
+-- audit_log (creada en la migración v2) la escriben en lotes los workers (ver
+-- proyecto/utils/auditoria.py). Se particiona por mes de created_at para que la
+-- retención sea un DROP PARTITION en lugar de un DELETE masivo: created_at pasa
+-- a DATETIME (TO_DAYS) y entra en la clave primaria, como exige MySQL para
+-- particionar. Las particiones mensuales (p202610, ...) las crea y elimina
+-- "flask auditoria-retencion"; p_futuro recibe lo que aún no tiene partición.
+-- Ambos pasos se saltan si ya se aplicaron: volver a particionar borraría las
+-- particiones mensuales y movería todas las filas a p_futuro.
+SET @sql = IF((SELECT COUNT(*) FROM information_schema.STATISTICS
+    WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'audit_log'
+      AND INDEX_NAME = 'PRIMARY' AND COLUMN_NAME = 'created_at') = 0,
+    'ALTER TABLE audit_log
+        MODIFY created_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+        DROP PRIMARY KEY,
+        ADD PRIMARY KEY (id, created_at)',
+    'DO 0');
+PREPARE stmt FROM @sql;
+EXECUTE stmt;
+DEALLOCATE PREPARE stmt;
+
+SET @sql = IF((SELECT COUNT(*) FROM information_schema.PARTITIONS
+    WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'audit_log'
+      AND PARTITION_NAME IS NOT NULL) = 0,
+    'ALTER TABLE audit_log
+        PARTITION BY RANGE (TO_DAYS(created_at)) (
+            PARTITION p_futuro VALUES LESS THAN MAXVALUE
+        )',
+    'DO 0');
+PREPARE stmt FROM @sql;
+EXECUTE stmt;
+DEALLOCATE PREPARE stmt;
+
+-- =====================================================
+-- 10. ROLLUPS MENSUALES Y SEMANALES DE CLIMA
+-- =====================================================
+
+-- Sumas, días y extremos de temperatura por mes y por semana, mantenidos por
+-- Clima.create y Clima.update_or_create en la misma transacción que el día
+-- (ver Clima._aplicar_rollups). El resumen mensual y /clima/api/resumen leen
+-- de aquí; los promedios son suma / dias_* (días con valor en esa columna,
+-- igual que el AVG sobre clima, que ignora los NULL).
+-- Poblar con: flask reconstruir-rollups-clima
+CREATE TABLE IF NOT EXISTS clima_rollup_mensual (
+    periodo DATE PRIMARY KEY, -- primer día del mes
+    total_dias INT NOT NULL DEFAULT 0,
+    suma_temp_min DECIMAL(10,2) NOT NULL DEFAULT 0,
+    suma_temp_max DECIMAL(10,2) NOT NULL DEFAULT 0,
+    suma_temp_promedio DECIMAL(10,2) NOT NULL DEFAULT 0,
+    suma_lluvia DECIMAL(10,2) NOT NULL DEFAULT 0,
+    suma_humedad DECIMAL(10,2) NOT NULL DEFAULT 0,
+    suma_viento DECIMAL(10,2) NOT NULL DEFAULT 0,
+    suma_horas_sol DECIMAL(10,2) NOT NULL DEFAULT 0,
+    dias_temp_min INT NOT NULL DEFAULT 0,
+    dias_temp_max INT NOT NULL DEFAULT 0,
+    dias_temp_promedio INT NOT NULL DEFAULT 0,
+    dias_lluvia INT NOT NULL DEFAULT 0,
+    dias_humedad INT NOT NULL DEFAULT 0,
+    dias_viento INT NOT NULL DEFAULT 0,
+    dias_horas_sol INT NOT NULL DEFAULT 0,
+    temp_min_absoluta DECIMAL(5,2) NULL,
+    temp_max_absoluta DECIMAL(5,2) NULL,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS clima_rollup_semanal (
+    periodo DATE PRIMARY KEY, -- lunes de la semana
+    total_dias INT NOT NULL DEFAULT 0,
+    suma_temp_min DECIMAL(10,2) NOT NULL DEFAULT 0,
+    suma_temp_max DECIMAL(10,2) NOT NULL DEFAULT 0,
+    suma_temp_promedio DECIMAL(10,2) NOT NULL DEFAULT 0,
+    suma_lluvia DECIMAL(10,2) NOT NULL DEFAULT 0,
+    suma_humedad DECIMAL(10,2) NOT NULL DEFAULT 0,
+    suma_viento DECIMAL(10,2) NOT NULL DEFAULT 0,
+    suma_horas_sol DECIMAL(10,2) NOT NULL DEFAULT 0,
+    dias_temp_min INT NOT NULL DEFAULT 0,
+    dias_temp_max INT NOT NULL DEFAULT 0,
+    dias_temp_promedio INT NOT NULL DEFAULT 0,
+    dias_lluvia INT NOT NULL DEFAULT 0,
+    dias_humedad INT NOT NULL DEFAULT 0,
+    dias_viento INT NOT NULL DEFAULT 0,
+    dias_horas_sol INT NOT NULL DEFAULT 0,
+    temp_min_absoluta DECIMAL(5,2) NULL,
+    temp_max_absoluta DECIMAL(5,2) NULL,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+);
+
+-- =====================================================
+-- FIN DE MIGRACIÓN
+-- =====================================================
@@ -1,8 +1,8 @@
-from flask_mysqldb import MySQL
+from proyecto.utils.pool import PooledMySQL
 
-# Initialize MySQL
-mysql = MySQL()
+# Initialize MySQL (pooled per worker process)
+mysql = PooledMySQL()
  
 def init_app(app):
     """Initialize the MySQL extension with the app"""
-    mysql.init_app(app) 
\ No newline at end of file
+    mysql.init_app(app)
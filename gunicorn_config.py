@@ -1,26 +1,82 @@
+import gc
 import os
+import shutil
 import multiprocessing
+import time
+
+_inicio = time.monotonic()
+
+# Métricas Prometheus agregadas entre workers: cada proceso escribe en este
+# directorio y /metrics combina los archivos (debe fijarse antes de importar la app)
+prometheus_dir = os.environ.setdefault('PROMETHEUS_MULTIPROC_DIR', '/tmp/pastoreo_metrics')
+
+# Perfil de concurrencia (GUNICORN_PROFILE):
+#   sync    - un request a la vez por proceso; workers = 2 * CPU + 1
+#   gthread - GUNICORN_THREADS hilos por proceso; workers = CPU
+#   gevent  - greenlets (GUNICORN_WORKER_CONNECTIONS por proceso); workers = CPU.
+#             Usa PyMySQL (MYSQL_DRIVER=pymysql): mysqlclient es C y bloquea
+#             el event loop durante cada consulta.
+# Cada request usa una conexión del pool del proceso (proyecto/utils/pool.py), así
+# que MYSQL_POOL_SIZE se deriva de la concurrencia por proceso si no se fija.
+PERFILES = ('sync', 'gthread', 'gevent')
+perfil = os.environ.get('GUNICORN_PROFILE', 'gthread').lower()
+if perfil not in PERFILES:
+    raise RuntimeError(f"GUNICORN_PROFILE debe ser uno de {', '.join(PERFILES)} (no '{perfil}')")
+
+cpus = multiprocessing.cpu_count()
 
 # Server socket
-bind = "0.0.0.0:5000"
+bind = f"0.0.0.0:{os.environ.get('PORT', 5000)}"
 backlog = 2048
 
 # Worker processes
-workers = multiprocessing.cpu_count() * 2 + 1
-worker_class = "sync"
-worker_connections = 1000
-timeout = 30
+worker_class = perfil
+if perfil == 'sync':
+    workers = int(os.environ.get('GUNICORN_WORKERS', cpus * 2 + 1))
+    threads = 1
+    concurrencia = 1
+elif perfil == 'gthread':
+    workers = int(os.environ.get('GUNICORN_WORKERS', cpus))
+    threads = int(os.environ.get('GUNICORN_THREADS', 4))
+    concurrencia = threads
+else:
+    workers = int(os.environ.get('GUNICORN_WORKERS', cpus))
+    threads = 1
+    worker_connections = int(os.environ.get('GUNICORN_WORKER_CONNECTIONS', 100))
+    # Los greenlets que no consiguen conexión esperan en el pool sin bloquear al resto
+    concurrencia = min(worker_connections, 20)
+    os.environ.setdefault('MYSQL_DRIVER', 'pymysql')
+
+# Una conexión por request concurrente y una de reserva (trabajos, avance de exportaciones)
+os.environ.setdefault('MYSQL_POOL_SIZE', str(concurrencia + 1))
+
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 30))
+graceful_timeout = 30
 keepalive = 2
 
 # Restart workers after this many requests, to help prevent memory leaks
 max_requests = 1000
 max_requests_jitter = 50
 
-# Logging
-accesslog = "logs/access.log"
-errorlog = "logs/error.log"
+# Arranque de workers (GUNICORN_PRELOAD=true): el maestro importa la app y todos
+# los módulos una vez y cada worker la hereda con fork, así reciclar un worker no
+# vuelve a importar nada. Sin preload, los módulos pesados se importan de forma
+# perezosa en el primer request que los usa (LAZY_IMPORTS, proyecto/utils/arranque.py).
+preload_app = os.environ.get('GUNICORN_PRELOAD', 'false').lower() == 'true'
+if preload_app:
+    if perfil == 'gevent':
+        # gevent debe parchear la biblioteca estándar antes de importar la app
+        raise RuntimeError("GUNICORN_PRELOAD no es compatible con GUNICORN_PROFILE=gevent")
+    os.environ.setdefault('LAZY_IMPORTS', 'false')
+# Tiempo máximo esperado desde el fork hasta que el worker atiende (se avisa si se supera)
+presupuesto_arranque_ms = float(os.environ.get('GUNICORN_BOOT_BUDGET_MS', 1000))
+
+# Logging (logs/ no se versiona: crearlo antes de que gunicorn abra los archivos)
+os.makedirs('logs', exist_ok=True)
+accesslog = os.environ.get('GUNICORN_ACCESS_LOG', "logs/access.log")
+errorlog = os.environ.get('GUNICORN_ERROR_LOG', "logs/error.log")
 loglevel = "info"
-access_log_format = '%(h)s %(l)s %(u)s %(t)s "%(r)s" %(s)s %(b)s "%(f)s" "%(a)s"'
+access_log_format = '%(h)s %(l)s %(u)s %(t)s "%(r)s" %(s)s %(b)s "%(f)s" "%(a)s" %(D)sus'
 
 # Process naming
 proc_name = "pastoreo_web"
@@ -37,4 +93,42 @@ keyfile = None
 certfile = None
 
 # Application
-wsgi_module = "app:create_app()"
\ No newline at end of file
+wsgi_module = "app:create_app()"
+
+# Server hooks
+def on_starting(server):
+    """Limpiar métricas de una ejecución anterior e informar el perfil"""
+    shutil.rmtree(prometheus_dir, ignore_errors=True)
+    os.makedirs(prometheus_dir, exist_ok=True)
+    server.log.info(
+        f"Perfil {perfil}: {workers} workers x {concurrencia} requests concurrentes, "
+        f"pool MySQL de {os.environ['MYSQL_POOL_SIZE']} conexiones por worker "
+        f"(hasta {workers * int(os.environ['MYSQL_POOL_SIZE'])} conexiones en total)"
+    )
+
+def when_ready(server):
+    """Con preload: terminar de importar en el maestro y congelar el heap antes del fork"""
+    if preload_app:
+        from proyecto.utils.arranque import precargar
+        precargar()
+        # Los objetos ya creados no se recorren en las colecciones de los workers,
+        # así sus páginas de memoria siguen compartidas (copy-on-write)
+        gc.freeze()
+        server.log.info(f"App precargada en el maestro en {(time.monotonic() - _inicio) * 1000:.0f} ms")
+
+def post_fork(server, worker):
+    worker.inicio_arranque = time.monotonic()
+
+def post_worker_init(worker):
+    """Medir el arranque del worker contra el presupuesto"""
+    ms = (time.monotonic() - worker.inicio_arranque) * 1000
+    if ms > presupuesto_arranque_ms:
+        worker.log.warning(f"Worker {worker.pid} arrancó en {ms:.0f} ms "
+                           f"(presupuesto {presupuesto_arranque_ms:.0f} ms)")
+    else:
+        worker.log.info(f"Worker {worker.pid} arrancó en {ms:.0f} ms")
+
+def child_exit(server, worker):
+    """Descartar los gauges en vivo de un worker que terminó"""
+    from prometheus_client import multiprocess
+    multiprocess.mark_process_dead(worker.pid)
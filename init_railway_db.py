@@ -1,7 +1,11 @@
 #!/usr/bin/env python3
 """
 Script para inicializar la base de datos MySQL en Railway
-Ejecuta automáticamente el SQL de migración
+Ejecuta automáticamente el SQL de migración. Cada archivo se aplica una sola vez
+y queda registrado en schema_migrations, así que una base existente recibe las
+migraciones nuevas en el siguiente despliegue. Si alguna sentencia falla (salvo
+"already exists") el archivo no se registra y el script termina con código 1,
+así el despliegue se detiene y el archivo se reintenta en el siguiente.
 """
 
 import os
@@ -10,6 +14,9 @@ import mysql.connector
 from mysql.connector import Error
 import time
 
+# Archivos de migración, en el orden en que deben ejecutarse
+MIGRATION_FILES = ['database_migration_v2.sql', 'database_migration_v3.sql']
+
 def wait_for_database(max_attempts=30, delay=2):
     """Esperar a que la base de datos esté disponible"""
     config = {
@@ -34,6 +41,33 @@ def wait_for_database(max_attempts=30, delay=2):
     
     raise Exception("No se pudo conectar a la base de datos después de múltiples intentos")
 
+def split_statements(sql_content):
+    """
+    Separar un archivo SQL en sentencias. Respeta los bloques ``DELIMITER``
+    (triggers con BEGIN ... END) e ignora las líneas de comentario, que podrían
+    contener un ';'.
+    """
+    statements = []
+    delimiter = ';'
+    current = []
+    for line in sql_content.splitlines():
+        stripped = line.strip()
+        if stripped.startswith('--'):
+            continue
+        if stripped.upper().startswith('DELIMITER '):
+            delimiter = stripped.split(None, 1)[1]
+            continue
+        current.append(line)
+        while delimiter in '\n'.join(current):
+            text = '\n'.join(current)
+            statement, rest = text.split(delimiter, 1)
+            if statement.strip():
+                statements.append(statement.strip())
+            current = [rest] if rest.strip() else []
+    if '\n'.join(current).strip():
+        statements.append('\n'.join(current).strip())
+    return statements
+
 def init_database():
     """Inicializar la base de datos con el esquema necesario"""
     
@@ -65,43 +99,70 @@ def init_database():
         connection = mysql.connector.connect(**config)
         cursor = connection.cursor()
         
-        # Verificar si las tablas ya existen
-        cursor.execute("SHOW TABLES")
-        existing_tables = [table[0] for table in cursor.fetchall()]
+        # Migraciones ya aplicadas (una fila por archivo)
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS schema_migrations (
+                archivo VARCHAR(100) PRIMARY KEY,
+                aplicado_en TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+        cursor.execute("SELECT archivo FROM schema_migrations")
+        applied = {row[0] for row in cursor.fetchall()}
         
-        if existing_tables:
-            print(f"Base de datos ya tiene {len(existing_tables)} tablas. Saltando inicialización.")
-            cursor.close()
-            connection.close()
-            return True
+        if not applied:
+            cursor.execute("SHOW TABLES")
+            existing_tables = [table[0] for table in cursor.fetchall() if table[0] != 'schema_migrations']
+            if existing_tables:
+                # Base creada antes del registro de migraciones: este script sólo
+                # ejecutaba la v2 en bases vacías
+                print(f"Base de datos ya tiene {len(existing_tables)} tablas. Registrando {MIGRATION_FILES[0]} como aplicada.")
+                cursor.execute("INSERT INTO schema_migrations (archivo) VALUES (%s)", (MIGRATION_FILES[0],))
+                connection.commit()
+                applied.add(MIGRATION_FILES[0])
         
-        # Leer el archivo de migración
-        sql_file = 'database_migration_v2.sql'
-        if os.path.exists(sql_file):
+        # Ejecutar en orden los archivos de migración pendientes
+        for sql_file in MIGRATION_FILES:
+            if sql_file in applied:
+                print(f"✔️ {sql_file} ya aplicada")
+                continue
+            
+            if not os.path.exists(sql_file):
+                print(f"⚠️ Archivo {sql_file} no encontrado")
+                return False
+            
             print(f"Ejecutando {sql_file}...")
             
             with open(sql_file, 'r', encoding='utf-8') as file:
-                sql_content = file.read()
+                statements = split_statements(file.read())
             
             # Ejecutar las declaraciones SQL
-            statements = [stmt.strip() for stmt in sql_content.split(';') if stmt.strip()]
-            
+            failed = 0
             for i, statement in enumerate(statements):
-                if statement and not statement.startswith('--'):
-                    try:
-                        cursor.execute(statement)
-                        connection.commit()
-                        print(f"✅ ({i+1}/{len(statements)}) Ejecutado correctamente")
-                    except Error as e:
-                        if "already exists" not in str(e).lower():
-                            print(f"⚠️ Error ejecutando statement {i+1}: {e}")
-                            print(f"Statement: {statement[:100]}...")
-                        connection.rollback()
+                try:
+                    cursor.execute(statement)
+                    if cursor.with_rows:
+                        cursor.fetchall()
+                    connection.commit()
+                    print(f"✅ ({i+1}/{len(statements)}) Ejecutado correctamente")
+                except Error as e:
+                    if "already exists" not in str(e).lower():
+                        failed += 1
+                        print(f"⚠️ Error ejecutando statement {i+1}: {e}")
+                        print(f"Statement: {statement[:100]}...")
+                    connection.rollback()
+            
+            # Con errores el archivo no se registra: el próximo despliegue lo
+            # vuelve a ejecutar (y las migraciones siguientes esperan)
+            if failed:
+                print(f"❌ {sql_file}: {failed} sentencias fallaron; no se registra como aplicada")
+                cursor.close()
+                connection.close()
+                return False
             
-            print("🎉 Base de datos inicializada correctamente")
-        else:
-            print(f"⚠️ Archivo {sql_file} no encontrado")
-            return False
+            cursor.execute("INSERT INTO schema_migrations (archivo) VALUES (%s)", (sql_file,))
+            connection.commit()
+        
+        print("🎉 Base de datos inicializada correctamente")
         
         cursor.close()
         connection.close()
@@ -1,21 +1,69 @@
 from db import mysql
+from proyecto.utils.arranque import perezoso
+from proyecto.utils.auditoria import auditoria
+from proyecto.utils.cache import cache_usuarios, contadores, incrementar_version
+from proyecto.utils.catalogo import catalogo_potreros
+from proyecto.utils.consultas import ultimo_por_grupo
+from proyecto.utils.pagination import paginar
 from werkzeug.security import generate_password_hash, check_password_hash
-from datetime import datetime, timedelta
+from datetime import datetime, date, timedelta
+from bisect import bisect_left, insort
 from flask import current_app
-from flask_login import UserMixin
 
-class User(UserMixin):
+# NumPy sólo se importa cuando se reduce una serie (ver proyecto/utils/arranque.py)
+series = perezoso('proyecto.utils.series')
+
+
+def _como_fecha(valor):
+    """Normaliza datetime/date/'YYYY-MM-DD' a date"""
+    if isinstance(valor, datetime):
+        return valor.date()
+    if isinstance(valor, date):
+        return valor
+    return datetime.strptime(str(valor), '%Y-%m-%d').date()
+
+class User:
+    """
+    Usuario de Flask-Login. Con __slots__ (sin UserMixin, que añadiría __dict__)
+    para que la identidad cacheada por request sea compacta.
+    """
+    __slots__ = ('id', 'nombre', 'email', 'password', 'finca_actual_id', 'finca_actual_nombre')
+    
+    # Campos que se cachean y se guardan en la sesión (nunca la contraseña)
+    CAMPOS_IDENTIDAD = ('id', 'nombre', 'email', 'finca_actual_id', 'finca_actual_nombre')
+    
     def __init__(self, user_data):
         self.id = str(user_data['id'])
         self.nombre = user_data['nombre']
         self.email = user_data['email']
-        self.password = user_data['password']
+        self.password = user_data.get('password')
         self.finca_actual_id = user_data.get('finca_actual_id')
         self.finca_actual_nombre = user_data.get('finca_actual_nombre')
     
     def get_id(self):
         return self.id
     
+    def __eq__(self, other):
+        if isinstance(other, User):
+            return self.id == other.id
+        return NotImplemented
+    
+    def __ne__(self, other):
+        igual = self.__eq__(other)
+        return igual if igual is NotImplemented else not igual
+    
+    def __hash__(self):
+        # Definir __eq__ anula el hash heredado; se usa el mismo id que compara
+        return hash(self.id)
+    
+    def identidad(self):
+        """Tupla con los campos de CAMPOS_IDENTIDAD"""
+        return tuple(getattr(self, campo) for campo in User.CAMPOS_IDENTIDAD)
+    
+    @staticmethod
+    def desde_identidad(identidad):
+        return User(dict(zip(User.CAMPOS_IDENTIDAD, identidad)))
+    
     @property
     def is_authenticated(self):
         return True
@@ -38,6 +86,7 @@ class User(UserMixin):
                 (nombre, email, hashed_password)
             )
             mysql.connection.commit()
+            contadores.invalidar('users')
             user_id = cursor.lastrowid
             cursor.close()
             return user_id
@@ -77,49 +126,36 @@ class User(UserMixin):
             return User(user_data)
         return None
         
+    @staticmethod
+    def get_cached(user_id):
+        """
+        Usuario para el user_loader: identidad de la sesión o de la caché de
+        usuarios y, si no está o venció, get_by_id. Sin contraseña.
+        """
+        def cargar(user_id):
+            usuario = User.get_by_id(user_id)
+            return usuario.identidad() if usuario else None
+        
+        identidad = cache_usuarios.obtener(user_id, cargar)
+        return User.desde_identidad(identidad) if identidad else None
+        
     def check_password(self, password):
-        return check_password_hash(self.password, password)
+        return bool(self.password) and check_password_hash(self.password, password)
 
 class Potrero:
     @staticmethod
     def get_all(page=1, per_page=10):
         offset = (page - 1) * per_page
         
+        # Los datos de rotación se leen de potrero_resumen, que se mantiene
+        # en cada escritura de aforos (ver Potrero.refrescar_resumen)
         query = """
             SELECT p.*, 
-                a.fecha as ultima_fecha,
-                (
-                    SELECT COALESCE(DATEDIFF(a1.fecha, MAX(a2.fecha)), 0)
-                    FROM aforos a1
-                    LEFT JOIN aforos a2 ON a1.potrero_id = a2.potrero_id AND a1.fecha > a2.fecha
-                    WHERE a1.potrero_id = p.id AND a1.fecha = a.fecha
-                    GROUP BY a1.id
-                ) as dias_rotacion,
-                (
-                    SELECT AVG(dias_entre_aforos) 
-                    FROM (
-                        SELECT 
-                            DATEDIFF(a1.fecha, a2.fecha) as dias_entre_aforos
-                        FROM 
-                            aforos a1
-                        JOIN 
-                            aforos a2 ON a1.potrero_id = a2.potrero_id AND a1.fecha > a2.fecha
-                        WHERE 
-                            a1.potrero_id = p.id
-                        ORDER BY 
-                            a1.fecha
-                    ) as diffs
-                ) as promedio_rotacion
+                r.ultima_fecha,
+                r.dias_rotacion,
+                r.promedio_rotacion
             FROM potreros p
-            LEFT JOIN (
-                SELECT potrero_id, fecha, materia_verde, porcentaje_ms, materia_seca
-                FROM aforos a
-                WHERE (potrero_id, fecha) IN (
-                    SELECT potrero_id, MAX(fecha) as max_fecha
-                    FROM aforos
-                    GROUP BY potrero_id
-                )
-            ) a ON p.id = a.potrero_id
+            LEFT JOIN potrero_resumen r ON r.potrero_id = p.id
             ORDER BY p.nombre
             LIMIT %s OFFSET %s
         """
@@ -135,6 +171,75 @@ class Potrero:
         
         return potreros, total
     
+    @staticmethod
+    def refrescar_resumen(potrero_id=None, cursor=None):
+        """
+        Recalcula la fila de potrero_resumen de un potrero, de una lista de potreros
+        o de todos si no se indica.
+        El promedio de rotación es el promedio de los intervalos entre fechas de aforo
+        consecutivas, que equivale a (última fecha - primera fecha) / (fechas distintas - 1).
+        Si se recibe un cursor, no hace commit para que el llamador lo incluya en su transacción.
+        """
+        filtro_aforos = ""
+        filtro_potreros = "WHERE 1=1"
+        params = []
+        if potrero_id:
+            ids = list(potrero_id) if isinstance(potrero_id, (list, tuple, set)) else [potrero_id]
+            marcadores = ', '.join(['%s'] * len(ids))
+            filtro_aforos = f"WHERE potrero_id IN ({marcadores})"
+            filtro_potreros = f"WHERE p.id IN ({marcadores})"
+            params = ids + ids
+        
+        query = f"""
+            INSERT INTO potrero_resumen
+                (potrero_id, ultimo_aforo_id, ultima_fecha, dias_rotacion,
+                 promedio_rotacion, total_aforos)
+            SELECT 
+                p.id,
+                ua.id,
+                ua.fecha,
+                COALESCE(DATEDIFF(ua.fecha, (
+                    SELECT MAX(a2.fecha) FROM aforos a2
+                    WHERE a2.potrero_id = p.id AND a2.fecha < ua.fecha
+                )), 0),
+                CASE WHEN st.fechas_distintas > 1
+                     THEN DATEDIFF(st.max_fecha, st.min_fecha) / (st.fechas_distintas - 1)
+                     ELSE 0 END,
+                COALESCE(st.total, 0)
+            FROM potreros p
+            LEFT JOIN (
+                SELECT potrero_id, MIN(fecha) as min_fecha, MAX(fecha) as max_fecha,
+                       COUNT(DISTINCT fecha) as fechas_distintas, COUNT(*) as total
+                FROM aforos
+                {filtro_aforos}
+                GROUP BY potrero_id
+            ) st ON st.potrero_id = p.id
+            LEFT JOIN aforos ua ON ua.id = (
+                SELECT a3.id FROM aforos a3
+                WHERE a3.potrero_id = p.id
+                ORDER BY a3.fecha DESC, a3.id DESC
+                LIMIT 1
+            )
+            {filtro_potreros}
+            ON DUPLICATE KEY UPDATE
+                ultimo_aforo_id = VALUES(ultimo_aforo_id),
+                ultima_fecha = VALUES(ultima_fecha),
+                dias_rotacion = VALUES(dias_rotacion),
+                promedio_rotacion = VALUES(promedio_rotacion),
+                total_aforos = VALUES(total_aforos)
+        """
+        
+        propio = cursor is None
+        if propio:
+            cursor = mysql.connection.cursor()
+        try:
+            cursor.execute(query, tuple(params))
+            if propio:
+                mysql.connection.commit()
+        finally:
+            if propio:
+                cursor.close()
+    
     @staticmethod
     def get_by_id(potrero_id):
         cursor = mysql.connection.cursor()
@@ -151,8 +256,12 @@ class Potrero:
             "VALUES (%s, %s, %s, %s, %s)",
             (nombre, hectareas, tipo_pasto, etapa_ganado, descripcion)
         )
-        mysql.connection.commit()
+        # Antes de incrementar_version, que ejecuta otro INSERT en el mismo cursor
         potrero_id = cursor.lastrowid
+        incrementar_version(cursor, 'potreros')
+        mysql.connection.commit()
+        contadores.invalidar('potreros')
+        catalogo_potreros.invalidar()
         cursor.close()
         return potrero_id
     
@@ -164,8 +273,10 @@ class Potrero:
             "descripcion = %s WHERE id = %s",
             (nombre, hectareas, tipo_pasto, etapa_ganado, descripcion, potrero_id)
         )
-        mysql.connection.commit()
         affected_rows = cursor.rowcount
+        incrementar_version(cursor, 'potreros')
+        mysql.connection.commit()
+        catalogo_potreros.invalidar()
         cursor.close()
         return affected_rows > 0
     
@@ -173,8 +284,12 @@ class Potrero:
     def delete(potrero_id):
         cursor = mysql.connection.cursor()
         cursor.execute("DELETE FROM potreros WHERE id = %s", (potrero_id,))
-        mysql.connection.commit()
         affected_rows = cursor.rowcount
+        # El borrado en cascada también cambia los datos de los gráficos
+        incrementar_version(cursor, 'potreros', 'aforos', 'ph', 'recorridos')
+        mysql.connection.commit()
+        contadores.invalidar('potreros')
+        catalogo_potreros.invalidar()
         cursor.close()
         return affected_rows > 0
 
@@ -184,7 +299,12 @@ class Potrero:
         Obtiene información sobre el último aforo de cada potrero y calcula los días en rotación.
         Retorna una lista de diccionarios con id del potrero, nombre, fecha del último aforo y días en rotación.
         """
-        query = """
+        ultimos = ultimo_por_grupo(
+            'aforos',
+            'id, potrero_id, fecha, materia_verde, porcentaje_ms, materia_seca, '
+            'dias_rotacion, promedio_dias_rotacion'
+        )
+        query = f"""
             SELECT 
                 p.id, 
                 p.nombre, 
@@ -201,16 +321,7 @@ class Potrero:
                 a.materia_seca
             FROM 
                 potreros p
-            LEFT JOIN (
-                SELECT potrero_id, fecha, materia_verde, porcentaje_ms, materia_seca, 
-                       dias_rotacion, promedio_dias_rotacion
-                FROM aforos
-                WHERE (potrero_id, fecha) IN (
-                    SELECT potrero_id, MAX(fecha) as max_fecha
-                    FROM aforos
-                    GROUP BY potrero_id
-                )
-            ) a ON p.id = a.potrero_id
+            LEFT JOIN ({ultimos}) a ON p.id = a.potrero_id
             ORDER BY p.nombre
         """
         
@@ -221,123 +332,245 @@ class Potrero:
         
         return resultados
 
+_SQL_INSERTAR_AFOROS = """
+    INSERT INTO aforos 
+    (potrero_id, fecha, materia_verde, porcentaje_ms, materia_seca, 
+     dias_rotacion, promedio_dias_rotacion, materia_verde_total, materia_seca_total, observaciones,
+     altura_pasto, peso_verde, peso_seco) 
+    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+"""
+
 class Aforo:
     @staticmethod
-    def get_all(page=1, per_page=10, fecha_inicio=None, fecha_fin=None, potrero_id=None):
-        offset = (page - 1) * per_page
-        query = "SELECT a.*, p.nombre as potrero_nombre, p.hectareas FROM aforos a JOIN potreros p ON a.potrero_id = p.id WHERE 1=1"
+    def _filtros(fecha_inicio=None, fecha_fin=None, potrero_id=None):
+        """Condiciones WHERE (sobre el alias a) y parámetros de los listados de aforos"""
+        condiciones = ""
         params = []
         
         if fecha_inicio:
-            query += " AND a.fecha >= %s"
+            condiciones += " AND a.fecha >= %s"
             params.append(fecha_inicio)
         if fecha_fin:
-            query += " AND a.fecha <= %s"
+            condiciones += " AND a.fecha <= %s"
             params.append(fecha_fin)
         if potrero_id:
-            query += " AND a.potrero_id = %s"
+            condiciones += " AND a.potrero_id = %s"
             params.append(potrero_id)
-            
+        
+        return condiciones, params
+    
+    @staticmethod
+    def get_all(page=1, per_page=10, fecha_inicio=None, fecha_fin=None, potrero_id=None):
+        offset = (page - 1) * per_page
+        condiciones, params = Aforo._filtros(fecha_inicio, fecha_fin, potrero_id)
+        query = "SELECT a.*, p.nombre as potrero_nombre, p.hectareas FROM aforos a JOIN potreros p ON a.potrero_id = p.id WHERE 1=1" + condiciones
         query += " ORDER BY a.fecha DESC LIMIT %s OFFSET %s"
-        params.extend([per_page, offset])
         
         cursor = mysql.connection.cursor()
-        cursor.execute(query, tuple(params))
+        cursor.execute(query, tuple(params + [per_page, offset]))
         aforos = cursor.fetchall()
         
         # Contar total
-        count_query = "SELECT COUNT(*) as total FROM aforos a WHERE 1=1"
-        count_params = []
-        
-        if fecha_inicio:
-            count_query += " AND a.fecha >= %s"
-            count_params.append(fecha_inicio)
-        if fecha_fin:
-            count_query += " AND a.fecha <= %s"
-            count_params.append(fecha_fin)
-        if potrero_id:
-            count_query += " AND a.potrero_id = %s"
-            count_params.append(potrero_id)
-            
-        cursor.execute(count_query, tuple(count_params))
+        count_query = "SELECT COUNT(*) as total FROM aforos a WHERE 1=1" + condiciones
+        cursor.execute(count_query, tuple(params))
         total = cursor.fetchone()['total']
         cursor.close()
         return aforos, total
     
+    @staticmethod
+    def get_export_query(fecha_inicio=None, fecha_fin=None, potrero_id=None):
+        """(query, params) de exportación con los mismos filtros que get_all, en orden cronológico"""
+        condiciones, params = Aforo._filtros(fecha_inicio, fecha_fin, potrero_id)
+        query = "SELECT p.nombre as potrero_nombre, a.* FROM aforos a JOIN potreros p ON a.potrero_id = p.id WHERE 1=1" + condiciones
+        return query + " ORDER BY a.fecha, a.id", params
+    
+    @staticmethod
+    def get_pagina(per_page=10, cursor=None, offset=0, conteo='exacto', fecha_inicio=None, fecha_fin=None, potrero_id=None):
+        """Página de aforos por cursor (fecha, id); ver proyecto.utils.pagination"""
+        condiciones, params = Aforo._filtros(fecha_inicio, fecha_fin, potrero_id)
+        db_cursor = mysql.connection.cursor()
+        try:
+            return paginar(
+                db_cursor,
+                "SELECT a.*, p.nombre as potrero_nombre, p.hectareas FROM aforos a JOIN potreros p ON a.potrero_id = p.id",
+                "aforos a", "a", condiciones, params,
+                per_page=per_page, cursor=cursor, offset=offset, conteo=conteo
+            )
+        finally:
+            db_cursor.close()
+    
     @staticmethod
     def create(potrero_id, fecha, materia_verde, porcentaje_ms, materia_seca, observaciones=None, dias_rotacion=None, promedio_dias_rotacion=None, altura_pasto=None, peso_verde=None, peso_seco=None):
         cursor = mysql.connection.cursor()
         
-        # Determinar días en rotación si no se proporciona
-        if dias_rotacion is None:
-            # Obtener la fecha del último aforo para este potrero
-            cursor.execute(
-                "SELECT MAX(fecha) as ultima_fecha FROM aforos WHERE potrero_id = %s AND fecha < %s",
-                (potrero_id, fecha)
-            )
-            resultado = cursor.fetchone()
-            ultima_fecha = resultado['ultima_fecha'] if resultado else None
-            
-            if ultima_fecha:
-                # Calcular días entre el último aforo y el actual
-                dias_rotacion = (fecha.date() - ultima_fecha).days
-            else:
-                # Si no hay aforos previos, usar 0 como valor predeterminado
-                dias_rotacion = 0
-        
-        # Calcular promedio de días en rotación si no se proporciona
-        if promedio_dias_rotacion is None:
-            cursor.execute(
-                "SELECT AVG(dias_rotacion) as promedio FROM aforos WHERE potrero_id = %s AND dias_rotacion IS NOT NULL AND dias_rotacion > 0",
-                (potrero_id,)
-            )
-            resultado = cursor.fetchone()
-            promedio_anterior = resultado['promedio'] if resultado and resultado['promedio'] else 0
-            
-            # Calcular el nuevo promedio, incluyendo el valor actual si es mayor que 0
-            if dias_rotacion and dias_rotacion > 0:
-                # Obtener la cantidad de registros anteriores con días_rotacion > 0
-                cursor.execute(
-                    "SELECT COUNT(*) as total FROM aforos WHERE potrero_id = %s AND dias_rotacion IS NOT NULL AND dias_rotacion > 0",
-                    (potrero_id,)
-                )
-                count_result = cursor.fetchone()
-                num_registros = count_result['total'] if count_result else 0
-                
-                if num_registros > 0:
-                    # Si hay registros anteriores, calcular el nuevo promedio incluyendo el valor actual
-                    promedio_dias_rotacion = (float(promedio_anterior) * num_registros + float(dias_rotacion)) / (num_registros + 1)
-                else:
-                    # Si no hay registros anteriores, el promedio es el valor actual
-                    promedio_dias_rotacion = float(dias_rotacion)
-            else:
-                # Si el valor actual es 0, mantener el promedio anterior
-                promedio_dias_rotacion = promedio_anterior if promedio_anterior > 0 else 0
-        
-        # Obtener hectáreas del potrero para calcular totales
-        cursor.execute("SELECT hectareas FROM potreros WHERE id = %s", (potrero_id,))
-        potrero = cursor.fetchone()
-        hectareas = float(potrero['hectareas']) if potrero else 0
-        
-        # Calcular totales (multiplicando por hectáreas y por 10000 m² por hectárea)
-        materia_verde_total = float(materia_verde) * hectareas * 10000
-        materia_seca_total = float(materia_seca) * hectareas * 10000
-        
+        # Un solo INSERT ... SELECT calcula en el servidor los días en rotación
+        # (respecto al aforo anterior), el promedio de rotación del potrero y los
+        # totales por hectárea. Los valores explícitos tienen prioridad.
         cursor.execute(
             """INSERT INTO aforos 
                (potrero_id, fecha, materia_verde, porcentaje_ms, materia_seca, 
                 dias_rotacion, promedio_dias_rotacion, materia_verde_total, materia_seca_total, observaciones,
                 altura_pasto, peso_verde, peso_seco) 
-               VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)""",
-            (potrero_id, fecha, materia_verde, porcentaje_ms, materia_seca, 
-             dias_rotacion, promedio_dias_rotacion, materia_verde_total, materia_seca_total, observaciones,
-             altura_pasto, peso_verde, peso_seco)
+               SELECT 
+                   base.id, %s, %s, %s, %s,
+                   base.dias,
+                   COALESCE(%s, CASE 
+                       WHEN base.dias > 0 THEN (base.suma_dias + base.dias) / (base.num_registros + 1)
+                       WHEN base.num_registros > 0 THEN base.suma_dias / base.num_registros
+                       ELSE 0 END),
+                   %s * base.hectareas * 10000,
+                   %s * base.hectareas * 10000,
+                   %s, %s, %s, %s
+               FROM (
+                   SELECT 
+                       p.id,
+                       COALESCE(p.hectareas, 0) as hectareas,
+                       COALESCE(%s, DATEDIFF(%s, (
+                           SELECT MAX(a.fecha) FROM aforos a
+                           WHERE a.potrero_id = p.id AND a.fecha < %s
+                       )), 0) as dias,
+                       COALESCE(r.suma_dias, 0) as suma_dias,
+                       COALESCE(r.num_registros, 0) as num_registros
+                   FROM potreros p
+                   LEFT JOIN (
+                       SELECT potrero_id, SUM(dias_rotacion) as suma_dias, COUNT(*) as num_registros
+                       FROM aforos
+                       WHERE potrero_id = %s AND dias_rotacion > 0
+                       GROUP BY potrero_id
+                   ) r ON r.potrero_id = p.id
+                   WHERE p.id = %s
+               ) base""",
+            (fecha, materia_verde, porcentaje_ms, materia_seca,
+             promedio_dias_rotacion,
+             materia_verde, materia_seca,
+             observaciones, altura_pasto, peso_verde, peso_seco,
+             dias_rotacion, fecha, fecha,
+             potrero_id, potrero_id)
         )
-        mysql.connection.commit()
+        
+        if cursor.rowcount == 0:
+            # El potrero no existe
+            cursor.close()
+            return None
         aforo_id = cursor.lastrowid
+        
+        # Mantener el resumen de rotación del potrero en la misma transacción
+        Potrero.refrescar_resumen(potrero_id, cursor)
+        incrementar_version(cursor, 'aforos')
+        
+        mysql.connection.commit()
+        contadores.invalidar('aforos')
         cursor.close()
+        auditoria.registrar('aforos', aforo_id, 'CREATE', {
+            'potrero_id': potrero_id, 'fecha': fecha, 'materia_verde': materia_verde,
+            'porcentaje_ms': porcentaje_ms, 'materia_seca': materia_seca,
+        })
         return aforo_id
     
+    @staticmethod
+    def create_many(aforos):
+        """
+        Crear varios aforos en una sola transacción.
+        Cada elemento es un dict con los mismos campos que Aforo.create (ver
+        Aforo.preparar_filas); se insertan todos con executemany. Retorna la
+        cantidad insertada.
+        """
+        if not aforos:
+            return 0
+        
+        cursor = mysql.connection.cursor()
+        try:
+            filas, potrero_ids = Aforo.preparar_filas(cursor, aforos)
+            cursor.executemany(_SQL_INSERTAR_AFOROS, filas)
+            primer_id = cursor.lastrowid
+            
+            Potrero.refrescar_resumen(potrero_ids, cursor)
+            incrementar_version(cursor, 'aforos')
+            mysql.connection.commit()
+            contadores.invalidar('aforos')
+            # Un evento por lote: executemany sólo informa el id del primer aforo
+            auditoria.registrar('aforos', primer_id, 'CREATE', {'lote': len(filas), 'potreros': potrero_ids})
+            return len(filas)
+        except Exception:
+            mysql.connection.rollback()
+            raise
+        finally:
+            cursor.close()
+    
+    @staticmethod
+    def preparar_filas(cursor, aforos):
+        """
+        Tuplas para _SQL_INSERTAR_AFOROS y lista de potreros involucrados.
+        Los días y el promedio de rotación se calculan en memoria a partir de una
+        única lectura de los aforos existentes de esos potreros, procesando el lote
+        en orden de fecha. Lanza ValueError si un potrero no existe. No escribe.
+        """
+        potrero_ids = sorted({int(a['potrero_id']) for a in aforos})
+        marcadores = ', '.join(['%s'] * len(potrero_ids))
+        
+        # Única lectura: hectáreas y fechas/días de rotación existentes por potrero
+        cursor.execute(f"""
+            SELECT p.id as potrero_id, COALESCE(p.hectareas, 0) as hectareas,
+                   a.fecha, a.dias_rotacion
+            FROM potreros p
+            LEFT JOIN aforos a ON a.potrero_id = p.id
+            WHERE p.id IN ({marcadores})
+        """, tuple(potrero_ids))
+        
+        estado = {}
+        for fila in cursor.fetchall():
+            info = estado.setdefault(fila['potrero_id'], {
+                'hectareas': float(fila['hectareas']), 'fechas': [], 'suma_dias': 0, 'num_registros': 0
+            })
+            if fila['fecha'] is not None:
+                info['fechas'].append(_como_fecha(fila['fecha']))
+            if fila['dias_rotacion'] and fila['dias_rotacion'] > 0:
+                info['suma_dias'] += fila['dias_rotacion']
+                info['num_registros'] += 1
+        for info in estado.values():
+            info['fechas'].sort()
+        
+        filas = []
+        for aforo in sorted(aforos, key=lambda a: (int(a['potrero_id']), _como_fecha(a['fecha']))):
+            potrero_id = int(aforo['potrero_id'])
+            info = estado.get(potrero_id)
+            if info is None:
+                raise ValueError(f"Potrero {potrero_id} no existe")
+            fecha = _como_fecha(aforo['fecha'])
+            
+            dias_rotacion = aforo.get('dias_rotacion')
+            if dias_rotacion is None:
+                posicion = bisect_left(info['fechas'], fecha)
+                dias_rotacion = (fecha - info['fechas'][posicion - 1]).days if posicion > 0 else 0
+            
+            promedio_dias_rotacion = aforo.get('promedio_dias_rotacion')
+            if promedio_dias_rotacion is None:
+                if dias_rotacion > 0:
+                    promedio_dias_rotacion = (info['suma_dias'] + dias_rotacion) / (info['num_registros'] + 1)
+                elif info['num_registros'] > 0:
+                    promedio_dias_rotacion = info['suma_dias'] / info['num_registros']
+                else:
+                    promedio_dias_rotacion = 0
+            
+            # Los aforos siguientes del mismo potrero ven a este como anterior
+            insort(info['fechas'], fecha)
+            if dias_rotacion > 0:
+                info['suma_dias'] += dias_rotacion
+                info['num_registros'] += 1
+            
+            materia_verde = float(aforo['materia_verde'])
+            materia_seca = float(aforo['materia_seca'])
+            filas.append((
+                potrero_id, fecha, materia_verde, aforo['porcentaje_ms'], materia_seca,
+                dias_rotacion, promedio_dias_rotacion,
+                materia_verde * info['hectareas'] * 10000,
+                materia_seca * info['hectareas'] * 10000,
+                aforo.get('observaciones'), aforo.get('altura_pasto'),
+                aforo.get('peso_verde'), aforo.get('peso_seco')
+            ))
+        
+        return filas, potrero_ids
+    
     @staticmethod
     def get_data_for_chart(potrero_id=None, meses=6):
         query = """
@@ -516,18 +749,13 @@ class Aforo:
                 """, (potrero_id,))
             else:
                 # Get the latest aforo for each potrero
-                cur.execute("""
+                cur.execute(f"""
                     SELECT 
                         a.id,
                         a.fecha,
                         p.nombre as potrero_nombre,
                         a.dias_rotacion
-                    FROM aforos a
-                    JOIN (
-                        SELECT potrero_id, MAX(fecha) as max_fecha
-                        FROM aforos
-                        GROUP BY potrero_id
-                    ) as latest ON a.potrero_id = latest.potrero_id AND a.fecha = latest.max_fecha
+                    FROM ({ultimo_por_grupo('aforos', 'id, potrero_id, fecha, dias_rotacion')}) a
                     JOIN potreros p ON a.potrero_id = p.id
                     ORDER BY a.dias_rotacion DESC
                     LIMIT 20
@@ -546,7 +774,8 @@ class Aforo:
             return []
 
     @staticmethod
-    def get_timeline_data(potrero_id=None, months=12):
+    def get_timeline_data(potrero_id=None, months=12, max_points=None, metodo='lttb'):
+        """Serie de materia verde/seca por potrero; con max_points se reduce cada potrero (ver proyecto.utils.series)"""
         try:
             cur = mysql.connection.cursor()
             
@@ -578,7 +807,7 @@ class Aforo:
             cur.execute(query, params)
             aforos = cur.fetchall()
             
-            return [{
+            datos = [{
                 'fecha': a['fecha'].strftime('%Y-%m-%d'),
                 'potrero_id': a['potrero_id'],
                 'potrero_nombre': a['potrero_nombre'],
@@ -586,53 +815,70 @@ class Aforo:
                 'materia_seca': float(a['materia_seca']),
                 'porcentaje_ms': float(a['porcentaje_ms'])
             } for a in aforos]
+            return series.reducir_filas(datos, max_points, 'fecha', 'materia_seca', grupo='potrero_id', metodo=metodo)
         except Exception as e:
             current_app.logger.error(f"Error in get_timeline_data: {e}")
             return []
 
 class PH:
     @staticmethod
-    def get_all(page=1, per_page=10, fecha_inicio=None, fecha_fin=None, potrero_id=None):
-        offset = (page - 1) * per_page
-        query = "SELECT ph.*, p.nombre as potrero_nombre FROM ph ph JOIN potreros p ON ph.potrero_id = p.id WHERE 1=1"
+    def _filtros(fecha_inicio=None, fecha_fin=None, potrero_id=None):
+        """Condiciones WHERE (sobre el alias ph) y parámetros de los listados de pH"""
+        condiciones = ""
         params = []
         
         if fecha_inicio:
-            query += " AND ph.fecha >= %s"
+            condiciones += " AND ph.fecha >= %s"
             params.append(fecha_inicio)
         if fecha_fin:
-            query += " AND ph.fecha <= %s"
+            condiciones += " AND ph.fecha <= %s"
             params.append(fecha_fin)
         if potrero_id:
-            query += " AND ph.potrero_id = %s"
+            condiciones += " AND ph.potrero_id = %s"
             params.append(potrero_id)
-            
+        
+        return condiciones, params
+    
+    @staticmethod
+    def get_all(page=1, per_page=10, fecha_inicio=None, fecha_fin=None, potrero_id=None):
+        offset = (page - 1) * per_page
+        condiciones, params = PH._filtros(fecha_inicio, fecha_fin, potrero_id)
+        query = "SELECT ph.*, p.nombre as potrero_nombre FROM ph ph JOIN potreros p ON ph.potrero_id = p.id WHERE 1=1" + condiciones
         query += " ORDER BY ph.fecha DESC LIMIT %s OFFSET %s"
-        params.extend([per_page, offset])
         
         cursor = mysql.connection.cursor()
-        cursor.execute(query, tuple(params))
+        cursor.execute(query, tuple(params + [per_page, offset]))
         ph_records = cursor.fetchall()
         
         # Contar total
-        count_query = "SELECT COUNT(*) as total FROM ph WHERE 1=1"
-        count_params = []
-        
-        if fecha_inicio:
-            count_query += " AND fecha >= %s"
-            count_params.append(fecha_inicio)
-        if fecha_fin:
-            count_query += " AND fecha <= %s"
-            count_params.append(fecha_fin)
-        if potrero_id:
-            count_query += " AND potrero_id = %s"
-            count_params.append(potrero_id)
-            
-        cursor.execute(count_query, tuple(count_params))
+        count_query = "SELECT COUNT(*) as total FROM ph ph WHERE 1=1" + condiciones
+        cursor.execute(count_query, tuple(params))
         total = cursor.fetchone()['total']
         cursor.close()
         return ph_records, total
     
+    @staticmethod
+    def get_export_query(fecha_inicio=None, fecha_fin=None, potrero_id=None):
+        """(query, params) de exportación con los mismos filtros que get_all, en orden cronológico"""
+        condiciones, params = PH._filtros(fecha_inicio, fecha_fin, potrero_id)
+        query = "SELECT p.nombre as potrero_nombre, ph.* FROM ph ph JOIN potreros p ON ph.potrero_id = p.id WHERE 1=1" + condiciones
+        return query + " ORDER BY ph.fecha, ph.id", params
+    
+    @staticmethod
+    def get_pagina(per_page=10, cursor=None, offset=0, conteo='exacto', fecha_inicio=None, fecha_fin=None, potrero_id=None):
+        """Página de registros de pH por cursor (fecha, id)"""
+        condiciones, params = PH._filtros(fecha_inicio, fecha_fin, potrero_id)
+        db_cursor = mysql.connection.cursor()
+        try:
+            return paginar(
+                db_cursor,
+                "SELECT ph.*, p.nombre as potrero_nombre FROM ph ph JOIN potreros p ON ph.potrero_id = p.id",
+                "ph ph", "ph", condiciones, params,
+                per_page=per_page, cursor=cursor, offset=offset, conteo=conteo
+            )
+        finally:
+            db_cursor.close()
+    
     @staticmethod
     def create(potrero_id, fecha, valor, observaciones=None):
         if not 0 <= valor <= 14:
@@ -643,8 +889,9 @@ class PH:
             "INSERT INTO ph (potrero_id, fecha, valor, observaciones) VALUES (%s, %s, %s, %s)",
             (potrero_id, fecha, valor, observaciones)
         )
-        mysql.connection.commit()
         ph_id = cursor.lastrowid
+        incrementar_version(cursor, 'ph')
+        mysql.connection.commit()
         cursor.close()
         return ph_id
         
@@ -672,64 +919,99 @@ class PH:
 
 class Actividad:
     @staticmethod
-    def get_all(page=1, per_page=10, fecha_inicio=None, fecha_fin=None, potrero_id=None, tipo_actividad=None, estado=None):
-        offset = (page - 1) * per_page
-        query = """
-            SELECT a.*, p.nombre as potrero_nombre 
-            FROM actividades a 
-            JOIN potreros p ON a.potrero_id = p.id 
-            WHERE 1=1
-        """
+    def _filtros(fecha_inicio=None, fecha_fin=None, potrero_id=None, tipo_actividad=None, estado=None):
+        """Condiciones WHERE (sobre el alias a) y parámetros comunes a los listados de actividades"""
+        condiciones = ""
         params = []
         
         if fecha_inicio:
-            query += " AND a.fecha >= %s"
+            condiciones += " AND a.fecha >= %s"
             params.append(fecha_inicio)
         if fecha_fin:
-            query += " AND a.fecha <= %s"
+            condiciones += " AND a.fecha <= %s"
             params.append(fecha_fin)
         if potrero_id:
-            query += " AND a.potrero_id = %s"
+            condiciones += " AND a.potrero_id = %s"
             params.append(potrero_id)
         if tipo_actividad:
-            query += " AND a.tipo_actividad = %s"
+            condiciones += " AND a.tipo_actividad = %s"
             params.append(tipo_actividad)
         if estado:
-            query += " AND a.estado = %s"
+            condiciones += " AND a.estado = %s"
             params.append(estado)
+        
+        return condiciones, params
+    
+    @staticmethod
+    def get_all(page=1, per_page=10, fecha_inicio=None, fecha_fin=None, potrero_id=None, tipo_actividad=None, estado=None):
+        offset = (page - 1) * per_page
+        condiciones, params = Actividad._filtros(fecha_inicio, fecha_fin, potrero_id, tipo_actividad, estado)
+        query = """
+            SELECT a.*, p.nombre as potrero_nombre 
+            FROM actividades a 
+            JOIN potreros p ON a.potrero_id = p.id 
+            WHERE 1=1
+        """ + condiciones
             
         query += " ORDER BY a.fecha DESC LIMIT %s OFFSET %s"
-        params.extend([per_page, offset])
         
         cursor = mysql.connection.cursor()
-        cursor.execute(query, tuple(params))
+        cursor.execute(query, tuple(params + [per_page, offset]))
         actividades = cursor.fetchall()
         
         # Contar total
-        count_query = "SELECT COUNT(*) as total FROM actividades a WHERE 1=1"
-        count_params = []
-        
-        if fecha_inicio:
-            count_query += " AND a.fecha >= %s"
-            count_params.append(fecha_inicio)
-        if fecha_fin:
-            count_query += " AND a.fecha <= %s"
-            count_params.append(fecha_fin)
-        if potrero_id:
-            count_query += " AND a.potrero_id = %s"
-            count_params.append(potrero_id)
-        if tipo_actividad:
-            count_query += " AND a.tipo_actividad = %s"
-            count_params.append(tipo_actividad)
-        if estado:
-            count_query += " AND a.estado = %s"
-            count_params.append(estado)
-            
-        cursor.execute(count_query, tuple(count_params))
+        count_query = "SELECT COUNT(*) as total FROM actividades a WHERE 1=1" + condiciones
+        cursor.execute(count_query, tuple(params))
         total = cursor.fetchone()['total']
         cursor.close()
         return actividades, total
     
+    @staticmethod
+    def get_export_query(fecha_inicio=None, fecha_fin=None, potrero_id=None, tipo_actividad=None, estado=None):
+        """(query, params) de exportación con los mismos filtros que get_all, en orden cronológico"""
+        condiciones, params = Actividad._filtros(fecha_inicio, fecha_fin, potrero_id, tipo_actividad, estado)
+        query = "SELECT p.nombre as potrero_nombre, a.* FROM actividades a JOIN potreros p ON a.potrero_id = p.id WHERE 1=1" + condiciones
+        return query + " ORDER BY a.fecha, a.id", params
+    
+    @staticmethod
+    def get_pagina(per_page=10, cursor=None, offset=0, conteo='exacto', fecha_inicio=None, fecha_fin=None,
+                   potrero_id=None, tipo_actividad=None, estado=None):
+        """Página de actividades por cursor (fecha, id)"""
+        condiciones, params = Actividad._filtros(fecha_inicio, fecha_fin, potrero_id, tipo_actividad, estado)
+        db_cursor = mysql.connection.cursor()
+        try:
+            return paginar(
+                db_cursor,
+                "SELECT a.*, p.nombre as potrero_nombre FROM actividades a JOIN potreros p ON a.potrero_id = p.id",
+                "actividades a", "a", condiciones, params,
+                per_page=per_page, cursor=cursor, offset=offset, conteo=conteo
+            )
+        finally:
+            db_cursor.close()
+    
+    @staticmethod
+    def get_stats(fecha_inicio=None, fecha_fin=None, potrero_id=None, tipo_actividad=None):
+        """
+        Conteo de actividades por estado en una sola consulta agrupada, con los mismos
+        filtros de Actividad.get_all (salvo el estado, que es lo que se desglosa).
+        """
+        condiciones, params = Actividad._filtros(fecha_inicio, fecha_fin, potrero_id, tipo_actividad)
+        cursor = mysql.connection.cursor()
+        cursor.execute(
+            "SELECT a.estado, COUNT(*) as total FROM actividades a WHERE 1=1" + condiciones +
+            " GROUP BY a.estado",
+            tuple(params)
+        )
+        por_estado = {fila['estado']: int(fila['total']) for fila in cursor.fetchall()}
+        cursor.close()
+        
+        return {
+            'pendientes': por_estado.get('Pendiente', 0),
+            'en_progreso': por_estado.get('En Progreso', 0),
+            'completadas': por_estado.get('Completada', 0),
+            'total': sum(por_estado.values())
+        }
+    
     @staticmethod
     def create(potrero_id, fecha, tipo_actividad, descripcion, responsable=None, costo=None, estado="Pendiente"):
         cursor = mysql.connection.cursor()
@@ -759,8 +1041,13 @@ class Actividad:
         try:
             cursor.execute(query, (potrero_id, fecha, tipo_actividad, descripcion, responsable, costo, estado))
             mysql.connection.commit()
+            contadores.invalidar('actividades')
             actividad_id = cursor.lastrowid
             cursor.close()
+            auditoria.registrar('actividades', actividad_id, 'CREATE', {
+                'potrero_id': potrero_id, 'fecha': fecha, 'tipo_actividad': tipo_actividad,
+                'responsable': responsable, 'costo': costo, 'estado': estado,
+            })
             return actividad_id
         except Exception as e:
             print(f"ERROR en la inserción: {e}")
@@ -817,6 +1104,10 @@ class Actividad:
             # (por ejemplo, si los datos eran iguales a los existentes)
             print(f"DEBUG - Actualización: Filas afectadas: {cursor.rowcount}")
             cursor.close()
+            auditoria.registrar('actividades', actividad_id, 'UPDATE', {'new': {
+                'potrero_id': potrero_id, 'fecha': fecha, 'tipo_actividad': tipo_actividad,
+                'descripcion': descripcion, 'responsable': responsable, 'costo': costo, 'estado': estado,
+            }})
             return True
         except Exception as e:
             print(f"ERROR en la actualización: {e}")
@@ -829,8 +1120,11 @@ class Actividad:
         cursor = mysql.connection.cursor()
         cursor.execute("DELETE FROM actividades WHERE id = %s", (actividad_id,))
         mysql.connection.commit()
+        contadores.invalidar('actividades')
         affected_rows = cursor.rowcount
         cursor.close()
+        if affected_rows > 0:
+            auditoria.registrar('actividades', actividad_id, 'DELETE')
         return affected_rows > 0
 
     @staticmethod
@@ -875,44 +1169,131 @@ class Actividad:
             current_app.logger.error(f"Error in get_in_progress: {e}")
             return []
 
+# Rollups de clima: una fila por mes (periodo = día 1) y por semana (periodo = lunes)
+ROLLUPS_CLIMA = {
+    'mensual': 'clima_rollup_mensual',
+    'semanal': 'clima_rollup_semanal',
+}
+# Columnas diarias que se suman en los rollups. Cada una lleva además la cantidad
+# de días con valor (dias_*): los promedios son suma / dias_* y, como el AVG sobre
+# los días, no cuentan los NULL
+_CAMPOS_ROLLUP_CLIMA = ('temperatura_min', 'temperatura_max', 'temperatura_promedio', 'lluvia',
+                        'humedad', 'velocidad_viento', 'horas_sol')
+
+_SQL_ROLLUP_CLIMA = """
+    INSERT INTO {tabla}
+        (periodo, total_dias, suma_temp_min, suma_temp_max, suma_temp_promedio, suma_lluvia,
+         suma_humedad, suma_viento, suma_horas_sol, dias_temp_min, dias_temp_max, dias_temp_promedio,
+         dias_lluvia, dias_humedad, dias_viento, dias_horas_sol, temp_min_absoluta, temp_max_absoluta)
+    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+    ON DUPLICATE KEY UPDATE
+        total_dias = total_dias + VALUES(total_dias),
+        suma_temp_min = suma_temp_min + VALUES(suma_temp_min),
+        suma_temp_max = suma_temp_max + VALUES(suma_temp_max),
+        suma_temp_promedio = suma_temp_promedio + VALUES(suma_temp_promedio),
+        suma_lluvia = suma_lluvia + VALUES(suma_lluvia),
+        suma_humedad = suma_humedad + VALUES(suma_humedad),
+        suma_viento = suma_viento + VALUES(suma_viento),
+        suma_horas_sol = suma_horas_sol + VALUES(suma_horas_sol),
+        dias_temp_min = dias_temp_min + VALUES(dias_temp_min),
+        dias_temp_max = dias_temp_max + VALUES(dias_temp_max),
+        dias_temp_promedio = dias_temp_promedio + VALUES(dias_temp_promedio),
+        dias_lluvia = dias_lluvia + VALUES(dias_lluvia),
+        dias_humedad = dias_humedad + VALUES(dias_humedad),
+        dias_viento = dias_viento + VALUES(dias_viento),
+        dias_horas_sol = dias_horas_sol + VALUES(dias_horas_sol),
+        temp_min_absoluta = LEAST(COALESCE(temp_min_absoluta, VALUES(temp_min_absoluta)),
+                                  COALESCE(VALUES(temp_min_absoluta), temp_min_absoluta)),
+        temp_max_absoluta = GREATEST(COALESCE(temp_max_absoluta, VALUES(temp_max_absoluta)),
+                                     COALESCE(VALUES(temp_max_absoluta), temp_max_absoluta))
+"""
+
+# Mismas columnas que devolvía el resumen mensual calculado sobre los días
+_SQL_RESUMEN_ROLLUP_CLIMA = """
+    SELECT periodo, total_dias,
+        suma_temp_min / NULLIF(dias_temp_min, 0) as temp_min_promedio,
+        suma_temp_max / NULLIF(dias_temp_max, 0) as temp_max_promedio,
+        suma_temp_promedio / NULLIF(dias_temp_promedio, 0) as temp_promedio,
+        temp_min_absoluta, temp_max_absoluta,
+        IF(dias_lluvia > 0, suma_lluvia, NULL) as lluvia_total,
+        suma_lluvia / NULLIF(dias_lluvia, 0) as lluvia_promedio,
+        suma_humedad / NULLIF(dias_humedad, 0) as humedad_promedio,
+        suma_viento / NULLIF(dias_viento, 0) as viento_promedio,
+        IF(dias_horas_sol > 0, suma_horas_sol, NULL) as horas_sol_total
+    FROM {tabla}
+"""
+
+
+def _periodos_clima(fecha):
+    """[(tabla de rollup, inicio del período, inicio del siguiente)] de una fecha"""
+    fecha = _como_fecha(fecha)
+    mes = fecha.replace(day=1)
+    lunes = fecha - timedelta(days=fecha.weekday())
+    return [
+        ('clima_rollup_mensual', mes, (mes + timedelta(days=32)).replace(day=1)),
+        ('clima_rollup_semanal', lunes, lunes + timedelta(days=7)),
+    ]
+
+
+def _valor(numero):
+    return float(numero) if numero is not None else 0.0
+
+
 class Clima:
     @staticmethod
-    def get_all(page=1, per_page=10, fecha_inicio=None, fecha_fin=None):
-        """Obtener todos los registros de clima con paginación y filtros"""
-        offset = (page - 1) * per_page
-        query = "SELECT * FROM clima WHERE 1=1"
+    def _filtros(fecha_inicio=None, fecha_fin=None):
+        """Condiciones WHERE y parámetros de los listados de clima"""
+        condiciones = ""
         params = []
         
         if fecha_inicio:
-            query += " AND fecha >= %s"
+            condiciones += " AND clima.fecha >= %s"
             params.append(fecha_inicio)
         if fecha_fin:
-            query += " AND fecha <= %s"
+            condiciones += " AND clima.fecha <= %s"
             params.append(fecha_fin)
-            
+        
+        return condiciones, params
+    
+    @staticmethod
+    def get_all(page=1, per_page=10, fecha_inicio=None, fecha_fin=None):
+        """Obtener todos los registros de clima con paginación y filtros"""
+        offset = (page - 1) * per_page
+        condiciones, params = Clima._filtros(fecha_inicio, fecha_fin)
+        query = "SELECT * FROM clima WHERE 1=1" + condiciones
         query += " ORDER BY fecha DESC LIMIT %s OFFSET %s"
-        params.extend([per_page, offset])
         
         cursor = mysql.connection.cursor()
-        cursor.execute(query, tuple(params))
+        cursor.execute(query, tuple(params + [per_page, offset]))
         registros = cursor.fetchall()
         
         # Contar total
-        count_query = "SELECT COUNT(*) as total FROM clima WHERE 1=1"
-        count_params = []
-        
-        if fecha_inicio:
-            count_query += " AND fecha >= %s"
-            count_params.append(fecha_inicio)
-        if fecha_fin:
-            count_query += " AND fecha <= %s"
-            count_params.append(fecha_fin)
-            
-        cursor.execute(count_query, tuple(count_params))
+        count_query = "SELECT COUNT(*) as total FROM clima WHERE 1=1" + condiciones
+        cursor.execute(count_query, tuple(params))
         total = cursor.fetchone()['total']
         cursor.close()
         return registros, total
     
+    @staticmethod
+    def get_export_query(fecha_inicio=None, fecha_fin=None):
+        """(query, params) de exportación con los mismos filtros que get_all, en orden cronológico"""
+        condiciones, params = Clima._filtros(fecha_inicio, fecha_fin)
+        query = "SELECT * FROM clima WHERE 1=1" + condiciones
+        return query + " ORDER BY clima.fecha, clima.id", params
+    
+    @staticmethod
+    def get_pagina(per_page=10, cursor=None, offset=0, conteo='exacto', fecha_inicio=None, fecha_fin=None):
+        """Página de registros de clima por cursor (fecha, id)"""
+        condiciones, params = Clima._filtros(fecha_inicio, fecha_fin)
+        db_cursor = mysql.connection.cursor()
+        try:
+            return paginar(
+                db_cursor, "SELECT * FROM clima", "clima", "clima", condiciones, params,
+                per_page=per_page, cursor=cursor, offset=offset, conteo=conteo
+            )
+        finally:
+            db_cursor.close()
+    
     @staticmethod
     def create(fecha, temperatura_min, temperatura_max, temperatura_promedio, humedad, 
                presion, lluvia, velocidad_viento, direccion_viento, nubosidad, 
@@ -935,12 +1316,18 @@ class Clima:
                 nubosidad, horas_sol, descripcion, icono, probabilidad_lluvia, 
                 uv_index, visibilidad, punto_rocio
             ))
-            mysql.connection.commit()
             clima_id = cursor.lastrowid
+            Clima._aplicar_rollups(cursor, fecha, dict(zip(_CAMPOS_ROLLUP_CLIMA, (
+                temperatura_min, temperatura_max, temperatura_promedio, lluvia,
+                humedad, velocidad_viento, horas_sol
+            ))))
+            incrementar_version(cursor, 'clima')
+            mysql.connection.commit()
             cursor.close()
             return clima_id
         except Exception as e:
             print(f"Error creando registro de clima: {e}")
+            mysql.connection.rollback()
             cursor.close()
             return None
     
@@ -975,17 +1362,31 @@ class Clima:
                 WHERE fecha = %s
             """
             try:
+                # Valores anteriores bloqueados hasta el commit: el delta de los
+                # rollups no se mezcla con otra edición del mismo día
+                cursor.execute(
+                    f"SELECT {', '.join(_CAMPOS_ROLLUP_CLIMA)} FROM clima WHERE fecha = %s FOR UPDATE",
+                    (fecha,)
+                )
+                anterior = cursor.fetchone()
                 cursor.execute(query, (
                     temperatura_min, temperatura_max, temperatura_promedio, humedad, 
                     presion, lluvia, velocidad_viento, direccion_viento, nubosidad, 
                     horas_sol, descripcion, icono, probabilidad_lluvia, uv_index, 
                     visibilidad, punto_rocio, fecha
                 ))
+                if anterior:
+                    Clima._aplicar_rollups(cursor, fecha, dict(zip(_CAMPOS_ROLLUP_CLIMA, (
+                        temperatura_min, temperatura_max, temperatura_promedio, lluvia,
+                        humedad, velocidad_viento, horas_sol
+                    ))), anterior)
+                incrementar_version(cursor, 'clima')
                 mysql.connection.commit()
                 cursor.close()
                 return existing['id']
             except Exception as e:
                 print(f"Error actualizando registro de clima: {e}")
+                mysql.connection.rollback()
                 cursor.close()
                 return None
         else:
@@ -1010,8 +1411,8 @@ class Clima:
         return registros
     
     @staticmethod
-    def get_data_for_chart(days=30):
-        """Obtener datos formateados para gráficos"""
+    def get_data_for_chart(days=30, max_points=None, metodo='lttb'):
+        """Obtener datos formateados para gráficos (reducidos a max_points si se indica)"""
         registros = Clima.get_latest(days)
         
         data = {
@@ -1033,87 +1434,209 @@ class Clima:
             data['humedad'].append(registro['humedad'])
             data['velocidad_viento'].append(float(registro['velocidad_viento']))
         
-        return data
+        return series.reducir_columnas(data, max_points, 'fechas', 'temperatura_promedio', metodo=metodo)
+    
+    @staticmethod
+    def _aplicar_rollups(cursor, fecha, nuevo, anterior=None):
+        """
+        Sumar al mes y a la semana de ``fecha`` la diferencia entre el día
+        ``nuevo`` y el ``anterior`` (None al crear), en la transacción del
+        llamador. Los extremos se actualizan con LEAST/GREATEST; si una edición
+        sube la mínima o baja la máxima del día (que podía ser el extremo del
+        período) se recalculan con los días del período.
+        """
+        deltas = [_valor(nuevo[c]) - (_valor(anterior[c]) if anterior else 0) for c in _CAMPOS_ROLLUP_CLIMA]
+        # Días con valor: cambian si la edición completa o borra una columna
+        deltas += [(nuevo[c] is not None) - (anterior is not None and anterior[c] is not None)
+                   for c in _CAMPOS_ROLLUP_CLIMA]
+        # También si la edición borra la mínima o la máxima: el upsert con COALESCE
+        # conservaría el valor borrado
+        minima, maxima = nuevo['temperatura_min'], nuevo['temperatura_max']
+        recalcular_extremos = anterior is not None and (
+            (anterior['temperatura_min'] is not None
+             and (minima is None or _valor(minima) > _valor(anterior['temperatura_min'])))
+            or (anterior['temperatura_max'] is not None
+                and (maxima is None or _valor(maxima) < _valor(anterior['temperatura_max'])))
+        )
+        for tabla, inicio, fin in _periodos_clima(fecha):
+            cursor.execute(
+                _SQL_ROLLUP_CLIMA.format(tabla=tabla),
+                (inicio, 0 if anterior else 1, *deltas, nuevo['temperatura_min'], nuevo['temperatura_max'])
+            )
+            if recalcular_extremos:
+                cursor.execute(
+                    f"""UPDATE {tabla} r
+                       JOIN (SELECT MIN(temperatura_min) as minima, MAX(temperatura_max) as maxima
+                             FROM clima WHERE fecha >= %s AND fecha < %s) c
+                       SET r.temp_min_absoluta = c.minima, r.temp_max_absoluta = c.maxima
+                       WHERE r.periodo = %s""",
+                    (inicio, fin, inicio)
+                )
+    
+    @staticmethod
+    def reconstruir_rollups():
+        """
+        Reconstruir clima_rollup_mensual y clima_rollup_semanal desde el histórico
+        en una sola lectura de clima (sin buffer) y una transacción. Ejecutar sin
+        cargas de clima en curso. Retorna {tabla: períodos}.
+        """
+        acumulados = {tabla: {} for tabla in ROLLUPS_CLIMA.values()}
+        lectura = mysql.cursor_sin_buffer()
+        try:
+            lectura.execute(f"SELECT fecha, {', '.join(_CAMPOS_ROLLUP_CLIMA)} FROM clima")
+            while True:
+                filas = lectura.fetchmany(1000)
+                if not filas:
+                    break
+                for fecha, *crudos in filas:
+                    valores = [_valor(v) for v in crudos] + [int(v is not None) for v in crudos]
+                    minima = float(crudos[0]) if crudos[0] is not None else None
+                    maxima = float(crudos[1]) if crudos[1] is not None else None
+                    for tabla, inicio, _ in _periodos_clima(fecha):
+                        acumulado = acumulados[tabla].get(inicio)
+                        if acumulado is None:
+                            acumulados[tabla][inicio] = [1, *valores, minima, maxima]
+                            continue
+                        acumulado[0] += 1
+                        for i, v in enumerate(valores, start=1):
+                            acumulado[i] += v
+                        if minima is not None and (acumulado[-2] is None or minima < acumulado[-2]):
+                            acumulado[-2] = minima
+                        if maxima is not None and (acumulado[-1] is None or maxima > acumulado[-1]):
+                            acumulado[-1] = maxima
+        finally:
+            lectura.close()
+        
+        cursor = mysql.connection.cursor()
+        try:
+            for tabla, periodos in acumulados.items():
+                cursor.execute(f"DELETE FROM {tabla}")
+                if periodos:
+                    cursor.executemany(
+                        _SQL_ROLLUP_CLIMA.format(tabla=tabla),
+                        [(inicio, *valores) for inicio, valores in sorted(periodos.items())]
+                    )
+            incrementar_version(cursor, 'clima')
+            mysql.connection.commit()
+        except Exception:
+            mysql.connection.rollback()
+            raise
+        finally:
+            cursor.close()
+        return {tabla: len(periodos) for tabla, periodos in acumulados.items()}
     
     @staticmethod
     def get_monthly_summary(año=None, mes=None):
-        """Obtener resumen mensual del clima"""
+        """Obtener resumen mensual del clima (de clima_rollup_mensual)"""
         if not año:
             año = datetime.now().year
         if not mes:
             mes = datetime.now().month
             
         cursor = mysql.connection.cursor()
-        query = """
-            SELECT 
-                COUNT(*) as total_dias,
-                AVG(temperatura_min) as temp_min_promedio,
-                AVG(temperatura_max) as temp_max_promedio,
-                AVG(temperatura_promedio) as temp_promedio,
-                MIN(temperatura_min) as temp_min_absoluta,
-                MAX(temperatura_max) as temp_max_absoluta,
-                SUM(lluvia) as lluvia_total,
-                AVG(lluvia) as lluvia_promedio,
-                AVG(humedad) as humedad_promedio,
-                AVG(velocidad_viento) as viento_promedio,
-                SUM(horas_sol) as horas_sol_total
-            FROM clima 
-            WHERE YEAR(fecha) = %s AND MONTH(fecha) = %s
-        """
-        cursor.execute(query, (año, mes))
+        cursor.execute(
+            _SQL_RESUMEN_ROLLUP_CLIMA.format(tabla='clima_rollup_mensual') + " WHERE periodo = %s",
+            (date(int(año), int(mes), 1),)
+        )
         resultado = cursor.fetchone()
         cursor.close()
-        return resultado 
+        if resultado is None:
+            # Mes sin registros: lo mismo que devolvían los agregados sobre cero filas
+            resultado = {
+                'periodo': date(int(año), int(mes), 1), 'total_dias': 0,
+                'temp_min_promedio': None, 'temp_max_promedio': None, 'temp_promedio': None,
+                'temp_min_absoluta': None, 'temp_max_absoluta': None,
+                'lluvia_total': None, 'lluvia_promedio': None, 'humedad_promedio': None,
+                'viento_promedio': None, 'horas_sol_total': None,
+            }
+        return resultado
+    
+    @staticmethod
+    def get_rollup_data_for_chart(periodo='semanal', cantidad=12):
+        """Series por semana o por mes de los últimos ``cantidad`` períodos (de los rollups)"""
+        cursor = mysql.connection.cursor()
+        cursor.execute(
+            _SQL_RESUMEN_ROLLUP_CLIMA.format(tabla=ROLLUPS_CLIMA[periodo]) + " ORDER BY periodo DESC LIMIT %s",
+            (cantidad,)
+        )
+        filas = cursor.fetchall()
+        cursor.close()
+        
+        columnas = ('total_dias', 'temp_min_promedio', 'temp_max_promedio', 'temp_promedio',
+                    'temp_min_absoluta', 'temp_max_absoluta', 'lluvia_total', 'humedad_promedio',
+                    'viento_promedio', 'horas_sol_total')
+        data = {'periodos': [], **{columna: [] for columna in columnas}}
+        for fila in reversed(filas):  # orden cronológico
+            data['periodos'].append(fila['periodo'].strftime('%Y-%m-%d'))
+            for columna in columnas:
+                data[columna].append(float(fila[columna]) if fila[columna] is not None else None)
+        return data
 
 class Recorrido:
     @staticmethod
-    def get_all(page=1, per_page=10, fecha_inicio=None, fecha_fin=None, potrero_id=None):
-        """Obtener todos los recorridos con paginación y filtros"""
-        offset = (page - 1) * per_page
-        query = """
-            SELECT r.*, p.nombre as potrero_nombre, p.hectareas 
-            FROM recorridos r 
-            JOIN potreros p ON r.potrero_id = p.id 
-            WHERE 1=1
-        """
+    def _filtros(fecha_inicio=None, fecha_fin=None, potrero_id=None):
+        """Condiciones WHERE (sobre el alias r) y parámetros de los listados de recorridos"""
+        condiciones = ""
         params = []
         
         if fecha_inicio:
-            query += " AND r.fecha >= %s"
+            condiciones += " AND r.fecha >= %s"
             params.append(fecha_inicio)
         if fecha_fin:
-            query += " AND r.fecha <= %s"
+            condiciones += " AND r.fecha <= %s"
             params.append(fecha_fin)
         if potrero_id:
-            query += " AND r.potrero_id = %s"
+            condiciones += " AND r.potrero_id = %s"
             params.append(potrero_id)
-            
+        
+        return condiciones, params
+    
+    @staticmethod
+    def get_all(page=1, per_page=10, fecha_inicio=None, fecha_fin=None, potrero_id=None):
+        """Obtener todos los recorridos con paginación y filtros"""
+        offset = (page - 1) * per_page
+        condiciones, params = Recorrido._filtros(fecha_inicio, fecha_fin, potrero_id)
+        query = """
+            SELECT r.*, p.nombre as potrero_nombre, p.hectareas 
+            FROM recorridos r 
+            JOIN potreros p ON r.potrero_id = p.id 
+            WHERE 1=1
+        """ + condiciones
         query += " ORDER BY r.fecha DESC LIMIT %s OFFSET %s"
-        params.extend([per_page, offset])
         
         cursor = mysql.connection.cursor()
-        cursor.execute(query, tuple(params))
+        cursor.execute(query, tuple(params + [per_page, offset]))
         recorridos = cursor.fetchall()
         
         # Contar total
-        count_query = "SELECT COUNT(*) as total FROM recorridos r WHERE 1=1"
-        count_params = []
-        
-        if fecha_inicio:
-            count_query += " AND r.fecha >= %s"
-            count_params.append(fecha_inicio)
-        if fecha_fin:
-            count_query += " AND r.fecha <= %s"
-            count_params.append(fecha_fin)
-        if potrero_id:
-            count_query += " AND r.potrero_id = %s"
-            count_params.append(potrero_id)
-            
-        cursor.execute(count_query, tuple(count_params))
+        count_query = "SELECT COUNT(*) as total FROM recorridos r WHERE 1=1" + condiciones
+        cursor.execute(count_query, tuple(params))
         total = cursor.fetchone()['total']
         cursor.close()
         return recorridos, total
     
+    @staticmethod
+    def get_export_query(fecha_inicio=None, fecha_fin=None, potrero_id=None):
+        """(query, params) de exportación con los mismos filtros que get_all, en orden cronológico"""
+        condiciones, params = Recorrido._filtros(fecha_inicio, fecha_fin, potrero_id)
+        query = "SELECT p.nombre as potrero_nombre, r.* FROM recorridos r JOIN potreros p ON r.potrero_id = p.id WHERE 1=1" + condiciones
+        return query + " ORDER BY r.fecha, r.id", params
+    
+    @staticmethod
+    def get_pagina(per_page=10, cursor=None, offset=0, conteo='exacto', fecha_inicio=None, fecha_fin=None, potrero_id=None):
+        """Página de recorridos por cursor (fecha, id)"""
+        condiciones, params = Recorrido._filtros(fecha_inicio, fecha_fin, potrero_id)
+        db_cursor = mysql.connection.cursor()
+        try:
+            return paginar(
+                db_cursor,
+                "SELECT r.*, p.nombre as potrero_nombre, p.hectareas FROM recorridos r JOIN potreros p ON r.potrero_id = p.id",
+                "recorridos r", "r", condiciones, params,
+                per_page=per_page, cursor=cursor, offset=offset, conteo=conteo
+            )
+        finally:
+            db_cursor.close()
+    
     @staticmethod
     def create(potrero_id, fecha, altura_promedio, altura_minima, altura_maxima, 
                cobertura_vegetal, estado_general, puntos_medicion=5, 
@@ -1143,11 +1666,11 @@ class Recorrido:
                 presencia_plagas, necesita_riego, necesita_fertilizacion, observaciones, responsable
             ))
             recorrido_id = cursor.lastrowid
+            # Tasas del nuevo recorrido y del siguiente del potrero
+            Recorrido.recompute_growth_rates(potrero_id, since=fecha, cursor=cursor)
+            incrementar_version(cursor, 'recorridos')
             mysql.connection.commit()
             
-            # Calcular y actualizar tasas de crecimiento
-            Recorrido._calcular_tasas_crecimiento(recorrido_id, potrero_id, fecha)
-            
             cursor.close()
             return recorrido_id
         except Exception as e:
@@ -1156,57 +1679,80 @@ class Recorrido:
             return None
     
     @staticmethod
-    def _calcular_tasas_crecimiento(recorrido_id, potrero_id, fecha):
-        """Calcular tasas de crecimiento basadas en el recorrido anterior"""
-        cursor = mysql.connection.cursor()
+    def recompute_growth_rates(potrero_id=None, since=None, cursor=None):
+        """
+        Recalcular tasa_crecimiento_diaria y tasa_crecimiento_semanal con LAG()
+        sobre (potrero_id ORDER BY fecha, id) en un único UPDATE.
+
+        potrero_id: sólo ese potrero (None para todos).
+        since: sólo las filas con fecha >= since. La ventana incluye la fila
+            anterior, así el primer recorrido afectado toma la altura previa.
+        El primer recorrido de cada potrero y los de la misma fecha que el
+        anterior quedan en NULL. Devuelve las filas modificadas.
+        """
+        propio = cursor is None
+        if propio:
+            cursor = mysql.connection.cursor()
+        
+        internas, externas, params = "", "", []
+        if potrero_id is not None:
+            internas += " AND potrero_id = %s"
+            params.append(potrero_id)
+            if since is not None:
+                # Desde la fecha del recorrido anterior a since, no todo el historial
+                internas += """ AND fecha >= COALESCE(
+                    (SELECT MAX(fecha) FROM recorridos WHERE potrero_id = %s AND fecha < %s), %s)"""
+                params.extend([potrero_id, since, since])
+        if since is not None:
+            externas += " AND r.fecha >= %s"
+            params.append(since)
         
         try:
-            # Buscar el recorrido anterior más reciente
-            cursor.execute("""
-                SELECT altura_promedio, fecha 
-                FROM recorridos 
-                WHERE potrero_id = %s AND fecha < %s 
-                ORDER BY fecha DESC 
-                LIMIT 1
-            """, (potrero_id, fecha))
-            
-            anterior = cursor.fetchone()
-            
-            if anterior:
-                # Obtener altura actual
-                cursor.execute("SELECT altura_promedio FROM recorridos WHERE id = %s", (recorrido_id,))
-                actual = cursor.fetchone()
-                
-                if actual:
-                    altura_anterior = float(anterior['altura_promedio'])
-                    altura_actual = float(actual['altura_promedio'])
-                    fecha_anterior = anterior['fecha']
-                    
-                    # Calcular diferencia en días
-                    if isinstance(fecha, str):
-                        fecha = datetime.strptime(fecha, '%Y-%m-%d').date()
-                    
-                    dias_diferencia = (fecha - fecha_anterior).days
-                    
-                    if dias_diferencia > 0:
-                        # Calcular tasas
-                        crecimiento_total = altura_actual - altura_anterior
-                        tasa_diaria = crecimiento_total / dias_diferencia
-                        tasa_semanal = tasa_diaria * 7
-                        
-                        # Actualizar el registro
-                        cursor.execute("""
-                            UPDATE recorridos 
-                            SET tasa_crecimiento_diaria = %s, tasa_crecimiento_semanal = %s 
-                            WHERE id = %s
-                        """, (tasa_diaria, tasa_semanal, recorrido_id))
-                        
-                        mysql.connection.commit()
-                        
-        except Exception as e:
-            current_app.logger.error(f"Error calculando tasas de crecimiento: {e}")
+            cursor.execute(f"""
+                UPDATE recorridos r
+                JOIN (
+                    SELECT id,
+                           LAG(altura_promedio) OVER w as altura_anterior,
+                           DATEDIFF(fecha, LAG(fecha) OVER w) as dias
+                    FROM recorridos
+                    WHERE 1=1{internas}
+                    WINDOW w AS (PARTITION BY potrero_id ORDER BY fecha, id)
+                ) t ON t.id = r.id
+                SET r.tasa_crecimiento_diaria = CASE WHEN t.dias > 0
+                        THEN (r.altura_promedio - t.altura_anterior) / t.dias END,
+                    r.tasa_crecimiento_semanal = CASE WHEN t.dias > 0
+                        THEN (r.altura_promedio - t.altura_anterior) / t.dias * 7 END
+                WHERE 1=1{externas}
+            """, tuple(params))
+            modificadas = cursor.rowcount
+            if propio:
+                incrementar_version(cursor, 'recorridos')
+                mysql.connection.commit()
+            return modificadas
         finally:
-            cursor.close()
+            if propio:
+                cursor.close()
+    
+    @staticmethod
+    def _encolar_tasas_afectadas(cursor, *posiciones):
+        """
+        Encolar el recálculo de las tasas desde cada (potrero_id, fecha) de
+        ``posiciones`` (una fila de recorridos o una tupla; None se ignora): la
+        posición anterior y la nueva de un recorrido editado, o la de uno borrado.
+        Lo ejecuta el worker (tarea tasas_crecimiento) después del commit.
+        """
+        from proyecto.utils.tareas import encolar_recalculo
+        
+        desde = {}
+        for posicion in posiciones:
+            if not posicion:
+                continue
+            if isinstance(posicion, dict):
+                posicion = (posicion['potrero_id'], posicion['fecha'])
+            potrero_id, fecha = int(posicion[0]), _como_fecha(posicion[1])
+            desde[potrero_id] = min(fecha, desde.get(potrero_id, fecha))
+        for potrero_id, fecha in desde.items():
+            encolar_recalculo('tasas_crecimiento', {'potrero_id': potrero_id, 'desde': fecha.isoformat()}, cursor)
     
     @staticmethod
     def get_by_id(recorrido_id):
@@ -1233,6 +1779,8 @@ class Recorrido:
         semana_numero = fecha.isocalendar()[1] if isinstance(fecha, datetime) else datetime.strptime(str(fecha), '%Y-%m-%d').isocalendar()[1]
         
         cursor = mysql.connection.cursor()
+        cursor.execute("SELECT potrero_id, fecha FROM recorridos WHERE id = %s", (recorrido_id,))
+        anterior = cursor.fetchone()
         query = """
             UPDATE recorridos SET 
             potrero_id = %s, fecha = %s, semana_numero = %s, altura_promedio = %s, 
@@ -1250,12 +1798,11 @@ class Recorrido:
                 presencia_plagas, necesita_riego, necesita_fertilizacion, observaciones, 
                 responsable, recorrido_id
             ))
+            affected_rows = cursor.rowcount
+            Recorrido._encolar_tasas_afectadas(cursor, anterior, (potrero_id, fecha))
+            incrementar_version(cursor, 'recorridos')
             mysql.connection.commit()
             
-            # Recalcular tasas de crecimiento
-            Recorrido._calcular_tasas_crecimiento(recorrido_id, potrero_id, fecha)
-            
-            affected_rows = cursor.rowcount
             cursor.close()
             return affected_rows > 0
         except Exception as e:
@@ -1267,15 +1814,20 @@ class Recorrido:
     def delete(recorrido_id):
         """Eliminar un recorrido"""
         cursor = mysql.connection.cursor()
+        cursor.execute("SELECT potrero_id, fecha FROM recorridos WHERE id = %s", (recorrido_id,))
+        anterior = cursor.fetchone()
         cursor.execute("DELETE FROM recorridos WHERE id = %s", (recorrido_id,))
-        mysql.connection.commit()
         affected_rows = cursor.rowcount
+        # El siguiente recorrido del potrero pasa a compararse con el previo al borrado
+        Recorrido._encolar_tasas_afectadas(cursor, anterior)
+        incrementar_version(cursor, 'recorridos')
+        mysql.connection.commit()
         cursor.close()
         return affected_rows > 0
     
     @staticmethod
-    def get_growth_data_for_chart(potrero_id=None, weeks=12):
-        """Obtener datos de crecimiento para gráficos"""
+    def get_growth_data_for_chart(potrero_id=None, weeks=12, max_points=None, metodo='lttb'):
+        """Obtener datos de crecimiento para gráficos (reducidos a max_points por potrero si se indica)"""
         query = """
             SELECT 
                 DATE_FORMAT(fecha, '%Y-%m-%d') as fecha,
@@ -1323,22 +1875,17 @@ class Recorrido:
             data['estados'].append(resultado['estado_general'])
             data['potreros'].append(resultado['potrero_nombre'])
         
-        return data
+        return series.reducir_columnas(data, max_points, 'fechas', 'alturas', grupo='potreros', metodo=metodo)
     
     @staticmethod
     def get_latest_by_potrero():
         """Obtener el último recorrido de cada potrero"""
         cursor = mysql.connection.cursor()
-        cursor.execute("""
+        cursor.execute(f"""
             SELECT r.*, p.nombre as potrero_nombre, p.hectareas,
                    DATEDIFF(CURDATE(), r.fecha) as dias_desde_recorrido
-            FROM recorridos r
+            FROM ({ultimo_por_grupo('recorridos')}) r
             JOIN potreros p ON r.potrero_id = p.id
-            WHERE (r.potrero_id, r.fecha) IN (
-                SELECT potrero_id, MAX(fecha) as max_fecha
-                FROM recorridos
-                GROUP BY potrero_id
-            )
             ORDER BY p.nombre
         """)
         resultados = cursor.fetchall()
@@ -1378,7 +1925,7 @@ class Recorrido:
     def get_growth_alerts():
         """Obtener alertas de crecimiento (potreros con bajo crecimiento o problemas)"""
         cursor = mysql.connection.cursor()
-        cursor.execute("""
+        cursor.execute(f"""
             SELECT r.*, p.nombre as potrero_nombre,
                    CASE 
                        WHEN r.tasa_crecimiento_semanal < 1.0 THEN 'Crecimiento lento'
@@ -1389,14 +1936,9 @@ class Recorrido:
                        ELSE 'Normal'
                    END as tipo_alerta,
                    DATEDIFF(CURDATE(), r.fecha) as dias_desde_recorrido
-            FROM recorridos r
+            FROM ({ultimo_por_grupo('recorridos')}) r
             JOIN potreros p ON r.potrero_id = p.id
-            WHERE (r.potrero_id, r.fecha) IN (
-                SELECT potrero_id, MAX(fecha) as max_fecha
-                FROM recorridos
-                GROUP BY potrero_id
-            )
-            AND (
+            WHERE (
                 r.tasa_crecimiento_semanal < 1.0 
                 OR r.altura_promedio < 15.0 
                 OR r.cobertura_vegetal < 70.0 
@@ -1460,23 +2002,57 @@ class PuntoMedicion:
         cursor.close()
         return affected_rows 
 
+# Columnas derivadas del aforo a partir de sus sumas y conteos de muestras.
+# En un UPDATE de una sola tabla MySQL evalúa las asignaciones de izquierda a
+# derecha, así que estas expresiones ven las sumas y conteos ya actualizados.
+# Marco de 0.25 m²: kg/ha = gramos / 1000 * (10000 / 0.25)
+_SQL_DERIVADOS_AFORO = """
+    peso_verde_promedio = IF(num_muestras > 0, suma_peso_verde / num_muestras, NULL),
+    peso_seco_promedio = IF(muestras_con_peso_seco > 0, suma_peso_seco / muestras_con_peso_seco, NULL),
+    porcentaje_ms_promedio = IF(peso_seco_promedio IS NOT NULL AND peso_verde_promedio > 0,
+                                peso_seco_promedio / peso_verde_promedio * 100, NULL),
+    estado_muestras = IF(num_muestras > 0 AND muestras_con_peso_seco = num_muestras, 'completo', 'incompleto'),
+    materia_verde = COALESCE(peso_verde_promedio / 1000 * 40000, 0),
+    materia_seca = COALESCE(peso_seco_promedio / 1000 * 40000, 0),
+    porcentaje_ms = COALESCE(porcentaje_ms_promedio, 0)
+"""
+
 class MuestraAforo:
     @staticmethod
-    def create(aforo_id, numero_muestra, peso_verde, altura_pasto=None, observaciones=None):
+    def create(aforo_id, numero_muestra, peso_verde, altura_pasto=None, observaciones=None, peso_seco=None):
         """Crear una nueva muestra de aforo"""
         cursor = mysql.connection.cursor()
-        cursor.execute(
-            """INSERT INTO muestras_aforo 
-               (aforo_id, numero_muestra, peso_verde, altura_pasto, observaciones) 
-               VALUES (%s, %s, %s, %s, %s)""",
-            (aforo_id, numero_muestra, peso_verde, altura_pasto, observaciones)
+        if peso_seco is not None:
+            cursor.execute(
+                """INSERT INTO muestras_aforo 
+                   (aforo_id, numero_muestra, peso_verde, peso_seco, fecha_pesaje_seco, altura_pasto, observaciones) 
+                   VALUES (%s, %s, %s, %s, NOW(), %s, %s)""",
+                (aforo_id, numero_muestra, peso_verde, peso_seco, altura_pasto, observaciones)
+            )
+        else:
+            cursor.execute(
+                """INSERT INTO muestras_aforo 
+                   (aforo_id, numero_muestra, peso_verde, altura_pasto, observaciones) 
+                   VALUES (%s, %s, %s, %s, %s)""",
+                (aforo_id, numero_muestra, peso_verde, altura_pasto, observaciones)
+            )
+        muestra_id = cursor.lastrowid
+        
+        # Actualizar promedios del aforo por diferencia
+        MuestraAforo._aplicar_delta(
+            cursor, aforo_id,
+            delta_verde=float(peso_verde),
+            delta_seco=float(peso_seco) if peso_seco is not None else 0,
+            delta_muestras=1,
+            delta_con_seco=1 if peso_seco is not None else 0
         )
+        
         mysql.connection.commit()
-        muestra_id = cursor.lastrowid
         cursor.close()
-        
-        # Actualizar promedios del aforo
-        MuestraAforo.actualizar_promedios_aforo(aforo_id)
+        auditoria.registrar('muestras_aforo', muestra_id, 'CREATE', {
+            'aforo_id': aforo_id, 'numero_muestra': numero_muestra, 'peso_verde': peso_verde,
+            'peso_seco': peso_seco, 'altura_pasto': altura_pasto,
+        })
         
         return muestra_id
     
@@ -1497,14 +2073,12 @@ class MuestraAforo:
         """Actualizar el peso seco de una muestra"""
         cursor = mysql.connection.cursor()
         
-        # Primero obtenemos el aforo_id
-        cursor.execute("SELECT aforo_id FROM muestras_aforo WHERE id = %s", (muestra_id,))
+        # Primero obtenemos el aforo_id y el peso seco anterior
+        cursor.execute("SELECT aforo_id, peso_seco FROM muestras_aforo WHERE id = %s", (muestra_id,))
         result = cursor.fetchone()
         if not result:
             cursor.close()
             return False
-            
-        aforo_id = result['aforo_id']
         
         cursor.execute(
             """UPDATE muestras_aforo 
@@ -1512,13 +2086,21 @@ class MuestraAforo:
                WHERE id = %s""",
             (peso_seco, muestra_id)
         )
-        mysql.connection.commit()
         success = cursor.rowcount > 0
-        cursor.close()
         
-        # Actualizar promedios del aforo
+        # Actualizar promedios del aforo por diferencia
+        anterior = result['peso_seco']
+        MuestraAforo._aplicar_delta(
+            cursor, result['aforo_id'],
+            delta_seco=float(peso_seco or 0) - float(anterior or 0),
+            delta_con_seco=(peso_seco is not None) - (anterior is not None)
+        )
+        
+        mysql.connection.commit()
+        cursor.close()
         if success:
-            MuestraAforo.actualizar_promedios_aforo(aforo_id)
+            auditoria.registrar('muestras_aforo', muestra_id, 'UPDATE',
+                                {'old': {'peso_seco': anterior}, 'new': {'peso_seco': peso_seco}})
         
         return success
     
@@ -1527,23 +2109,32 @@ class MuestraAforo:
         """Eliminar una muestra"""
         cursor = mysql.connection.cursor()
         
-        # Primero obtenemos el aforo_id antes de eliminar
-        cursor.execute("SELECT aforo_id FROM muestras_aforo WHERE id = %s", (muestra_id,))
+        # Primero obtenemos el aforo_id y los pesos antes de eliminar
+        cursor.execute("SELECT aforo_id, peso_verde, peso_seco FROM muestras_aforo WHERE id = %s", (muestra_id,))
         result = cursor.fetchone()
         if not result:
             cursor.close()
             return False
-            
-        aforo_id = result['aforo_id']
         
         cursor.execute("DELETE FROM muestras_aforo WHERE id = %s", (muestra_id,))
-        mysql.connection.commit()
         success = cursor.rowcount > 0
-        cursor.close()
         
-        # Actualizar promedios del aforo
+        # Actualizar promedios del aforo por diferencia
         if success:
-            MuestraAforo.actualizar_promedios_aforo(aforo_id)
+            MuestraAforo._aplicar_delta(
+                cursor, result['aforo_id'],
+                delta_verde=-float(result['peso_verde']),
+                delta_seco=-float(result['peso_seco'] or 0),
+                delta_muestras=-1,
+                delta_con_seco=-1 if result['peso_seco'] is not None else 0
+            )
+        
+        mysql.connection.commit()
+        cursor.close()
+        if success:
+            auditoria.registrar('muestras_aforo', muestra_id, 'DELETE', {'old': {
+                'aforo_id': result['aforo_id'], 'peso_verde': result['peso_verde'], 'peso_seco': result['peso_seco'],
+            }})
         
         return success
     
@@ -1561,14 +2152,12 @@ class MuestraAforo:
         """Actualizar una muestra completa"""
         cursor = mysql.connection.cursor()
         
-        # Primero obtenemos el aforo_id
-        cursor.execute("SELECT aforo_id FROM muestras_aforo WHERE id = %s", (muestra_id,))
+        # Primero obtenemos el aforo_id y los pesos anteriores
+        cursor.execute("SELECT aforo_id, peso_verde, peso_seco FROM muestras_aforo WHERE id = %s", (muestra_id,))
         result = cursor.fetchone()
         if not result:
             cursor.close()
             return False
-            
-        aforo_id = result['aforo_id']
         
         if peso_seco is not None:
             cursor.execute(
@@ -1578,6 +2167,8 @@ class MuestraAforo:
                    WHERE id = %s""",
                 (peso_verde, peso_seco, altura_pasto, observaciones, muestra_id)
             )
+            delta_seco = float(peso_seco) - float(result['peso_seco'] or 0)
+            delta_con_seco = 0 if result['peso_seco'] is not None else 1
         else:
             cursor.execute(
                 """UPDATE muestras_aforo 
@@ -1585,96 +2176,133 @@ class MuestraAforo:
                    WHERE id = %s""",
                 (peso_verde, altura_pasto, observaciones, muestra_id)
             )
+            delta_seco = 0
+            delta_con_seco = 0
         
-        mysql.connection.commit()
         success = cursor.rowcount > 0
-        cursor.close()
         
-        # Actualizar promedios del aforo
+        # Actualizar promedios del aforo por diferencia
+        MuestraAforo._aplicar_delta(
+            cursor, result['aforo_id'],
+            delta_verde=float(peso_verde) - float(result['peso_verde']),
+            delta_seco=delta_seco,
+            delta_con_seco=delta_con_seco
+        )
+        
+        mysql.connection.commit()
+        cursor.close()
         if success:
-            MuestraAforo.actualizar_promedios_aforo(aforo_id)
+            auditoria.registrar('muestras_aforo', muestra_id, 'UPDATE', {
+                'old': {'peso_verde': result['peso_verde'], 'peso_seco': result['peso_seco']},
+                'new': {'peso_verde': peso_verde, 'peso_seco': peso_seco,
+                        'altura_pasto': altura_pasto, 'observaciones': observaciones},
+            })
         
         return success
     
     @staticmethod
-    def actualizar_promedios_aforo(aforo_id):
-        """Actualizar promedios de un aforo basado en sus muestras"""
-        cursor = mysql.connection.cursor()
+    def _aplicar_delta(cursor, aforo_id, delta_verde=0, delta_seco=0, delta_muestras=0, delta_con_seco=0):
+        """
+        Ajustar las sumas y conteos de muestras del aforo y recalcular sus columnas
+        derivadas en un único UPDATE, sin releer las muestras (costo O(1)).
+        No hace commit: se ejecuta dentro de la transacción del cambio de la muestra.
+        """
+        cursor.execute(
+            f"""UPDATE aforos SET
+                   suma_peso_verde = COALESCE(suma_peso_verde, 0) + %s,
+                   suma_peso_seco = COALESCE(suma_peso_seco, 0) + %s,
+                   num_muestras = COALESCE(num_muestras, 0) + %s,
+                   muestras_con_peso_seco = COALESCE(muestras_con_peso_seco, 0) + %s,
+                   {_SQL_DERIVADOS_AFORO}
+                   WHERE id = %s""",
+            (delta_verde, delta_seco, delta_muestras, delta_con_seco, aforo_id)
+        )
+        incrementar_version(cursor, 'aforos')
+    
+    @staticmethod
+    def create_many(cursor, muestras):
+        """
+        Insertar muestras con executemany dentro de la transacción del llamador.
+        Cada elemento: (aforo_id, numero_muestra, peso_verde, peso_seco, altura_pasto,
+        observaciones). No actualiza los promedios: llamar luego a
+        actualizar_promedios_aforos con los aforos afectados.
+        """
+        ahora = datetime.now()
+        cursor.executemany(
+            """INSERT INTO muestras_aforo 
+               (aforo_id, numero_muestra, peso_verde, peso_seco, fecha_pesaje_seco, altura_pasto, observaciones) 
+               VALUES (%s, %s, %s, %s, %s, %s, %s)""",
+            [(aforo_id, numero, verde, seco, ahora if seco is not None else None, altura, obs)
+             for aforo_id, numero, verde, seco, altura, obs in muestras]
+        )
+        return len(muestras)
+    
+    @staticmethod
+    def actualizar_promedios_aforos(aforo_ids, cursor):
+        """
+        Recalcular sumas, conteos y promedios de varios aforos en un único UPDATE
+        (una subconsulta correlacionada por columna). No hace commit.
+        """
+        if not aforo_ids:
+            return
+        marcadores = ', '.join(['%s'] * len(aforo_ids))
+        cursor.execute(
+            f"""UPDATE aforos SET
+                   suma_peso_verde = (SELECT COALESCE(SUM(m.peso_verde), 0) FROM muestras_aforo m WHERE m.aforo_id = aforos.id),
+                   suma_peso_seco = (SELECT COALESCE(SUM(m.peso_seco), 0) FROM muestras_aforo m WHERE m.aforo_id = aforos.id),
+                   num_muestras = (SELECT COUNT(*) FROM muestras_aforo m WHERE m.aforo_id = aforos.id),
+                   muestras_con_peso_seco = (SELECT COUNT(m.peso_seco) FROM muestras_aforo m WHERE m.aforo_id = aforos.id),
+                   {_SQL_DERIVADOS_AFORO}
+                   WHERE id IN ({marcadores})""",
+            tuple(aforo_ids)
+        )
+        incrementar_version(cursor, 'aforos')
+    
+    @staticmethod
+    def actualizar_promedios_aforo(aforo_id, cursor=None):
+        """
+        Recalcular desde cero las sumas, conteos y promedios de un aforo a partir de
+        sus muestras. Las escrituras de muestras usan deltas; esto queda para
+        reparaciones y cargas masivas (una vez por aforo, no por muestra).
+        """
+        propio = cursor is None
+        if propio:
+            cursor = mysql.connection.cursor()
         
         try:
-            # Obtener todas las muestras del aforo
-            cursor.execute(
-                "SELECT * FROM muestras_aforo WHERE aforo_id = %s",
-                (aforo_id,)
-            )
-            muestras = cursor.fetchall()
-            
-            if not muestras:
-                # Si no hay muestras, resetear valores
-                cursor.execute(
-                    """UPDATE aforos SET
-                       num_muestras = 0,
-                       peso_verde_promedio = NULL,
-                       peso_seco_promedio = NULL,
-                       porcentaje_ms_promedio = NULL,
-                       muestras_con_peso_seco = 0,
-                       estado_muestras = 'incompleto',
-                       materia_verde = 0,
-                       materia_seca = 0,
-                       porcentaje_ms = 0
-                       WHERE id = %s""",
-                    (aforo_id,)
-                )
+            MuestraAforo.actualizar_promedios_aforos([aforo_id], cursor)
+            if propio:
                 mysql.connection.commit()
-                return True
-            
-            # Calcular estadísticas
-            num_muestras = len(muestras)
-            peso_verde_total = sum(m['peso_verde'] for m in muestras)
-            peso_verde_promedio = peso_verde_total / num_muestras
-            
-            muestras_con_peso_seco = [m for m in muestras if m['peso_seco'] is not None]
-            num_muestras_con_peso_seco = len(muestras_con_peso_seco)
-            
-            peso_seco_promedio = None
-            porcentaje_ms_promedio = None
-            
-            if muestras_con_peso_seco:
-                peso_seco_total = sum(m['peso_seco'] for m in muestras_con_peso_seco)
-                peso_seco_promedio = peso_seco_total / num_muestras_con_peso_seco
-                porcentaje_ms_promedio = (peso_seco_promedio / peso_verde_promedio) * 100
-            
-            # Determinar estado
-            estado_muestras = 'completo' if num_muestras_con_peso_seco == num_muestras else 'incompleto'
-            
-            # Calcular materia verde y seca por hectárea (marco de 0.25 m²)
-            factor_conversion = 10000 / 0.25  # 40000
-            materia_verde = (peso_verde_promedio / 1000) * factor_conversion  # kg/ha
-            materia_seca = (peso_seco_promedio / 1000 * factor_conversion) if peso_seco_promedio else 0  # kg/ha
-            
-            # Actualizar tabla aforos
-            cursor.execute(
-                """UPDATE aforos SET
-                   num_muestras = %s,
-                   peso_verde_promedio = %s,
-                   peso_seco_promedio = %s,
-                   porcentaje_ms_promedio = %s,
-                   muestras_con_peso_seco = %s,
-                   estado_muestras = %s,
-                   materia_verde = %s,
-                   materia_seca = %s,
-                   porcentaje_ms = %s
-                   WHERE id = %s""",
-                (num_muestras, peso_verde_promedio, peso_seco_promedio,
-                 porcentaje_ms_promedio, num_muestras_con_peso_seco, estado_muestras,
-                 materia_verde, materia_seca, porcentaje_ms_promedio or 0, aforo_id)
-            )
-            
-            mysql.connection.commit()
             return True
             
         except Exception as e:
             print(f"Error actualizando promedios: {e}")
             return False
         finally:
-            cursor.close() 
\ No newline at end of file
+            if propio:
+                cursor.close()
+
+
+class ConfiguracionSistema:
+    @staticmethod
+    def get_numero(clave, defecto=None, cursor=None):
+        """Valor numérico de configuracion_sistema, o ``defecto`` si no existe, está inactivo o no es un número"""
+        propio = cursor is None
+        if propio:
+            cursor = mysql.connection.cursor()
+        try:
+            cursor.execute(
+                "SELECT valor FROM configuracion_sistema WHERE clave = %s AND activo = TRUE",
+                (clave,)
+            )
+            fila = cursor.fetchone()
+        except Exception as e:
+            print(f"Error leyendo configuración {clave}: {e}")
+            return defecto
+        finally:
+            if propio:
+                cursor.close()
+        try:
+            return float(fila['valor']) if fila and fila['valor'] not in (None, '') else defecto
+        except (TypeError, ValueError):
+            return defecto
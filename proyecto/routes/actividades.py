@@ -1,4 +1,4 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash
+from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify
 from flask_login import login_required
 from datetime import datetime
 import os
@@ -6,6 +6,10 @@ import sys
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from proyecto.models.models import Actividad, Potrero
+from proyecto.utils.exportacion import respuesta_csv
+from proyecto.utils.tareas import encolar_exportacion
+from proyecto.utils.pagination import CursorInvalido, leer_conteo, leer_cursor
+from proyecto.utils.catalogo import catalogo_potreros
 from db import mysql
 
 actividades_bp = Blueprint('actividades', __name__, url_prefix='/actividades')
@@ -42,25 +46,28 @@ def index():
         except ValueError:
             potrero_id = None
     
-    # Obtener actividades filtradas
-    actividades, total = Actividad.get_all(
-        page=page, 
+    # Obtener actividades filtradas (cursor para avanzar/retroceder; page sólo para saltos directos)
+    per_page = 10
+    cursor_pagina = leer_cursor(request.args.get('cursor'))
+    pagina = Actividad.get_pagina(
+        per_page=per_page,
+        cursor=cursor_pagina,
+        offset=0 if cursor_pagina else (page - 1) * per_page,
+        conteo=leer_conteo(request.args.get('conteo')),
         fecha_inicio=fecha_inicio, 
         fecha_fin=fecha_fin, 
         potrero_id=potrero_id,
         tipo_actividad=tipo_actividad,
         estado=estado
     )
+    actividades = pagina.items
+    total = pagina.total or 0
     
     # Calcular páginas para paginación
-    per_page = 10
-    pages = (total + per_page - 1) // per_page
+    pages = pagina.pages or page
     
     # Obtener todos los potreros para el selector de filtros
-    cursor = mysql.connection.cursor()
-    cursor.execute("SELECT id, nombre FROM potreros ORDER BY nombre")
-    potreros = cursor.fetchall()
-    cursor.close()
+    potreros = catalogo_potreros.listar()
     
     # Tipos de actividades - IMPORTANTE: Deben coincidir exactamente con los valores del ENUM en la base de datos
     tipos_actividad = ['Riego', 'Fumigación', 'Reparación de Cercas', 'Limpieza', 'Fertilización', 'Otro']
@@ -68,39 +75,13 @@ def index():
     # Estados
     estados = ['Pendiente', 'En Progreso', 'Completada', 'Cancelada']
     
-    # Calcular estadísticas con consultas simples y manejo seguro
-    cursor = mysql.connection.cursor()
-    
-    # Función auxiliar para obtener count de forma segura
-    def get_safe_count(query):
-        cursor.execute(query)
-        result = cursor.fetchone()
-        if result:
-            # El cursor está configurado como DictCursor, así que result es un dict
-            count_value = result.get('COUNT(*)', 0)
-            return int(count_value) if count_value is not None else 0
-        return 0
-    
-    # Contar pendientes
-    pendientes = get_safe_count("SELECT COUNT(*) FROM actividades WHERE estado = 'Pendiente'")
-    
-    # Contar en progreso
-    en_progreso = get_safe_count("SELECT COUNT(*) FROM actividades WHERE estado = 'En Progreso'")
-    
-    # Contar completadas
-    completadas = get_safe_count("SELECT COUNT(*) FROM actividades WHERE estado = 'Completada'")
-    
-    # Contar total
-    total_count = get_safe_count("SELECT COUNT(*) FROM actividades")
-    
-    cursor.close()
-    
-    stats = {
-        'pendientes': pendientes,
-        'en_progreso': en_progreso,
-        'completadas': completadas,
-        'total': total_count
-    }
+    # Calcular estadísticas por estado (una consulta agrupada con los mismos filtros)
+    stats = Actividad.get_stats(
+        fecha_inicio=fecha_inicio,
+        fecha_fin=fecha_fin,
+        potrero_id=potrero_id,
+        tipo_actividad=tipo_actividad
+    )
 
     return render_template('actividades/index.html', 
                           actividades=actividades, 
@@ -111,6 +92,7 @@ def index():
                           pages=pages,
                           total=total,
                           stats=stats,
+                          pagina=pagina,
                           fecha_inicio=fecha_inicio.strftime('%Y-%m-%d') if fecha_inicio else '',
                           fecha_fin=fecha_fin.strftime('%Y-%m-%d') if fecha_fin else '',
                           potrero_id=potrero_id,
@@ -150,25 +132,28 @@ def index_educational():
         except ValueError:
             potrero_id = None
     
-    # Obtener actividades filtradas
-    actividades, total = Actividad.get_all(
-        page=page, 
+    # Obtener actividades filtradas (cursor para avanzar/retroceder; page sólo para saltos directos)
+    per_page = 10
+    cursor_pagina = leer_cursor(request.args.get('cursor'))
+    pagina = Actividad.get_pagina(
+        per_page=per_page,
+        cursor=cursor_pagina,
+        offset=0 if cursor_pagina else (page - 1) * per_page,
+        conteo=leer_conteo(request.args.get('conteo')),
         fecha_inicio=fecha_inicio, 
         fecha_fin=fecha_fin, 
         potrero_id=potrero_id,
         tipo_actividad=tipo_actividad,
         estado=estado
     )
+    actividades = pagina.items
+    total = pagina.total or 0
     
     # Calcular páginas para paginación
-    per_page = 10
-    pages = (total + per_page - 1) // per_page
+    pages = pagina.pages or page
     
     # Obtener todos los potreros para el selector de filtros
-    cursor = mysql.connection.cursor()
-    cursor.execute("SELECT id, nombre FROM potreros ORDER BY nombre")
-    potreros = cursor.fetchall()
-    cursor.close()
+    potreros = catalogo_potreros.listar()
     
     # Tipos de actividades
     tipos_actividad = ['Riego', 'Fumigación', 'Reparación de Cercas', 'Limpieza', 'Fertilización', 'Otro']
@@ -177,29 +162,12 @@ def index_educational():
     estados = ['Pendiente', 'En Progreso', 'Completada', 'Cancelada']
     
     # Calcular estadísticas
-    cursor = mysql.connection.cursor()
-    
-    def get_safe_count(query):
-        cursor.execute(query)
-        result = cursor.fetchone()
-        if result:
-            count_value = result.get('COUNT(*)', 0)
-            return int(count_value) if count_value is not None else 0
-        return 0
-    
-    pendientes = get_safe_count("SELECT COUNT(*) FROM actividades WHERE estado = 'Pendiente'")
-    en_progreso = get_safe_count("SELECT COUNT(*) FROM actividades WHERE estado = 'En Progreso'")
-    completadas = get_safe_count("SELECT COUNT(*) FROM actividades WHERE estado = 'Completada'")
-    total_count = get_safe_count("SELECT COUNT(*) FROM actividades")
-    
-    cursor.close()
-    
-    stats = {
-        'pendientes': pendientes,
-        'en_progreso': en_progreso,
-        'completadas': completadas,
-        'total': total_count
-    }
+    stats = Actividad.get_stats(
+        fecha_inicio=fecha_inicio,
+        fecha_fin=fecha_fin,
+        potrero_id=potrero_id,
+        tipo_actividad=tipo_actividad
+    )
 
     return render_template('actividades/index_educational.html', 
                           actividades=actividades, 
@@ -210,12 +178,55 @@ def index_educational():
                           pages=pages,
                           total=total,
                           stats=stats,
+                          pagina=pagina,
                           fecha_inicio=fecha_inicio.strftime('%Y-%m-%d') if fecha_inicio else '',
                           fecha_fin=fecha_fin.strftime('%Y-%m-%d') if fecha_fin else '',
                           potrero_id=potrero_id,
                           tipo_actividad=tipo_actividad,
                           estado=estado)
 
+@actividades_bp.route('/api/lista')
+@login_required
+def api_lista():
+    """Listado de actividades paginado por cursor (JSON): ?cursor=&per_page=&conteo=exacto|estimado|ninguno"""
+    try:
+        pagina = Actividad.get_pagina(
+            per_page=min(max(request.args.get('per_page', 50, type=int), 1), 500),
+            cursor=request.args.get('cursor'),
+            conteo=leer_conteo(request.args.get('conteo'), 'ninguno'),
+            fecha_inicio=request.args.get('fecha_inicio'),
+            fecha_fin=request.args.get('fecha_fin'),
+            potrero_id=request.args.get('potrero_id', type=int),
+            tipo_actividad=request.args.get('tipo_actividad'),
+            estado=request.args.get('estado'),
+        )
+        return jsonify({'success': True, **pagina.to_dict()})
+    except CursorInvalido as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@actividades_bp.route('/export.csv')
+@login_required
+def export_csv():
+    """Exportar a CSV (streaming) con los mismos filtros del listado; con ?en_segundo_plano=1 se encola"""
+    if request.args.get('en_segundo_plano', type=int):
+        return encolar_exportacion('actividades', {
+            'fecha_inicio': request.args.get('fecha_inicio'),
+            'fecha_fin': request.args.get('fecha_fin'),
+            'potrero_id': request.args.get('potrero_id', type=int),
+            'tipo_actividad': request.args.get('tipo_actividad'),
+            'estado': request.args.get('estado'),
+        })
+    consulta = Actividad.get_export_query(
+        fecha_inicio=request.args.get('fecha_inicio'),
+        fecha_fin=request.args.get('fecha_fin'),
+        potrero_id=request.args.get('potrero_id', type=int),
+        tipo_actividad=request.args.get('tipo_actividad'),
+        estado=request.args.get('estado'),
+    )
+    return respuesta_csv(mysql, f"actividades_{datetime.now():%Y%m%d}.csv", consulta)
+
 @actividades_bp.route('/nueva_educativo', methods=['GET', 'POST'])
 @login_required
 def nueva_educational():
@@ -235,10 +246,7 @@ def nueva_educational():
             flash('Los campos Potrero, Fecha, Tipo de Actividad y Descripción son obligatorios', 'danger')
             
             # Get data for template
-            cursor = mysql.connection.cursor()
-            cursor.execute("SELECT id, nombre, hectareas, tipo_pasto FROM potreros ORDER BY nombre")
-            potreros = cursor.fetchall()
-            cursor.close()
+            potreros = catalogo_potreros.listar()
             
             tipos_actividad = ['Riego', 'Fumigación', 'Reparación de Cercas', 'Limpieza', 'Fertilización', 'Otro']
             estados = ['Pendiente', 'En Progreso', 'Completada', 'Cancelada']
@@ -253,10 +261,7 @@ def nueva_educational():
         if tipo_actividad not in tipos_actividad_permitidos:
             flash(f'Tipo de actividad no válido: "{tipo_actividad}"', 'danger')
             
-            cursor = mysql.connection.cursor()
-            cursor.execute("SELECT id, nombre, hectareas, tipo_pasto FROM potreros ORDER BY nombre")
-            potreros = cursor.fetchall()
-            cursor.close()
+            potreros = catalogo_potreros.listar()
             
             tipos_actividad = tipos_actividad_permitidos
             estados = ['Pendiente', 'En Progreso', 'Completada', 'Cancelada']
@@ -279,10 +284,7 @@ def nueva_educational():
         except (ValueError, TypeError):
             flash('Valores inválidos para los campos', 'danger')
             
-            cursor = mysql.connection.cursor()
-            cursor.execute("SELECT id, nombre, hectareas, tipo_pasto FROM potreros ORDER BY nombre")
-            potreros = cursor.fetchall()
-            cursor.close()
+            potreros = catalogo_potreros.listar()
             
             tipos_actividad = ['Riego', 'Fumigación', 'Reparación de Cercas', 'Limpieza', 'Fertilización', 'Otro']
             estados = ['Pendiente', 'En Progreso', 'Completada', 'Cancelada']
@@ -307,10 +309,7 @@ def nueva_educational():
             flash('Error al crear la actividad', 'danger')
     
     # GET request - show form
-    cursor = mysql.connection.cursor()
-    cursor.execute("SELECT id, nombre, hectareas, tipo_pasto FROM potreros ORDER BY nombre")
-    potreros = cursor.fetchall()
-    cursor.close()
+    potreros = catalogo_potreros.listar()
     
     tipos_actividad = ['Riego', 'Fumigación', 'Reparación de Cercas', 'Limpieza', 'Fertilización', 'Otro']
     estados = ['Pendiente', 'En Progreso', 'Completada', 'Cancelada']
@@ -338,10 +337,7 @@ def nueva():
             flash('Los campos Potrero, Fecha, Tipo de Actividad y Descripción son obligatorios', 'danger')
             
             # Obtener todos los potreros para el selector
-            cursor = mysql.connection.cursor()
-            cursor.execute("SELECT id, nombre FROM potreros ORDER BY nombre")
-            potreros = cursor.fetchall()
-            cursor.close()
+            potreros = catalogo_potreros.listar()
             
             # Tipos de actividades
             tipos_actividad = ['Riego', 'Fumigación', 'Reparación de Cercas', 'Limpieza', 'Fertilización', 'Otro']
@@ -360,10 +356,7 @@ def nueva():
             flash(f'Tipo de actividad no válido: "{tipo_actividad}". Valores permitidos: {", ".join(tipos_actividad_permitidos)}', 'danger')
             
             # Obtener todos los potreros para el selector
-            cursor = mysql.connection.cursor()
-            cursor.execute("SELECT id, nombre FROM potreros ORDER BY nombre")
-            potreros = cursor.fetchall()
-            cursor.close()
+            potreros = catalogo_potreros.listar()
             
             # Tipos de actividades
             tipos_actividad = tipos_actividad_permitidos
@@ -391,10 +384,7 @@ def nueva():
             flash('Valores inválidos para los campos', 'danger')
             
             # Obtener todos los potreros para el selector
-            cursor = mysql.connection.cursor()
-            cursor.execute("SELECT id, nombre FROM potreros ORDER BY nombre")
-            potreros = cursor.fetchall()
-            cursor.close()
+            potreros = catalogo_potreros.listar()
             
             # Tipos de actividades
             tipos_actividad = ['Riego', 'Fumigación', 'Reparación de Cercas', 'Limpieza', 'Fertilización', 'Otro']
@@ -422,10 +412,7 @@ def nueva():
             flash('Error al registrar la actividad', 'danger')
     
     # Obtener todos los potreros para el selector
-    cursor = mysql.connection.cursor()
-    cursor.execute("SELECT id, nombre FROM potreros ORDER BY nombre")
-    potreros = cursor.fetchall()
-    cursor.close()
+    potreros = catalogo_potreros.listar()
     
     # Tipos de actividades
     tipos_actividad = ['Riego', 'Fumigación', 'Reparación de Cercas', 'Limpieza', 'Fertilización', 'Otro']
@@ -501,10 +488,7 @@ def editar(actividad_id):
         return redirect(url_for('actividades.index'))
     
     # Obtener todos los potreros para el selector
-    cursor = mysql.connection.cursor()
-    cursor.execute("SELECT id, nombre FROM potreros ORDER BY nombre")
-    potreros = cursor.fetchall()
-    cursor.close()
+    potreros = catalogo_potreros.listar()
     
     # Tipos de actividades
     tipos_actividad = ['Riego', 'Fumigación', 'Reparación de Cercas', 'Limpieza', 'Fertilización', 'Otro']
@@ -1,4 +1,4 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify, session
+from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify, session, current_app, abort
 from flask_login import login_required, current_user
 from datetime import datetime
 import os
@@ -6,6 +6,8 @@ import sys
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from proyecto.models.models import User
+from proyecto.utils.cache import cache_usuarios, contadores
+from proyecto.utils.profiler import perfil_sql
 from db import mysql
 
 admin_bp = Blueprint('admin', __name__, url_prefix='/admin')
@@ -15,20 +17,14 @@ admin_bp = Blueprint('admin', __name__, url_prefix='/admin')
 def index():
     """Página principal del módulo de administración"""
     try:
-        cursor = mysql.connection.cursor()
-        
-        # Obtener estadísticas del sistema
-        cursor.execute("SELECT COUNT(*) as total FROM users")
-        total_usuarios = cursor.fetchone()['total']
-        
-        cursor.execute("SELECT COUNT(*) as total FROM fincas WHERE activa = TRUE")
-        total_fincas = cursor.fetchone()['total']
-        
-        cursor.execute("SELECT COUNT(*) as total FROM potreros")
-        total_potreros = cursor.fetchone()['total']
+        # Obtener estadísticas del sistema (caché de contadores)
+        totales = contadores.obtener('usuarios', 'fincas', 'potreros', 'aforos_mes')
+        total_usuarios = totales['usuarios']
+        total_fincas = totales['fincas']
+        total_potreros = totales['potreros']
+        aforos_mes = totales['aforos_mes']
         
-        cursor.execute("SELECT COUNT(*) as total FROM aforos WHERE fecha >= DATE_SUB(CURDATE(), INTERVAL 30 DAY)")
-        aforos_mes = cursor.fetchone()['total']
+        cursor = mysql.connection.cursor()
         
         # Obtener fincas para el selector
         cursor.execute("SELECT id, nombre, area_total, propietario FROM fincas WHERE activa = TRUE ORDER BY nombre")
@@ -178,6 +174,7 @@ def editar_usuario(user_id):
                 WHERE id = %s
             """, (nombre, email, finca_id, user_id))
             mysql.connection.commit()
+            cache_usuarios.invalidar(user_id)
             
             if cursor.rowcount > 0:
                 flash('Usuario actualizado exitosamente', 'success')
@@ -257,6 +254,7 @@ def nueva_finca():
                 VALUES (%s, %s, %s, %s, TRUE)
             """, (nombre, ubicacion, hectareas, descripcion))
             mysql.connection.commit()
+            contadores.invalidar('fincas')
             
             finca_id = cursor.lastrowid
             cursor.close()
@@ -297,6 +295,7 @@ def editar_finca(finca_id):
                 WHERE id = %s
             """, (nombre, ubicacion, hectareas, descripcion, activa, finca_id))
             mysql.connection.commit()
+            contadores.invalidar('fincas')
             
             if cursor.rowcount > 0:
                 flash('Finca actualizada exitosamente', 'success')
@@ -384,6 +383,7 @@ def cambiar_finca():
                       (finca_id, current_user.id))
         mysql.connection.commit()
         cursor.close()
+        cache_usuarios.invalidar(current_user.id)
         
         flash('Finca cambiada exitosamente', 'success')
         return redirect(url_for('dashboard_simple.index'))
@@ -427,6 +427,7 @@ def nuevo_rol():
                 VALUES (%s, %s)
             """, (nombre, descripcion))
             mysql.connection.commit()
+            contadores.invalidar('roles')
             
             rol_id = cursor.lastrowid
             cursor.close()
@@ -447,19 +448,11 @@ def nuevo_rol():
 def dashboard():
     """Dashboard avanzado"""
     try:
-        cursor = mysql.connection.cursor()
-        
-        # Estadísticas avanzadas
-        cursor.execute("SELECT COUNT(*) as total FROM fincas WHERE activa = TRUE")
-        total_fincas = cursor.fetchone()['total']
-        
-        cursor.execute("SELECT COUNT(*) as total FROM users")
-        usuarios_activos = cursor.fetchone()['total']
-        
-        cursor.execute("SELECT COUNT(*) as total FROM roles")
-        roles_admin = cursor.fetchone()['total']
-        
-        cursor.close()
+        # Estadísticas avanzadas (caché de contadores)
+        totales = contadores.obtener('fincas', 'usuarios', 'roles')
+        total_fincas = totales['fincas']
+        usuarios_activos = totales['usuarios']
+        roles_admin = totales['roles']
         
         estadisticas = {
             'total_fincas': total_fincas,
@@ -472,4 +465,24 @@ def dashboard():
         
     except Exception as e:
         flash(f'Error al cargar dashboard: {str(e)}', 'error')
-        return render_template('admin/dashboard.html', estadisticas={})
\ No newline at end of file
+        return render_template('admin/dashboard.html', estadisticas={})
+
+@admin_bp.route('/perf')
+@login_required
+def perf():
+    """Huellas SQL más costosas de este worker (sólo en modo debug)"""
+    if not current_app.debug:
+        abort(404)
+    
+    if request.args.get('reiniciar'):
+        perfil_sql.reiniciar()
+        return redirect(url_for('admin.perf'))
+    
+    orden = request.args.get('orden', 'total_ms')
+    if orden not in ('total_ms', 'max_ms', 'promedio_ms', 'ejecuciones'):
+        orden = 'total_ms'
+    
+    return render_template('admin/perf.html',
+                         huellas=perfil_sql.top(50, orden),
+                         orden=orden,
+                         umbral_n1=perfil_sql.umbral_n1)
@@ -1,4 +1,4 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify
+from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify, current_app
 from flask_login import login_required
 from datetime import datetime
 import json
@@ -6,9 +6,19 @@ import os
 import sys
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from proyecto.models.models import Aforo, Potrero, MuestraAforo
+from proyecto.models.models import Aforo, MuestraAforo
+from proyecto.utils.cache import cache_respuestas, contadores, incrementar_version
+from proyecto.utils.importacion import ErrorImportacion, ImportadorAforos, leer_filas
+from proyecto.utils.exportacion import respuesta_csv
+from proyecto.utils.tareas import encolar_exportacion, encolar_recalculo
+from proyecto.utils.pagination import CursorInvalido, leer_conteo, leer_cursor
+from proyecto.utils.arranque import perezoso
+from proyecto.utils.auditoria import auditoria
+from proyecto.utils.catalogo import catalogo_potreros
 from db import mysql
 
+series = perezoso('proyecto.utils.series')
+
 
 aforos_bp = Blueprint('aforos', __name__, url_prefix='/aforos')
 
@@ -42,23 +52,26 @@ def index():
         except ValueError:
             potrero_id = None
     
-    # Obtener aforos filtrados
-    aforos, total = Aforo.get_all(
-        page=page, 
+    # Obtener aforos filtrados (cursor para avanzar/retroceder; page sólo para saltos directos)
+    per_page = 10
+    cursor_pagina = leer_cursor(request.args.get('cursor'))
+    pagina = Aforo.get_pagina(
+        per_page=per_page,
+        cursor=cursor_pagina,
+        offset=0 if cursor_pagina else (page - 1) * per_page,
+        conteo=leer_conteo(request.args.get('conteo')),
         fecha_inicio=fecha_inicio, 
         fecha_fin=fecha_fin, 
         potrero_id=potrero_id
     )
+    aforos = pagina.items
+    total = pagina.total or 0
     
     # Calcular páginas para paginación
-    per_page = 10
-    pages = (total + per_page - 1) // per_page
+    pages = pagina.pages or page
     
     # Obtener todos los potreros para el selector de filtros
-    cursor = mysql.connection.cursor()
-    cursor.execute("SELECT id, nombre FROM potreros ORDER BY nombre")
-    potreros = cursor.fetchall()
-    cursor.close()
+    potreros = catalogo_potreros.listar()
     
     return render_template('aforos/index.html', 
                           aforos=aforos, 
@@ -66,10 +79,47 @@ def index():
                           page=page,
                           pages=pages,
                           total=total,
+                          pagina=pagina,
                           fecha_inicio=fecha_inicio.strftime('%Y-%m-%d') if fecha_inicio else '',
                           fecha_fin=fecha_fin.strftime('%Y-%m-%d') if fecha_fin else '',
                           potrero_id=potrero_id)
 
+@aforos_bp.route('/api/lista')
+@login_required
+def api_lista():
+    """Listado de aforos paginado por cursor (JSON): ?cursor=&per_page=&conteo=exacto|estimado|ninguno"""
+    try:
+        pagina = Aforo.get_pagina(
+            per_page=min(max(request.args.get('per_page', 50, type=int), 1), 500),
+            cursor=request.args.get('cursor'),
+            conteo=leer_conteo(request.args.get('conteo'), 'ninguno'),
+            fecha_inicio=request.args.get('fecha_inicio'),
+            fecha_fin=request.args.get('fecha_fin'),
+            potrero_id=request.args.get('potrero_id', type=int),
+        )
+        return jsonify({'success': True, **pagina.to_dict()})
+    except CursorInvalido as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@aforos_bp.route('/export.csv')
+@login_required
+def export_csv():
+    """Exportar a CSV (streaming) con los mismos filtros del listado; con ?en_segundo_plano=1 se encola"""
+    if request.args.get('en_segundo_plano', type=int):
+        return encolar_exportacion('aforos', {
+            'fecha_inicio': request.args.get('fecha_inicio'),
+            'fecha_fin': request.args.get('fecha_fin'),
+            'potrero_id': request.args.get('potrero_id', type=int),
+        })
+    consulta = Aforo.get_export_query(
+        fecha_inicio=request.args.get('fecha_inicio'),
+        fecha_fin=request.args.get('fecha_fin'),
+        potrero_id=request.args.get('potrero_id', type=int),
+    )
+    return respuesta_csv(mysql, f"aforos_{datetime.now():%Y%m%d}.csv", consulta)
+
 @aforos_bp.route('/nuevo', methods=['GET', 'POST'])
 @login_required
 def nuevo():
@@ -88,10 +138,7 @@ def nuevo():
                 flash('Los campos Potrero y Fecha son obligatorios', 'danger')
                 
                 # Obtener todos los potreros para el selector
-                cursor = mysql.connection.cursor()
-                cursor.execute("SELECT id, nombre, hectareas FROM potreros ORDER BY nombre")
-                potreros = cursor.fetchall()
-                cursor.close()
+                potreros = catalogo_potreros.listar()
                 
                 return render_template('aforos/new.html', potreros=potreros)
             
@@ -102,10 +149,7 @@ def nuevo():
                 flash('Valores inválidos para los campos básicos', 'danger')
                 
                 # Obtener todos los potreros para el selector
-                cursor = mysql.connection.cursor()
-                cursor.execute("SELECT id, nombre, hectareas FROM potreros ORDER BY nombre")
-                potreros = cursor.fetchall()
-                cursor.close()
+                potreros = catalogo_potreros.listar()
                 
                 return render_template('aforos/new.html', potreros=potreros)
             
@@ -157,10 +201,7 @@ def nuevo():
                 flash('Debe ingresar al menos una muestra con peso verde válido', 'danger')
                 
                 # Obtener todos los potreros para el selector
-                cursor = mysql.connection.cursor()
-                cursor.execute("SELECT id, nombre, hectareas FROM potreros ORDER BY nombre")
-                potreros = cursor.fetchall()
-                cursor.close()
+                potreros = catalogo_potreros.listar()
                 
                 return render_template('aforos/new.html', potreros=potreros)
             
@@ -169,37 +210,24 @@ def nuevo():
             materia_seca_promedio = (total_peso_seco / muestras_con_seco) if muestras_con_seco > 0 else 0
             porcentaje_ms = (materia_seca_promedio / materia_verde_promedio * 100) if materia_verde_promedio > 0 else 0
             
-            # Obtener hectáreas del potrero
-            cursor = mysql.connection.cursor()
-            cursor.execute("SELECT hectareas FROM potreros WHERE id = %s", (potrero_id,))
-            potrero = cursor.fetchone()
-            hectareas = float(potrero['hectareas']) if potrero else 0
-            
-            # Calcular totales
-            materia_verde_total = materia_verde_promedio * hectareas
-            materia_seca_total = materia_seca_promedio * hectareas
-            
             try:
-                # Crear aforo principal
+                # Crear aforo principal (Aforo.create calcula rotación y totales por hectárea)
                 aforo_id = Aforo.create(
                     potrero_id, fecha, materia_verde_promedio, porcentaje_ms, materia_seca_promedio, 
-                    observaciones, materia_verde_total, materia_seca_total, None, None, None
+                    observaciones
                 )
                 
                 if aforo_id:
                     # Crear muestras individuales
                     for i, muestra in enumerate(muestras_data):
-                        muestra_id = MuestraAforo.create(
+                        MuestraAforo.create(
                             aforo_id, 
                             i + 1, 
                             muestra['peso_verde_g'], 
                             None,  # altura_pasto not used in this form
-                            f"Muestra {i + 1}"
+                            f"Muestra {i + 1}",
+                            peso_seco=muestra['peso_seco_g']
                         )
-                        
-                        # Actualizar peso seco si está disponible
-                        if muestra['peso_seco_g'] is not None:
-                            MuestraAforo.update_peso_seco(muestra_id, muestra['peso_seco_g'])
                     
                     flash(f'Aforo creado exitosamente con {muestras_validas} muestras', 'success')
                     return redirect(url_for('aforos.index'))
@@ -207,18 +235,12 @@ def nuevo():
                     flash('Error al crear el aforo', 'danger')
                     
             except Exception as e:
-                cursor.close()
                 flash(f'Error al procesar el aforo: {str(e)}', 'danger')
                 
                 # Obtener todos los potreros para el selector
-                cursor = mysql.connection.cursor()
-                cursor.execute("SELECT id, nombre, hectareas FROM potreros ORDER BY nombre")
-                potreros = cursor.fetchall()
-                cursor.close()
+                potreros = catalogo_potreros.listar()
                 
                 return render_template('aforos/new.html', potreros=potreros)
-            
-            cursor.close()
         
         elif action == 'create_base':
             # Mantener funcionalidad original para compatibilidad
@@ -232,10 +254,7 @@ def nuevo():
                 flash('Los campos Potrero y Fecha son obligatorios', 'danger')
                 
                 # Obtener todos los potreros para el selector
-                cursor = mysql.connection.cursor()
-                cursor.execute("SELECT id, nombre, hectareas FROM potreros ORDER BY nombre")
-                potreros = cursor.fetchall()
-                cursor.close()
+                potreros = catalogo_potreros.listar()
                 
                 return render_template('aforos/new.html', potreros=potreros)
             
@@ -246,17 +265,12 @@ def nuevo():
                 flash('Valores inválidos para los campos', 'danger')
                 
                 # Obtener todos los potreros para el selector
-                cursor = mysql.connection.cursor()
-                cursor.execute("SELECT id, nombre, hectareas FROM potreros ORDER BY nombre")
-                potreros = cursor.fetchall()
-                cursor.close()
+                potreros = catalogo_potreros.listar()
                 
                 return render_template('aforos/new.html', potreros=potreros)
             
             # Crear aforo base (sin muestras aún)
-            aforo_id = Aforo.create(
-                potrero_id, fecha, 0, 0, 0, observaciones, None, None, None, None, None
-            )
+            aforo_id = Aforo.create(potrero_id, fecha, 0, 0, 0, observaciones)
             
             if aforo_id:
                 return redirect(url_for('aforos.add_muestras', aforo_id=aforo_id))
@@ -271,13 +285,46 @@ def nuevo():
                 return redirect(url_for('aforos.index'))
     
     # Obtener todos los potreros para el selector
-    cursor = mysql.connection.cursor()
-    cursor.execute("SELECT id, nombre, hectareas FROM potreros ORDER BY nombre")
-    potreros = cursor.fetchall()
-    cursor.close()
+    potreros = catalogo_potreros.listar()
     
     return render_template('aforos/new.html', potreros=potreros)
 
+@aforos_bp.route('/import', methods=['GET', 'POST'])
+@login_required
+def importar():
+    """Importación masiva de aforos con muestras desde CSV/XLSX (formulario o JSON)"""
+    if request.method == 'GET':
+        return render_template('aforos/import.html', resultado=None)
+    
+    quiere_json = request.accept_mimetypes.best == 'application/json' or request.args.get('formato') == 'json'
+    archivo = request.files.get('archivo')
+    if not archivo or not archivo.filename:
+        if quiere_json:
+            return jsonify({'success': False, 'error': 'Debe adjuntar un archivo CSV o XLSX'}), 400
+        flash('Debe adjuntar un archivo CSV o XLSX', 'danger')
+        return render_template('aforos/import.html', resultado=None)
+    
+    try:
+        resultado = ImportadorAforos(mysql).importar(
+            leer_filas(archivo.stream, archivo.filename),
+            solo_validar=bool(request.values.get('solo_validar')),
+            omitir_errores=bool(request.values.get('omitir_errores'))
+        )
+    except ErrorImportacion as e:
+        if quiere_json:
+            return jsonify({'success': False, 'error': str(e)}), 400
+        flash(str(e), 'danger')
+        return render_template('aforos/import.html', resultado=None)
+    
+    if quiere_json:
+        return jsonify({'success': resultado.insertado, **resultado.to_dict()})
+    
+    if resultado.insertado:
+        flash(f'Importados {resultado.aforos} aforos con {resultado.muestras} muestras', 'success')
+    elif resultado.total_errores:
+        flash(f'El archivo tiene {resultado.total_errores} filas con errores; no se importó nada', 'danger')
+    return render_template('aforos/import.html', resultado=resultado)
+
 @aforos_bp.route('/add_muestras/<int:aforo_id>', methods=['GET', 'POST'])
 @login_required
 def add_muestras(aforo_id):
@@ -389,8 +436,22 @@ def api_delete_muestra(muestra_id):
     else:
         return jsonify({'success': False, 'message': 'Error al eliminar la muestra'})
 
+@aforos_bp.route('/api/timeline')
+@login_required
+@cache_respuestas.respuesta_cacheada('aforos', 'potreros')
+def api_timeline():
+    """Serie temporal de materia verde/seca por potrero, reducida a max_points por potrero"""
+    datos = Aforo.get_timeline_data(
+        potrero_id=request.args.get('potrero_id', type=int),
+        months=request.args.get('meses', 12, type=int),
+        max_points=series.leer_max_puntos(request.args.get('max_points'), current_app.config.get('CHART_MAX_POINTS')),
+        metodo=request.args.get('metodo', 'lttb')
+    )
+    return jsonify({'success': True, 'data': datos})
+
 @aforos_bp.route('/api/data')
 @login_required
+@cache_respuestas.respuesta_cacheada('aforos', 'potreros')
 def api_data():
     potrero_id = request.args.get('potrero_id')
     meses = request.args.get('meses', 6, type=int)
@@ -553,8 +614,7 @@ def editar(aforo_id):
             flash('Los campos Potrero, Fecha, Materia Verde y Porcentaje MS son obligatorios', 'danger')
             
             # Obtener todos los potreros para el selector
-            cursor.execute("SELECT id, nombre FROM potreros ORDER BY nombre")
-            potreros = cursor.fetchall()
+            potreros = catalogo_potreros.listar()
             cursor.close()
             
             return render_template('aforos/edit.html', aforo=aforo, potreros=potreros)
@@ -622,8 +682,7 @@ def editar(aforo_id):
             flash('Valores inválidos para los campos', 'danger')
             
             # Obtener todos los potreros para el selector
-            cursor.execute("SELECT id, nombre FROM potreros ORDER BY nombre")
-            potreros = cursor.fetchall()
+            potreros = catalogo_potreros.listar()
             cursor.close()
             
             return render_template('aforos/edit.html', aforo=aforo, potreros=potreros)
@@ -659,10 +718,23 @@ def editar(aforo_id):
             (materia_verde_total, materia_seca_total, aforo_id)
         )
         
+        # Resumen de rotación del potrero nuevo y, si cambió, del anterior: lo
+        # recalcula el worker (el trabajo se confirma junto con la edición)
+        encolar_recalculo('resumen_potreros', {'potrero_id': [potrero_id, aforo['potrero_id']]}, cursor)
+        incrementar_version(cursor, 'aforos')
+        
         mysql.connection.commit()
+        contadores.invalidar('aforos')
         
         # Usar el resultado de la primera actualización para determinar el éxito
         if update_success:
+            auditoria.registrar('aforos', aforo_id, 'UPDATE', {
+                'old': {campo: aforo.get(campo) for campo in ('potrero_id', 'fecha', 'materia_verde',
+                                                              'porcentaje_ms', 'materia_seca', 'dias_rotacion')},
+                'new': {'potrero_id': potrero_id, 'fecha': fecha, 'materia_verde': materia_verde,
+                        'porcentaje_ms': porcentaje_ms, 'materia_seca': materia_seca,
+                        'dias_rotacion': dias_rotacion},
+            })
             cursor.close()
             flash('Aforo actualizado exitosamente', 'success')
             return redirect(url_for('aforos.index'))
@@ -670,8 +742,7 @@ def editar(aforo_id):
             flash('Error al actualizar el aforo', 'danger')
     
     # Obtener todos los potreros para el selector
-    cursor.execute("SELECT id, nombre, hectareas FROM potreros ORDER BY nombre")
-    potreros = cursor.fetchall()
+    potreros = catalogo_potreros.listar()
     cursor.close()
     
     return render_template('aforos/edit.html', aforo=aforo, potreros=potreros)
@@ -681,12 +752,23 @@ def editar(aforo_id):
 def delete(aforo_id):
     """Eliminar aforo"""
     cursor = mysql.connection.cursor()
+    cursor.execute("SELECT potrero_id FROM aforos WHERE id = %s", (aforo_id,))
+    aforo = cursor.fetchone()
+    
     cursor.execute("DELETE FROM aforos WHERE id = %s", (aforo_id,))
-    mysql.connection.commit()
     success = cursor.rowcount > 0
+    
+    # El worker recalcula el resumen de rotación del potrero
+    if success and aforo:
+        encolar_recalculo('resumen_potreros', {'potrero_id': [aforo['potrero_id']]}, cursor)
+        incrementar_version(cursor, 'aforos')
+    
+    mysql.connection.commit()
+    contadores.invalidar('aforos')
     cursor.close()
     
     if success:
+        auditoria.registrar('aforos', aforo_id, 'DELETE', {'old': {'potrero_id': aforo['potrero_id']}} if aforo else None)
         flash('Aforo eliminado exitosamente', 'success')
     else:
         flash('Error al eliminar el aforo', 'danger')
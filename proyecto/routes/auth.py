@@ -2,6 +2,7 @@ from flask import Blueprint, render_template, request, redirect, url_for, flash,
 from flask_login import login_user, logout_user, login_required
 from functools import wraps
 from proyecto.models.models import User
+from proyecto.utils.cache import cache_usuarios
 
 auth_bp = Blueprint('auth', __name__)
 
@@ -21,6 +22,7 @@ def login():
         if user and user.check_password(password):
             # Iniciar sesión con Flask-Login
             login_user(user)
+            cache_usuarios.guardar_en_sesion(user.identidad())
             
             next_page = request.args.get('next')
             if next_page:
@@ -70,5 +72,6 @@ def register():
 @auth_bp.route('/logout')
 def logout():
     logout_user()
+    session.pop(cache_usuarios.CLAVE_SESION, None)
     flash('Has cerrado sesión correctamente', 'success')
     return redirect(url_for('auth.login')) 
\ No newline at end of file
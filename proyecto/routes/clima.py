@@ -1,13 +1,20 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify
+from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify, current_app
 from flask_login import login_required
 from datetime import datetime, timedelta
 import os
 import sys
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from proyecto.models.models import Clima
+from proyecto.models.models import ROLLUPS_CLIMA, Clima
+from proyecto.utils.cache import cache_respuestas
+from proyecto.utils.exportacion import respuesta_csv
+from proyecto.utils.tareas import encolar_exportacion
+from proyecto.utils.pagination import CursorInvalido, leer_conteo, leer_cursor
+from proyecto.utils.arranque import perezoso
 from db import mysql
 
+series = perezoso('proyecto.utils.series')
+
 clima_bp = Blueprint('clima', __name__, url_prefix='/clima')
 
 @clima_bp.route('/')
@@ -65,19 +72,25 @@ def historico():
         if fecha_fin:
             fecha_fin = datetime.strptime(fecha_fin, '%Y-%m-%d')
         
-        registros, total = Clima.get_all(page=page, per_page=20, 
-                                       fecha_inicio=fecha_inicio, 
-                                       fecha_fin=fecha_fin)
+        cursor_pagina = leer_cursor(request.args.get('cursor'))
+        pagina = Clima.get_pagina(per_page=20,
+                                  cursor=cursor_pagina,
+                                  offset=0 if cursor_pagina else (page - 1) * 20,
+                                  conteo=leer_conteo(request.args.get('conteo')),
+                                  fecha_inicio=fecha_inicio,
+                                  fecha_fin=fecha_fin)
+        registros = pagina.items
+        total = pagina.total or 0
         
         # Calcular páginas para paginación
-        per_page = 20
-        pages = (total + per_page - 1) // per_page
+        pages = pagina.pages or page
         
         return render_template('clima/historico.html',
                              registros=registros,
                              total=total,
                              page=page,
                              pages=pages,
+                             pagina=pagina,
                              fecha_inicio=request.args.get('fecha_inicio', ''),
                              fecha_fin=request.args.get('fecha_fin', ''))
     except Exception as e:
@@ -87,16 +100,55 @@ def historico():
                              total=0,
                              page=1,
                              pages=1,
+                             pagina=None,
                              fecha_inicio='',
                              fecha_fin='')
 
+@clima_bp.route('/api/lista')
+@login_required
+def api_lista():
+    """Histórico de clima paginado por cursor (JSON): ?cursor=&per_page=&conteo=exacto|estimado|ninguno"""
+    try:
+        pagina = Clima.get_pagina(
+            per_page=min(max(request.args.get('per_page', 50, type=int), 1), 500),
+            cursor=request.args.get('cursor'),
+            conteo=leer_conteo(request.args.get('conteo'), 'ninguno'),
+            fecha_inicio=request.args.get('fecha_inicio'),
+            fecha_fin=request.args.get('fecha_fin'),
+        )
+        return jsonify({'success': True, **pagina.to_dict()})
+    except CursorInvalido as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@clima_bp.route('/export.csv')
+@login_required
+def export_csv():
+    """Exportar a CSV (streaming) con los mismos filtros del listado; con ?en_segundo_plano=1 se encola"""
+    if request.args.get('en_segundo_plano', type=int):
+        return encolar_exportacion('clima', {
+            'fecha_inicio': request.args.get('fecha_inicio'),
+            'fecha_fin': request.args.get('fecha_fin'),
+        })
+    consulta = Clima.get_export_query(
+        fecha_inicio=request.args.get('fecha_inicio'),
+        fecha_fin=request.args.get('fecha_fin'),
+    )
+    return respuesta_csv(mysql, f"clima_{datetime.now():%Y%m%d}.csv", consulta)
+
 @clima_bp.route('/api/data')
 @login_required
+@cache_respuestas.respuesta_cacheada('clima')
 def api_data():
     """API para obtener datos climáticos en formato JSON"""
     try:
         days = request.args.get('days', 30, type=int)
-        datos = Clima.get_data_for_chart(days)
+        datos = Clima.get_data_for_chart(
+            days,
+            max_points=series.leer_max_puntos(request.args.get('max_points'), current_app.config.get('CHART_MAX_POINTS')),
+            metodo=request.args.get('metodo', 'lttb')
+        )
         
         return jsonify({
             'success': True,
@@ -108,6 +160,27 @@ def api_data():
             'error': str(e)
         }), 500
 
+@clima_bp.route('/api/resumen')
+@login_required
+@cache_respuestas.respuesta_cacheada('clima')
+def api_resumen():
+    """Series por semana o por mes desde los rollups: ?periodo=semanal|mensual&cantidad=12"""
+    periodo = request.args.get('periodo', 'semanal')
+    if periodo not in ROLLUPS_CLIMA:
+        return jsonify({'success': False, 'error': f"Período no válido: {periodo}"}), 400
+    try:
+        cantidad = min(max(request.args.get('cantidad', 12, type=int), 1), 520)
+        return jsonify({
+            'success': True,
+            'periodo': periodo,
+            'data': Clima.get_rollup_data_for_chart(periodo, cantidad)
+        })
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
 @clima_bp.route('/nuevo', methods=['GET', 'POST'])
 @login_required
 def nuevo():
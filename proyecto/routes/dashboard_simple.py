@@ -16,7 +16,7 @@ dashboard_simple_bp = Blueprint('dashboard_simple', __name__)
 def index():
     """Página principal del dashboard simplificado"""
     try:
-        from db import mysql
+        from proyecto.utils.cache import contadores
         
         # Obtener información básica del usuario
         usuario_info = {
@@ -24,33 +24,15 @@ def index():
             'email': current_user.email if current_user.is_authenticated else ''
         }
         
-        # Obtener estadísticas reales de la base de datos
-        cursor = mysql.connection.cursor()
-        
-        # Contar fincas
-        cursor.execute("SELECT COUNT(*) as total FROM fincas WHERE activa = TRUE")
-        total_fincas = cursor.fetchone()['total']
-        
-        # Contar potreros
-        cursor.execute("SELECT COUNT(*) as total FROM potreros")
-        total_potreros = cursor.fetchone()['total']
-        
-        # Contar aforos
-        cursor.execute("SELECT COUNT(*) as total FROM aforos")
-        total_aforos = cursor.fetchone()['total']
-        
-        # Contar actividades
-        cursor.execute("SELECT COUNT(*) as total FROM actividades")
-        total_actividades = cursor.fetchone()['total']
-        
-        cursor.close()
+        # Obtener estadísticas reales (caché de contadores; una consulta sólo al expirar)
+        totales = contadores.obtener('fincas', 'potreros', 'aforos', 'actividades')
         
         # Estadísticas reales
         stats = {
-            'total_fincas': total_fincas,
-            'total_potreros': total_potreros,
-            'total_aforos': total_aforos,
-            'total_actividades': total_actividades
+            'total_fincas': totales['fincas'],
+            'total_potreros': totales['potreros'],
+            'total_aforos': totales['aforos'],
+            'total_actividades': totales['actividades']
         }
         
         # Información de la finca actual
@@ -6,9 +6,18 @@ import sys
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from db import mysql
+from proyecto.utils.arranque import perezoso
+from proyecto.utils.auditoria import auditoria
+from proyecto.utils.cache import cache_respuestas, incrementar_version
+from proyecto.utils.catalogo import catalogo_potreros
 
 ganado_bp = Blueprint('ganado', __name__, url_prefix='/ganado')
 
+# Motores de análisis con NumPy: se importan en el primer request que los usa
+_balance = perezoso('proyecto.utils.balance')
+_proyeccion = perezoso('proyecto.utils.proyeccion')
+_rotacion = perezoso('proyecto.utils.rotacion')
+
 @ganado_bp.route('/')
 @login_required
 def index():
@@ -68,6 +77,7 @@ def nuevo_lote():
                   potrero_id, observaciones, datetime.now(), current_user.id))
             
             lote_id = cursor.lastrowid
+            incrementar_version(cursor, 'lotes_ganado_v2')
             mysql.connection.commit()
             
             # Si se asignó a un potrero, crear movimiento inicial
@@ -78,6 +88,9 @@ def nuevo_lote():
                     VALUES (%s, NULL, %s, %s, 'Ingreso inicial', %s)
                 """, (lote_id, potrero_id, datetime.now(), current_user.id))
                 mysql.connection.commit()
+                auditoria.registrar('movimientos_ganado', cursor.lastrowid, 'CREATE', {
+                    'lote_id': lote_id, 'potrero_destino_id': potrero_id, 'motivo': 'Ingreso inicial',
+                })
             
             cursor.close()
             
@@ -94,10 +107,7 @@ def nuevo_lote():
     
     # Obtener lista de potreros
     try:
-        cursor = mysql.connection.cursor()
-        cursor.execute("SELECT id, nombre FROM potreros ORDER BY nombre")
-        potreros = cursor.fetchall()
-        cursor.close()
+        potreros = catalogo_potreros.listar()
         
         return render_template('ganado/nuevo_lote.html', potreros=potreros)
         
@@ -259,13 +269,19 @@ def nuevo_movimiento():
                 VALUES (%s, %s, %s, %s, %s, %s, %s)
             """, (lote_id, potrero_origen_id, potrero_destino_id, fecha_ingreso,
                   motivo, observaciones, current_user.id))
+            movimiento_id = cursor.lastrowid
             
             # Actualizar potrero actual del lote
             cursor.execute("UPDATE lotes SET potrero_actual_id = %s WHERE id = %s",
                           (potrero_destino_id, lote_id))
+            incrementar_version(cursor, 'lotes_ganado_v2')
             
             mysql.connection.commit()
             cursor.close()
+            auditoria.registrar('movimientos_ganado', movimiento_id, 'CREATE', {
+                'lote_id': lote_id, 'potrero_origen_id': potrero_origen_id,
+                'potrero_destino_id': potrero_destino_id, 'fecha_ingreso': fecha_ingreso, 'motivo': motivo,
+            })
             
             flash('Movimiento registrado exitosamente', 'success')
             return redirect(url_for('ganado.movimientos'))
@@ -283,8 +299,7 @@ def nuevo_movimiento():
         lotes = cursor.fetchall()
         
         # Obtener potreros
-        cursor.execute("SELECT id, nombre FROM potreros ORDER BY nombre")
-        potreros = cursor.fetchall()
+        potreros = catalogo_potreros.listar()
         
         cursor.close()
         
@@ -304,63 +319,107 @@ def balance_forrajero():
     """Calcular balance forrajero"""
     try:
         cursor = mysql.connection.cursor()
+        balance = _balance.BalanceForrajero.cargar(cursor, finca_id=request.args.get('finca_id', type=int))
+        cursor.close()
         
-        # Obtener datos de lotes y potreros
-        cursor.execute("""
-            SELECT l.*, p.nombre as potrero_nombre, p.hectareas,
-                   (l.numero_animales * l.peso_promedio) as peso_total_lote
-            FROM lotes_ganado_v2 l
-            LEFT JOIN potreros p ON l.potrero_actual_id = p.id
-            WHERE l.potrero_actual_id IS NOT NULL
-        """)
-        lotes_en_potreros = cursor.fetchall()
+        return render_template('ganado/balance_forrajero.html',
+                             balances=balance.filas(),
+                             kpis=balance.kpis(),
+                             alertas=balance.alertas())
         
-        # Obtener datos de aforos recientes por potrero
-        cursor.execute("""
-            SELECT potrero_id, 
-                   AVG(materia_seca) as ms_promedio,
-                   MAX(fecha) as ultima_medicion
-            FROM aforos 
-            WHERE fecha >= DATE_SUB(CURDATE(), INTERVAL 30 DAY)
-            GROUP BY potrero_id
-        """)
-        aforos_recientes = cursor.fetchall()
+    except Exception as e:
+        flash(f'Error al calcular balance forrajero: {str(e)}', 'error')
+        return render_template('ganado/balance_forrajero.html', balances=[], kpis=None, alertas=[])
+
+@ganado_bp.route('/api/balance-forrajero')
+@login_required
+def api_balance_forrajero():
+    """API del balance forrajero: balance por lote, KPIs y alertas"""
+    try:
+        cursor = mysql.connection.cursor()
+        balance = _balance.BalanceForrajero.cargar(cursor, finca_id=request.args.get('finca_id', type=int))
         cursor.close()
         
-        # Crear diccionario de aforos por potrero
-        aforos_dict = {a['potrero_id']: a for a in aforos_recientes}
+        return jsonify({
+            'success': True,
+            **balance.to_dict()
+        })
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@ganado_bp.route('/api/proyeccion-forrajera')
+@login_required
+@cache_respuestas.respuesta_cacheada('lotes_ganado_v2', 'potreros', 'aforos', 'recorridos', 'clima')
+def api_proyeccion_forrajera():
+    """API de proyección: materia seca por potrero para los próximos N días"""
+    dias = request.args.get('dias', 90, type=int)
+    if not 1 <= dias <= _proyeccion.DIAS_MAXIMOS:
+        return jsonify({
+            'success': False,
+            'error': f'dias debe estar entre 1 y {_proyeccion.DIAS_MAXIMOS}'
+        }), 400
+    
+    try:
+        cursor = mysql.connection.cursor()
+        proyeccion = _proyeccion.ProyeccionForrajera.cargar(cursor, dias=dias,
+                                               finca_id=request.args.get('finca_id', type=int))
+        cursor.close()
         
-        # Calcular balance para cada lote
-        balances = []
-        for lote in lotes_en_potreros:
-            potrero_id = lote['potrero_actual_id']
-            aforo = aforos_dict.get(potrero_id)
-            
-            if aforo and lote['hectareas']:
-                # Cálculos de balance forrajero
-                peso_total = lote['peso_total_lote']
-                consumo_diario = peso_total * 0.025  # 2.5% del peso vivo
-                ms_disponible = aforo['ms_promedio'] * lote['hectareas']
-                dias_disponibles = ms_disponible / consumo_diario if consumo_diario > 0 else 0
-                
-                balance = {
-                    'lote_nombre': lote['nombre'],
-                    'potrero_nombre': lote['potrero_nombre'],
-                    'numero_animales': lote['numero_animales'],
-                    'peso_total': peso_total,
-                    'consumo_diario': consumo_diario,
-                    'ms_disponible': ms_disponible,
-                    'dias_disponibles': dias_disponibles,
-                    'ultima_medicion': aforo['ultima_medicion'],
-                    'estado': 'Crítico' if dias_disponibles < 7 else 'Atención' if dias_disponibles < 15 else 'Bueno'
-                }
-                balances.append(balance)
-        
-        return render_template('ganado/balance_forrajero.html', balances=balances)
+        return jsonify({
+            'success': True,
+            **proyeccion.to_dict()
+        })
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@ganado_bp.route('/plan-rotacion')
+@login_required
+def plan_rotacion():
+    """Movimientos de lotes sugeridos para los próximos días"""
+    dias = min(max(request.args.get('dias', 60, type=int), 1), _proyeccion.DIAS_MAXIMOS)
+    try:
+        cursor = mysql.connection.cursor()
+        plan = _rotacion.planificar(cursor, dias=dias, finca_id=request.args.get('finca_id', type=int))
+        cursor.close()
+        
+        return render_template('ganado/plan_rotacion.html', plan=plan.to_dict(), dias=dias)
         
     except Exception as e:
-        flash(f'Error al calcular balance forrajero: {str(e)}', 'error')
-        return render_template('ganado/balance_forrajero.html', balances=[])
+        flash(f'Error al calcular el plan de rotación: {str(e)}', 'error')
+        return render_template('ganado/plan_rotacion.html', plan=None, dias=dias)
+
+@ganado_bp.route('/api/plan-rotacion')
+@login_required
+@cache_respuestas.respuesta_cacheada('lotes_ganado_v2', 'potreros', 'aforos', 'recorridos', 'clima')
+def api_plan_rotacion():
+    """API del plan de rotación"""
+    dias = request.args.get('dias', 60, type=int)
+    if not 1 <= dias <= _proyeccion.DIAS_MAXIMOS:
+        return jsonify({
+            'success': False,
+            'error': f'dias debe estar entre 1 y {_proyeccion.DIAS_MAXIMOS}'
+        }), 400
+    
+    try:
+        cursor = mysql.connection.cursor()
+        plan = _rotacion.planificar(cursor, dias=dias, finca_id=request.args.get('finca_id', type=int))
+        cursor.close()
+        
+        return jsonify({
+            'success': True,
+            **plan.to_dict()
+        })
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
 
 @ganado_bp.route('/api/lotes-potrero/<int:potrero_id>')
 @login_required
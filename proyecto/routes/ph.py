@@ -6,6 +6,11 @@ import sys
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from proyecto.models.models import PH, Potrero
+from proyecto.utils.cache import cache_respuestas, incrementar_version
+from proyecto.utils.exportacion import respuesta_csv
+from proyecto.utils.tareas import encolar_exportacion
+from proyecto.utils.pagination import CursorInvalido, leer_conteo, leer_cursor
+from proyecto.utils.catalogo import catalogo_potreros
 from db import mysql
 
 ph_bp = Blueprint('ph', __name__, url_prefix='/ph')
@@ -27,20 +32,22 @@ def index():
             fecha_fin = datetime.strptime(fecha_fin, '%Y-%m-%d')
         
         # Obtener registros de pH
-        ph_records, total = PH.get_all(page=page, per_page=15,
-                                      fecha_inicio=fecha_inicio,
-                                      fecha_fin=fecha_fin,
-                                      potrero_id=potrero_id)
+        cursor_pagina = leer_cursor(request.args.get('cursor'))
+        pagina = PH.get_pagina(per_page=15,
+                                  cursor=cursor_pagina,
+                                  offset=0 if cursor_pagina else (page - 1) * 15,
+                                  conteo=leer_conteo(request.args.get('conteo')),
+                                  fecha_inicio=fecha_inicio,
+                                  fecha_fin=fecha_fin,
+                                  potrero_id=potrero_id)
+        ph_records = pagina.items
+        total = pagina.total or 0
         
         # Obtener lista de potreros para el filtro
-        cursor = mysql.connection.cursor()
-        cursor.execute("SELECT id, nombre FROM potreros ORDER BY nombre")
-        potreros = cursor.fetchall()
-        cursor.close()
+        potreros = catalogo_potreros.listar()
         
         # Calcular páginas para paginación
-        per_page = 15
-        pages = (total + per_page - 1) // per_page
+        pages = pagina.pages or page
         
         # Obtener datos para gráfico
         chart_data = PH.get_data_for_chart(potrero_id, 6)
@@ -51,6 +58,7 @@ def index():
                              total=total,
                              page=page,
                              pages=pages,
+                             pagina=pagina,
                              fecha_inicio=request.args.get('fecha_inicio', ''),
                              fecha_fin=request.args.get('fecha_fin', ''),
                              potrero_id=request.args.get('potrero_id', ''),
@@ -64,6 +72,7 @@ def index():
                              total=0,
                              page=1,
                              pages=1,
+                             pagina=None,
                              fecha_inicio='',
                              fecha_fin='',
                              potrero_id='',
@@ -101,10 +110,7 @@ def nuevo():
     
     # Obtener lista de potreros
     try:
-        cursor = mysql.connection.cursor()
-        cursor.execute("SELECT id, nombre FROM potreros ORDER BY nombre")
-        potreros = cursor.fetchall()
-        cursor.close()
+        potreros = catalogo_potreros.listar()
         
         return render_template('ph/new.html', potreros=potreros)
         
@@ -112,8 +118,45 @@ def nuevo():
         flash(f'Error al cargar formulario: {str(e)}', 'error')
         return render_template('ph/new.html', potreros=[])
 
+@ph_bp.route('/api/lista')
+@login_required
+def api_lista():
+    """Listado de registros de pH paginado por cursor (JSON): ?cursor=&per_page=&conteo=exacto|estimado|ninguno"""
+    try:
+        pagina = PH.get_pagina(
+            per_page=min(max(request.args.get('per_page', 50, type=int), 1), 500),
+            cursor=request.args.get('cursor'),
+            conteo=leer_conteo(request.args.get('conteo'), 'ninguno'),
+            fecha_inicio=request.args.get('fecha_inicio'),
+            fecha_fin=request.args.get('fecha_fin'),
+            potrero_id=request.args.get('potrero_id', type=int),
+        )
+        return jsonify({'success': True, **pagina.to_dict()})
+    except CursorInvalido as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@ph_bp.route('/export.csv')
+@login_required
+def export_csv():
+    """Exportar a CSV (streaming) con los mismos filtros del listado; con ?en_segundo_plano=1 se encola"""
+    if request.args.get('en_segundo_plano', type=int):
+        return encolar_exportacion('ph', {
+            'fecha_inicio': request.args.get('fecha_inicio'),
+            'fecha_fin': request.args.get('fecha_fin'),
+            'potrero_id': request.args.get('potrero_id', type=int),
+        })
+    consulta = PH.get_export_query(
+        fecha_inicio=request.args.get('fecha_inicio'),
+        fecha_fin=request.args.get('fecha_fin'),
+        potrero_id=request.args.get('potrero_id', type=int),
+    )
+    return respuesta_csv(mysql, f"ph_{datetime.now():%Y%m%d}.csv", consulta)
+
 @ph_bp.route('/api/data')
 @login_required
+@cache_respuestas.respuesta_cacheada('ph', 'potreros')
 def api_data():
     """API para obtener datos de pH en formato JSON"""
     try:
@@ -139,9 +182,11 @@ def delete(ph_id):
     try:
         cursor = mysql.connection.cursor()
         cursor.execute("DELETE FROM ph WHERE id = %s", (ph_id,))
+        eliminados = cursor.rowcount
+        incrementar_version(cursor, 'ph')
         mysql.connection.commit()
         
-        if cursor.rowcount > 0:
+        if eliminados > 0:
             flash('Registro de pH eliminado exitosamente', 'success')
         else:
             flash('No se encontró el registro a eliminar', 'error')
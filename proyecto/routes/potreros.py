@@ -5,6 +5,8 @@ import sys
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from proyecto.models.models import Potrero, mysql
+from proyecto.utils.cache import cache_respuestas
+from proyecto.utils.consultas import ultimo_por_grupo
 from datetime import datetime, timedelta
 
 potreros_bp = Blueprint('potreros', __name__, url_prefix='/potreros')
@@ -161,12 +163,14 @@ def delete(potrero_id):
 
 @potreros_bp.route('/api/data')
 @login_required
+@cache_respuestas.respuesta_cacheada('potreros', 'aforos')
 def api_data():
     """API para obtener datos de potreros"""
     try:
         # Obtener todos los potreros sin paginación para el visualizador
         cursor = mysql.connection.cursor()
-        cursor.execute("""
+        ultimos = ultimo_por_grupo('aforos', 'id, potrero_id, fecha, dias_rotacion, materia_verde')
+        cursor.execute(f"""
             SELECT 
                 p.id, 
                 p.nombre, 
@@ -178,15 +182,7 @@ def api_data():
                 COALESCE(a.dias_rotacion, 0) as dias_rotacion,
                 COALESCE(a.materia_verde, 0) as materia_verde
             FROM potreros p
-            LEFT JOIN (
-                SELECT potrero_id, fecha, dias_rotacion, materia_verde
-                FROM aforos
-                WHERE (potrero_id, fecha) IN (
-                    SELECT potrero_id, MAX(fecha) as max_fecha
-                    FROM aforos
-                    GROUP BY potrero_id
-                )
-            ) a ON p.id = a.potrero_id
+            LEFT JOIN ({ultimos}) a ON p.id = a.potrero_id
             ORDER BY p.nombre
         """)
         potreros = cursor.fetchall()
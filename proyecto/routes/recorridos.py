@@ -1,4 +1,4 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify
+from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify, current_app
 from flask_login import login_required, current_user
 from datetime import datetime, timedelta
 import os
@@ -6,8 +6,16 @@ import sys
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from proyecto.models.models import Recorrido, Potrero, PuntoMedicion
+from proyecto.utils.cache import cache_respuestas
+from proyecto.utils.exportacion import respuesta_csv
+from proyecto.utils.tareas import encolar_exportacion
+from proyecto.utils.pagination import CursorInvalido, leer_conteo, leer_cursor
+from proyecto.utils.arranque import perezoso
+from proyecto.utils.catalogo import catalogo_potreros
 from db import mysql
 
+series = perezoso('proyecto.utils.series')
+
 recorridos_bp = Blueprint('recorridos', __name__, url_prefix='/recorridos')
 
 @recorridos_bp.route('/')
@@ -27,20 +35,22 @@ def index():
             fecha_fin = datetime.strptime(fecha_fin, '%Y-%m-%d')
         
         # Obtener recorridos
-        recorridos, total = Recorrido.get_all(page=page, per_page=15,
-                                            fecha_inicio=fecha_inicio,
-                                            fecha_fin=fecha_fin,
-                                            potrero_id=potrero_id)
+        cursor_pagina = leer_cursor(request.args.get('cursor'))
+        pagina = Recorrido.get_pagina(per_page=15,
+                                  cursor=cursor_pagina,
+                                  offset=0 if cursor_pagina else (page - 1) * 15,
+                                  conteo=leer_conteo(request.args.get('conteo')),
+                                  fecha_inicio=fecha_inicio,
+                                  fecha_fin=fecha_fin,
+                                  potrero_id=potrero_id)
+        recorridos = pagina.items
+        total = pagina.total or 0
         
         # Obtener lista de potreros para el filtro
-        cursor = mysql.connection.cursor()
-        cursor.execute("SELECT id, nombre FROM potreros ORDER BY nombre")
-        potreros = cursor.fetchall()
-        cursor.close()
+        potreros = catalogo_potreros.listar()
         
         # Calcular páginas para paginación
-        per_page = 15
-        pages = (total + per_page - 1) // per_page
+        pages = pagina.pages or page
         
         # Calcular recorridos de esta semana
         week_ago = (datetime.now() - timedelta(days=7)).date()
@@ -56,6 +66,7 @@ def index():
                              total=total,
                              page=page,
                              pages=pages,
+                             pagina=pagina,
                              fecha_inicio=request.args.get('fecha_inicio', ''),
                              fecha_fin=request.args.get('fecha_fin', ''),
                              potrero_id=request.args.get('potrero_id', ''),
@@ -71,6 +82,7 @@ def index():
                              total=0,
                              page=1,
                              pages=1,
+                             pagina=None,
                              fecha_inicio='',
                              fecha_fin='',
                              potrero_id='',
@@ -120,10 +132,7 @@ def nuevo():
     
     # Obtener lista de potreros
     try:
-        cursor = mysql.connection.cursor()
-        cursor.execute("SELECT id, nombre FROM potreros ORDER BY nombre")
-        potreros = cursor.fetchall()
-        cursor.close()
+        potreros = catalogo_potreros.listar()
         
         return render_template('recorridos/nuevo.html', potreros=potreros)
         
@@ -200,10 +209,7 @@ def editar(recorrido_id):
             return redirect(url_for('recorridos.index'))
         
         # Obtener lista de potreros
-        cursor = mysql.connection.cursor()
-        cursor.execute("SELECT id, nombre FROM potreros ORDER BY nombre")
-        potreros = cursor.fetchall()
-        cursor.close()
+        potreros = catalogo_potreros.listar()
         
         return render_template('recorridos/editar.html',
                              recorrido=recorrido,
@@ -256,10 +262,7 @@ def analisis():
         datos_crecimiento = Recorrido.get_growth_data_for_chart(potrero_id, weeks)
         
         # Obtener lista de potreros
-        cursor = mysql.connection.cursor()
-        cursor.execute("SELECT id, nombre FROM potreros ORDER BY nombre")
-        potreros = cursor.fetchall()
-        cursor.close()
+        potreros = catalogo_potreros.listar()
         
         return render_template('recorridos/analisis.html',
                              datos_crecimiento=datos_crecimiento,
@@ -292,15 +295,56 @@ def delete(recorrido_id):
     
     return redirect(url_for('recorridos.index'))
 
+@recorridos_bp.route('/api/lista')
+@login_required
+def api_lista():
+    """Listado de recorridos paginado por cursor (JSON): ?cursor=&per_page=&conteo=exacto|estimado|ninguno"""
+    try:
+        pagina = Recorrido.get_pagina(
+            per_page=min(max(request.args.get('per_page', 50, type=int), 1), 500),
+            cursor=request.args.get('cursor'),
+            conteo=leer_conteo(request.args.get('conteo'), 'ninguno'),
+            fecha_inicio=request.args.get('fecha_inicio'),
+            fecha_fin=request.args.get('fecha_fin'),
+            potrero_id=request.args.get('potrero_id', type=int),
+        )
+        return jsonify({'success': True, **pagina.to_dict()})
+    except CursorInvalido as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@recorridos_bp.route('/export.csv')
+@login_required
+def export_csv():
+    """Exportar a CSV (streaming) con los mismos filtros del listado; con ?en_segundo_plano=1 se encola"""
+    if request.args.get('en_segundo_plano', type=int):
+        return encolar_exportacion('recorridos', {
+            'fecha_inicio': request.args.get('fecha_inicio'),
+            'fecha_fin': request.args.get('fecha_fin'),
+            'potrero_id': request.args.get('potrero_id', type=int),
+        })
+    consulta = Recorrido.get_export_query(
+        fecha_inicio=request.args.get('fecha_inicio'),
+        fecha_fin=request.args.get('fecha_fin'),
+        potrero_id=request.args.get('potrero_id', type=int),
+    )
+    return respuesta_csv(mysql, f"recorridos_{datetime.now():%Y%m%d}.csv", consulta)
+
 @recorridos_bp.route('/api/growth-data')
 @login_required
+@cache_respuestas.respuesta_cacheada('recorridos', 'potreros')
 def api_growth_data():
     """API para obtener datos de crecimiento"""
     try:
         potrero_id = request.args.get('potrero_id')
         weeks = request.args.get('weeks', 12, type=int)
         
-        datos = Recorrido.get_growth_data_for_chart(potrero_id, weeks)
+        datos = Recorrido.get_growth_data_for_chart(
+            potrero_id, weeks,
+            max_points=series.leer_max_puntos(request.args.get('max_points'), current_app.config.get('CHART_MAX_POINTS')),
+            metodo=request.args.get('metodo', 'lttb')
+        )
         
         return jsonify({
             'success': True,
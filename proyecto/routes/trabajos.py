@@ -0,0 +1,88 @@
+from flask import Blueprint, request, jsonify, abort, send_file, url_for
+from flask_login import login_required, current_user
+import io
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from proyecto.utils.trabajos import Cola, TareaDesconocida
+from proyecto.utils import tareas  # registra las tareas
+from db import mysql
+
+trabajos_bp = Blueprint('trabajos', __name__, url_prefix='/jobs')
+
+# Recálculos que se pueden pedir por POST /jobs/recalcular
+RECALCULOS = ('resumen_potreros', 'tasas_crecimiento', 'rollups_clima')
+
+
+def _trabajo_propio(trabajo_id):
+    trabajo = Cola(mysql).obtener(trabajo_id)
+    if trabajo is None:
+        abort(404)
+    # Los recálculos se comparten (deduplicados entre usuarios); las exportaciones no
+    if trabajo['tipo'] == 'exportar_csv' and str(trabajo['usuario_id']) != str(current_user.id):
+        abort(403)
+    return trabajo
+
+
+@trabajos_bp.route('/<int:trabajo_id>')
+@login_required
+def estado(trabajo_id):
+    """Estado y progreso de un trabajo (para consultar periódicamente)"""
+    trabajo = _trabajo_propio(trabajo_id)
+    datos = {
+        'id': trabajo['id'],
+        'tipo': trabajo['tipo'],
+        'estado': trabajo['estado'],
+        'progreso': trabajo['progreso'],
+        'mensaje': trabajo['mensaje'],
+        'intentos': trabajo['intentos'],
+        'max_intentos': trabajo['max_intentos'],
+        'error': trabajo['error'],
+        'creado_en': trabajo['creado_en'],
+        'iniciado_en': trabajo['iniciado_en'],
+        'terminado_en': trabajo['terminado_en'],
+        'resultado': trabajo['resultado'],
+    }
+    if trabajo['estado'] == 'completado' and trabajo['tipo'] == 'exportar_csv':
+        datos['descarga_url'] = url_for('trabajos.descarga', trabajo_id=trabajo_id)
+    return jsonify({'success': True, 'trabajo': datos})
+
+
+@trabajos_bp.route('/<int:trabajo_id>/descarga')
+@login_required
+def descarga(trabajo_id):
+    """Archivo generado por un trabajo de exportación"""
+    trabajo = _trabajo_propio(trabajo_id)
+    if trabajo['tipo'] != 'exportar_csv' or trabajo['estado'] != 'completado':
+        abort(404)
+    archivo = tareas.archivo_exportacion(trabajo_id)
+    if archivo is None:
+        abort(404)
+    nombre, contenido = archivo
+    return send_file(io.BytesIO(contenido), mimetype='text/csv', as_attachment=True, download_name=nombre)
+
+
+@trabajos_bp.route('/recalcular', methods=['POST'])
+@login_required
+def recalcular():
+    """Encolar un recálculo: {"tipo": "tasas_crecimiento", "potrero_id": 3, "desde": "2024-01-01"}"""
+    datos = request.get_json(silent=True) or request.form.to_dict()
+    tipo = datos.get('tipo')
+    if tipo not in RECALCULOS:
+        return jsonify({'success': False, 'error': f"Tipo de recálculo no válido: {tipo}"}), 400
+
+    parametros = {}
+    if datos.get('potrero_id'):
+        parametros['potrero_id'] = int(datos['potrero_id'])
+    if tipo == 'tasas_crecimiento' and datos.get('desde'):
+        parametros['desde'] = datos['desde']
+    try:
+        trabajo_id = Cola(mysql).encolar(tipo, parametros, usuario_id=int(current_user.id))
+    except TareaDesconocida as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    return jsonify({
+        'success': True,
+        'trabajo_id': trabajo_id,
+        'estado_url': url_for('trabajos.estado', trabajo_id=trabajo_id),
+    }), 202
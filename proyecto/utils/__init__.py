@@ -0,0 +1 @@
+# Utilidades de infraestructura del sistema de pastoreo
@@ -0,0 +1,127 @@
+"""
+Tiempo de arranque de los workers.
+
+- ``perezoso('modulo')``: referencia a un módulo pesado (NumPy y los motores de
+  análisis) que se importa recién al usar uno de sus atributos. Los workers de
+  gunicorn se reciclan cada ``max_requests`` y la mayoría de los requests nunca
+  usa esos módulos. Con ``LAZY_IMPORTS=false`` se importa en el momento (lo que
+  conviene con ``preload_app``: el maestro carga todo una vez y los workers lo
+  heredan al hacer fork).
+- ``precargar()``: importar ya todos los módulos registrados como perezosos.
+- ``perfil_importacion()``: costo de importación por módulo con ``-X importtime``
+  en un proceso aparte (comando ``flask perfil-arranque``).
+
+Los blueprints se siguen registrando al crear la app: Flask no admite registrar
+rutas después del primer request. Lo perezoso son sus dependencias pesadas.
+"""
+
+import importlib
+import os
+import re
+import subprocess
+import sys
+import threading
+
+# Módulos declarados con perezoso() (para precargar() y el informe)
+MODULOS_PEREZOSOS = set()
+
+_LINEA_IMPORTTIME = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$')
+
+
+def importacion_perezosa_activa():
+    return os.environ.get('LAZY_IMPORTS', 'true').lower() == 'true'
+
+
+class _ModuloPerezoso:
+    """Importa ``nombre`` en el primer acceso a un atributo (una sola vez entre hilos)"""
+
+    def __init__(self, nombre):
+        self._nombre = nombre
+        self._modulo = None
+        self._lock = threading.Lock()
+
+    def _cargar(self):
+        if self._modulo is None:
+            with self._lock:
+                if self._modulo is None:
+                    self._modulo = importlib.import_module(self._nombre)
+        return self._modulo
+
+    def __getattr__(self, atributo):
+        return getattr(self._cargar(), atributo)
+
+    def __repr__(self):
+        estado = 'cargado' if self._modulo is not None else 'sin cargar'
+        return f"<módulo perezoso {self._nombre} ({estado})>"
+
+
+def perezoso(nombre):
+    """Módulo ``nombre``: perezoso si LAZY_IMPORTS está activo o ya importado si no"""
+    MODULOS_PEREZOSOS.add(nombre)
+    if nombre in sys.modules or not importacion_perezosa_activa():
+        return importlib.import_module(nombre)
+    return _ModuloPerezoso(nombre)
+
+
+def precargar():
+    """Importar todos los módulos perezosos (antes del fork con preload_app)"""
+    for nombre in sorted(MODULOS_PEREZOSOS):
+        importlib.import_module(nombre)
+    return sorted(MODULOS_PEREZOSOS)
+
+
+def cargados():
+    """{módulo perezoso: ya importado}"""
+    return {nombre: nombre in sys.modules for nombre in sorted(MODULOS_PEREZOSOS)}
+
+
+def leer_importtime(texto):
+    """
+    Líneas de ``-X importtime`` como dicts con modulo, propio_ms, acumulado_ms y
+    nivel (0 = el módulo medido, 1 = lo que importa directamente).
+    """
+    modulos = []
+    for linea in texto.splitlines():
+        coincidencia = _LINEA_IMPORTTIME.match(linea)
+        if coincidencia:
+            propio, acumulado, sangria, modulo = coincidencia.groups()
+            modulos.append({
+                'modulo': modulo,
+                'propio_ms': int(propio) / 1000,
+                'acumulado_ms': int(acumulado) / 1000,
+                'nivel': (len(sangria) - 1) // 2,
+            })
+    return modulos
+
+
+def por_paquete(modulos):
+    """Tiempo propio sumado por paquete de primer nivel, de mayor a menor"""
+    totales = {}
+    for m in modulos:
+        paquete = m['modulo'].split('.')[0]
+        totales[paquete] = totales.get(paquete, 0.0) + m['propio_ms']
+    return sorted(totales.items(), key=lambda t: -t[1])
+
+
+def perfil_importacion(objetivo='app', entorno=None, directorio=None):
+    """
+    Importar ``objetivo`` en un intérprete nuevo con ``-X importtime``.
+    Devuelve (tiempo total en ms, lista de leer_importtime).
+    """
+    codigo = (
+        "import time; inicio = time.perf_counter(); "
+        f"import {objetivo}; "
+        "print('TOTAL_MS', (time.perf_counter() - inicio) * 1000)"
+    )
+    resultado = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', codigo],
+        cwd=directorio, env={**os.environ, **(entorno or {})},
+        capture_output=True, text=True,
+    )
+    total = None
+    for linea in resultado.stdout.splitlines():
+        if linea.startswith('TOTAL_MS'):
+            total = float(linea.split()[1])
+    if total is None:
+        raise RuntimeError(f"No se pudo importar {objetivo}:\n{resultado.stderr[-2000:]}")
+    return total, leer_importtime(resultado.stderr)
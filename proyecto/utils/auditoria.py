@@ -0,0 +1,300 @@
+"""
+Auditoría de escrituras en la tabla ``audit_log``.
+
+Los modelos llaman ``auditoria.registrar(tabla, id, accion, cambios)`` después
+del commit. El evento (con usuario, IP, user agent y hora tomados del request)
+entra en un buffer circular en memoria y un hilo del proceso lo escribe en
+lotes: un INSERT de varias filas cada ``AUDITORIA_INTERVALO_MS`` o en cuanto se
+juntan ``AUDITORIA_LOTE`` eventos. El request nunca espera a la base de datos.
+
+- Con el buffer lleno (base caída o lenta) se descartan los eventos más viejos
+  y se cuentan en ``descartados``; un lote que no se pudo escribir vuelve al
+  buffer y se reintenta en el ciclo siguiente.
+- El hilo se crea con el primer evento de cada proceso (los workers de gunicorn
+  nacen por fork y no heredan hilos); al terminar el proceso se escribe lo
+  pendiente.
+- audit_log está particionada por mes de ``created_at`` (ver
+  database_migration_v3.sql). ``mantener_particiones`` crea las de los próximos
+  meses y elimina las que superan la retención; la ejecutan
+  ``flask auditoria-retencion`` y la tarea ``auditoria_retencion``.
+"""
+
+import atexit
+import json
+import logging
+import os
+import re
+import threading
+from collections import deque
+from datetime import date, datetime
+
+from flask import has_request_context, request
+
+logger = logging.getLogger(__name__)
+
+ACCIONES = ('CREATE', 'UPDATE', 'DELETE', 'LOGIN', 'LOGOUT')
+
+_SQL_INSERTAR = """INSERT INTO audit_log
+    (table_name, record_id, action, user_id, changes, ip_address, user_agent, created_at)
+    VALUES {filas}"""
+_MARCADORES_FILA = '(%s, %s, %s, %s, %s, %s, %s, %s)'
+
+# Particiones mensuales: p202610 guarda las filas de octubre de 2026 (y, si es la
+# primera, todo lo anterior); p_futuro recibe lo que aún no tiene partición.
+_PARTICION_MES = re.compile(r'^p(\d{4})(\d{2})$')
+PARTICION_FUTURO = 'p_futuro'
+FILAS_POR_BORRADO = 5000
+
+
+def _usuario_y_origen():
+    """(user_id, ip, user agent) del request actual, o Nones fuera de un request"""
+    if not has_request_context():
+        return None, None, None
+    usuario_id = None
+    try:
+        from flask_login import current_user
+        if current_user.is_authenticated:
+            usuario_id = int(current_user.get_id())
+    except Exception:
+        pass
+    agente = request.headers.get('User-Agent')
+    return usuario_id, request.remote_addr, agente[:500] if agente else None
+
+
+class Auditoria:
+    """Buffer circular de eventos de auditoría con escritura en lotes desde un hilo"""
+
+    def __init__(self, app=None, mysql=None):
+        self.mysql = None
+        self.activa = False
+        self.intervalo = 0.5
+        self.lote = 200
+        self._buffer = deque(maxlen=10000)
+        self._cond = threading.Condition()
+        self._hilo = None
+        self._pid = None
+        self._detener = False
+        self._atexit = False
+
+        # Estadísticas del proceso
+        self.registrados = 0
+        self.escritos = 0
+        self.descartados = 0
+        self.errores = 0
+        if app is not None:
+            self.init_app(app, mysql)
+
+    def init_app(self, app, mysql):
+        app.config.setdefault('AUDITORIA_ENABLED', True)
+        app.config.setdefault('AUDITORIA_INTERVALO_MS', 500)
+        app.config.setdefault('AUDITORIA_LOTE', 200)
+        app.config.setdefault('AUDITORIA_CAPACIDAD', 10000)
+        app.config.setdefault('AUDITORIA_RETENCION_MESES', 12)
+        self.mysql = mysql
+        self.activa = bool(app.config['AUDITORIA_ENABLED'])
+        self.intervalo = int(app.config['AUDITORIA_INTERVALO_MS']) / 1000
+        self.lote = max(1, int(app.config['AUDITORIA_LOTE']))
+        with self._cond:
+            self._buffer = deque(self._buffer, maxlen=max(self.lote, int(app.config['AUDITORIA_CAPACIDAD'])))
+        if not self._atexit:
+            atexit.register(self.detener)
+            self._atexit = True
+
+    def registrar(self, tabla, registro_id, accion, cambios=None):
+        """Encolar un evento; no accede a la base de datos"""
+        if not self.activa:
+            return
+        usuario_id, ip, agente = _usuario_y_origen()
+        evento = (
+            tabla, int(registro_id or 0), accion, usuario_id,
+            json.dumps(cambios, default=str, ensure_ascii=False) if cambios is not None else None,
+            ip, agente, datetime.now(),
+        )
+        self._asegurar_hilo()
+        with self._cond:
+            if len(self._buffer) == self._buffer.maxlen:
+                self.descartados += 1
+            self._buffer.append(evento)
+            self.registrados += 1
+            if len(self._buffer) >= self.lote:
+                self._cond.notify()
+
+    def _asegurar_hilo(self):
+        """Iniciar el hilo escritor de este proceso (uno nuevo después de un fork)"""
+        pid = os.getpid()
+        if self._pid == pid:
+            return
+        with self._cond:
+            if self._pid == pid:
+                return
+            if self._pid is not None:
+                # Eventos copiados del proceso padre: los escribe el padre
+                self._buffer.clear()
+            self._detener = False
+            self._hilo = threading.Thread(target=self._bucle, name='auditoria', daemon=True)
+            self._hilo.start()
+            self._pid = pid
+
+    def _bucle(self):
+        while True:
+            with self._cond:
+                if not self._detener and len(self._buffer) < self.lote:
+                    self._cond.wait(self.intervalo)
+                detener = self._detener
+            self.vaciar()
+            if detener:
+                return
+
+    def vaciar(self):
+        """Escribir ya lo pendiente, en INSERTs de hasta ``lote`` filas; devuelve los eventos escritos"""
+        escritos = 0
+        while True:
+            with self._cond:
+                eventos = [self._buffer.popleft() for _ in range(min(len(self._buffer), self.lote))]
+            if not eventos:
+                return escritos
+            try:
+                self._escribir(eventos)
+            except Exception as e:
+                self.errores += 1
+                logger.warning(f"No se pudieron escribir {len(eventos)} eventos de auditoría: {e}")
+                self._devolver(eventos)
+                return escritos
+            escritos += len(eventos)
+            self.escritos += len(eventos)
+
+    def _devolver(self, eventos):
+        """Reponer un lote fallido al frente del buffer (sin pisar eventos más nuevos)"""
+        with self._cond:
+            espacio = self._buffer.maxlen - len(self._buffer)
+            devueltos = eventos[max(0, len(eventos) - espacio):] if espacio > 0 else []
+            self._buffer.extendleft(reversed(devueltos))
+            self.descartados += len(eventos) - len(devueltos)
+
+    def _escribir(self, eventos):
+        conexion = self.mysql.pool.acquire()
+        descartar = False
+        try:
+            cursor = conexion.cursor()
+            try:
+                cursor.execute(
+                    _SQL_INSERTAR.format(filas=', '.join([_MARCADORES_FILA] * len(eventos))),
+                    tuple(valor for evento in eventos for valor in evento),
+                )
+                conexion.commit()
+            finally:
+                cursor.close()
+        except Exception:
+            descartar = True
+            raise
+        finally:
+            self.mysql.pool.release(conexion, discard=descartar)
+
+    def detener(self, timeout=5):
+        """Detener el hilo de este proceso escribiendo antes lo pendiente"""
+        if self._pid != os.getpid():
+            return
+        with self._cond:
+            self._detener = True
+            self._cond.notify()
+        if self._hilo is not None and self._hilo.is_alive():
+            self._hilo.join(timeout)
+        self.vaciar()
+        self._pid = None
+
+    def stats(self):
+        return {
+            'pendientes': len(self._buffer),
+            'registrados': self.registrados,
+            'escritos': self.escritos,
+            'descartados': self.descartados,
+            'errores': self.errores,
+        }
+
+
+def _sumar_meses(mes, meses):
+    indice = mes.year * 12 + mes.month - 1 + meses
+    return date(indice // 12, indice % 12 + 1, 1)
+
+
+def planificar_particiones(existentes, hoy, retencion_meses, meses_adelante=2):
+    """
+    Meses a crear y particiones a eliminar.
+    ``existentes`` son los nombres de las particiones de audit_log en orden. Se
+    crean particiones hasta ``meses_adelante`` meses después del actual
+    (siempre después de la última, como exige RANGE) y se eliminan las de meses
+    anteriores a los últimos ``retencion_meses`` completos.
+    """
+    actual = date(hoy.year, hoy.month, 1)
+    meses = {}
+    for nombre in existentes:
+        coincidencia = _PARTICION_MES.match(nombre or '')
+        if coincidencia:
+            meses[nombre] = date(int(coincidencia.group(1)), int(coincidencia.group(2)), 1)
+
+    desde = _sumar_meses(max(meses.values()), 1) if meses else actual
+    hasta = _sumar_meses(actual, meses_adelante)
+    crear = []
+    while desde <= hasta:
+        crear.append(desde)
+        desde = _sumar_meses(desde, 1)
+
+    corte = _sumar_meses(actual, -retencion_meses)
+    eliminar = [nombre for nombre, mes in meses.items() if mes < corte]
+    return crear, eliminar, corte
+
+
+def mantener_particiones(conexion, retencion_meses, meses_adelante=2, hoy=None):
+    """
+    Aplicar la retención de audit_log. Con particiones: REORGANIZE de p_futuro
+    para los meses nuevos y DROP PARTITION de los vencidos (instantáneo). Sin
+    particiones: DELETE por lotes de las filas anteriores al corte.
+    """
+    hoy = hoy or date.today()
+    cursor = conexion.cursor()
+    try:
+        cursor.execute("""
+            SELECT PARTITION_NAME as nombre FROM information_schema.PARTITIONS
+            WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'audit_log'
+            ORDER BY PARTITION_ORDINAL_POSITION
+        """)
+        existentes = [fila['nombre'] for fila in cursor.fetchall()]
+        crear, eliminar, corte = planificar_particiones(existentes, hoy, retencion_meses, meses_adelante)
+
+        if PARTICION_FUTURO not in existentes:
+            filas = 0
+            while True:
+                cursor.execute(
+                    "DELETE FROM audit_log WHERE created_at < %s ORDER BY created_at LIMIT %s",
+                    (corte, FILAS_POR_BORRADO),
+                )
+                borradas = cursor.rowcount
+                conexion.commit()
+                filas += borradas
+                if borradas < FILAS_POR_BORRADO:
+                    break
+            return {'particionada': False, 'corte': corte.isoformat(), 'filas_borradas': filas}
+
+        if crear:
+            nuevas = ', '.join(
+                f"PARTITION p{mes:%Y%m} VALUES LESS THAN (TO_DAYS('{_sumar_meses(mes, 1).isoformat()}'))"
+                for mes in crear
+            )
+            cursor.execute(
+                f"ALTER TABLE audit_log REORGANIZE PARTITION {PARTICION_FUTURO} INTO "
+                f"({nuevas}, PARTITION {PARTICION_FUTURO} VALUES LESS THAN MAXVALUE)"
+            )
+        if eliminar:
+            cursor.execute(f"ALTER TABLE audit_log DROP PARTITION {', '.join(eliminar)}")
+        return {
+            'particionada': True,
+            'corte': corte.isoformat(),
+            'creadas': [f"p{mes:%Y%m}" for mes in crear],
+            'eliminadas': eliminar,
+        }
+    finally:
+        cursor.close()
+
+
+# Instancia compartida por modelos y rutas
+auditoria = Auditoria()
@@ -0,0 +1,232 @@
+"""
+Balance forrajero: materia seca disponible frente al consumo de los lotes.
+
+Los lotes, potreros y aforos recientes se cargan una vez en arreglos NumPy y el
+balance de todos los lotes se calcula con unas pocas operaciones vectorizadas
+(sin recorrer lotes ni buscar en diccionarios).
+
+- Consumo por animal: ``consumo_animal_diario`` de configuracion_sistema (kg MS
+  por animal y día, el mismo valor que usa vista_balance_forrajero). Si no está
+  configurado se usa el 2.5% del peso vivo.
+- Forraje disponible: promedio de materia seca de los aforos de los últimos
+  ``dias_aforo`` días por las hectáreas del potrero.
+- Los lotes que comparten potrero comparten su forraje: los días disponibles se
+  calculan con el consumo sumado de todos ellos.
+"""
+
+import time
+
+import numpy as np
+
+from proyecto.models.models import ConfiguracionSistema
+
+CONSUMO_PESO_VIVO = 0.025  # fracción del peso vivo si no hay consumo configurado
+KG_UGM = 450  # peso vivo de una unidad gran mamífero
+DIAS_AFORO = 30
+DIAS_CRITICO = 7
+DIAS_ATENCION = 15
+ESTADOS = np.array(['Crítico', 'Atención', 'Bueno'])
+
+
+def _columna(filas, clave, dtype=np.float64, vacio=np.nan):
+    """Columna de una lista de dicts como arreglo (None -> ``vacio``)"""
+    return np.fromiter(
+        (vacio if f[clave] is None else f[clave] for f in filas),
+        dtype=dtype, count=len(filas)
+    )
+
+
+def posiciones(claves, buscadas):
+    """
+    Posición de cada valor de ``buscadas`` dentro de ``claves`` (ids únicos) y
+    una máscara de los encontrados. Los no encontrados quedan en la posición 0.
+    """
+    if not len(claves):
+        return np.zeros(len(buscadas), dtype=np.int64), np.zeros(len(buscadas), dtype=bool)
+    orden = np.argsort(claves, kind='stable')
+    ordenadas = claves[orden]
+    pos = np.clip(np.searchsorted(ordenadas, buscadas), 0, len(claves) - 1)
+    encontradas = ordenadas[pos] == buscadas
+    return np.where(encontradas, orden[pos], 0), encontradas
+
+
+class BalanceForrajero:
+    """Balance de todos los lotes asignados a un potrero, calculado sobre arreglos"""
+
+    def __init__(self, lotes, potreros, aforos, consumo_animal=None, horizonte=DIAS_ATENCION):
+        """
+        ``lotes``: dicts con id, nombre, numero_animales, peso_promedio, potrero_actual_id
+        ``potreros``: dicts con id, nombre, hectareas
+        ``aforos``: dicts con potrero_id, ms_promedio, ultima_medicion (uno por potrero)
+        ``horizonte``: días de consumo que se descuentan para el balance en kg MS
+        """
+        inicio = time.perf_counter()
+        self.consumo_animal = consumo_animal
+        self.horizonte = horizonte
+
+        self.lote_ids = _columna(lotes, 'id', np.int64, -1)
+        self.lote_nombres = [l['nombre'] for l in lotes]
+        self.animales = np.nan_to_num(_columna(lotes, 'numero_animales'))
+        self.peso_promedio = np.nan_to_num(_columna(lotes, 'peso_promedio'))
+        lote_potrero = _columna(lotes, 'potrero_actual_id', np.int64, -1)
+
+        self.potrero_ids = _columna(potreros, 'id', np.int64, -1)
+        self.potrero_nombres = [p['nombre'] for p in potreros]
+        self.hectareas = np.nan_to_num(_columna(potreros, 'hectareas'))
+
+        # Materia seca promedio y fecha del último aforo, alineadas con potreros
+        self.ms_promedio = np.full(len(potreros), np.nan)
+        self.ultima_medicion = [None] * len(potreros)
+        if aforos:
+            pos, ok = posiciones(self.potrero_ids, _columna(aforos, 'potrero_id', np.int64, -1))
+            self.ms_promedio[pos[ok]] = _columna(aforos, 'ms_promedio')[ok]
+            for i in np.flatnonzero(ok):
+                self.ultima_medicion[pos[i]] = aforos[i]['ultima_medicion']
+
+        self.potrero_de_lote, self.con_potrero = posiciones(self.potrero_ids, lote_potrero)
+        self._calcular()
+        self.segundos = time.perf_counter() - inicio
+
+    def _calcular(self):
+        n_potreros = len(self.potrero_ids)
+        self.peso_total = self.animales * self.peso_promedio
+        if self.consumo_animal:
+            self.consumo = self.animales * self.consumo_animal
+        else:
+            self.consumo = self.peso_total * CONSUMO_PESO_VIVO
+
+        # Por potrero: forraje disponible y consumo de todos sus lotes
+        idx = self.potrero_de_lote[self.con_potrero]
+        self.demanda_potrero = np.bincount(idx, weights=self.consumo[self.con_potrero], minlength=n_potreros)
+        self.animales_potrero = np.bincount(idx, weights=self.animales[self.con_potrero], minlength=n_potreros)
+        self.peso_potrero = np.bincount(idx, weights=self.peso_total[self.con_potrero], minlength=n_potreros)
+        self.ms_disponible_potrero = self.ms_promedio * self.hectareas
+        con_demanda = self.demanda_potrero > 0
+        self.dias_potrero = np.divide(
+            self.ms_disponible_potrero, self.demanda_potrero,
+            out=np.zeros(n_potreros), where=con_demanda & ~np.isnan(self.ms_disponible_potrero)
+        )
+        self.balance_potrero = self.ms_disponible_potrero - self.demanda_potrero * self.horizonte
+        self.ocupados = self.animales_potrero > 0
+        self.con_datos_potrero = ~np.isnan(self.ms_promedio) & (self.hectareas > 0)
+
+        # Por lote: los valores de su potrero
+        self.validos = self.con_potrero & self.con_datos_potrero[self.potrero_de_lote]
+        self.dias = self.dias_potrero[self.potrero_de_lote]
+        self.estado = ESTADOS[np.digitize(self.dias, [DIAS_CRITICO, DIAS_ATENCION])]
+
+    @classmethod
+    def cargar(cls, cursor, finca_id=None, dias_aforo=DIAS_AFORO, horizonte=DIAS_ATENCION):
+        """
+        Leer lotes, potreros, aforos recientes y el consumo configurado (tres consultas).
+        ``finca_id`` filtra los lotes; la tabla potreros no tiene finca, así que
+        se leen todos (los lotes de la finca pueden ocupar o rotar a cualquiera).
+        """
+        filtro_lotes, params = '', ()
+        if finca_id:
+            filtro_lotes, params = ' AND finca_id = %s', (finca_id,)
+
+        cursor.execute(f"""
+            SELECT id, nombre, numero_animales, peso_promedio, potrero_actual_id
+            FROM lotes_ganado_v2
+            WHERE potrero_actual_id IS NOT NULL{filtro_lotes}
+        """, params)
+        lotes = cursor.fetchall()
+
+        cursor.execute("SELECT id, nombre, hectareas FROM potreros")
+        potreros = cursor.fetchall()
+
+        cursor.execute("""
+            SELECT potrero_id,
+                   AVG(materia_seca) as ms_promedio,
+                   MAX(fecha) as ultima_medicion
+            FROM aforos
+            WHERE fecha >= DATE_SUB(CURDATE(), INTERVAL %s DAY)
+            GROUP BY potrero_id
+        """, (dias_aforo,))
+        aforos = cursor.fetchall()
+
+        consumo = ConfiguracionSistema.get_numero('consumo_animal_diario', cursor=cursor)
+        return cls(lotes, potreros, aforos, consumo_animal=consumo, horizonte=horizonte)
+
+    def filas(self):
+        """Un dict por lote con datos, de menos a más días disponibles"""
+        elegidos = np.flatnonzero(self.validos)
+        elegidos = elegidos[np.argsort(self.dias[elegidos], kind='stable')]
+        p = self.potrero_de_lote[elegidos]
+
+        # tolist() una vez por columna: evita escalares NumPy en plantillas y JSON
+        columnas = {
+            'lote_id': self.lote_ids[elegidos].tolist(),
+            'potrero_id': self.potrero_ids[p].tolist(),
+            'numero_animales': self.animales[elegidos].astype(np.int64).tolist(),
+            'peso_total': self.peso_total[elegidos].round(1).tolist(),
+            'consumo_diario': self.consumo[elegidos].round(2).tolist(),
+            'hectareas': self.hectareas[p].tolist(),
+            'cantidad_animales': self.animales_potrero[p].astype(np.int64).tolist(),
+            'demanda_ms_diaria': self.demanda_potrero[p].round(2).tolist(),
+            'ms_disponible': self.ms_disponible_potrero[p].round(1).tolist(),
+            'dias_disponibles': self.dias[elegidos].round(1).tolist(),
+            'balance_forraje': self.balance_potrero[p].round(1).tolist(),
+            'estado': self.estado[elegidos].tolist(),
+        }
+        columnas['lote_nombre'] = [self.lote_nombres[i] for i in elegidos.tolist()]
+        columnas['potrero_nombre'] = [self.potrero_nombres[i] for i in p.tolist()]
+        columnas['ultima_medicion'] = [self.ultima_medicion[i] for i in p.tolist()]
+        # Nombres que usa la plantilla del balance por potrero
+        columnas['forraje_total_disponible'] = columnas['ms_disponible']
+        columnas['dias_disponibilidad'] = columnas['dias_disponibles']
+
+        claves = list(columnas)
+        return [dict(zip(claves, valores)) for valores in zip(*columnas.values())]
+
+    def kpis(self):
+        """Indicadores del sistema sobre los potreros ocupados con aforo reciente"""
+        evaluados = self.ocupados & self.con_datos_potrero
+        hectareas = float(self.hectareas[self.ocupados].sum())
+        consumo = float(self.demanda_potrero[evaluados].sum())
+        forraje = float(self.ms_disponible_potrero[evaluados].sum())
+        total = len(self.potrero_ids)
+        ocupados = int(self.ocupados.sum())
+        return {
+            'carga_animal_ugm_ha': float(self.peso_potrero[self.ocupados].sum()) / KG_UGM / hectareas if hectareas else 0.0,
+            'consumo_total_diario': consumo,
+            'forraje_total_disponible': forraje,
+            'dias_disponibilidad_promedio': forraje / consumo if consumo else 0.0,
+            'total_potreros': total,
+            'potreros_ocupados': ocupados,
+            'porcentaje_ocupacion': ocupados * 100 / total if total else 0.0,
+            'consumo_animal_diario': self.consumo_animal,
+        }
+
+    def alertas(self):
+        alertas = []
+        for nivel, estado in (('critico', 'Crítico'), ('advertencia', 'Atención')):
+            afectados = np.flatnonzero(self.validos & (self.estado == estado))
+            if len(afectados):
+                nombres = ', '.join(self.lote_nombres[i] for i in afectados[:5].tolist())
+                resto = f' y {len(afectados) - 5} más' if len(afectados) > 5 else ''
+                limite = DIAS_CRITICO if nivel == 'critico' else DIAS_ATENCION
+                alertas.append({
+                    'nivel': nivel,
+                    'mensaje': f'{len(afectados)} lote(s) con menos de {limite} días de forraje: {nombres}{resto}',
+                })
+        sin_aforo = int((self.con_potrero & ~self.validos).sum())
+        if sin_aforo:
+            alertas.append({
+                'nivel': 'info',
+                'mensaje': f'{sin_aforo} lote(s) en potreros sin aforo reciente o sin hectáreas registradas',
+            })
+        return alertas
+
+    def to_dict(self):
+        filas = self.filas()
+        for fila in filas:
+            if hasattr(fila['ultima_medicion'], 'isoformat'):
+                fila['ultima_medicion'] = fila['ultima_medicion'].isoformat()
+        return {
+            'balances': filas,
+            'kpis': self.kpis(),
+            'alertas': self.alertas(),
+            'calculo_ms': round(self.segundos * 1000, 3),
+        }
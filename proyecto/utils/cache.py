@@ -0,0 +1,387 @@
+"""
+Cachés de la aplicación.
+
+- Contadores de los dashboards: totales (fincas, potreros, aforos, ...) con TTL en
+  memoria del proceso o, si se configura ``CACHE_REDIS_URL``, en Redis para
+  compartirlos entre workers. Los métodos create/delete de los modelos invalidan
+  los contadores de la tabla que modifican.
+- Respuestas JSON de las APIs de gráficos: la clave incluye la versión de cada
+  tabla consultada (tabla ``tabla_version``), que las escrituras incrementan en su
+  misma transacción. Se responden con ETag fuerte y Last-Modified para que el
+  navegador reciba 304 mientras los datos no cambien.
+- Identidad del usuario autenticado: el user_loader de Flask-Login la toma de la
+  sesión o de la caché del proceso (TTL corto) en lugar de consultar users JOIN
+  fincas en cada request. admin.editar_usuario y admin.cambiar_finca la
+  invalidan; en otros workers y sesiones el cambio se ve al vencer el TTL.
+"""
+
+import hashlib
+import json
+import logging
+import threading
+import time
+from datetime import date
+from functools import wraps
+
+from flask import current_app, has_request_context, make_response, request, session
+
+logger = logging.getLogger(__name__)
+
+
+class CacheLocal:
+    """Caché en memoria del proceso con expiración por clave (y tamaño máximo opcional)"""
+
+    def __init__(self, max_entradas=None):
+        self._datos = {}  # clave -> (expira_en, valor)
+        self._lock = threading.Lock()
+        self.max_entradas = max_entradas
+
+    def get_many(self, claves):
+        ahora = time.monotonic()
+        resultado = {}
+        with self._lock:
+            for clave in claves:
+                entrada = self._datos.get(clave)
+                if entrada is None:
+                    continue
+                if entrada[0] <= ahora:
+                    del self._datos[clave]
+                    continue
+                resultado[clave] = entrada[1]
+        return resultado
+
+    def set_many(self, valores, ttl):
+        ahora = time.monotonic()
+        with self._lock:
+            for clave, valor in valores.items():
+                self._datos[clave] = (ahora + ttl, valor)
+            if self.max_entradas and len(self._datos) > self.max_entradas:
+                # Descartar primero las vencidas y luego las más próximas a vencer
+                vigentes = sorted(
+                    (e for e in self._datos.items() if e[1][0] > ahora), key=lambda e: e[1][0]
+                )
+                self._datos = dict(vigentes[-self.max_entradas:])
+
+    def delete(self, *claves):
+        with self._lock:
+            for clave in claves:
+                self._datos.pop(clave, None)
+
+
+class CacheRedis:
+    """Caché en Redis compartida entre workers (requiere el paquete redis)"""
+
+    def __init__(self, url, prefijo='pastoreo:'):
+        import redis
+        self._cliente = redis.Redis.from_url(url, socket_timeout=0.5)
+        self.prefijo = prefijo
+
+    def get_many(self, claves):
+        claves = list(claves)
+        valores = self._cliente.mget([self.prefijo + c for c in claves])
+        return {c: json.loads(v) for c, v in zip(claves, valores) if v is not None}
+
+    def set_many(self, valores, ttl):
+        pipe = self._cliente.pipeline()
+        for clave, valor in valores.items():
+            pipe.setex(self.prefijo + clave, int(max(1, ttl)), json.dumps(valor))
+        pipe.execute()
+
+    def delete(self, *claves):
+        if claves:
+            self._cliente.delete(*[self.prefijo + c for c in claves])
+
+
+class Contadores:
+    """Totales de los dashboards, calculados en una sola consulta al fallar la caché"""
+
+    # nombre del contador -> subconsulta que lo calcula
+    CONSULTAS = {
+        'fincas': "SELECT COUNT(*) FROM fincas WHERE activa = TRUE",
+        'potreros': "SELECT COUNT(*) FROM potreros",
+        'aforos': "SELECT COUNT(*) FROM aforos",
+        'aforos_mes': "SELECT COUNT(*) FROM aforos WHERE fecha >= DATE_SUB(CURDATE(), INTERVAL 30 DAY)",
+        'actividades': "SELECT COUNT(*) FROM actividades",
+        'usuarios': "SELECT COUNT(*) FROM users",
+        'roles': "SELECT COUNT(*) FROM roles",
+    }
+
+    # tabla modificada -> contadores que deja desactualizados
+    DEPENDENCIAS = {
+        'fincas': ('fincas',),
+        'potreros': ('potreros', 'aforos', 'aforos_mes', 'actividades'),  # borrado en cascada
+        'aforos': ('aforos', 'aforos_mes'),
+        'actividades': ('actividades',),
+        'users': ('usuarios',),
+        'roles': ('roles',),
+    }
+
+    def __init__(self, app=None):
+        self.ttl = 60
+        self.backend = CacheLocal()
+        self.hits = 0
+        self.misses = 0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('CACHE_CONTADORES_TTL', 60)
+        app.config.setdefault('CACHE_REDIS_URL', None)
+        self.ttl = float(app.config['CACHE_CONTADORES_TTL'])
+        self.backend = CacheLocal()
+
+        url = app.config['CACHE_REDIS_URL']
+        if url:
+            try:
+                self.backend = CacheRedis(url, prefijo='pastoreo:contadores:')
+            except ImportError:
+                logger.warning("CACHE_REDIS_URL configurado pero redis no está instalado; se usa caché local")
+
+    def obtener(self, *nombres):
+        """Devolver {nombre: total}; sólo consulta la base de datos por los que no están en caché"""
+        try:
+            valores = self.backend.get_many(nombres)
+        except Exception as e:
+            logger.warning(f"Error leyendo contadores de la caché: {e}")
+            valores = {}
+
+        faltantes = [n for n in nombres if n not in valores]
+        self.hits += len(nombres) - len(faltantes)
+        self.misses += len(faltantes)
+
+        if faltantes:
+            calculados = self._calcular(faltantes)
+            try:
+                self.backend.set_many(calculados, self.ttl)
+            except Exception as e:
+                logger.warning(f"Error guardando contadores en la caché: {e}")
+            valores.update(calculados)
+
+        return {n: valores[n] for n in nombres}
+
+    def invalidar(self, *tablas):
+        """Descartar los contadores que dependen de las tablas modificadas"""
+        claves = set()
+        for tabla in tablas:
+            claves.update(self.DEPENDENCIAS.get(tabla, ()))
+        try:
+            self.backend.delete(*claves)
+        except Exception as e:
+            logger.warning(f"Error invalidando contadores: {e}")
+
+    def _calcular(self, nombres):
+        from db import mysql
+
+        columnas = ", ".join(f"({self.CONSULTAS[n]}) AS {n}" for n in nombres)
+        cursor = mysql.connection.cursor()
+        cursor.execute(f"SELECT {columnas}")
+        fila = cursor.fetchone()
+        cursor.close()
+        return {n: int(fila[n] or 0) for n in nombres}
+
+
+def incrementar_version(cursor, *tablas):
+    """
+    Marcar tablas como modificadas dentro de la transacción del llamador.
+    Invalida las respuestas cacheadas que dependen de ellas en todos los workers.
+    """
+    for tabla in tablas:
+        try:
+            cursor.execute(
+                """INSERT INTO tabla_version (tabla, version) VALUES (%s, 1)
+                   ON DUPLICATE KEY UPDATE version = version + 1""",
+                (tabla,)
+            )
+        except Exception as e:
+            # Sin la tabla de versiones (migración pendiente) la escritura sigue su curso
+            logger.warning(f"No se pudo incrementar la versión de {tabla}: {e}")
+
+
+class CacheRespuestas:
+    """Caché de respuestas JSON por endpoint, argumentos y versión de las tablas consultadas"""
+
+    MAX_ENTRADAS_LOCAL = 1000
+
+    def __init__(self, app=None):
+        self.ttl = 300
+        self.backend = CacheLocal(self.MAX_ENTRADAS_LOCAL)
+        self.hits = 0
+        self.misses = 0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('CACHE_RESPUESTAS_TTL', 300)
+        app.config.setdefault('CACHE_REDIS_URL', None)
+        self.ttl = float(app.config['CACHE_RESPUESTAS_TTL'])
+        self.backend = CacheLocal(self.MAX_ENTRADAS_LOCAL)
+
+        url = app.config['CACHE_REDIS_URL']
+        if url:
+            try:
+                self.backend = CacheRedis(url, prefijo='pastoreo:respuestas:')
+            except ImportError:
+                logger.warning("CACHE_REDIS_URL configurado pero redis no está instalado; se usa caché local")
+
+    @staticmethod
+    def versiones(tablas):
+        """{tabla: (version, updated_at)} en una consulta por clave primaria"""
+        from db import mysql
+
+        marcadores = ", ".join(["%s"] * len(tablas))
+        cursor = mysql.connection.cursor()
+        cursor.execute(
+            f"SELECT tabla, version, updated_at FROM tabla_version WHERE tabla IN ({marcadores})",
+            tuple(tablas)
+        )
+        filas = {f['tabla']: (f['version'], f['updated_at']) for f in cursor.fetchall()}
+        cursor.close()
+        return {t: filas.get(t, (0, None)) for t in tablas}
+
+    def respuesta_cacheada(self, *tablas):
+        """
+        Decorador para vistas JSON de sólo lectura que dependen de ``tablas``.
+        Colocarlo debajo de @login_required para que la autenticación se verifique primero.
+        """
+        def decorador(vista):
+            @wraps(vista)
+            def envoltura(*args, **kwargs):
+                try:
+                    versiones = self.versiones(tablas)
+                except Exception as e:
+                    logger.warning(f"Sin versiones de tablas, respuesta sin caché: {e}")
+                    return vista(*args, **kwargs)
+
+                # La fecha entra en la clave porque los gráficos usan rangos relativos a hoy
+                firma = json.dumps([
+                    request.endpoint, sorted(request.args.items(multi=True)), kwargs,
+                    [versiones[t][0] for t in tablas], date.today().isoformat()
+                ], default=str)
+                clave = hashlib.sha1(firma.encode()).hexdigest()
+
+                try:
+                    entrada = self.backend.get_many([clave]).get(clave)
+                except Exception as e:
+                    logger.warning(f"Error leyendo la caché de respuestas: {e}")
+                    entrada = None
+
+                if entrada is not None:
+                    self.hits += 1
+                else:
+                    self.misses += 1
+                    respuesta = make_response(vista(*args, **kwargs))
+                    if respuesta.status_code != 200 or not respuesta.is_json:
+                        return respuesta
+                    cuerpo = respuesta.get_data(as_text=True)
+                    entrada = {'cuerpo': cuerpo, 'etag': hashlib.sha1(cuerpo.encode()).hexdigest()}
+                    try:
+                        self.backend.set_many({clave: entrada}, self.ttl)
+                    except Exception as e:
+                        logger.warning(f"Error guardando en la caché de respuestas: {e}")
+
+                respuesta = current_app.response_class(entrada['cuerpo'], mimetype='application/json')
+                respuesta.set_etag(entrada['etag'])
+                modificadas = [v[1] for v in versiones.values() if v[1] is not None]
+                if modificadas:
+                    respuesta.last_modified = max(modificadas)
+                # El navegador guarda la respuesta pero revalida siempre (304 si no cambió)
+                respuesta.cache_control.private = True
+                respuesta.cache_control.no_cache = True
+                return respuesta.make_conditional(request)
+            return envoltura
+        return decorador
+
+
+class CacheUsuarios:
+    """Identidad de los usuarios (tupla sin contraseña) para el user_loader"""
+
+    CLAVE_SESION = '_identidad'
+    MAX_ENTRADAS_LOCAL = 10000
+
+    def __init__(self, app=None):
+        self.ttl = 60
+        self.usar_sesion = True
+        self.backend = CacheLocal(self.MAX_ENTRADAS_LOCAL)
+        self.hits = 0
+        self.misses = 0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('USUARIOS_CACHE_TTL', 60)
+        app.config.setdefault('USUARIOS_CACHE_SESION', True)
+        app.config.setdefault('CACHE_REDIS_URL', None)
+        self.ttl = float(app.config['USUARIOS_CACHE_TTL'])
+        self.usar_sesion = bool(app.config['USUARIOS_CACHE_SESION'])
+        self.backend = CacheLocal(self.MAX_ENTRADAS_LOCAL)
+
+        url = app.config['CACHE_REDIS_URL']
+        if url:
+            try:
+                self.backend = CacheRedis(url, prefijo='pastoreo:usuarios:')
+            except ImportError:
+                logger.warning("CACHE_REDIS_URL configurado pero redis no está instalado; se usa caché local")
+
+    def obtener(self, user_id, cargar):
+        """
+        Identidad de ``user_id``: de la sesión si es reciente, si no de la caché y
+        como último recurso de ``cargar(user_id)`` (None si el usuario no existe).
+        """
+        user_id = str(user_id)
+        identidad = self._de_sesion(user_id)
+        if identidad is not None:
+            self.hits += 1
+            return identidad
+
+        try:
+            identidad = self.backend.get_many([user_id]).get(user_id)
+        except Exception as e:
+            logger.warning(f"Error leyendo la caché de usuarios: {e}")
+            identidad = None
+
+        if identidad is not None:
+            self.hits += 1
+            identidad = tuple(identidad)
+        else:
+            self.misses += 1
+            identidad = cargar(user_id)
+            if identidad is None:
+                return None
+            identidad = tuple(identidad)
+            try:
+                self.backend.set_many({user_id: identidad}, self.ttl)
+            except Exception as e:
+                logger.warning(f"Error guardando en la caché de usuarios: {e}")
+        self.guardar_en_sesion(identidad)
+        return identidad
+
+    def guardar_en_sesion(self, identidad):
+        """Copiar la identidad en la sesión (con su hora) para los próximos requests"""
+        if self.usar_sesion and has_request_context():
+            session[self.CLAVE_SESION] = list(identidad) + [time.time()]
+
+    def _de_sesion(self, user_id):
+        if not self.usar_sesion or not has_request_context():
+            return None
+        guardada = session.get(self.CLAVE_SESION)
+        if not guardada or str(guardada[0]) != user_id or time.time() - guardada[-1] >= self.ttl:
+            return None
+        return tuple(guardada[:-1])
+
+    def invalidar(self, user_id):
+        """Descartar la identidad cacheada de un usuario (y la de la sesión actual si es la suya)"""
+        user_id = str(user_id)
+        try:
+            self.backend.delete(user_id)
+        except Exception as e:
+            logger.warning(f"Error invalidando la caché de usuarios: {e}")
+        if has_request_context():
+            guardada = session.get(self.CLAVE_SESION)
+            if guardada and str(guardada[0]) == user_id:
+                session.pop(self.CLAVE_SESION, None)
+
+
+# Instancias compartidas por modelos y rutas
+contadores = Contadores()
+cache_respuestas = CacheRespuestas()
+cache_usuarios = CacheUsuarios()
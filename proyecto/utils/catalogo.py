@@ -0,0 +1,135 @@
+"""
+Catálogo de potreros para los selectores de los formularios.
+
+Casi todas las páginas de alta, edición y listado cargan la lista de potreros
+(id, nombre y a veces hectáreas y tipo de pasto). El catálogo la guarda en la
+memoria del proceso como tuplas compactas (la tabla potreros no tiene finca:
+es una sola lista):
+
+- Dentro de un request se resuelve una sola vez (memo en ``g``).
+- Entre requests se reutiliza mientras no cambie la versión de ``potreros`` en
+  tabla_version; esa versión se consulta como mucho cada ``intervalo`` segundos
+  (una lectura por clave primaria), así los cambios hechos en otros workers se
+  ven a más tardar tras ese intervalo.
+- Potrero.create/update/delete invalidan el catálogo del proceso al instante.
+
+Las plantillas acceden a ``potrero.id``, ``potrero.nombre``, etc. igual que con
+los dicts de DictCursor; además está disponible ``catalogo_potreros()`` en el
+contexto de todas las plantillas.
+"""
+
+import logging
+import threading
+import time
+from collections import namedtuple
+
+from flask import g, has_app_context
+
+logger = logging.getLogger(__name__)
+
+PotreroItem = namedtuple('PotreroItem', 'id nombre hectareas tipo_pasto etapa_ganado')
+
+
+class PotreroCatalog:
+    """Lista de potreros cacheada en el proceso con invalidación por versión"""
+
+    def __init__(self, app=None):
+        self.intervalo = 30
+        self._datos = None  # (version, tupla de PotreroItem)
+        self._version = None  # versión de potreros vista en la última verificación
+        self._verificado_en = 0.0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('CATALOGO_POTREROS_INTERVALO', 30)
+        self.intervalo = float(app.config['CATALOGO_POTREROS_INTERVALO'])
+        self.invalidar()
+
+    def invalidar(self):
+        """Descartar el catálogo del proceso (lo llaman las escrituras de Potrero)"""
+        with self._lock:
+            self._datos = None
+            self._version = None
+            self._verificado_en = 0.0
+        if has_app_context():
+            g.pop('_catalogo_potreros', None)
+
+    def listar(self):
+        """Tupla de PotreroItem ordenada por nombre"""
+        if has_app_context() and '_catalogo_potreros' in g:
+            return g._catalogo_potreros
+
+        version = self._version_vigente()
+        with self._lock:
+            entrada = self._datos
+        if entrada is not None and version is not None and entrada[0] == version:
+            self.hits += 1
+            items = entrada[1]
+        else:
+            self.misses += 1
+            items = self._cargar()
+            if version is not None:
+                with self._lock:
+                    if self._version == version:
+                        self._datos = (version, items)
+        if has_app_context():
+            g._catalogo_potreros = items
+        return items
+
+    def opciones(self):
+        """Pares (id, nombre) para selectores simples"""
+        return tuple((p.id, p.nombre) for p in self.listar())
+
+    def nombres(self):
+        """{id: nombre}"""
+        return {p.id: p.nombre for p in self.listar()}
+
+    def _version_vigente(self):
+        """Versión de potreros, consultada como mucho cada ``intervalo`` segundos"""
+        ahora = time.monotonic()
+        with self._lock:
+            if self._version is not None and ahora - self._verificado_en < self.intervalo:
+                return self._version
+        try:
+            from proyecto.utils.cache import CacheRespuestas
+            version = CacheRespuestas.versiones(('potreros',))['potreros'][0]
+        except Exception as e:
+            # Sin tabla de versiones no hay forma segura de reutilizar: se consulta siempre
+            logger.warning(f"Sin versión de potreros, catálogo sin caché: {e}")
+            return None
+        with self._lock:
+            if version != self._version:
+                self._datos = None
+            self._version = version
+            self._verificado_en = ahora
+        return version
+
+    @staticmethod
+    def _cargar():
+        from db import mysql
+
+        cursor = mysql.connection.cursor()
+        try:
+            cursor.execute("SELECT id, nombre, hectareas, tipo_pasto, etapa_ganado FROM potreros ORDER BY nombre")
+            return tuple(
+                PotreroItem(f['id'], f['nombre'], f['hectareas'], f['tipo_pasto'], f['etapa_ganado'])
+                for f in cursor.fetchall()
+            )
+        finally:
+            cursor.close()
+
+    def stats(self):
+        return {
+            'potreros': len(self._datos[1]) if self._datos else 0,
+            'version': self._version,
+            'hits': self.hits,
+            'misses': self.misses,
+        }
+
+
+# Instancia compartida por modelos, rutas y plantillas
+catalogo_potreros = PotreroCatalog()
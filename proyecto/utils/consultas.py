@@ -0,0 +1,34 @@
+"""
+Constructores de SQL compartidos por los modelos.
+
+``ultimo_por_grupo`` reemplaza el patrón
+``WHERE (potrero_id, fecha) IN (SELECT potrero_id, MAX(fecha) ... GROUP BY potrero_id)``,
+que MySQL suele ejecutar como subconsulta dependiente, por una función de ventana
+``ROW_NUMBER() OVER (PARTITION BY ...)`` (el mismo enfoque que la vista
+vista_potreros_resumen). Con un índice (potrero_id, fecha) el recorrido es un
+único escaneo ordenado del índice.
+"""
+
+
+def ultimo_por_grupo(tabla, columnas='*', grupo='potrero_id', orden='fecha DESC, id DESC', condiciones=''):
+    """
+    Tabla derivada con la última fila de ``tabla`` por cada valor de ``grupo``.
+
+    columnas: columnas a devolver (texto SQL sin alias de tabla).
+    orden: criterio dentro de cada grupo; el id desempata fechas repetidas, así
+        cada grupo aporta exactamente una fila.
+    condiciones: filtros ``AND ...`` aplicados antes de elegir la última fila.
+
+    Se usa como ``FROM ({ultimo_por_grupo('aforos')}) a`` o en un LEFT JOIN.
+    Con ``columnas='*'`` el resultado incluye además la columna rn_grupo.
+    """
+    # MySQL no admite un * sin calificar junto a otras expresiones
+    internas = f"{tabla}.*" if columnas.strip() == '*' else columnas
+    return f"""
+        SELECT {columnas} FROM (
+            SELECT {internas}, ROW_NUMBER() OVER (PARTITION BY {grupo} ORDER BY {orden}) AS rn_grupo
+            FROM {tabla}
+            WHERE 1=1{condiciones}
+        ) ultimos_{tabla}
+        WHERE rn_grupo = 1
+    """
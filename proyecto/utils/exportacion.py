@@ -0,0 +1,66 @@
+"""
+Exportación CSV en streaming.
+
+La consulta se lee con un cursor sin buffer del lado del servidor y cada bloque
+de filas se escribe y envía apenas llega: el primer byte sale sin esperar al
+resultado completo y la memoria no crece con el rango exportado.
+"""
+
+import csv
+import io
+from datetime import date, datetime
+from decimal import Decimal
+
+from flask import Response, stream_with_context
+
+TAMANO_BLOQUE = 1000
+
+
+def _valor(valor):
+    if valor is None:
+        return ''
+    if isinstance(valor, (date, datetime)):
+        return valor.isoformat()
+    if isinstance(valor, Decimal):
+        return format(valor, 'f')
+    return valor
+
+
+def filas_csv(cursor, query, params=(), tamano_bloque=TAMANO_BLOQUE):
+    """Generador de texto CSV (encabezado y luego bloques de filas); cierra el cursor al terminar"""
+    buffer = io.StringIO()
+    escritor = csv.writer(buffer)
+    try:
+        cursor.execute(query, tuple(params))
+        # BOM para que Excel reconozca UTF-8 (tildes y eñes)
+        escritor.writerow([columna[0] for columna in cursor.description])
+        yield '\ufeff' + buffer.getvalue()
+
+        while True:
+            filas = cursor.fetchmany(tamano_bloque)
+            if not filas:
+                break
+            buffer.seek(0)
+            buffer.truncate()
+            escritor.writerows([_valor(v) for v in fila] for fila in filas)
+            yield buffer.getvalue()
+    finally:
+        cursor.close()
+
+
+def respuesta_csv(mysql, nombre_archivo, consulta):
+    """
+    Response que transmite ``consulta`` = (query, params) como CSV descargable.
+    El contexto del request se mantiene mientras dura la transmisión, así la
+    conexión prestada del pool sigue siendo la del request.
+    """
+    query, params = consulta
+    cursor = mysql.cursor_sin_buffer()
+    return Response(
+        stream_with_context(filas_csv(cursor, query, params)),
+        mimetype='text/csv',
+        headers={
+            'Content-Disposition': f'attachment; filename="{nombre_archivo}"',
+            'X-Accel-Buffering': 'no',  # que un proxy nginx no acumule la respuesta
+        },
+    )
@@ -0,0 +1,295 @@
+"""
+Importación masiva de aforos con sus muestras desde CSV o XLSX.
+
+Formato: una fila por muestra. Las filas con el mismo potrero y fecha forman un
+aforo. Columnas (encabezado obligatorio, sin distinguir mayúsculas):
+
+    potrero        id o nombre del potrero (obligatoria)
+    fecha          AAAA-MM-DD o DD/MM/AAAA (obligatoria)
+    peso_verde     gramos del marco de 0.25 m² (obligatoria, > 0)
+    peso_seco      gramos (opcional)
+    altura_pasto   cm (opcional)
+    numero_muestra (opcional; por defecto el orden dentro del aforo)
+    observaciones  de la muestra (opcional)
+
+El archivo se lee fila a fila y se valida contra los potreros cargados una sola
+vez en memoria. Los aforos (INSERT de varias filas) y las muestras (executemany)
+se insertan por lotes dentro de una única transacción, y los promedios se
+recalculan una vez por aforo.
+"""
+
+import csv
+import io
+import time
+from datetime import date, datetime
+
+from proyecto.models.models import _SQL_INSERTAR_AFOROS, Aforo, MuestraAforo
+from proyecto.utils.auditoria import auditoria
+from proyecto.utils.cache import contadores, incrementar_version
+from proyecto.utils.tareas import encolar_recalculo
+
+# Factor del marco de muestreo de 0.25 m²: gramos -> kg/ha
+FACTOR_KG_HA = 10000 / 0.25 / 1000
+
+FORMATOS_FECHA = ('%Y-%m-%d', '%d/%m/%Y', '%Y/%m/%d')
+MAX_ERRORES = 1000
+
+
+class ErrorImportacion(ValueError):
+    """El archivo no se puede procesar (formato o encabezado inválido)"""
+
+
+def leer_filas(archivo, nombre):
+    """
+    Iterar las filas de un archivo CSV o XLSX como dicts con claves en minúsculas.
+    ``archivo`` es un objeto binario (FileStorage.stream o un archivo abierto en 'rb').
+    """
+    extension = nombre.rsplit('.', 1)[-1].lower() if '.' in nombre else ''
+    if extension in ('xlsx', 'xlsm'):
+        return _filas_xlsx(archivo)
+    if extension in ('csv', 'txt'):
+        return _filas_csv(archivo)
+    raise ErrorImportacion(f"Formato no soportado: .{extension or '?'} (use CSV o XLSX)")
+
+
+def _encabezado(valores):
+    columnas = [str(v or '').strip().lower().replace(' ', '_') for v in valores]
+    faltantes = [c for c in ('potrero', 'fecha', 'peso_verde') if c not in columnas]
+    if faltantes:
+        raise ErrorImportacion(f"Faltan columnas obligatorias: {', '.join(faltantes)}")
+    return columnas
+
+
+def _filas_csv(archivo):
+    texto = io.TextIOWrapper(archivo, encoding='utf-8-sig', newline='')
+    muestra = texto.read(4096)
+    texto.seek(0)
+    try:
+        dialecto = csv.Sniffer().sniff(muestra, delimiters=',;\t')
+    except csv.Error:
+        dialecto = csv.excel
+    lector = csv.reader(texto, dialecto)
+    columnas = _encabezado(next(lector, []))
+    for valores in lector:
+        if any(v.strip() for v in valores):
+            yield dict(zip(columnas, valores))
+        else:
+            yield None  # fila vacía: se cuenta para numerar bien los errores
+
+
+def _filas_xlsx(archivo):
+    try:
+        from openpyxl import load_workbook
+    except ImportError:
+        raise ErrorImportacion("Para importar XLSX se requiere el paquete openpyxl")
+    libro = load_workbook(archivo, read_only=True, data_only=True)
+    try:
+        filas = libro.active.iter_rows(values_only=True)
+        columnas = _encabezado(next(filas, ()))
+        for valores in filas:
+            if any(v not in (None, '') for v in valores):
+                yield dict(zip(columnas, valores))
+            else:
+                yield None
+    finally:
+        libro.close()
+
+
+def _texto(valor):
+    return str(valor).strip() if valor is not None else ''
+
+
+def _numero(valor, campo, obligatorio=False, positivo=False):
+    texto = _texto(valor).replace(',', '.')  # se acepta coma decimal
+    if not texto:
+        if obligatorio:
+            raise ValueError(f"{campo} es obligatorio")
+        return None
+    try:
+        numero = float(texto)
+    except ValueError:
+        raise ValueError(f"{campo} no es un número: {valor!r}")
+    if numero < 0 or (positivo and numero == 0):
+        raise ValueError(f"{campo} debe ser {'mayor que 0' if positivo else 'no negativo'}")
+    return numero
+
+
+def _fecha(valor):
+    if isinstance(valor, datetime):
+        return valor.date()
+    if isinstance(valor, date):
+        return valor
+    texto = _texto(valor)
+    if not texto:
+        raise ValueError("fecha es obligatoria")
+    for formato in FORMATOS_FECHA:
+        try:
+            return datetime.strptime(texto, formato).date()
+        except ValueError:
+            continue
+    raise ValueError(f"fecha inválida: {texto!r}")
+
+
+class ResultadoImportacion:
+    """Resumen de una importación: conteos, errores por fila y tiempo"""
+
+    def __init__(self):
+        self.filas = 0
+        self.aforos = 0
+        self.muestras = 0
+        self.errores = []  # (número de fila del archivo, mensaje)
+        self.total_errores = 0
+        self.insertado = False
+        self.segundos = 0.0
+
+    def agregar_error(self, fila, mensaje):
+        self.total_errores += 1
+        if len(self.errores) < MAX_ERRORES:
+            self.errores.append((fila, mensaje))
+
+    @property
+    def filas_por_segundo(self):
+        return self.filas / self.segundos if self.segundos else 0
+
+    def to_dict(self):
+        return {
+            'filas': self.filas,
+            'aforos': self.aforos,
+            'muestras': self.muestras,
+            'insertado': self.insertado,
+            'total_errores': self.total_errores,
+            'errores': [{'fila': f, 'error': m} for f, m in self.errores],
+            'segundos': round(self.segundos, 3),
+            'filas_por_segundo': round(self.filas_por_segundo),
+        }
+
+
+class ImportadorAforos:
+    """Valida y carga aforos con sus muestras en una única transacción"""
+
+    def __init__(self, mysql, tamano_lote=1000):
+        self.mysql = mysql
+        self.tamano_lote = tamano_lote
+
+    def importar(self, filas, solo_validar=False, omitir_errores=False):
+        """
+        Procesar las filas (dicts de leer_filas). Sin ``omitir_errores`` basta un
+        error para no insertar nada; con él se cargan sólo las filas válidas.
+        """
+        resultado = ResultadoImportacion()
+        inicio = time.perf_counter()
+        cursor = self.mysql.connection.cursor()
+        try:
+            grupos = self._validar(cursor, filas, resultado)
+            resultado.aforos = len(grupos)
+            resultado.muestras = sum(len(g['muestras']) for g in grupos.values())
+
+            if grupos and not solo_validar and (omitir_errores or not resultado.total_errores):
+                self._insertar(cursor, grupos)
+                resultado.insertado = True
+        except Exception:
+            self.mysql.connection.rollback()
+            raise
+        finally:
+            cursor.close()
+            resultado.segundos = time.perf_counter() - inicio
+        return resultado
+
+    def _validar(self, cursor, filas, resultado):
+        """Agrupar las filas válidas por (potrero_id, fecha) en orden de aparición"""
+        cursor.execute("SELECT id, nombre FROM potreros")
+        por_id, por_nombre = {}, {}
+        for potrero in cursor.fetchall():
+            por_id[str(potrero['id'])] = potrero['id']
+            por_nombre[potrero['nombre'].strip().lower()] = potrero['id']
+
+        grupos = {}
+        # La fila 1 es el encabezado
+        for numero, fila in enumerate(filas, start=2):
+            if fila is None:
+                continue
+            resultado.filas += 1
+            try:
+                referencia = _texto(fila.get('potrero'))
+                if isinstance(fila.get('potrero'), float) and fila['potrero'].is_integer():
+                    referencia = str(int(fila['potrero']))
+                potrero_id = por_id.get(referencia) or por_nombre.get(referencia.lower())
+                if potrero_id is None:
+                    raise ValueError(f"potrero no encontrado: {referencia!r}" if referencia else "potrero es obligatorio")
+                fecha = _fecha(fila.get('fecha'))
+                peso_verde = _numero(fila.get('peso_verde'), 'peso_verde', obligatorio=True, positivo=True)
+                peso_seco = _numero(fila.get('peso_seco'), 'peso_seco')
+                if peso_seco is not None and peso_seco > peso_verde:
+                    raise ValueError("peso_seco no puede superar a peso_verde")
+                altura = _numero(fila.get('altura_pasto'), 'altura_pasto')
+                numero_muestra = _numero(fila.get('numero_muestra'), 'numero_muestra')
+            except ValueError as e:
+                resultado.agregar_error(numero, str(e))
+                continue
+
+            grupo = grupos.setdefault((potrero_id, fecha), {'muestras': []})
+            grupo['muestras'].append((
+                int(numero_muestra) if numero_muestra is not None else len(grupo['muestras']) + 1,
+                peso_verde, peso_seco, altura, _texto(fila.get('observaciones')) or None
+            ))
+        return grupos
+
+    def _insertar(self, cursor, grupos):
+        # Valores del aforo calculados de sus muestras (mismas fórmulas que _SQL_DERIVADOS_AFORO)
+        aforos = []
+        for (potrero_id, fecha), grupo in grupos.items():
+            verdes = [m[1] for m in grupo['muestras']]
+            secos = [m[2] for m in grupo['muestras'] if m[2] is not None]
+            alturas = [m[3] for m in grupo['muestras'] if m[3] is not None]
+            verde = sum(verdes) / len(verdes)
+            seco = sum(secos) / len(secos) if secos else None
+            aforos.append({
+                'potrero_id': potrero_id, 'fecha': fecha,
+                'materia_verde': verde * FACTOR_KG_HA,
+                'materia_seca': seco * FACTOR_KG_HA if seco is not None else 0,
+                'porcentaje_ms': seco / verde * 100 if seco is not None else 0,
+                'altura_pasto': sum(alturas) / len(alturas) if alturas else None,
+                'observaciones': 'Importado desde archivo',
+            })
+
+        filas, potrero_ids = Aforo.preparar_filas(cursor, aforos)
+
+        # Un INSERT de varias filas por lote: MySQL asigna a sus filas ids
+        # consecutivos (paso auto_increment_increment) a partir de lastrowid, sin
+        # que otras escrituras concurrentes se intercalen
+        cursor.execute("SELECT @@auto_increment_increment as paso")
+        paso = int(cursor.fetchone()['paso'])
+        columnas, marcadores = _SQL_INSERTAR_AFOROS.rsplit('VALUES', 1)
+        aforo_ids = {}
+        for i in range(0, len(filas), self.tamano_lote):
+            lote = filas[i:i + self.tamano_lote]
+            cursor.execute(
+                f"{columnas}VALUES {', '.join([marcadores.strip()] * len(lote))}",
+                tuple(valor for fila in lote for valor in fila)
+            )
+            primer_id = cursor.lastrowid
+            for k, fila in enumerate(lote):
+                aforo_ids[(fila[0], fila[1])] = primer_id + k * paso
+
+        muestras = [
+            (aforo_ids[clave], *muestra)
+            for clave, grupo in grupos.items()
+            for muestra in grupo['muestras']
+        ]
+        for i in range(0, len(muestras), self.tamano_lote):
+            MuestraAforo.create_many(cursor, muestras[i:i + self.tamano_lote])
+
+        ids = list(aforo_ids.values())
+        for i in range(0, len(ids), self.tamano_lote):
+            MuestraAforo.actualizar_promedios_aforos(ids[i:i + self.tamano_lote], cursor)
+
+        # El resumen de rotación de los potreros importados lo recalcula el worker
+        encolar_recalculo('resumen_potreros', {'potrero_id': potrero_ids}, cursor)
+        incrementar_version(cursor, 'aforos')
+        self.mysql.connection.commit()
+        contadores.invalidar('aforos')
+        for (potrero_id, fecha), grupo in grupos.items():
+            auditoria.registrar('aforos', aforo_ids[(potrero_id, fecha)], 'CREATE', {
+                'potrero_id': potrero_id, 'fecha': fecha,
+                'muestras': len(grupo['muestras']), 'origen': 'importacion',
+            })
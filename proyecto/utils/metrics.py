@@ -0,0 +1,168 @@
+"""
+Métricas Prometheus de la aplicación (endpoint /metrics).
+
+Latencia de requests por blueprint y endpoint, requests en curso, consultas y
+tiempo de base de datos, saturación del pool de conexiones, aciertos de caché y
+eventos de auditoría pendientes.
+
+Con varios workers de gunicorn, ``PROMETHEUS_MULTIPROC_DIR`` debe apuntar a un
+directorio compartido antes de importar la aplicación (lo fija gunicorn_config.py):
+cada proceso escribe sus valores en archivos mmap y /metrics los agrega todos.
+"""
+
+import os
+import threading
+import time
+
+from flask import Response, current_app, g, request
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Gauge, Histogram, REGISTRY, generate_latest
+)
+from prometheus_client import multiprocess
+
+# Buckets pensados para páginas HTML y APIs JSON (de 5 ms a 10 s)
+BUCKETS_LATENCIA = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+LATENCIA = Histogram(
+    'pastoreo_http_request_duration_seconds', 'Latencia de requests HTTP',
+    ['blueprint', 'endpoint', 'method'], buckets=BUCKETS_LATENCIA
+)
+REQUESTS = Counter(
+    'pastoreo_http_requests_total', 'Requests HTTP atendidos',
+    ['blueprint', 'endpoint', 'method', 'status']
+)
+EN_CURSO = Gauge(
+    'pastoreo_http_requests_in_flight', 'Requests HTTP en curso',
+    multiprocess_mode='livesum'
+)
+DB_CONSULTAS = Counter(
+    'pastoreo_db_queries_total', 'Consultas SQL ejecutadas', ['blueprint', 'endpoint']
+)
+DB_SEGUNDOS = Counter(
+    'pastoreo_db_query_seconds_total', 'Tiempo total en consultas SQL', ['blueprint', 'endpoint']
+)
+POOL_CONEXIONES = Gauge(
+    'pastoreo_db_pool_connections', 'Conexiones del pool por estado', ['estado'],
+    multiprocess_mode='livesum'
+)
+POOL_ESPERAS = Counter(
+    'pastoreo_db_pool_waits_total', 'Préstamos del pool que tuvieron que esperar'
+)
+POOL_TIMEOUTS = Counter(
+    'pastoreo_db_pool_timeouts_total', 'Préstamos del pool que agotaron el tiempo de espera'
+)
+POOL_ESPERA_SEGUNDOS = Counter(
+    'pastoreo_db_pool_wait_seconds_total', 'Tiempo total esperando una conexión del pool'
+)
+CACHE = Counter(
+    'pastoreo_cache_requests_total', 'Lecturas de caché', ['cache', 'resultado']
+)
+AUDITORIA = Counter(
+    'pastoreo_audit_events_total', 'Eventos de auditoría escritos o descartados', ['resultado']
+)
+AUDITORIA_PENDIENTES = Gauge(
+    'pastoreo_audit_events_pending', 'Eventos de auditoría en memoria sin escribir',
+    multiprocess_mode='livesum'
+)
+
+
+class Metricas:
+    """Registra los hooks de request y el endpoint /metrics"""
+
+    def __init__(self, app=None, mysql=None):
+        self.mysql = None
+        self._ultimos = {}  # último valor visto de cada contador acumulado (por proceso)
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app, mysql)
+
+    def init_app(self, app, mysql):
+        app.config.setdefault('METRICS_ENABLED', True)
+        app.config.setdefault('METRICS_TOKEN', None)
+        if not app.config['METRICS_ENABLED']:
+            return
+        self.mysql = mysql
+        app.before_request(self._inicio_request)
+        app.after_request(self._fin_request)
+        app.teardown_request(self._cierre_request)
+        app.add_url_rule('/metrics', 'metrics', self.exportar)
+
+    def exportar(self):
+        """Texto de exposición Prometheus (agregado de todos los workers si hay multiproceso)"""
+        token = current_app.config.get('METRICS_TOKEN')
+        if token and request.headers.get('Authorization') != f'Bearer {token}':
+            return Response('No autorizado\n', status=401, mimetype='text/plain')
+
+        self._sincronizar()
+        if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+            registro = CollectorRegistry()
+            multiprocess.MultiProcessCollector(registro)
+        else:
+            registro = REGISTRY
+        return Response(generate_latest(registro), mimetype=CONTENT_TYPE_LATEST)
+
+    def _inicio_request(self):
+        g._metricas_inicio = time.perf_counter()
+        EN_CURSO.inc()
+
+    def _fin_request(self, response):
+        g._metricas_status = response.status_code
+        return response
+
+    def _cierre_request(self, exception):
+        inicio = g.pop('_metricas_inicio', None)
+        if inicio is None:
+            return
+        EN_CURSO.dec()
+        if request.endpoint == 'metrics':
+            return
+
+        endpoint = request.endpoint or 'sin_ruta'
+        blueprint = request.blueprint or ''
+        status = g.pop('_metricas_status', 500)
+        LATENCIA.labels(blueprint, endpoint, request.method).observe(time.perf_counter() - inicio)
+        REQUESTS.labels(blueprint, endpoint, request.method, str(status)).inc()
+
+        consultas = g.get('_sql_consultas')
+        if consultas:
+            DB_CONSULTAS.labels(blueprint, endpoint).inc(len(consultas))
+            DB_SEGUNDOS.labels(blueprint, endpoint).inc(sum(ms for _, ms, _ in consultas) / 1000)
+
+        self._sincronizar()
+
+    def _sincronizar(self):
+        """Volcar a las métricas el estado del pool y de la caché de este proceso"""
+        with self._lock:
+            self._sincronizar_sin_lock()
+
+    def _sincronizar_sin_lock(self):
+        estadisticas = self.mysql.pool_stats() if self.mysql is not None else None
+        if isinstance(estadisticas, dict):
+            POOL_CONEXIONES.labels('en_uso').set(estadisticas['in_use'])
+            POOL_CONEXIONES.labels('libres').set(estadisticas['idle'])
+            POOL_CONEXIONES.labels('capacidad').set(estadisticas['size'])
+            self._incrementar(POOL_ESPERAS, 'pool_waits', estadisticas['waits'])
+            self._incrementar(POOL_TIMEOUTS, 'pool_timeouts', estadisticas['timeouts'])
+            self._incrementar(POOL_ESPERA_SEGUNDOS, 'pool_wait_s', estadisticas['wait_ms_total'] / 1000)
+
+        from proyecto.utils.cache import cache_respuestas, contadores
+        for nombre, cache in (('contadores', contadores), ('respuestas', cache_respuestas)):
+            self._incrementar(CACHE.labels(nombre, 'hit'), f'{nombre}_hit', cache.hits)
+            self._incrementar(CACHE.labels(nombre, 'miss'), f'{nombre}_miss', cache.misses)
+
+        from proyecto.utils.auditoria import auditoria
+        estado = auditoria.stats()
+        AUDITORIA_PENDIENTES.set(estado['pendientes'])
+        for resultado in ('escritos', 'descartados'):
+            self._incrementar(AUDITORIA.labels(resultado), f'auditoria_{resultado}', estado[resultado])
+
+    def _incrementar(self, contador, clave, valor_actual):
+        """Incrementar un Counter con la diferencia desde el último valor acumulado visto"""
+        anterior = self._ultimos.get(clave, 0)
+        if valor_actual > anterior:
+            contador.inc(valor_actual - anterior)
+        self._ultimos[clave] = valor_actual
+
+
+# Instancia compartida
+metricas = Metricas()
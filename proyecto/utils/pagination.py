@@ -0,0 +1,162 @@
+"""
+Paginación por cursor (keyset) sobre (fecha, id).
+
+En lugar de ``LIMIT n OFFSET k``, cada página continúa desde la última fila de la
+anterior: ``WHERE (fecha, id) < (f, i) ORDER BY fecha DESC, id DESC LIMIT n``.
+El costo no crece con la profundidad de la página. Los cursores son tokens opacos
+(base64 de la posición y la dirección) que el cliente devuelve en ``?cursor=``.
+"""
+
+import base64
+import json
+import math
+from datetime import date, datetime
+from decimal import Decimal
+
+CONTEOS = ('exacto', 'estimado', 'ninguno')
+
+
+class CursorInvalido(ValueError):
+    """Token de paginación mal formado"""
+
+
+def codificar_cursor(fecha, id_, direccion='sig'):
+    """Token opaco que apunta a la fila (fecha, id) en la dirección indicada ('sig' o 'ant')"""
+    if isinstance(fecha, (date, datetime)):
+        fecha = fecha.isoformat()
+    datos = json.dumps({'f': str(fecha), 'i': int(id_), 'd': direccion}, separators=(',', ':'))
+    return base64.urlsafe_b64encode(datos.encode()).decode().rstrip('=')
+
+
+def decodificar_cursor(token):
+    """Devuelve (fecha, id, direccion) o lanza CursorInvalido"""
+    try:
+        relleno = '=' * (-len(token) % 4)
+        datos = json.loads(base64.urlsafe_b64decode(token + relleno).decode())
+        fecha, id_, direccion = datos['f'], int(datos['i']), datos['d']
+    except (ValueError, TypeError, KeyError, AttributeError) as e:
+        raise CursorInvalido(f"Cursor de paginación inválido: {e}")
+    if not isinstance(fecha, str) or direccion not in ('sig', 'ant'):
+        raise CursorInvalido("Cursor de paginación inválido")
+    return fecha, id_, direccion
+
+
+def leer_cursor(token):
+    """Token si es válido, None si falta o está mal formado (vistas HTML: volver a la primera página)"""
+    if not token:
+        return None
+    try:
+        decodificar_cursor(token)
+        return token
+    except CursorInvalido:
+        return None
+
+
+def leer_conteo(valor, defecto='exacto'):
+    """Modo de conteo pedido por el cliente ('exacto', 'estimado' o 'ninguno')"""
+    return valor if valor in CONTEOS else defecto
+
+
+class Pagina:
+    """Resultado de una consulta paginada por cursor"""
+
+    def __init__(self, items, per_page, siguiente=None, anterior=None, total=None, total_estimado=False):
+        self.items = items
+        self.per_page = per_page
+        self.siguiente = siguiente
+        self.anterior = anterior
+        self.total = total
+        self.total_estimado = total_estimado
+
+    @property
+    def pages(self):
+        if self.total is None:
+            return None
+        return max(1, math.ceil(self.total / self.per_page))
+
+    def to_dict(self):
+        return {
+            'data': [serializar_fila(fila) for fila in self.items],
+            'per_page': self.per_page,
+            'next_cursor': self.siguiente,
+            'prev_cursor': self.anterior,
+            'total': self.total,
+            'total_estimado': self.total_estimado,
+        }
+
+
+def serializar_fila(fila):
+    """Convertir fechas y decimales de una fila DictCursor a tipos JSON"""
+    resultado = {}
+    for clave, valor in fila.items():
+        if isinstance(valor, (date, datetime)):
+            valor = valor.isoformat()
+        elif isinstance(valor, Decimal):
+            valor = float(valor)
+        resultado[clave] = valor
+    return resultado
+
+
+def paginar(db_cursor, select_sql, desde_sql, alias, condiciones='', params=(), per_page=10,
+            cursor=None, offset=0, conteo='exacto'):
+    """
+    Ejecutar una consulta paginada por (alias.fecha, alias.id).
+
+    select_sql: ``SELECT ... FROM tabla alias [JOIN ...]`` sin WHERE ni ORDER BY.
+    desde_sql: ``tabla alias`` para el conteo (sin los JOIN de presentación).
+    condiciones/params: filtros ``AND ...`` ya construidos por el modelo.
+    offset sólo se usa sin cursor (salto directo a una página numerada).
+    """
+    params = list(params)
+    col_fecha = f"{alias}.fecha"
+    col_id = f"{alias}.id"
+
+    direccion = 'sig'
+    query = select_sql + " WHERE 1=1" + condiciones
+    args = list(params)
+    if cursor:
+        fecha, id_, direccion = decodificar_cursor(cursor)
+        comparador = '<' if direccion == 'sig' else '>'
+        query += f" AND ({col_fecha} {comparador} %s OR ({col_fecha} = %s AND {col_id} {comparador} %s))"
+        args.extend([fecha, fecha, id_])
+
+    orden = 'DESC' if direccion == 'sig' else 'ASC'
+    query += f" ORDER BY {col_fecha} {orden}, {col_id} {orden} LIMIT %s"
+    args.append(per_page + 1)
+    if offset and not cursor:
+        query += " OFFSET %s"
+        args.append(offset)
+
+    db_cursor.execute(query, tuple(args))
+    filas = list(db_cursor.fetchall())
+    hay_mas = len(filas) > per_page
+    filas = filas[:per_page]
+    if direccion == 'ant':
+        filas.reverse()
+
+    siguiente = anterior = None
+    if filas:
+        primera, ultima = filas[0], filas[-1]
+        if direccion == 'sig':
+            if hay_mas:
+                siguiente = codificar_cursor(ultima['fecha'], ultima['id'], 'sig')
+            if cursor or offset:
+                anterior = codificar_cursor(primera['fecha'], primera['id'], 'ant')
+        else:
+            if hay_mas:
+                anterior = codificar_cursor(primera['fecha'], primera['id'], 'ant')
+            siguiente = codificar_cursor(ultima['fecha'], ultima['id'], 'sig')
+
+    total = None
+    estimado = False
+    if conteo == 'exacto':
+        db_cursor.execute(f"SELECT COUNT(*) as total FROM {desde_sql} WHERE 1=1" + condiciones, tuple(params))
+        total = int(db_cursor.fetchone()['total'])
+    elif conteo == 'estimado':
+        # Estimación del optimizador: no recorre las filas
+        db_cursor.execute(f"EXPLAIN SELECT 1 FROM {desde_sql} WHERE 1=1" + condiciones, tuple(params))
+        plan = db_cursor.fetchone()
+        total = int(plan.get('rows') or 0) if plan else 0
+        estimado = True
+
+    return Pagina(filas, per_page, siguiente, anterior, total, estimado)
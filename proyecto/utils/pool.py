@@ -0,0 +1,310 @@
+"""
+Pool de conexiones MySQL por proceso (worker de gunicorn).
+
+PooledMySQL expone la misma interfaz que flask_mysqldb.MySQL (``mysql.connection``),
+pero reutiliza conexiones entre requests en lugar de abrir una nueva en cada
+contexto de aplicación.
+
+La conexión se guarda en ``g``, que es propio de cada contexto: con workers
+gthread cada hilo y con gevent cada greenlet toma la suya, y el pool los hace
+esperar cuando no quedan libres. Con gevent conviene ``MYSQL_DRIVER=pymysql``
+(Python puro, cede el event loop durante la espera de red); mysqlclient es C y
+bloquea a todos los greenlets del proceso mientras dura cada consulta.
+"""
+
+import os
+import threading
+import time
+
+from flask import g, has_app_context
+
+
+class PoolTimeout(Exception):
+    """No se obtuvo una conexión del pool dentro del tiempo de espera"""
+
+
+class ConnectionPool:
+    """Pool de conexiones DB-API con verificación al prestar y reciclaje por antigüedad"""
+
+    def __init__(self, connect, size=5, timeout=10, max_lifetime=1800, pre_ping=True):
+        self.connect = connect
+        self.size = size
+        self.timeout = timeout
+        self.max_lifetime = max_lifetime
+        self.pre_ping = pre_ping
+
+        self._cond = threading.Condition()
+        self._idle = []          # conexiones libres (LIFO para mantener calientes las recientes)
+        self._created_at = {}    # id(conn) -> instante de creación
+        self._total = 0          # conexiones abiertas (libres + prestadas)
+
+        # Estadísticas
+        self._checkouts = 0
+        self._created = 0
+        self._recycled = 0
+        self._discarded = 0
+        self._waits = 0
+        self._timeouts = 0
+        self._wait_time_total = 0.0
+        self._wait_time_max = 0.0
+
+    def acquire(self):
+        """Prestar una conexión; espera hasta ``timeout`` segundos si el pool está lleno"""
+        inicio = time.monotonic()
+        limite = inicio + self.timeout
+        espero = False
+
+        with self._cond:
+            while True:
+                if self._idle:
+                    conn = self._idle.pop()
+                    break
+                if self._total < self.size:
+                    self._total += 1
+                    conn = None
+                    break
+                restante = limite - time.monotonic()
+                if restante <= 0:
+                    self._timeouts += 1
+                    raise PoolTimeout(
+                        f"Sin conexiones disponibles tras {self.timeout}s (tamaño del pool: {self.size})"
+                    )
+                espero = True
+                self._cond.wait(restante)
+
+            espera = time.monotonic() - inicio
+            self._checkouts += 1
+            if espero:
+                self._waits += 1
+                self._wait_time_total += espera
+                self._wait_time_max = max(self._wait_time_max, espera)
+
+        try:
+            if conn is None:
+                return self._open()
+            if self._expired(conn):
+                self._close(conn)
+                with self._cond:
+                    self._recycled += 1
+                return self._open()
+            if self.pre_ping and not self._healthy(conn):
+                self._close(conn)
+                with self._cond:
+                    self._discarded += 1
+                return self._open()
+            return conn
+        except Exception:
+            # No se pudo abrir la conexión: liberar el cupo reservado
+            with self._cond:
+                self._total -= 1
+                self._cond.notify()
+            raise
+
+    def release(self, conn, discard=False):
+        """Devolver una conexión al pool (se descarta si falla el rollback)"""
+        if not discard:
+            try:
+                # Descartar cualquier transacción sin confirmar del request
+                conn.rollback()
+            except Exception:
+                discard = True
+
+        with self._cond:
+            if discard:
+                self._close(conn)
+                self._discarded += 1
+                self._total -= 1
+            else:
+                self._idle.append(conn)
+            self._cond.notify()
+
+    def close_all(self):
+        """Cerrar todas las conexiones libres"""
+        with self._cond:
+            for conn in self._idle:
+                self._close(conn)
+                self._total -= 1
+            self._idle = []
+            self._cond.notify_all()
+
+    def stats(self):
+        """Estadísticas de uso y espera del pool"""
+        with self._cond:
+            return {
+                'size': self.size,
+                'open': self._total,
+                'idle': len(self._idle),
+                'in_use': self._total - len(self._idle),
+                'checkouts': self._checkouts,
+                'created': self._created,
+                'recycled': self._recycled,
+                'discarded': self._discarded,
+                'waits': self._waits,
+                'timeouts': self._timeouts,
+                'wait_ms_total': round(self._wait_time_total * 1000, 2),
+                'wait_ms_max': round(self._wait_time_max * 1000, 2),
+            }
+
+    def _open(self):
+        conn = self.connect()
+        with self._cond:
+            self._created_at[id(conn)] = time.monotonic()
+            self._created += 1
+        return conn
+
+    def _close(self, conn):
+        self._created_at.pop(id(conn), None)
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def _expired(self, conn):
+        if not self.max_lifetime:
+            return False
+        creada = self._created_at.get(id(conn), 0)
+        return time.monotonic() - creada > self.max_lifetime
+
+    @staticmethod
+    def _healthy(conn):
+        try:
+            if hasattr(conn, 'ping'):
+                conn.ping()
+            else:
+                cursor = conn.cursor()
+                cursor.execute("SELECT 1")
+                cursor.close()
+            return True
+        except Exception:
+            return False
+
+
+class PooledMySQL:
+    """Reemplazo de flask_mysqldb.MySQL respaldado por un ConnectionPool por proceso"""
+
+    def __init__(self, app=None, connect=None):
+        self.app = None
+        self._connect = connect
+        self._pool = None
+        self._pool_pid = None
+        self._lock = threading.Lock()
+        # Pools heredados de un proceso padre (fork): se conservan sin cerrarlos
+        # para no cortar los sockets que sigue usando el padre
+        self._inherited = []
+        self._envoltorio = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        app.config.setdefault('MYSQL_HOST', 'localhost')
+        app.config.setdefault('MYSQL_USER', None)
+        app.config.setdefault('MYSQL_PASSWORD', None)
+        app.config.setdefault('MYSQL_DB', None)
+        app.config.setdefault('MYSQL_PORT', 3306)
+        app.config.setdefault('MYSQL_UNIX_SOCKET', None)
+        app.config.setdefault('MYSQL_CONNECT_TIMEOUT', 10)
+        app.config.setdefault('MYSQL_CHARSET', 'utf8')
+        app.config.setdefault('MYSQL_CURSORCLASS', None)
+        app.config.setdefault('MYSQL_POOL_SIZE', 5)
+        app.config.setdefault('MYSQL_POOL_TIMEOUT', 10)
+        app.config.setdefault('MYSQL_POOL_MAX_LIFETIME', 1800)
+        app.config.setdefault('MYSQL_POOL_PRE_PING', True)
+        app.config.setdefault('MYSQL_DRIVER', 'mysqlclient')
+        app.teardown_appcontext(self.teardown)
+
+    def _driver(self):
+        """Módulo DB-API y su módulo de cursores según MYSQL_DRIVER"""
+        if self.app.config['MYSQL_DRIVER'] == 'pymysql':
+            import pymysql
+            import pymysql.cursors
+            return pymysql, pymysql.cursors
+        import MySQLdb
+        import MySQLdb.cursors
+        return MySQLdb, MySQLdb.cursors
+
+    def connect(self):
+        """Abrir una conexión nueva con la configuración de la app"""
+        if self._connect is not None:
+            return self._connect()
+
+        driver, cursores = self._driver()
+
+        config = self.app.config
+        kwargs = {
+            'host': config['MYSQL_HOST'],
+            'port': config['MYSQL_PORT'],
+            'connect_timeout': config['MYSQL_CONNECT_TIMEOUT'],
+            'charset': config['MYSQL_CHARSET'],
+        }
+        if config['MYSQL_USER']:
+            kwargs['user'] = config['MYSQL_USER']
+        if config['MYSQL_PASSWORD']:
+            kwargs['password'] = config['MYSQL_PASSWORD']
+        if config['MYSQL_DB']:
+            kwargs['database'] = config['MYSQL_DB']
+        if config['MYSQL_UNIX_SOCKET']:
+            kwargs['unix_socket'] = config['MYSQL_UNIX_SOCKET']
+        if config['MYSQL_CURSORCLASS']:
+            kwargs['cursorclass'] = getattr(cursores, config['MYSQL_CURSORCLASS'])
+        return driver.connect(**kwargs)
+
+    @property
+    def pool(self):
+        """Pool del proceso actual (se crea de nuevo tras un fork)"""
+        pid = os.getpid()
+        if self._pool is None or self._pool_pid != pid:
+            with self._lock:
+                if self._pool is None or self._pool_pid != pid:
+                    if self._pool is not None:
+                        self._inherited.append(self._pool)
+                    config = self.app.config
+                    self._pool = ConnectionPool(
+                        self.connect,
+                        size=int(config['MYSQL_POOL_SIZE']),
+                        timeout=float(config['MYSQL_POOL_TIMEOUT']),
+                        max_lifetime=float(config['MYSQL_POOL_MAX_LIFETIME']),
+                        pre_ping=bool(config['MYSQL_POOL_PRE_PING']),
+                    )
+                    self._pool_pid = pid
+        return self._pool
+
+    def set_envoltorio(self, envoltorio):
+        """Registrar una función que envuelve la conexión entregada en cada contexto (instrumentación)"""
+        self._envoltorio = envoltorio
+
+    @property
+    def connection(self):
+        """Conexión del contexto de aplicación actual, prestada del pool"""
+        if not has_app_context():
+            return None
+        if not hasattr(g, '_mysql_pool_conn'):
+            conn = self.pool.acquire()
+            g._mysql_pool_conn = conn
+            g._mysql_pool_vista = self._envoltorio(conn) if self._envoltorio else conn
+        return g._mysql_pool_vista
+
+    def cursor_sin_buffer(self):
+        """
+        Cursor que recibe las filas del servidor a medida que se leen (SSCursor)
+        en lugar de cargar todo el resultado en memoria. Debe consumirse o cerrarse
+        antes de ejecutar otra consulta en la misma conexión.
+        """
+        try:
+            _, cursores = self._driver()
+            return self.connection.cursor(cursores.SSCursor)
+        except (ImportError, TypeError):
+            # Conexiones que no son de MySQLdb (pruebas): cursor normal
+            return self.connection.cursor()
+
+    def teardown(self, exception):
+        g.pop('_mysql_pool_vista', None)
+        conn = g.pop('_mysql_pool_conn', None)
+        if conn is not None:
+            self.pool.release(conn)
+
+    def pool_stats(self):
+        """Estadísticas del pool del proceso actual"""
+        if self._pool is None or self._pool_pid != os.getpid():
+            return None
+        return self._pool.stats()
@@ -0,0 +1,166 @@
+"""
+Instrumentación de consultas SQL por request.
+
+Envuelve la conexión que entrega ``mysql.connection`` para que cada cursor mida
+sus sentencias: huella (texto normalizado sin literales), duración y filas.
+Al terminar el request se registra una línea de resumen y se advierten las
+huellas repetidas (patrón N+1). El agregado por huella del worker alimenta la
+página de depuración /admin/perf.
+"""
+
+import logging
+import re
+import threading
+import time
+
+from flask import g, has_app_context, has_request_context, request
+
+logger = logging.getLogger(__name__)
+
+_RE_CADENAS = re.compile(r"'(?:[^'\\]|\\.)*'|\"(?:[^\"\\]|\\.)*\"")
+_RE_NUMEROS = re.compile(r"\b\d+(?:\.\d+)?\b")
+_RE_MARCADORES = re.compile(r"%s|%\(\w+\)s")
+_RE_LISTAS = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_RE_ESPACIOS = re.compile(r"\s+")
+
+
+def huella(sql):
+    """Texto normalizado de una sentencia: literales y parámetros reemplazados por ?"""
+    if isinstance(sql, bytes):
+        sql = sql.decode('utf-8', 'replace')
+    sql = _RE_CADENAS.sub('?', sql)
+    sql = _RE_MARCADORES.sub('?', sql)
+    sql = _RE_NUMEROS.sub('?', sql)
+    sql = _RE_LISTAS.sub('(?+)', sql)
+    return _RE_ESPACIOS.sub(' ', sql).strip()
+
+
+class CursorInstrumentado:
+    """Proxy de un cursor DB-API que mide execute/executemany"""
+
+    def __init__(self, cursor, perfil):
+        self._cursor = cursor
+        self._perfil = perfil
+
+    def _medir(self, metodo, query, args):
+        inicio = time.perf_counter()
+        try:
+            return metodo(query) if args is None else metodo(query, args)
+        finally:
+            ms = (time.perf_counter() - inicio) * 1000
+            self._perfil.registrar(query, ms, getattr(self._cursor, 'rowcount', -1))
+
+    def execute(self, query, args=None):
+        return self._medir(self._cursor.execute, query, args)
+
+    def executemany(self, query, args):
+        return self._medir(self._cursor.executemany, query, args)
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    def __getattr__(self, nombre):
+        return getattr(self._cursor, nombre)
+
+
+class ConexionInstrumentada:
+    """Proxy de una conexión cuyos cursores se miden"""
+
+    def __init__(self, conexion, perfil):
+        self._conexion = conexion
+        self._perfil = perfil
+
+    def cursor(self, *args, **kwargs):
+        return CursorInstrumentado(self._conexion.cursor(*args, **kwargs), self._perfil)
+
+    def __getattr__(self, nombre):
+        return getattr(self._conexion, nombre)
+
+
+class PerfilSQL:
+    """Registro de consultas por request y agregado por huella del worker"""
+
+    MAX_HUELLAS = 500
+
+    def __init__(self, app=None, mysql=None):
+        self.umbral_n1 = 5
+        self._agregado = {}
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app, mysql)
+
+    def init_app(self, app, mysql):
+        app.config.setdefault('SQL_PROFILING', True)
+        app.config.setdefault('SQL_N1_UMBRAL', 5)
+        if not app.config['SQL_PROFILING']:
+            return
+        self.umbral_n1 = int(app.config['SQL_N1_UMBRAL'])
+        mysql.set_envoltorio(lambda conexion: ConexionInstrumentada(conexion, self))
+        app.before_request(self._inicio_request)
+        app.after_request(self._fin_request)
+
+    def registrar(self, query, ms, filas):
+        """Anotar una sentencia ejecutada (en el request actual y en el agregado del worker)"""
+        clave = huella(query)
+        if has_app_context():
+            consultas = g.get('_sql_consultas')
+            if consultas is not None:
+                consultas.append((clave, ms, filas))
+
+        endpoint = request.endpoint if has_request_context() else None
+        with self._lock:
+            datos = self._agregado.get(clave)
+            if datos is None:
+                if len(self._agregado) >= self.MAX_HUELLAS:
+                    return
+                datos = self._agregado[clave] = {
+                    'huella': clave, 'ejecuciones': 0, 'total_ms': 0.0,
+                    'max_ms': 0.0, 'filas': 0, 'endpoints': set()
+                }
+            datos['ejecuciones'] += 1
+            datos['total_ms'] += ms
+            datos['max_ms'] = max(datos['max_ms'], ms)
+            datos['filas'] += max(filas or 0, 0)
+            if endpoint:
+                datos['endpoints'].add(endpoint)
+
+    def resumen_request(self):
+        """(consultas, ms en DB, {huella: repeticiones} sospechosas de N+1) del request actual"""
+        consultas = g.get('_sql_consultas') or []
+        total_ms = sum(ms for _, ms, _ in consultas)
+        repeticiones = {}
+        for clave, _, _ in consultas:
+            repeticiones[clave] = repeticiones.get(clave, 0) + 1
+        sospechosas = {c: n for c, n in repeticiones.items() if n >= self.umbral_n1}
+        return len(consultas), total_ms, sospechosas
+
+    def top(self, limite=25, orden='total_ms'):
+        """Huellas más costosas del worker"""
+        with self._lock:
+            filas = [dict(d, endpoints=sorted(d['endpoints'])) for d in self._agregado.values()]
+        for fila in filas:
+            fila['promedio_ms'] = fila['total_ms'] / fila['ejecuciones'] if fila['ejecuciones'] else 0
+        filas.sort(key=lambda f: f[orden], reverse=True)
+        return filas[:limite]
+
+    def reiniciar(self):
+        with self._lock:
+            self._agregado = {}
+
+    def _inicio_request(self):
+        g._sql_consultas = []
+
+    def _fin_request(self, response):
+        if g.get('_sql_consultas') is None:
+            return response
+        total, total_ms, sospechosas = self.resumen_request()
+        if total:
+            logger.info(f"{request.method} {request.path} [{request.endpoint}] -> "
+                        f"{total} consultas, {total_ms:.1f} ms en DB")
+        for clave, veces in sospechosas.items():
+            logger.warning(f"Posible N+1 en {request.endpoint}: {veces}x {clave[:200]}")
+        return response
+
+
+# Instancia compartida (la página /admin/perf lee su agregado)
+perfil_sql = PerfilSQL()
@@ -0,0 +1,203 @@
+"""
+Proyección del balance forrajero: materia seca por potrero día a día.
+
+Parte del forraje disponible de BalanceForrajero y avanza todos los potreros a
+la vez, un paso por día, sobre arreglos NumPy:
+
+    ms[t + 1] = clip(ms[t] + crecimiento[t] - consumo, 0, máximo)
+
+- Crecimiento: tasa_crecimiento_diaria promedio de los recorridos recientes
+  (cm/día) por la densidad del potrero (kg MS/ha por cm, de sus aforos con
+  altura) y las hectáreas. Los potreros sin tasa usan la mediana de la finca.
+- Clima: la tasa observada ya refleja el clima reciente, así que se escala por
+  el factor de cada día relativo al de los últimos ``DIAS_CLIMA`` días. Para
+  los días futuros sin registro en clima se repite el promedio reciente.
+- Consumo: el de los lotes asignados hoy a cada potrero (potrero_actual_id).
+"""
+
+import time
+from datetime import date, datetime, timedelta
+
+import numpy as np
+
+from proyecto.utils.balance import BalanceForrajero, _columna, posiciones
+
+DIAS_MAXIMOS = 365
+DIAS_TASAS = 60  # recorridos usados para la tasa de crecimiento
+DIAS_CLIMA = 14  # ventana del clima reciente y de la lluvia acumulada
+DIAS_DENSIDAD = 365  # aforos usados para la densidad kg MS/ha por cm
+KG_MS_CM_HA = 150  # densidad si el potrero no tiene aforos con altura
+MS_MAXIMA_HA = 6000  # techo de materia seca acumulable por hectárea
+
+# Respuesta del crecimiento a la temperatura (°C) y a la lluvia (mm/día)
+TEMP_BASE, TEMP_OPTIMA, TEMP_MAXIMA = 5.0, 20.0, 35.0
+LLUVIA_REFERENCIA = 3.0
+
+
+def factor_temperatura(temperatura):
+    """0 bajo TEMP_BASE, sube hasta 1 en TEMP_OPTIMA y baja a 0 en TEMP_MAXIMA"""
+    t = np.asarray(temperatura, dtype=np.float64)
+    subida = (t - TEMP_BASE) / (TEMP_OPTIMA - TEMP_BASE)
+    bajada = (TEMP_MAXIMA - t) / (TEMP_MAXIMA - TEMP_OPTIMA)
+    return np.clip(np.minimum(subida, np.where(t > TEMP_OPTIMA, bajada, 1.0)), 0, 1)
+
+
+def factor_lluvia(lluvia_media):
+    """Lluvia media diaria de la ventana frente a LLUVIA_REFERENCIA (mínimo 0.2 por la humedad del suelo)"""
+    return np.clip(np.asarray(lluvia_media, dtype=np.float64) / LLUVIA_REFERENCIA, 0.2, 1)
+
+
+def factores_clima(clima, hoy, dias):
+    """
+    Factor de crecimiento de cada día futuro relativo al clima reciente.
+    ``clima``: dicts con fecha, temperatura_promedio y lluvia (días recientes y,
+    si los hay, futuros). Devuelve un arreglo de ``dias`` valores.
+    """
+    if not clima:
+        return np.ones(dias)
+
+    # Serie diaria desde hoy - DIAS_CLIMA hasta hoy + dias, con huecos en NaN
+    total = DIAS_CLIMA + dias
+    temperatura = np.full(total, np.nan)
+    lluvia = np.full(total, np.nan)
+    fechas = np.array([
+        (f['fecha'].date() if isinstance(f['fecha'], datetime) else f['fecha']) - hoy for f in clima
+    ], dtype='timedelta64[D]').astype(np.int64) + DIAS_CLIMA
+    dentro = (fechas >= 0) & (fechas < total)
+    temperatura[fechas[dentro]] = _columna(clima, 'temperatura_promedio')[dentro]
+    lluvia[fechas[dentro]] = _columna(clima, 'lluvia')[dentro]
+
+    # Huecos: promedio reciente (o neutro si no hay historia)
+    temp_reciente = np.nanmean(temperatura[:DIAS_CLIMA]) if np.any(~np.isnan(temperatura[:DIAS_CLIMA])) else TEMP_OPTIMA
+    lluvia_reciente = np.nanmean(lluvia[:DIAS_CLIMA]) if np.any(~np.isnan(lluvia[:DIAS_CLIMA])) else LLUVIA_REFERENCIA
+    temperatura = np.where(np.isnan(temperatura), temp_reciente, temperatura)
+    lluvia = np.where(np.isnan(lluvia), lluvia_reciente, lluvia)
+
+    # Lluvia media de los DIAS_CLIMA días anteriores a cada día (ventana móvil)
+    acumulada = np.concatenate(([0.0], np.cumsum(lluvia)))
+    media_movil = (acumulada[DIAS_CLIMA:total] - acumulada[:dias]) / DIAS_CLIMA
+
+    futuro = factor_temperatura(temperatura[DIAS_CLIMA:]) * factor_lluvia(media_movil)
+    reciente = float(factor_temperatura(temp_reciente) * factor_lluvia(lluvia_reciente))
+    return np.clip(futuro / max(reciente, 0.1), 0, 2)
+
+
+class ProyeccionForrajera:
+    """Materia seca proyectada de todos los potreros con aforo reciente"""
+
+    def __init__(self, balance, tasas, densidades, clima, dias=90, hoy=None):
+        """
+        ``balance``: BalanceForrajero con potreros, forraje y consumo actuales
+        ``tasas``: dicts con potrero_id y tasa (cm/día)
+        ``densidades``: dicts con potrero_id y densidad (kg MS/ha por cm)
+        ``clima``: dicts con fecha, temperatura_promedio y lluvia
+        """
+        inicio = time.perf_counter()
+        self.balance = balance
+        self.dias = max(1, min(int(dias), DIAS_MAXIMOS))
+        self.hoy = hoy or date.today()
+        n = len(balance.potrero_ids)
+
+        self.tasa = np.full(n, np.nan)
+        if tasas:
+            pos, ok = posiciones(balance.potrero_ids, _columna(tasas, 'potrero_id', np.int64, -1))
+            self.tasa[pos[ok]] = _columna(tasas, 'tasa')[ok]
+        conocidas = self.tasa[~np.isnan(self.tasa)]
+        self.tasa = np.where(np.isnan(self.tasa), np.median(conocidas) if len(conocidas) else 0.0, self.tasa)
+
+        self.densidad = np.full(n, float(KG_MS_CM_HA))
+        if densidades:
+            pos, ok = posiciones(balance.potrero_ids, _columna(densidades, 'potrero_id', np.int64, -1))
+            valores = _columna(densidades, 'densidad')[ok]
+            self.densidad[pos[ok]] = np.where(valores > 0, valores, KG_MS_CM_HA)
+
+        self.factores = factores_clima(clima, self.hoy, self.dias)
+        self._simular()
+        self.segundos = time.perf_counter() - inicio
+
+    def _simular(self):
+        b = self.balance
+        self.simulados = b.con_datos_potrero
+        # kg MS/día con factor de clima 1 y techo de cada potrero (todos los potreros)
+        self.crecimiento_diario = self.tasa * self.densidad * b.hectareas
+        self.maximo = np.fmax(MS_MAXIMA_HA * b.hectareas, b.ms_disponible_potrero)
+
+        crecimiento_base = self.crecimiento_diario[self.simulados]
+        consumo = b.demanda_potrero[self.simulados]
+        maximo = self.maximo[self.simulados]
+
+        # Una fila por día: todos los potreros avanzan juntos
+        ms = np.empty((self.dias + 1, len(consumo)))
+        ms[0] = b.ms_disponible_potrero[self.simulados]
+        for t in range(self.dias):
+            ms[t + 1] = np.clip(ms[t] + crecimiento_base * self.factores[t] - consumo, 0, maximo)
+        self.ms = ms
+
+        # Primer día sin forraje (0 si no se agota dentro del horizonte)
+        agotado = (ms[1:] <= 0) & (consumo > 0)
+        self.dia_agotamiento = np.where(agotado.any(axis=0), agotado.argmax(axis=0) + 1, 0)
+
+    @classmethod
+    def cargar(cls, cursor, dias=90, finca_id=None):
+        """Leer balance actual, tasas de crecimiento, densidades y clima"""
+        balance = BalanceForrajero.cargar(cursor, finca_id=finca_id)
+
+        cursor.execute("""
+            SELECT potrero_id, AVG(tasa_crecimiento_diaria) as tasa
+            FROM recorridos
+            WHERE fecha >= DATE_SUB(CURDATE(), INTERVAL %s DAY)
+                AND tasa_crecimiento_diaria > 0
+            GROUP BY potrero_id
+        """, (DIAS_TASAS,))
+        tasas = cursor.fetchall()
+
+        cursor.execute("""
+            SELECT potrero_id, AVG(materia_seca / altura_pasto) as densidad
+            FROM aforos
+            WHERE fecha >= DATE_SUB(CURDATE(), INTERVAL %s DAY)
+                AND altura_pasto > 0 AND materia_seca > 0
+            GROUP BY potrero_id
+        """, (DIAS_DENSIDAD,))
+        densidades = cursor.fetchall()
+
+        cursor.execute("""
+            SELECT fecha, temperatura_promedio, lluvia
+            FROM clima
+            WHERE fecha >= DATE_SUB(CURDATE(), INTERVAL %s DAY)
+                AND fecha < DATE_ADD(CURDATE(), INTERVAL %s DAY)
+            ORDER BY fecha
+        """, (DIAS_CLIMA, dias))
+        clima = cursor.fetchall()
+
+        return cls(balance, tasas, densidades, clima, dias=dias)
+
+    def to_dict(self):
+        b = self.balance
+        indices = np.flatnonzero(self.simulados)
+        ms = self.ms.round(1)
+        fechas = [(self.hoy + timedelta(days=t)).isoformat() for t in range(self.dias + 1)]
+        potreros = []
+        for columna, (i, dia) in enumerate(zip(indices.tolist(), self.dia_agotamiento.tolist())):
+            potreros.append({
+                'potrero_id': int(b.potrero_ids[i]),
+                'potrero_nombre': b.potrero_nombres[i],
+                'hectareas': float(b.hectareas[i]),
+                'animales': int(b.animales_potrero[i]),
+                'consumo_diario': round(float(b.demanda_potrero[i]), 2),
+                'tasa_crecimiento_diaria': round(float(self.tasa[i]), 3),
+                'ms_inicial': float(ms[0, columna]),
+                'ms_final': float(ms[-1, columna]),
+                'dias_hasta_agotar': dia or None,
+                'fecha_agotamiento': fechas[dia] if dia else None,
+                'serie': ms[:, columna].tolist(),
+            })
+        potreros.sort(key=lambda p: (p['dias_hasta_agotar'] is None, p['dias_hasta_agotar'] or 0))
+        return {
+            'dias': self.dias,
+            'fechas': fechas,
+            'total_ms': ms.sum(axis=1).round(1).tolist(),
+            'factores_clima': self.factores.round(3).tolist(),
+            'potreros': potreros,
+            'potreros_sin_datos': int((~self.simulados).sum()),
+            'calculo_ms': round(self.segundos * 1000, 3),
+        }
@@ -0,0 +1,272 @@
+"""
+Plan de rotación: sugiere los movimientos de lotes entre potreros.
+
+Parte de ProyeccionForrajera (forraje actual, crecimiento diario y clima) y
+simula el horizonte día a día sobre arreglos NumPy:
+
+1. Todos los potreros crecen y los ocupados pierden el consumo de sus lotes.
+2. Un potrero ocupado que baja del residuo (``residuo_ha`` kg MS/ha) se
+   desocupa: cada lote va, de mayor a menor consumo, al potrero libre con más
+   forraje por encima del residuo entre los que superan ``entrada_ha`` y
+   cumplieron ``descanso_minimo`` días desde su última salida (asignación
+   voraz, un lote por potrero).
+3. Si no hay destino el lote se queda y el plan lo informa como alerta.
+
+Se guarda el estado al inicio de cada día. Cuando cambia el forraje de algunos
+potreros (un aforo nuevo o editado), ``replanificar`` retoma la simulación
+desde el primer día en que esos potreros pudieron influir en una decisión y
+conserva los movimientos anteriores.
+"""
+
+import copy
+import threading
+import time
+from datetime import date, timedelta
+
+import numpy as np
+
+from proyecto.models.models import ConfiguracionSistema
+from proyecto.utils.proyeccion import MS_MAXIMA_HA, ProyeccionForrajera
+
+RESIDUO_HA = 1500  # kg MS/ha a dejar al sacar los lotes
+ENTRADA_HA = 2500  # kg MS/ha mínimos para entrar a un potrero
+DESCANSO_MINIMO = 21  # días; se lee de dias_rotacion_promedio si está configurado
+SIN_SALIDA = -10 ** 6  # día de última salida de un potrero que ya descansó
+
+
+class PlanRotacion:
+    """Plan voraz de movimientos para el horizonte de una proyección"""
+
+    def __init__(self, proyeccion, residuo_ha=RESIDUO_HA, entrada_ha=ENTRADA_HA, descanso_minimo=DESCANSO_MINIMO):
+        inicio = time.perf_counter()
+        b = proyeccion.balance
+        self.hoy = proyeccion.hoy
+        self.dias = proyeccion.dias
+        self.factores = proyeccion.factores
+        self.residuo_ha = residuo_ha
+        self.entrada_ha = entrada_ha
+        self.descanso_minimo = descanso_minimo
+
+        self.potrero_ids = b.potrero_ids
+        self.potrero_nombres = b.potrero_nombres
+        self.hectareas = b.hectareas
+        self.crecimiento = proyeccion.crecimiento_diario
+        self.maximo = np.nan_to_num(proyeccion.maximo)
+        self.validos = b.con_datos_potrero
+        self.ms_inicial = np.where(self.validos, np.nan_to_num(b.ms_disponible_potrero), 0.0)
+        self.residuo = residuo_ha * self.hectareas
+        self.entrada = entrada_ha * self.hectareas
+
+        # Sólo se planifican los lotes que están en un potrero con aforo reciente
+        self.lote_ids = b.lote_ids
+        self.lote_nombres = b.lote_nombres
+        self.consumo = b.consumo
+        self.ubicacion_inicial = np.where(b.con_potrero & b.validos, b.potrero_de_lote, -1)
+        self.lotes_sin_datos = int((b.con_potrero & ~b.validos).sum())
+
+        n_potreros, n_lotes = len(self.potrero_ids), len(self.lote_ids)
+        self.hist_ms = np.zeros((self.dias + 1, n_potreros))
+        self.hist_ubicacion = np.full((self.dias + 1, n_lotes), -1, dtype=np.int64)
+        self.hist_salida = np.full((self.dias + 1, n_potreros), SIN_SALIDA, dtype=np.int64)
+        self.decisiones = np.zeros(self.dias, dtype=bool)  # días en que algún lote debió moverse
+        # Menor sobrante elegido cada día de decisión (-inf si un lote quedó sin destino)
+        self.umbral = np.full(self.dias, np.inf)
+        self.movimientos = []  # (día, lote, origen, destino, kg MS/ha del destino)
+        self.sin_destino = []  # (día, lote)
+
+        self._simular(0, self.ms_inicial.copy(), self.ubicacion_inicial.copy(),
+                      np.full(n_potreros, SIN_SALIDA, dtype=np.int64))
+        self.dia_replan = 0
+        self.segundos = time.perf_counter() - inicio
+
+    def _simular(self, desde, ms, ubicacion, salida):
+        n_potreros = len(self.potrero_ids)
+        for t in range(desde, self.dias):
+            self.hist_ms[t], self.hist_ubicacion[t], self.hist_salida[t] = ms, ubicacion, salida
+            ubicados = ubicacion >= 0
+            consumo = np.bincount(ubicacion[ubicados], weights=self.consumo[ubicados], minlength=n_potreros)
+            ocupados = np.bincount(ubicacion[ubicados], minlength=n_potreros) > 0
+            ms = np.clip(ms + self.crecimiento * self.factores[t] - consumo, 0, self.maximo)
+
+            agotados = ocupados & (ms <= self.residuo)
+            self.decisiones[t] = agotados.any()
+            if not self.decisiones[t]:
+                continue
+
+            ubicacion, salida = ubicacion.copy(), salida.copy()
+            a_mover = np.flatnonzero(ubicados & agotados[np.maximum(ubicacion, 0)])
+            a_mover = a_mover[np.argsort(-self.consumo[a_mover], kind='stable')]
+            libres = self.validos & ~ocupados & (ms >= self.entrada) & (t - salida >= self.descanso_minimo)
+            sobrante = np.where(libres, ms - self.residuo, -np.inf)
+            for lote in a_mover.tolist():
+                destino = int(np.argmax(sobrante))
+                if not np.isfinite(sobrante[destino]):
+                    self.sin_destino.append((t, lote))
+                    self.umbral[t] = -np.inf
+                    continue
+                self.umbral[t] = min(self.umbral[t], sobrante[destino])
+                origen = int(ubicacion[lote])
+                ubicacion[lote] = destino
+                sobrante[destino] = -np.inf
+                self.movimientos.append((t, lote, origen, destino, float(ms[destino] / self.hectareas[destino])))
+            # Empieza el descanso de los potreros que quedaron vacíos
+            vacios = agotados & (np.bincount(ubicacion[ubicacion >= 0], minlength=n_potreros) == 0)
+            salida[vacios] = t
+        self.hist_ms[self.dias], self.hist_ubicacion[self.dias], self.hist_salida[self.dias] = ms, ubicacion, salida
+
+    def replanificar(self, cambios):
+        """
+        Rehacer el plan tras cambiar el forraje inicial de algunos potreros.
+        ``cambios``: {posición del potrero: nuevo kg MS total}. Devuelve el día
+        desde el que se volvió a simular.
+        """
+        inicio = time.perf_counter()
+        posiciones = np.array(sorted(cambios), dtype=np.int64)
+        nuevos = np.array([cambios[p] for p in posiciones.tolist()], dtype=np.float64)
+
+        self.maximo = self.maximo.copy()
+        self.maximo[posiciones] = np.fmax(MS_MAXIMA_HA * self.hectareas[posiciones], nuevos)
+
+        # Trayectoria de los potreros cambiados mientras nadie los ocupa
+        trayectoria = np.empty((self.dias + 1, len(posiciones)))
+        trayectoria[0] = nuevos
+        for t in range(self.dias):
+            trayectoria[t + 1] = np.clip(trayectoria[t] + self.crecimiento[posiciones] * self.factores[t],
+                                         0, self.maximo[posiciones])
+
+        # Un potrero influye desde que está ocupado, desde el primer día en que
+        # el plan anterior lo eligió o desde el primer día de decisión en que con
+        # el valor nuevo habría ganado a alguno de los destinos elegidos
+        if np.isin(posiciones, self.ubicacion_inicial).any():
+            desde = 0
+        else:
+            elegidos = [m[0] for m in self.movimientos if m[3] in cambios]
+            dias = np.flatnonzero(self.decisiones)
+            ms_nuevo = trayectoria[dias + 1]
+            descansados = dias[:, None] - self.hist_salida[dias][:, posiciones] >= self.descanso_minimo
+            gana = (ms_nuevo >= self.entrada[posiciones]) & descansados & self.validos[posiciones] & (
+                ms_nuevo - self.residuo[posiciones] >= self.umbral[dias][:, None])
+            influyen = gana.any(axis=1)
+            desde = min(
+                int(dias[influyen.argmax()]) if influyen.any() else self.dias,
+                min(elegidos, default=self.dias),
+            )
+
+        self.ms_inicial = self.ms_inicial.copy()
+        self.ms_inicial[posiciones] = nuevos
+        self.hist_ms[:desde + 1, posiciones] = trayectoria[:desde + 1]
+        self.movimientos = [m for m in self.movimientos if m[0] < desde]
+        self.sin_destino = [s for s in self.sin_destino if s[0] < desde]
+        self.decisiones[desde:] = False
+        self.umbral[desde:] = np.inf
+        if desde < self.dias:
+            self._simular(desde, self.hist_ms[desde].copy(), self.hist_ubicacion[desde].copy(),
+                          self.hist_salida[desde].copy())
+        self.dia_replan = desde
+        self.segundos = time.perf_counter() - inicio
+        return desde
+
+    def compatible(self, proyeccion, residuo_ha=RESIDUO_HA, entrada_ha=ENTRADA_HA, descanso_minimo=DESCANSO_MINIMO):
+        """True si la proyección sólo puede diferir en el forraje inicial de los potreros"""
+        b = proyeccion.balance
+        return (
+            self.hoy == proyeccion.hoy and self.dias == proyeccion.dias
+            and (self.residuo_ha, self.entrada_ha, self.descanso_minimo) == (residuo_ha, entrada_ha, descanso_minimo)
+            and np.array_equal(self.potrero_ids, b.potrero_ids) and np.array_equal(self.hectareas, b.hectareas)
+            and np.array_equal(self.lote_ids, b.lote_ids) and np.array_equal(self.consumo, b.consumo)
+            and np.array_equal(self.ubicacion_inicial, np.where(b.con_potrero & b.validos, b.potrero_de_lote, -1))
+            and np.array_equal(self.validos, b.con_datos_potrero)
+            and np.array_equal(self.crecimiento, proyeccion.crecimiento_diario)
+            and np.array_equal(self.factores, proyeccion.factores)
+        )
+
+    def cambios(self, proyeccion):
+        """{posición: kg MS} de los potreros cuyo forraje inicial cambió"""
+        nuevos = np.where(self.validos, np.nan_to_num(proyeccion.balance.ms_disponible_potrero), 0.0)
+        return {int(p): float(nuevos[p]) for p in np.flatnonzero(nuevos != self.ms_inicial)}
+
+    def _primer_sin_destino(self):
+        """Un lote sin destino se reintenta cada día: se informa sólo la primera vez"""
+        vistos = set()
+        for dia, lote in self.sin_destino:
+            if lote not in vistos:
+                vistos.add(lote)
+                yield dia, lote
+
+    def to_dict(self):
+        ms_ha = np.divide(self.hist_ms, self.hectareas, out=np.zeros_like(self.hist_ms), where=self.hectareas > 0)
+        validos = np.flatnonzero(self.validos)
+        ocupaciones = np.bincount([m[3] for m in self.movimientos], minlength=len(self.potrero_ids))
+        return {
+            'dias': self.dias,
+            'parametros': {
+                'residuo_ha': self.residuo_ha,
+                'entrada_ha': self.entrada_ha,
+                'descanso_minimo': self.descanso_minimo,
+            },
+            'movimientos': [{
+                'fecha': (self.hoy + timedelta(days=dia + 1)).isoformat(),
+                'lote_id': int(self.lote_ids[lote]),
+                'lote_nombre': self.lote_nombres[lote],
+                'origen_id': int(self.potrero_ids[origen]),
+                'origen_nombre': self.potrero_nombres[origen],
+                'destino_id': int(self.potrero_ids[destino]),
+                'destino_nombre': self.potrero_nombres[destino],
+                'ms_ha_destino': round(ms_destino, 1),
+            } for dia, lote, origen, destino, ms_destino in self.movimientos],
+            'potreros': [{
+                'potrero_id': int(self.potrero_ids[p]),
+                'potrero_nombre': self.potrero_nombres[p],
+                'ms_ha_inicial': round(float(ms_ha[0, p]), 1),
+                'ms_ha_minima': round(float(ms_ha[:, p].min()), 1),
+                'ms_ha_final': round(float(ms_ha[-1, p]), 1),
+                'ocupaciones': int(ocupaciones[p]),
+            } for p in validos.tolist()],
+            'alertas': [{
+                'fecha': (self.hoy + timedelta(days=dia + 1)).isoformat(),
+                'lote_id': int(self.lote_ids[lote]),
+                'lote_nombre': self.lote_nombres[lote],
+                'mensaje': f'Sin potrero con {self.entrada_ha} kg MS/ha y {self.descanso_minimo} días de descanso',
+            } for dia, lote in self._primer_sin_destino()],
+            'potreros_bajo_residuo': int((ms_ha[:, validos] < self.residuo_ha * 0.5).any(axis=0).sum()),
+            'lotes_sin_datos': self.lotes_sin_datos,
+            'dia_replan': self.dia_replan,
+            'calculo_ms': round(self.segundos * 1000, 3),
+        }
+
+
+# Último plan por (finca, horizonte, día): base de los re-planes incrementales
+_planes = {}
+_lock_planes = threading.Lock()
+MAX_PLANES = 32
+
+
+def planificar(cursor, dias=60, finca_id=None):
+    """
+    Plan de rotación con los datos actuales. Si sólo cambió el forraje de
+    algunos potreros desde el último plan del mismo día, se re-planifica desde
+    ese plan en lugar de simular todo el horizonte.
+    """
+    proyeccion = ProyeccionForrajera.cargar(cursor, dias=dias, finca_id=finca_id)
+    descanso = int(ConfiguracionSistema.get_numero('dias_rotacion_promedio', DESCANSO_MINIMO, cursor=cursor))
+    clave = (finca_id, proyeccion.dias, proyeccion.hoy)
+
+    with _lock_planes:
+        previo = _planes.get(clave)
+    if previo is not None and previo.compatible(proyeccion, descanso_minimo=descanso):
+        cambios = previo.cambios(proyeccion)
+        if not cambios:
+            return previo
+        plan = copy.deepcopy(previo)
+        plan.replanificar(cambios)
+    else:
+        plan = PlanRotacion(proyeccion, descanso_minimo=descanso)
+
+    with _lock_planes:
+        # Los planes de otros días ya no sirven
+        for vieja in [c for c in _planes if c[2] != date.today()]:
+            del _planes[vieja]
+        if len(_planes) >= MAX_PLANES:
+            _planes.pop(next(iter(_planes)))
+        _planes[clave] = plan
+    return plan
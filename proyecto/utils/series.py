@@ -0,0 +1,141 @@
+"""
+Reducción de series temporales para gráficos.
+
+Las APIs de gráficos aceptan ``max_points``: si una serie tiene más puntos, se
+eligen en el servidor los que conservan su forma y el payload queda acotado sin
+importar el rango pedido.
+
+- ``lttb``: Largest-Triangle-Three-Buckets. Un punto por bucket, el que forma el
+  triángulo de mayor área con el punto elegido antes y el promedio del bucket
+  siguiente. Sigue bien tendencias y picos aislados.
+- ``minmax``: mínimo y máximo de cada bucket. Conserva la envolvente completa
+  (útil para lluvia u otras series con picos).
+
+Los cálculos son vectorizados con NumPy; LTTB sólo recorre los buckets.
+"""
+
+import numpy as np
+
+METODOS = ('lttb', 'minmax')
+
+
+def _como_numeros(valores):
+    """Fechas (date o 'AAAA-MM-DD') o números a un arreglo float"""
+    if len(valores) and not isinstance(valores[0], (int, float, np.number)):
+        return np.array(valores, dtype='datetime64[D]').astype(np.float64)
+    return np.asarray(valores, dtype=np.float64)
+
+
+def indices_lttb(x, y, max_puntos):
+    """Índices (ordenados) de los puntos que LTTB conserva"""
+    x = _como_numeros(x)
+    y = np.nan_to_num(np.asarray(y, dtype=np.float64))
+    n = len(x)
+    if max_puntos >= n or max_puntos < 3:
+        return np.arange(n)
+
+    # Los puntos interiores se reparten en max_puntos - 2 buckets; el primero y
+    # el último se conservan siempre
+    bordes = np.linspace(1, n - 1, max_puntos - 1).astype(np.int64)
+    inicios, fines = bordes[:-1], bordes[1:]
+
+    # Promedio de cada bucket con sumas acumuladas (sin recorrerlos)
+    suma_x = np.concatenate(([0.0], np.cumsum(x)))
+    suma_y = np.concatenate(([0.0], np.cumsum(y)))
+    tamanos = fines - inicios
+    promedio_x = (suma_x[fines] - suma_x[inicios]) / tamanos
+    promedio_y = (suma_y[fines] - suma_y[inicios]) / tamanos
+    # Para cada bucket, el "siguiente" es el promedio del próximo (o el último punto)
+    siguiente_x = np.append(promedio_x[1:], x[-1])
+    siguiente_y = np.append(promedio_y[1:], y[-1])
+
+    seleccion = np.empty(max_puntos, dtype=np.int64)
+    seleccion[0], seleccion[-1] = 0, n - 1
+    anterior = 0
+    for i in range(max_puntos - 2):
+        s, e = inicios[i], fines[i]
+        ax, ay = x[anterior], y[anterior]
+        areas = np.abs((ax - siguiente_x[i]) * (y[s:e] - ay) - (ax - x[s:e]) * (siguiente_y[i] - ay))
+        anterior = s + int(np.argmax(areas))
+        seleccion[i + 1] = anterior
+    return seleccion
+
+
+def indices_minmax(y, max_puntos):
+    """Índices del mínimo y el máximo de cada bucket (más el primero y el último)"""
+    y = np.nan_to_num(np.asarray(y, dtype=np.float64))
+    n = len(y)
+    if max_puntos >= n or max_puntos < 4:
+        return np.arange(n)
+
+    buckets = (max_puntos - 2) // 2
+    bordes = np.linspace(0, n, buckets + 1).astype(np.int64)
+    # Ordenar por (bucket, valor): el primero de cada bucket es su mínimo y el último su máximo
+    bucket = np.repeat(np.arange(buckets), np.diff(bordes))
+    orden = np.lexsort((y, bucket))
+    minimos = orden[bordes[:-1]]
+    maximos = orden[bordes[1:] - 1]
+    return np.unique(np.concatenate(([0, n - 1], minimos, maximos)))
+
+
+def indices(x, y, max_puntos, metodo='lttb'):
+    if metodo == 'minmax':
+        return indices_minmax(y, max_puntos)
+    return indices_lttb(x, y, max_puntos)
+
+
+def _posiciones_por_grupo(grupos):
+    posiciones = {}
+    for i, grupo in enumerate(grupos):
+        posiciones.setdefault(grupo, []).append(i)
+    return posiciones.values()
+
+
+def reducir_columnas(datos, max_puntos, x, y, grupo=None, metodo='lttb'):
+    """
+    Reducir un dict de listas alineadas ({'fechas': [...], 'valores': [...], ...})
+    a como máximo ``max_puntos`` por serie. Los índices se eligen con la columna
+    ``y`` y se aplican a todas las listas de igual longitud. Con ``grupo`` (otra
+    columna, p. ej. el potrero) cada grupo se reduce por separado.
+    """
+    n = len(datos[x])
+    if not max_puntos or n <= max_puntos:
+        return datos
+
+    if grupo is None:
+        elegidos = indices(datos[x], datos[y], max_puntos, metodo)
+    else:
+        partes = []
+        for posiciones in _posiciones_por_grupo(datos[grupo]):
+            posiciones = np.asarray(posiciones)
+            locales = indices([datos[x][i] for i in posiciones], [datos[y][i] for i in posiciones],
+                              max_puntos, metodo)
+            partes.append(posiciones[locales])
+        elegidos = np.sort(np.concatenate(partes))
+
+    return {
+        clave: [valores[i] for i in elegidos] if isinstance(valores, list) and len(valores) == n else valores
+        for clave, valores in datos.items()
+    }
+
+
+def reducir_filas(filas, max_puntos, x, y, grupo=None, metodo='lttb'):
+    """Como reducir_columnas, para una lista de dicts (una fila por punto)"""
+    if not max_puntos or len(filas) <= max_puntos:
+        return filas
+    columnas = {x: [f[x] for f in filas], y: [f[y] for f in filas], '_i': list(range(len(filas)))}
+    if grupo is not None:
+        columnas[grupo] = [f[grupo] for f in filas]
+    reducidas = reducir_columnas(columnas, max_puntos, x, y, grupo, metodo)
+    return [filas[i] for i in reducidas['_i']]
+
+
+def leer_max_puntos(valor, defecto):
+    """max_points pedido por el cliente: entero >= 3, 0 para no reducir, defecto si falta o es inválido"""
+    if valor in (None, ''):
+        return defecto
+    try:
+        valor = int(valor)
+    except (TypeError, ValueError):
+        return defecto
+    return 0 if valor <= 0 else max(valor, 3)
@@ -0,0 +1,166 @@
+"""
+Tareas que ejecuta el worker de la cola (ver proyecto/utils/trabajos.py).
+
+Cada tarea recibe ``(parametros, avance)`` dentro de un contexto de aplicación
+y devuelve un dict que queda como resultado del trabajo.
+"""
+
+import gzip
+import tempfile
+from datetime import datetime
+
+from flask import current_app, jsonify, url_for
+from flask_login import current_user
+
+from proyecto.models.models import PH, Actividad, Aforo, Clima, Potrero, Recorrido
+from proyecto.utils.auditoria import mantener_particiones
+from proyecto.utils.cache import incrementar_version
+from proyecto.utils.exportacion import filas_csv
+from proyecto.utils.trabajos import Cola, clave_por_defecto, tarea
+
+# módulo -> (consulta de exportación, filtros que acepta)
+EXPORTACIONES = {
+    'aforos': (Aforo.get_export_query, ('fecha_inicio', 'fecha_fin', 'potrero_id')),
+    'ph': (PH.get_export_query, ('fecha_inicio', 'fecha_fin', 'potrero_id')),
+    'actividades': (Actividad.get_export_query,
+                    ('fecha_inicio', 'fecha_fin', 'potrero_id', 'tipo_actividad', 'estado')),
+    'clima': (Clima.get_export_query, ('fecha_inicio', 'fecha_fin')),
+    'recorridos': (Recorrido.get_export_query, ('fecha_inicio', 'fecha_fin', 'potrero_id')),
+}
+
+
+def _mysql():
+    from db import mysql
+    return mysql
+
+
+@tarea('resumen_potreros')
+def resumen_potreros(parametros, avance):
+    """Reconstruir potrero_resumen (de un potrero, de una lista o de todos)"""
+    mysql = _mysql()
+    cursor = mysql.connection.cursor()
+    try:
+        Potrero.refrescar_resumen(parametros.get('potrero_id'), cursor=cursor)
+        incrementar_version(cursor, 'potreros', 'aforos')
+        mysql.connection.commit()
+    finally:
+        cursor.close()
+    return {'potrero_id': parametros.get('potrero_id')}
+
+
+@tarea('tasas_crecimiento')
+def tasas_crecimiento(parametros, avance):
+    """Recalcular las tasas de crecimiento de los recorridos"""
+    desde = parametros.get('desde')
+    filas = Recorrido.recompute_growth_rates(
+        parametros.get('potrero_id'),
+        since=datetime.strptime(desde, '%Y-%m-%d').date() if desde else None,
+    )
+    return {'recorridos_modificados': filas}
+
+
+@tarea('rollups_clima')
+def rollups_clima(parametros, avance):
+    """Reconstruir los rollups mensual y semanal de clima"""
+    return Clima.reconstruir_rollups()
+
+
+@tarea('auditoria_retencion')
+def auditoria_retencion(parametros, avance):
+    """Crear las particiones mensuales de audit_log y eliminar las vencidas"""
+    meses = parametros.get('meses', current_app.config['AUDITORIA_RETENCION_MESES'])
+    return mantener_particiones(_mysql().connection, meses)
+
+
+@tarea('exportar_csv')
+def exportar_csv(parametros, avance):
+    """
+    Generar la exportación CSV de un módulo y guardarla comprimida en
+    trabajos_archivos: la web la descarga desde la base aunque el worker corra
+    en otro servicio sin disco compartido.
+    """
+    modulo = parametros['modulo']
+    consulta, admitidos = EXPORTACIONES[modulo]
+    query, params = consulta(**{k: v for k, v in parametros.get('filtros', {}).items() if k in admitidos})
+
+    mysql = _mysql()
+    cursor = mysql.connection.cursor()
+    try:
+        cursor.execute(f"SELECT COUNT(*) as total FROM ({query}) t", tuple(params))
+        total = cursor.fetchone()['total']
+    finally:
+        cursor.close()
+
+    nombre = f"{modulo}_{datetime.now():%Y%m%d}.csv"
+    escritas = 0
+    # El CSV se comprime mientras se genera, en un archivo temporal del worker
+    with tempfile.TemporaryFile() as temporal:
+        with gzip.GzipFile(fileobj=temporal, mode='wb') as salida:
+            for bloque in filas_csv(mysql.cursor_sin_buffer(), query, params):
+                salida.write(bloque.encode('utf-8'))
+                escritas += bloque.count('\n')
+                if total:
+                    avance(min(99, escritas * 100 // (total + 1)), f"{min(escritas - 1, total)} de {total} filas")
+        temporal.seek(0)
+        contenido = temporal.read()
+
+    cursor = mysql.connection.cursor()
+    try:
+        cursor.execute("""
+            INSERT INTO trabajos_archivos (trabajo_id, nombre, contenido) VALUES (%s, %s, %s)
+            ON DUPLICATE KEY UPDATE nombre = VALUES(nombre), contenido = VALUES(contenido)
+        """, (avance.trabajo_id, nombre, contenido))
+        mysql.connection.commit()
+    finally:
+        cursor.close()
+    return {'nombre': nombre, 'filas': total, 'bytes_comprimidos': len(contenido)}
+
+
+def archivo_exportacion(trabajo_id):
+    """(nombre, CSV en bytes) de una exportación terminada, o None"""
+    mysql = _mysql()
+    cursor = mysql.connection.cursor()
+    try:
+        cursor.execute("SELECT nombre, contenido FROM trabajos_archivos WHERE trabajo_id = %s", (trabajo_id,))
+        fila = cursor.fetchone()
+    finally:
+        cursor.close()
+    if fila is None:
+        return None
+    return fila['nombre'], gzip.decompress(fila['contenido'])
+
+
+def encolar_recalculo(tipo, parametros, cursor):
+    """
+    Encolar un recálculo de campos derivados dentro de la transacción de la
+    escritura que lo origina: el trabajo existe sólo si ésta se confirma.
+    Las ediciones seguidas se juntan en un solo trabajo pendiente:
+    - resumen_potreros: ``potrero_id`` es una lista de ids; se ordena y sin
+      repetidos, así los mismos potreros dan siempre la misma clave.
+    - tasas_crecimiento: la clave es el potrero y el pendiente conserva la
+      fecha ``desde`` más antigua.
+    """
+    clave = conservar_minimo = None
+    if tipo == 'resumen_potreros':
+        parametros = {**parametros, 'potrero_id': sorted({int(i) for i in parametros['potrero_id']})}
+    elif tipo == 'tasas_crecimiento':
+        clave = clave_por_defecto(tipo, {'potrero_id': parametros['potrero_id']})
+        conservar_minimo = 'desde'
+    return Cola(_mysql()).encolar(tipo, parametros, clave=clave, cursor=cursor, conservar_minimo=conservar_minimo)
+
+
+def encolar_exportacion(modulo, filtros):
+    """Encolar la exportación de un módulo y responder 202 con la URL de seguimiento"""
+    filtros = {k: v for k, v in filtros.items() if v not in (None, '')}
+    parametros = {'modulo': modulo, 'filtros': filtros}
+    usuario_id = int(current_user.id) if current_user.is_authenticated else None
+    # El archivo sólo lo descarga quien lo pidió: la deduplicación es por usuario
+    trabajo_id = Cola(_mysql()).encolar(
+        'exportar_csv', parametros, usuario_id=usuario_id,
+        clave=clave_por_defecto('exportar_csv', {**parametros, 'usuario_id': usuario_id}),
+    )
+    return jsonify({
+        'success': True,
+        'trabajo_id': trabajo_id,
+        'estado_url': url_for('trabajos.estado', trabajo_id=trabajo_id),
+    }), 202
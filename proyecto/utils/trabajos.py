@@ -0,0 +1,366 @@
+"""
+Cola de trabajos en segundo plano sobre la tabla ``trabajos`` (MySQL).
+
+Las rutas encolan recálculos y exportaciones largas y responden enseguida con
+el id del trabajo; un proceso aparte (``flask trabajos-worker``) los ejecuta y
+el cliente consulta el avance en ``/jobs/<id>``.
+
+- Deduplicación: un trabajo pendiente con la misma ``clave`` absorbe a los
+  nuevos (índice único sobre la columna generada clave_pendiente). Mientras uno
+  se ejecuta se puede encolar otro igual, que verá los datos más recientes.
+- Los workers toman trabajos con ``FOR UPDATE SKIP LOCKED``: varios procesos
+  no se bloquean entre sí ni toman el mismo trabajo.
+- Reintentos con espera exponencial hasta ``max_intentos``; los trabajos de un
+  worker que murió se recuperan por antigüedad de su último latido.
+- Las tareas se registran con ``@tarea('nombre')`` y reciben
+  ``(parametros, avance)``; ``avance(porcentaje, mensaje)`` publica el progreso
+  y ``avance.trabajo_id`` identifica el trabajo.
+- Los archivos generados (exportaciones) se guardan en ``trabajos_archivos``, no
+  en disco: el worker puede ser otro servicio sin almacenamiento compartido.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import signal
+import socket
+import time
+
+logger = logging.getLogger(__name__)
+
+ESTADOS = ('pendiente', 'en_proceso', 'completado', 'error')
+MAX_INTENTOS = 3
+ESPERA_REINTENTO = 30  # segundos; se duplica en cada intento
+INTERVALO_AVANCE = 1.0  # segundos mínimos entre escrituras de progreso
+
+# nombre -> función(parametros, avance) que devuelve un resultado serializable a JSON
+TAREAS = {}
+
+
+class TareaDesconocida(ValueError):
+    """El tipo de trabajo no tiene una tarea registrada"""
+
+
+def tarea(nombre):
+    """Registrar una función como tarea ejecutable por los workers"""
+    def decorador(funcion):
+        TAREAS[nombre] = funcion
+        return funcion
+    return decorador
+
+
+def clave_por_defecto(tipo, parametros):
+    """Mismo tipo y mismos parámetros: mismo trabajo"""
+    firma = json.dumps([tipo, parametros], sort_keys=True, default=str)
+    return f"{tipo}:{hashlib.sha1(firma.encode()).hexdigest()}"
+
+
+def _como_dict(trabajo):
+    if trabajo is None:
+        return None
+    datos = dict(trabajo)
+    for campo in ('parametros', 'resultado'):
+        if isinstance(datos.get(campo), str):
+            datos[campo] = json.loads(datos[campo])
+    for campo in ('creado_en', 'iniciado_en', 'terminado_en', 'actualizado_en', 'disponible_en'):
+        if hasattr(datos.get(campo), 'isoformat'):
+            datos[campo] = datos[campo].isoformat()
+    return datos
+
+
+class Cola:
+    """Operaciones sobre la tabla trabajos. ``mysql`` es la extensión PooledMySQL"""
+
+    def __init__(self, mysql):
+        self.mysql = mysql
+
+    def encolar(self, tipo, parametros=None, clave=None, usuario_id=None, max_intentos=MAX_INTENTOS, cursor=None,
+                conservar_minimo=None):
+        """
+        Encolar un trabajo y devolver su id. Si ya hay uno pendiente con la misma
+        clave se devuelve el id de ése (no se duplica el trabajo). Con
+        ``conservar_minimo`` (un parámetro con fecha ISO) el pendiente se queda
+        con el menor valor de ese parámetro entre el suyo y el nuevo.
+        """
+        if tipo not in TAREAS:
+            raise TareaDesconocida(f"Tarea no registrada: {tipo}")
+        parametros = parametros or {}
+        clave = clave or clave_por_defecto(tipo, parametros)
+
+        fusion, params = "", [tipo, clave, json.dumps(parametros, default=str), usuario_id, max_intentos]
+        if conservar_minimo:
+            ruta = f'$.{conservar_minimo}'
+            fusion = """,
+                parametros = IF(COALESCE(JSON_UNQUOTE(JSON_EXTRACT(VALUES(parametros), %s)), '')
+                                < COALESCE(JSON_UNQUOTE(JSON_EXTRACT(parametros, %s)), ''),
+                                VALUES(parametros), parametros)"""
+            params += [ruta, ruta]
+
+        propio = cursor is None
+        if propio:
+            cursor = self.mysql.connection.cursor()
+        try:
+            # LAST_INSERT_ID(id) hace que lastrowid sea el id del pendiente existente
+            cursor.execute(f"""
+                INSERT INTO trabajos (tipo, clave, parametros, usuario_id, max_intentos)
+                VALUES (%s, %s, %s, %s, %s)
+                ON DUPLICATE KEY UPDATE id = LAST_INSERT_ID(id){fusion}
+            """, tuple(params))
+            trabajo_id = cursor.lastrowid
+            if propio:
+                self.mysql.connection.commit()
+            return trabajo_id
+        finally:
+            if propio:
+                cursor.close()
+
+    def obtener(self, trabajo_id):
+        cursor = self.mysql.connection.cursor()
+        try:
+            cursor.execute("""
+                SELECT id, tipo, clave, parametros, estado, progreso, mensaje, resultado, error,
+                       intentos, max_intentos, usuario_id, creado_en, iniciado_en, terminado_en,
+                       actualizado_en, disponible_en
+                FROM trabajos WHERE id = %s
+            """, (trabajo_id,))
+            return _como_dict(cursor.fetchone())
+        finally:
+            cursor.close()
+
+    # --- Operaciones del worker: cada una en su propia transacción corta ---
+
+    def tomar(self, conexion, worker, tipos=None):
+        """Reservar el próximo trabajo disponible o devolver None"""
+        condicion, params = "", []
+        if tipos:
+            condicion = f" AND tipo IN ({', '.join(['%s'] * len(tipos))})"
+            params = list(tipos)
+        cursor = conexion.cursor()
+        try:
+            cursor.execute(f"""
+                SELECT id, tipo, parametros, intentos, max_intentos
+                FROM trabajos
+                WHERE estado = 'pendiente' AND disponible_en <= NOW(){condicion}
+                ORDER BY id
+                LIMIT 1
+                FOR UPDATE SKIP LOCKED
+            """, tuple(params))
+            trabajo = cursor.fetchone()
+            if trabajo is None:
+                conexion.commit()
+                return None
+            cursor.execute("""
+                UPDATE trabajos
+                SET estado = 'en_proceso', intentos = intentos + 1, worker = %s, progreso = 0,
+                    mensaje = NULL, iniciado_en = NOW(), actualizado_en = NOW()
+                WHERE id = %s
+            """, (worker, trabajo['id']))
+            conexion.commit()
+            trabajo = _como_dict(trabajo)
+            trabajo['intentos'] += 1
+            return trabajo
+        except Exception:
+            conexion.rollback()
+            raise
+        finally:
+            cursor.close()
+
+    def avance(self, conexion, trabajo_id, progreso, mensaje=None):
+        cursor = conexion.cursor()
+        try:
+            cursor.execute("""
+                UPDATE trabajos SET progreso = %s, mensaje = COALESCE(%s, mensaje), actualizado_en = NOW()
+                WHERE id = %s AND estado = 'en_proceso'
+            """, (max(0, min(int(progreso), 100)), mensaje, trabajo_id))
+            conexion.commit()
+        finally:
+            cursor.close()
+
+    def completar(self, conexion, trabajo_id, resultado=None):
+        cursor = conexion.cursor()
+        try:
+            cursor.execute("""
+                UPDATE trabajos
+                SET estado = 'completado', progreso = 100, resultado = %s, error = NULL,
+                    terminado_en = NOW(), actualizado_en = NOW()
+                WHERE id = %s
+            """, (json.dumps(resultado, default=str), trabajo_id))
+            conexion.commit()
+        finally:
+            cursor.close()
+
+    def fallar(self, conexion, trabajo, error):
+        """Reprogramar con espera exponencial o marcar como error si no quedan intentos"""
+        cursor = conexion.cursor()
+        try:
+            reintentar = trabajo['intentos'] < trabajo['max_intentos']
+            if reintentar:
+                # Si ya se encoló otro igual, ése hará el trabajo
+                cursor.execute("SELECT id FROM trabajos WHERE clave_pendiente = %s",
+                               (trabajo.get('clave') or self._clave(cursor, trabajo['id']),))
+                otro = cursor.fetchone()
+                if otro:
+                    reintentar = False
+                    error = f"{error} (reintento absorbido por el trabajo #{otro['id']})"
+            if reintentar:
+                espera = ESPERA_REINTENTO * 2 ** (trabajo['intentos'] - 1)
+                cursor.execute("""
+                    UPDATE trabajos
+                    SET estado = 'pendiente', error = %s, worker = NULL, actualizado_en = NOW(),
+                        disponible_en = DATE_ADD(NOW(), INTERVAL %s SECOND)
+                    WHERE id = %s
+                """, (str(error)[:2000], espera, trabajo['id']))
+            else:
+                cursor.execute("""
+                    UPDATE trabajos
+                    SET estado = 'error', error = %s, terminado_en = NOW(), actualizado_en = NOW()
+                    WHERE id = %s
+                """, (str(error)[:2000], trabajo['id']))
+            conexion.commit()
+            return reintentar
+        finally:
+            cursor.close()
+
+    @staticmethod
+    def _clave(cursor, trabajo_id):
+        cursor.execute("SELECT clave FROM trabajos WHERE id = %s", (trabajo_id,))
+        fila = cursor.fetchone()
+        return fila['clave'] if fila else None
+
+    def rescatar(self, conexion, segundos):
+        """Devolver a la cola (o dar por fallidos) los trabajos sin latido hace ``segundos``"""
+        cursor = conexion.cursor()
+        try:
+            cursor.execute("""
+                SELECT id, clave, intentos, max_intentos FROM trabajos
+                WHERE estado = 'en_proceso' AND actualizado_en < DATE_SUB(NOW(), INTERVAL %s SECOND)
+            """, (segundos,))
+            colgados = cursor.fetchall()
+            conexion.commit()
+        finally:
+            cursor.close()
+        for trabajo in colgados:
+            self.fallar(conexion, trabajo, f"Sin señales del worker durante {segundos} s")
+        return len(colgados)
+
+    def purgar(self, conexion, dias):
+        """Borrar trabajos terminados hace más de ``dias`` días (y sus archivos, por cascada)"""
+        cursor = conexion.cursor()
+        try:
+            cursor.execute("""
+                SELECT id, resultado FROM trabajos
+                WHERE estado IN ('completado', 'error') AND terminado_en < DATE_SUB(NOW(), INTERVAL %s DAY)
+            """, (dias,))
+            viejos = [_como_dict(t) for t in cursor.fetchall()]
+            if viejos:
+                marcadores = ', '.join(['%s'] * len(viejos))
+                cursor.execute(f"DELETE FROM trabajos WHERE id IN ({marcadores})", tuple(t['id'] for t in viejos))
+            conexion.commit()
+            return viejos
+        finally:
+            cursor.close()
+
+
+class Avance:
+    """Callable que recibe cada tarea para informar su progreso (con escrituras espaciadas)"""
+
+    def __init__(self, cola, conexion, trabajo_id):
+        self.cola = cola
+        self.conexion = conexion
+        self.trabajo_id = trabajo_id
+        self._ultimo = 0.0
+
+    def __call__(self, progreso, mensaje=None):
+        ahora = time.monotonic()
+        if ahora - self._ultimo < INTERVALO_AVANCE and progreso < 100:
+            return
+        self._ultimo = ahora
+        try:
+            self.cola.avance(self.conexion, self.trabajo_id, progreso, mensaje)
+        except Exception as e:
+            logger.warning(f"No se pudo registrar el avance del trabajo {self.trabajo_id}: {e}")
+
+
+class Worker:
+    """
+    Bucle que toma y ejecuta trabajos. Las tareas usan ``mysql.connection`` en
+    un contexto de aplicación propio por trabajo; el worker reserva además una
+    conexión de control para tomar trabajos y publicar el avance sin mezclarlo
+    con la transacción de la tarea.
+    """
+
+    def __init__(self, app, mysql, tipos=None, intervalo=2.0, timeout=1800, retencion_dias=7):
+        self.app = app
+        self.mysql = mysql
+        self.cola = Cola(mysql)
+        self.tipos = tipos
+        self.intervalo = intervalo
+        self.timeout = timeout
+        self.retencion_dias = retencion_dias
+        self.nombre = f"{socket.gethostname()}:{os.getpid()}"
+        self.detener = False
+        self._mantenimiento = 0.0
+
+    def _senal(self, numero, frame):
+        logger.info(f"Worker {self.nombre}: señal {numero}, se detiene al terminar el trabajo actual")
+        self.detener = True
+
+    def ejecutar(self, una_vez=False):
+        """Procesar trabajos hasta recibir SIGTERM/SIGINT (o vaciar la cola con ``una_vez``)"""
+        signal.signal(signal.SIGTERM, self._senal)
+        signal.signal(signal.SIGINT, self._senal)
+        procesados = 0
+        with self.app.app_context():
+            conexion = self.mysql.pool.acquire()
+        try:
+            while not self.detener:
+                self._mantener(conexion)
+                trabajo = self.cola.tomar(conexion, self.nombre, self.tipos)
+                if trabajo is None:
+                    if una_vez:
+                        break
+                    time.sleep(self.intervalo)
+                    continue
+                self.procesar(conexion, trabajo)
+                procesados += 1
+        finally:
+            self.mysql.pool.release(conexion)
+        return procesados
+
+    def procesar(self, conexion, trabajo):
+        funcion = TAREAS.get(trabajo['tipo'])
+        inicio = time.perf_counter()
+        with self.app.app_context():
+            try:
+                if funcion is None:
+                    raise TareaDesconocida(f"Tarea no registrada: {trabajo['tipo']}")
+                resultado = funcion(trabajo['parametros'] or {}, Avance(self.cola, conexion, trabajo['id']))
+            except Exception as e:
+                try:
+                    self.mysql.connection.rollback()
+                except Exception:
+                    pass
+                reintenta = self.cola.fallar(conexion, trabajo, f"{type(e).__name__}: {e}")
+                logger.error(f"Trabajo {trabajo['id']} ({trabajo['tipo']}) falló en el intento "
+                             f"{trabajo['intentos']}{', se reintentará' if reintenta else ''}: {e}")
+                return False
+        self.cola.completar(conexion, trabajo['id'], resultado)
+        logger.info(f"Trabajo {trabajo['id']} ({trabajo['tipo']}) completado en {time.perf_counter() - inicio:.1f} s")
+        return True
+
+    def _mantener(self, conexion):
+        """Cada minuto: rescatar trabajos colgados y purgar los viejos"""
+        ahora = time.monotonic()
+        if ahora - self._mantenimiento < 60:
+            return
+        self._mantenimiento = ahora
+        try:
+            rescatados = self.cola.rescatar(conexion, self.timeout)
+            if rescatados:
+                logger.warning(f"{rescatados} trabajo(s) sin worker devueltos a la cola")
+            purgados = self.cola.purgar(conexion, self.retencion_dias)
+            if purgados:
+                logger.info(f"{len(purgados)} trabajo(s) terminados purgados")
+        except Exception as e:
+            logger.warning(f"Error en el mantenimiento de la cola: {e}")
@@ -4,6 +4,7 @@ Script de inicio para el Sistema de Gestión de Pastoreo
 Ejecuta la aplicación Flask con configuración de desarrollo
 """
 
+import importlib.util
 import os
 import sys
 from pathlib import Path
@@ -32,9 +33,12 @@ print("=" * 50)
 # Verificar que las dependencias estén instaladas
 try:
     import flask
-    import flask_mysqldb
     import flask_login
     import flask_session
+    # Driver de MySQL del pool (mysqlclient por defecto, PyMySQL con MYSQL_DRIVER=pymysql)
+    driver = 'pymysql' if os.getenv('MYSQL_DRIVER') == 'pymysql' else 'MySQLdb'
+    if importlib.util.find_spec(driver) is None:
+        raise ImportError(f"No module named '{driver}'")
     print("Dependencias verificadas")
 except ImportError as e:
     print(f"Error: Falta instalar dependencias: {e}")
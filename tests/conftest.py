@@ -29,4 +29,13 @@ def client(app):
 @pytest.fixture
 def runner(app):
     """Create a test CLI runner."""
-    return app.test_cli_runner()
\ No newline at end of file
+    return app.test_cli_runner()
+
+@pytest.fixture
+def models_mysql(monkeypatch):
+    """Replace the models' MySQL connection with a MagicMock (no cache version bumps)."""
+    from proyecto.models import models
+    mysql = MagicMock()
+    monkeypatch.setattr(models, 'mysql', mysql)
+    monkeypatch.setattr(models, 'incrementar_version', MagicMock())
+    return mysql
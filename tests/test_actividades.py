@@ -0,0 +1,24 @@
+"""Actividades status count tests"""
+import pytest
+
+from proyecto.models.models import Actividad
+
+
+@pytest.mark.unit
+def test_stats_group_by_state_with_the_listing_filters(models_mysql):
+    cursor = models_mysql.connection.cursor.return_value
+    cursor.fetchall.return_value = [{'estado': 'Pendiente', 'total': 3}, {'estado': 'Completada', 'total': 5}]
+    cursor.fetchone.return_value = {'total': 8}
+    filtros = dict(fecha_inicio='2026-10-01', fecha_fin='2026-10-31', potrero_id=4, tipo_actividad='Riego')
+
+    stats = Actividad.get_stats(**filtros)
+    sql, params = cursor.execute.call_args[0]
+    assert cursor.execute.call_count == 1 and sql.endswith(' GROUP BY a.estado')
+    assert stats == {'pendientes': 3, 'en_progreso': 0, 'completadas': 5, 'total': 8}
+
+    cursor.execute.reset_mock()
+    Actividad.get_all(**filtros)
+    conteo_sql, conteo_params = cursor.execute.call_args_list[1][0]
+    # Mismas condiciones y parámetros que el conteo del listado
+    assert params == conteo_params == ('2026-10-01', '2026-10-31', 4, 'Riego')
+    assert sql.split('WHERE 1=1')[1].split(' GROUP BY')[0] == conteo_sql.split('WHERE 1=1')[1]
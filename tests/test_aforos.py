@@ -0,0 +1,78 @@
+"""Aforo write path tests"""
+from datetime import date
+from decimal import Decimal
+from unittest.mock import MagicMock
+
+import pytest
+
+from proyecto.models import models
+from proyecto.models.models import Aforo
+
+
+@pytest.fixture
+def refrescar_resumen(monkeypatch):
+    monkeypatch.setattr(models, 'contadores', MagicMock())
+    refrescar = MagicMock()
+    monkeypatch.setattr(models.Potrero, 'refrescar_resumen', refrescar)
+    return refrescar
+
+
+@pytest.mark.unit
+def test_create_computes_rotation_in_a_single_insert_select(models_mysql, refrescar_resumen):
+    cursor = models_mysql.connection.cursor.return_value
+    cursor.rowcount = 1
+    cursor.lastrowid = 77
+
+    assert Aforo.create(3, date(2026, 10, 18), 2.5, 20, 0.5, observaciones='ok') == 77
+    cursor.execute.assert_called_once()
+    sql, params = cursor.execute.call_args[0]
+    assert sql.split()[:3] == ['INSERT', 'INTO', 'aforos'] and 'SELECT' in sql
+    # dias_rotacion (None: lo calcula el servidor), fecha del aforo anterior y potrero
+    assert params[11:] == (None, date(2026, 10, 18), date(2026, 10, 18), 3, 3)
+    refrescar_resumen.assert_called_once_with(3, cursor)
+    models_mysql.connection.commit.assert_called_once()
+
+
+@pytest.mark.unit
+def test_create_for_a_missing_potrero_writes_nothing(models_mysql, refrescar_resumen):
+    cursor = models_mysql.connection.cursor.return_value
+    cursor.rowcount = 0
+
+    assert Aforo.create(99, date(2026, 10, 18), 2.5, 20, 0.5) is None
+    refrescar_resumen.assert_not_called()
+    models_mysql.connection.commit.assert_not_called()
+
+
+@pytest.mark.unit
+def test_prepared_rows_chain_rotation_through_the_batch():
+    cursor = MagicMock()
+    cursor.fetchall.return_value = [
+        {'potrero_id': 1, 'hectareas': Decimal('2.0'), 'fecha': date(2026, 9, 1), 'dias_rotacion': 0},
+        {'potrero_id': 1, 'hectareas': Decimal('2.0'), 'fecha': date(2026, 9, 21), 'dias_rotacion': 20},
+        {'potrero_id': 2, 'hectareas': Decimal('5.0'), 'fecha': None, 'dias_rotacion': None},
+    ]
+    aforos = [
+        {'potrero_id': 1, 'fecha': '2026-10-21', 'materia_verde': 2, 'porcentaje_ms': 20, 'materia_seca': 0.4},
+        {'potrero_id': '1', 'fecha': date(2026, 10, 11), 'materia_verde': 3, 'porcentaje_ms': 20, 'materia_seca': 0.6},
+        {'potrero_id': 2, 'fecha': date(2026, 10, 1), 'materia_verde': 1, 'porcentaje_ms': 20, 'materia_seca': 0.2},
+    ]
+
+    filas, potrero_ids = Aforo.preparar_filas(cursor, aforos)
+    cursor.execute.assert_called_once()
+    assert potrero_ids == [1, 2]
+    # Lote en orden de fecha: el 21/10 ve como anterior al 11/10 del mismo lote
+    assert [(f[0], f[1], f[5], f[6]) for f in filas] == [
+        (1, date(2026, 10, 11), 20, 20.0),
+        (1, date(2026, 10, 21), 10, pytest.approx(50 / 3)),
+        (2, date(2026, 10, 1), 0, 0),
+    ]
+    assert filas[0][7:9] == (3 * 2.0 * 10000, pytest.approx(0.6 * 2.0 * 10000))
+
+
+@pytest.mark.unit
+def test_prepared_rows_reject_unknown_potreros():
+    cursor = MagicMock()
+    cursor.fetchall.return_value = []
+    with pytest.raises(ValueError, match='Potrero 8'):
+        Aforo.preparar_filas(cursor, [{'potrero_id': 8, 'fecha': date(2026, 10, 1),
+                                       'materia_verde': 1, 'porcentaje_ms': 20, 'materia_seca': 0.2}])
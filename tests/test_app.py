@@ -13,4 +13,13 @@ def test_health_endpoint(client):
     response = client.get('/health')
     assert response.status_code == 200
     data = response.get_json()
-    assert data['status'] == 'healthy'
\ No newline at end of file
+    assert data['status'] == 'healthy'
+
+
+@pytest.mark.unit
+def test_metrics_endpoint_reports_request_latency(client):
+    """Test that /metrics exposes latency labelled by endpoint."""
+    client.get('/health')
+    response = client.get('/metrics')
+    assert response.status_code == 200
+    assert b'pastoreo_http_request_duration_seconds_bucket{blueprint="",endpoint="health_check"' in response.data
@@ -0,0 +1,58 @@
+"""Lazy import and startup profiling tests"""
+import sys
+
+import pytest
+
+from proyecto.utils import arranque
+
+
+@pytest.fixture
+def modulo_pesado(tmp_path, monkeypatch):
+    (tmp_path / 'modulo_pesado_prueba.py').write_text("VALOR = 42\n")
+    monkeypatch.syspath_prepend(str(tmp_path))
+    monkeypatch.delitem(sys.modules, 'modulo_pesado_prueba', raising=False)
+    monkeypatch.setattr(arranque, 'MODULOS_PEREZOSOS', set())
+    yield 'modulo_pesado_prueba'
+    sys.modules.pop('modulo_pesado_prueba', None)
+
+
+@pytest.mark.unit
+def test_lazy_module_is_imported_on_first_attribute_access(modulo_pesado, monkeypatch):
+    monkeypatch.setenv('LAZY_IMPORTS', 'true')
+    modulo = arranque.perezoso(modulo_pesado)
+    assert modulo_pesado not in sys.modules
+    assert arranque.cargados() == {modulo_pesado: False}
+
+    assert modulo.VALOR == 42
+    assert modulo_pesado in sys.modules
+
+
+@pytest.mark.unit
+def test_eager_mode_imports_right_away(modulo_pesado, monkeypatch):
+    monkeypatch.setenv('LAZY_IMPORTS', 'false')
+    modulo = arranque.perezoso(modulo_pesado)
+    assert modulo is sys.modules[modulo_pesado]
+
+
+@pytest.mark.unit
+def test_preload_imports_every_registered_module(modulo_pesado, monkeypatch):
+    monkeypatch.setenv('LAZY_IMPORTS', 'true')
+    arranque.perezoso(modulo_pesado)
+    assert arranque.precargar() == [modulo_pesado]
+    assert arranque.cargados() == {modulo_pesado: True}
+
+
+@pytest.mark.unit
+def test_importtime_lines_are_parsed_and_grouped():
+    texto = (
+        "import time: self [us] | cumulative | imported package\n"
+        "import time:       205 |      85807 |   proyecto.utils.series\n"
+        "import time:      2986 |      85602 |     numpy\n"
+        "import time:      1000 |       1000 |     numpy.linalg\n"
+    )
+    modulos = arranque.leer_importtime(texto)
+    assert [m['modulo'] for m in modulos] == ['proyecto.utils.series', 'numpy', 'numpy.linalg']
+    assert modulos[1]['propio_ms'] == 2.986 and modulos[1]['nivel'] == 2
+    paquete, ms = arranque.por_paquete(modulos)[0]
+    assert paquete == 'numpy' and ms == pytest.approx(3.986)
+
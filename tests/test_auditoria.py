@@ -0,0 +1,141 @@
+"""Batched audit log writer tests"""
+import time
+from datetime import date
+from unittest.mock import MagicMock
+
+import pytest
+from flask import Flask
+
+from proyecto.utils.auditoria import Auditoria, mantener_particiones, planificar_particiones
+
+
+@pytest.fixture
+def entorno():
+    app = Flask(__name__)
+    app.config.update(AUDITORIA_LOTE=2, AUDITORIA_CAPACIDAD=4, AUDITORIA_INTERVALO_MS=60000)
+    conexion = MagicMock()
+    mysql = MagicMock()
+    mysql.pool.acquire.return_value = conexion
+    auditoria = Auditoria(app, mysql)
+    # Sin hilo: las pruebas vacían el buffer a mano
+    auditoria._asegurar_hilo = lambda: None
+    return app, auditoria, mysql, conexion
+
+
+def _inserts(conexion):
+    return [c for c in conexion.cursor.return_value.execute.call_args_list if 'INSERT INTO audit_log' in c[0][0]]
+
+
+@pytest.mark.unit
+def test_registering_does_not_touch_the_database(entorno):
+    app, auditoria, mysql, _ = entorno
+    auditoria.registrar('aforos', 1, 'CREATE', {'fecha': date(2026, 10, 1)})
+    mysql.pool.acquire.assert_not_called()
+    assert auditoria.stats()['pendientes'] == 1
+
+
+@pytest.mark.unit
+def test_events_are_written_with_multi_row_inserts(entorno):
+    app, auditoria, mysql, conexion = entorno
+    for i in range(3):
+        auditoria.registrar('actividades', i + 1, 'DELETE')
+    assert auditoria.vaciar() == 3
+
+    inserts = _inserts(conexion)
+    assert len(inserts) == 2  # lotes de AUDITORIA_LOTE filas
+    sql, valores = inserts[0][0]
+    assert sql.count('(%s, %s, %s, %s, %s, %s, %s, %s)') == 2 and len(valores) == 16
+    assert valores[:3] == ('actividades', 1, 'DELETE')
+    assert conexion.commit.call_count == 2
+    assert mysql.pool.release.call_count == 2
+
+
+@pytest.mark.unit
+def test_request_user_and_origin_are_captured(entorno):
+    app, auditoria, _, conexion = entorno
+    with app.test_request_context(headers={'User-Agent': 'campo/1.0'}, environ_base={'REMOTE_ADDR': '10.0.0.7'}):
+        auditoria.registrar('muestras_aforo', 9, 'UPDATE', {'old': {'peso_seco': None}, 'new': {'peso_seco': 40}})
+    auditoria.vaciar()
+    tabla, registro, accion, usuario, cambios, ip, agente, creado = _inserts(conexion)[0][0][1]
+    assert (tabla, registro, accion, ip, agente) == ('muestras_aforo', 9, 'UPDATE', '10.0.0.7', 'campo/1.0')
+    assert usuario is None and '"peso_seco": 40' in cambios
+
+
+@pytest.mark.unit
+def test_full_buffer_drops_the_oldest_events(entorno):
+    app, auditoria, _, conexion = entorno
+    for i in range(6):
+        auditoria.registrar('aforos', i, 'CREATE')
+    assert auditoria.stats()['descartados'] == 2
+    auditoria.vaciar()
+    escritos = [v[1] for c in _inserts(conexion) for v in [c[0][1][i:i + 8] for i in range(0, len(c[0][1]), 8)]]
+    assert escritos == [2, 3, 4, 5]
+
+
+@pytest.mark.unit
+def test_failed_batch_goes_back_to_the_buffer(entorno):
+    app, auditoria, mysql, conexion = entorno
+    auditoria.registrar('aforos', 1, 'CREATE')
+    auditoria.registrar('aforos', 2, 'CREATE')
+    conexion.commit.side_effect = [Exception('MySQL caído'), None]
+
+    assert auditoria.vaciar() == 0
+    assert auditoria.stats()['pendientes'] == 2 and auditoria.errores == 1
+    assert mysql.pool.release.call_args[1] == {'discard': True}
+    assert auditoria.vaciar() == 2
+
+
+@pytest.mark.unit
+def test_background_thread_flushes_on_batch_size():
+    app = Flask(__name__)
+    app.config.update(AUDITORIA_LOTE=2, AUDITORIA_INTERVALO_MS=60000)
+    mysql = MagicMock()
+    auditoria = Auditoria(app, mysql)
+    try:
+        auditoria.registrar('aforos', 1, 'CREATE')
+        auditoria.registrar('aforos', 2, 'CREATE')
+        limite = time.monotonic() + 2
+        while auditoria.escritos < 2 and time.monotonic() < limite:
+            time.sleep(0.01)
+        assert auditoria.escritos == 2
+    finally:
+        auditoria.detener()
+
+
+@pytest.mark.unit
+def test_partition_plan_adds_future_months_and_drops_expired():
+    existentes = ['p202601', 'p202602', 'p202610', 'p_futuro']
+    crear, eliminar, corte = planificar_particiones(existentes, date(2026, 10, 18), retencion_meses=8)
+    assert crear == [date(2026, 11, 1), date(2026, 12, 1)]
+    assert eliminar == ['p202601'] and corte == date(2026, 2, 1)
+
+    crear, eliminar, _ = planificar_particiones(['p_futuro'], date(2026, 12, 5), 12, meses_adelante=1)
+    assert crear == [date(2026, 12, 1), date(2027, 1, 1)] and eliminar == []
+
+
+@pytest.mark.unit
+def test_maintenance_reorganizes_and_drops_partitions():
+    conexion = MagicMock()
+    cursor = conexion.cursor.return_value
+    cursor.fetchall.return_value = [{'nombre': 'p202601'}, {'nombre': 'p202610'}, {'nombre': 'p_futuro'}]
+    resultado = mantener_particiones(conexion, 6, meses_adelante=1, hoy=date(2026, 10, 18))
+
+    sentencias = [c[0][0] for c in cursor.execute.call_args_list]
+    assert "REORGANIZE PARTITION p_futuro INTO (PARTITION p202611 VALUES LESS THAN (TO_DAYS('2026-12-01'))" in sentencias[1]
+    assert sentencias[2] == "ALTER TABLE audit_log DROP PARTITION p202601"
+    assert resultado['creadas'] == ['p202611'] and resultado['eliminadas'] == ['p202601']
+
+
+@pytest.mark.unit
+def test_unpartitioned_table_is_purged_in_batches(monkeypatch):
+    from proyecto.utils import auditoria as modulo
+    monkeypatch.setattr(modulo, 'FILAS_POR_BORRADO', 2)
+    conexion = MagicMock()
+    cursor = conexion.cursor.return_value
+    cursor.fetchall.return_value = [{'nombre': None}]
+    borradas = iter([None, 2, 2, 1])  # la consulta de particiones y tres DELETE
+    cursor.execute.side_effect = lambda *args: setattr(cursor, 'rowcount', next(borradas))
+
+    resultado = mantener_particiones(conexion, 12, hoy=date(2026, 10, 18))
+    assert resultado == {'particionada': False, 'corte': '2025-10-01', 'filas_borradas': 5}
+    assert conexion.commit.call_count == 3
@@ -0,0 +1,77 @@
+"""Forage balance engine tests"""
+from datetime import date
+
+import pytest
+
+from proyecto.utils.balance import BalanceForrajero
+
+POTREROS = [
+    {'id': 10, 'nombre': 'Norte', 'hectareas': 2},
+    {'id': 20, 'nombre': 'Sur', 'hectareas': 5},
+    {'id': 30, 'nombre': 'Loma', 'hectareas': None},
+]
+AFOROS = [
+    {'potrero_id': 10, 'ms_promedio': 1500, 'ultima_medicion': date(2024, 3, 1)},
+    {'potrero_id': 20, 'ms_promedio': 2000, 'ultima_medicion': date(2024, 3, 2)},
+    {'potrero_id': 30, 'ms_promedio': 2000, 'ultima_medicion': date(2024, 3, 2)},
+]
+
+
+def _lote(id, potrero_id, animales, peso=400):
+    return {'id': id, 'nombre': f'Lote {id}', 'numero_animales': animales,
+            'peso_promedio': peso, 'potrero_actual_id': potrero_id}
+
+
+@pytest.mark.unit
+def test_lots_sharing_a_potrero_share_its_forage():
+    lotes = [_lote(1, 10, 10), _lote(2, 20, 20), _lote(3, 20, 20), _lote(4, 99, 5), _lote(5, 30, 5)]
+    balance = BalanceForrajero(lotes, POTREROS, AFOROS, consumo_animal=15)
+    filas = {f['lote_id']: f for f in balance.filas()}
+
+    # Sin potrero conocido o sin hectáreas no hay balance
+    assert set(filas) == {1, 2, 3}
+    assert filas[1]['consumo_diario'] == 150
+    assert filas[1]['dias_disponibles'] == 20.0  # 3000 kg / 150 kg/día
+    assert filas[2]['demanda_ms_diaria'] == 600  # dos lotes de 20 animales
+    assert filas[2]['dias_disponibles'] == filas[3]['dias_disponibles'] == round(10000 / 600, 1)
+    assert filas[2]['estado'] == 'Bueno' and filas[2]['balance_forraje'] == 10000 - 600 * 15
+    assert [f['lote_id'] for f in balance.filas()][0] == 2  # de menos a más días
+
+    kpis = balance.kpis()
+    assert kpis['potreros_ocupados'] == 3 and kpis['total_potreros'] == 3
+    assert kpis['consumo_total_diario'] == 750
+    assert [a['nivel'] for a in balance.alertas()] == ['info']
+
+
+@pytest.mark.unit
+def test_live_weight_fallback_and_states():
+    lotes = [_lote(1, 10, 100, peso=500)]  # 100 * 500 * 2.5% = 1250 kg/día
+    balance = BalanceForrajero(lotes, POTREROS, AFOROS)
+    fila = balance.filas()[0]
+    assert fila['consumo_diario'] == 1250
+    assert fila['estado'] == 'Crítico' and fila['balance_forraje'] < 0
+    assert balance.alertas()[0]['nivel'] == 'critico'
+    assert balance.to_dict()['balances'][0]['ultima_medicion'] == '2024-03-01'
+
+
+@pytest.mark.unit
+def test_empty_inputs():
+    balance = BalanceForrajero([], [], [], consumo_animal=15)
+    assert balance.filas() == [] and balance.alertas() == []
+    assert balance.kpis()['dias_disponibilidad_promedio'] == 0.0
+
+
+@pytest.mark.unit
+def test_finca_filter_applies_to_lots_only():
+    from unittest.mock import MagicMock
+
+    cursor = MagicMock()
+    cursor.fetchall.side_effect = [[_lote(1, 10, 20)], POTREROS, AFOROS]
+    cursor.fetchone.return_value = {'valor': '15'}
+    balance = BalanceForrajero.cargar(cursor, finca_id=3)
+
+    lotes, potreros = cursor.execute.call_args_list[:2]
+    assert 'finca_id = %s' in lotes[0][0] and lotes[0][1] == (3,)
+    # La tabla potreros no tiene finca_id
+    assert 'finca_id' not in potreros[0][0]
+    assert [f['lote_id'] for f in balance.filas()] == [1]
@@ -0,0 +1,108 @@
+"""Dashboard counter and chart response cache tests"""
+from datetime import datetime
+
+import pytest
+from flask import Flask, jsonify
+
+from proyecto.utils.cache import CacheLocal, CacheRespuestas, Contadores
+
+
+class ContadoresFalsos(Contadores):
+    """Cuenta las consultas en lugar de ir a la base de datos"""
+
+    def __init__(self):
+        super().__init__()
+        self.consultas = []
+
+    def _calcular(self, nombres):
+        self.consultas.append(list(nombres))
+        return {n: 10 for n in nombres}
+
+
+@pytest.mark.unit
+def test_contadores_only_query_missing_names():
+    contadores = ContadoresFalsos()
+    assert contadores.obtener('fincas', 'potreros') == {'fincas': 10, 'potreros': 10}
+    contadores.obtener('fincas', 'potreros', 'aforos')
+    assert contadores.consultas == [['fincas', 'potreros'], ['aforos']]
+    assert contadores.hits == 2
+
+
+@pytest.mark.unit
+def test_contadores_invalidate_dependent_counters():
+    contadores = ContadoresFalsos()
+    contadores.obtener('fincas', 'aforos', 'aforos_mes')
+    contadores.invalidar('aforos')
+    contadores.obtener('fincas', 'aforos', 'aforos_mes')
+    assert contadores.consultas[-1] == ['aforos', 'aforos_mes']
+
+
+@pytest.mark.unit
+def test_cache_local_expires_entries():
+    cache = CacheLocal()
+    cache.set_many({'a': 1}, ttl=-1)
+    assert cache.get_many(['a']) == {}
+
+
+@pytest.mark.unit
+def test_cache_local_bounded_size():
+    cache = CacheLocal(max_entradas=2)
+    cache.set_many({'a': 1}, ttl=10)
+    cache.set_many({'b': 2}, ttl=20)
+    cache.set_many({'c': 3}, ttl=30)
+    assert cache.get_many(['a', 'b', 'c']) == {'b': 2, 'c': 3}
+
+
+@pytest.mark.unit
+def test_respuesta_cacheada_revalidates_with_etag(monkeypatch):
+    versiones = {'aforos': (1, datetime(2024, 1, 1))}
+    monkeypatch.setattr(CacheRespuestas, 'versiones', staticmethod(lambda tablas: versiones))
+
+    app = Flask(__name__)
+    cache = CacheRespuestas(app)
+    llamadas = []
+
+    @app.route('/datos')
+    @cache.respuesta_cacheada('aforos')
+    def datos():
+        llamadas.append(1)
+        return jsonify({'n': len(llamadas)})
+
+    cliente = app.test_client()
+    primera = cliente.get('/datos')
+    etag = primera.headers['ETag']
+    assert primera.headers['Last-Modified']
+    assert cliente.get('/datos', headers={'If-None-Match': etag}).status_code == 304
+    assert len(llamadas) == 1
+
+    # Una escritura incrementa la versión: nueva clave y nuevo cuerpo
+    versiones['aforos'] = (2, datetime(2024, 1, 2))
+    segunda = cliente.get('/datos', headers={'If-None-Match': etag})
+    assert segunda.status_code == 200
+    assert segunda.get_json() == {'n': 2}
+
+
+@pytest.mark.unit
+def test_new_potrero_id_is_read_before_bumping_the_table_version(monkeypatch):
+    from unittest.mock import MagicMock
+
+    from proyecto.models import models
+
+    class Cursor:
+        lastrowid = 0
+
+        def execute(self, sql, params=None):
+            # tabla_version no tiene AUTO_INCREMENT: MySQL deja lastrowid en 0
+            self.lastrowid = 42 if 'INSERT INTO potreros' in sql else 0
+
+        def close(self):
+            pass
+
+    mysql = MagicMock()
+    mysql.connection.cursor.return_value = Cursor()
+    monkeypatch.setattr(models, 'mysql', mysql)
+    monkeypatch.setattr(models, 'contadores', MagicMock())
+    monkeypatch.setattr(models, 'catalogo_potreros', MagicMock())
+
+    assert models.Potrero.create('Lote 1', 4.5, 'kikuyo', 'levante') == 42
+    mysql.connection.commit.assert_called_once()
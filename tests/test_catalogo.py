@@ -0,0 +1,114 @@
+"""Potrero catalog cache tests"""
+from unittest.mock import MagicMock
+
+import pytest
+from flask import Flask
+
+from proyecto.utils import catalogo
+from proyecto.utils.cache import CacheRespuestas
+from proyecto.utils.catalogo import PotreroCatalog
+
+
+@pytest.fixture
+def entorno(monkeypatch):
+    """Catálogo con la base simulada: versión de potreros y filas contadas"""
+    estado = {'version': 1, 'cargas': 0, 'versiones': 0}
+    filas = [
+        {'id': 2, 'nombre': 'Alto', 'hectareas': 3.5, 'tipo_pasto': 'Kikuyo', 'etapa_ganado': 'Cría'},
+        {'id': 1, 'nombre': 'Bajo', 'hectareas': 2.0, 'tipo_pasto': None, 'etapa_ganado': None},
+    ]
+
+    def versiones(tablas):
+        estado['versiones'] += 1
+        return {'potreros': (estado['version'], None)}
+
+    def cursor():
+        c = MagicMock()
+        c.execute.side_effect = lambda sql, *params: estado.__setitem__('sql', sql)
+        c.fetchall.side_effect = lambda: estado.__setitem__('cargas', estado['cargas'] + 1) or filas
+        return c
+
+    db = MagicMock()
+    db.mysql.connection.cursor.side_effect = cursor
+    monkeypatch.setitem(__import__('sys').modules, 'db', db)
+    monkeypatch.setattr(CacheRespuestas, 'versiones', staticmethod(versiones))
+
+    app = Flask(__name__)
+    app.config['CATALOGO_POTREROS_INTERVALO'] = 0
+    return app, PotreroCatalog(app), estado
+
+
+@pytest.mark.unit
+def test_items_are_compact_tuples_with_attribute_access(entorno):
+    app, cat, _ = entorno
+    with app.app_context():
+        potreros = cat.listar()
+    assert isinstance(potreros, tuple)
+    assert potreros[0].id == 2 and potreros[0].nombre == 'Alto' and potreros[0].hectareas == 3.5
+    assert cat.opciones() == ((2, 'Alto'), (1, 'Bajo'))
+
+
+@pytest.mark.unit
+def test_reused_across_requests_while_the_version_holds(entorno):
+    app, cat, estado = entorno
+    for _ in range(3):
+        with app.app_context():
+            cat.listar()
+    assert estado['cargas'] == 1
+
+    estado['version'] = 2
+    with app.app_context():
+        cat.listar()
+    assert estado['cargas'] == 2
+
+
+@pytest.mark.unit
+def test_memoized_within_a_request(entorno):
+    app, cat, estado = entorno
+    with app.app_context():
+        assert cat.listar() is cat.listar()
+    assert estado['versiones'] == 1
+
+
+@pytest.mark.unit
+def test_version_is_checked_at_most_once_per_interval(entorno):
+    app, cat, estado = entorno
+    cat.intervalo = 60
+    for _ in range(3):
+        with app.app_context():
+            cat.listar()
+    assert estado['versiones'] == 1
+
+
+@pytest.mark.unit
+def test_local_writes_invalidate_immediately(entorno):
+    app, cat, estado = entorno
+    cat.intervalo = 60
+    with app.app_context():
+        cat.listar()
+        cat.invalidar()
+        estado['version'] = 2
+        cat.listar()
+    assert estado['cargas'] == 2
+
+
+@pytest.mark.unit
+def test_loads_every_potrero_without_a_finca_filter(entorno):
+    app, cat, estado = entorno
+    with app.app_context():
+        cat.listar()
+    # La tabla potreros no tiene finca_id
+    assert 'finca_id' not in estado['sql'] and 'ORDER BY nombre' in estado['sql']
+    assert cat.stats()['potreros'] == 2
+
+
+@pytest.mark.unit
+def test_potrero_writes_invalidate_the_shared_catalog(models_mysql, monkeypatch):
+    from proyecto.models import models
+    invalidar = MagicMock()
+    monkeypatch.setattr(catalogo.catalogo_potreros, 'invalidar', invalidar)
+    models_mysql.connection.cursor.return_value.rowcount = 1
+
+    models.Potrero.update(1, 'Alto', 3, 'Kikuyo', 'Cría')
+    models.Potrero.delete(1)
+    assert invalidar.call_count == 2
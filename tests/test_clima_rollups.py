@@ -0,0 +1,123 @@
+"""Clima monthly/weekly rollup tests"""
+from datetime import date
+from decimal import Decimal
+
+import pytest
+
+from proyecto.models import models
+from proyecto.models.models import Clima, _periodos_clima
+
+DIA = dict(temperatura_min=12.0, temperatura_max=24.0, temperatura_promedio=18.0, humedad=70,
+           presion=1010, lluvia=3.5, velocidad_viento=2.0, direccion_viento='N', nubosidad=20,
+           horas_sol=6.0, descripcion='', icono='sun')
+
+
+def _rollups(cursor):
+    return [c[0][1] for c in cursor.execute.call_args_list if 'INSERT INTO clima_rollup' in c[0][0]]
+
+
+@pytest.mark.unit
+def test_periods_are_month_start_and_monday():
+    assert _periodos_clima('2026-10-18') == [
+        ('clima_rollup_mensual', date(2026, 10, 1), date(2026, 11, 1)),
+        ('clima_rollup_semanal', date(2026, 10, 12), date(2026, 10, 19)),
+    ]
+    assert _periodos_clima(date(2026, 12, 31))[0][2] == date(2027, 1, 1)
+
+
+@pytest.mark.unit
+def test_create_adds_one_day_to_month_and_week(models_mysql):
+    cursor = models_mysql.connection.cursor.return_value
+    Clima.create(date(2026, 10, 18), **DIA)
+
+    mensual, semanal = _rollups(cursor)
+    assert mensual == (date(2026, 10, 1), 1, 12.0, 24.0, 18.0, 3.5, 70.0, 2.0, 6.0, *[1] * 7, 12.0, 24.0)
+    assert semanal[0] == date(2026, 10, 12) and semanal[1:] == mensual[1:]
+    models_mysql.connection.commit.assert_called_once()
+
+
+@pytest.mark.unit
+def test_update_applies_the_difference_without_counting_a_new_day(models_mysql):
+    cursor = models_mysql.connection.cursor.return_value
+    cursor.fetchone.side_effect = [
+        {'id': 5},  # get_by_fecha
+        {'temperatura_min': Decimal('10'), 'temperatura_max': Decimal('24'), 'temperatura_promedio': Decimal('17'),
+         'lluvia': Decimal('0'), 'humedad': 70, 'velocidad_viento': Decimal('2'), 'horas_sol': Decimal('6')},
+    ]
+    assert Clima.update_or_create(date(2026, 10, 18), **DIA) == 5
+
+    mensual, _ = _rollups(cursor)
+    assert mensual[1:9] == (0, 2.0, 0.0, 1.0, 3.5, 0.0, 0.0, 0.0)
+    assert mensual[9:16] == (0,) * 7
+    # La mínima del día subió: los extremos del período se recalculan
+    recalculos = [c for c in cursor.execute.call_args_list if 'UPDATE clima_rollup' in c[0][0]]
+    assert [c[0][1] for c in recalculos] == [
+        (date(2026, 10, 1), date(2026, 11, 1), date(2026, 10, 1)),
+        (date(2026, 10, 12), date(2026, 10, 19), date(2026, 10, 12)),
+    ]
+
+
+@pytest.mark.unit
+def test_missing_values_do_not_count_as_days_with_that_value(models_mysql):
+    cursor = models_mysql.connection.cursor.return_value
+    cursor.fetchone.side_effect = [
+        {'id': 5},
+        dict(DIA, humedad=None, velocidad_viento=None, horas_sol=None),
+    ]
+    Clima.update_or_create(date(2026, 10, 18), **dict(DIA, horas_sol=None))
+
+    mensual, _ = _rollups(cursor)
+    # Se completaron humedad y viento; horas_sol sigue sin dato
+    assert mensual[1] == 0 and mensual[9:16] == (0, 0, 0, 0, 1, 1, 0)
+    assert 'suma_humedad / NULLIF(dias_humedad, 0)' in models._SQL_RESUMEN_ROLLUP_CLIMA
+
+
+@pytest.mark.unit
+def test_clearing_a_temperature_recomputes_the_period_extremes(models_mysql):
+    cursor = models_mysql.connection.cursor.return_value
+    cursor.fetchone.side_effect = [{'id': 5}, dict(DIA)]
+    Clima.update_or_create(date(2026, 10, 18), **dict(DIA, temperatura_min=None))
+
+    recalculos = [c for c in cursor.execute.call_args_list if 'UPDATE clima_rollup' in c[0][0]]
+    assert len(recalculos) == 2
+
+
+@pytest.mark.unit
+def test_failed_write_rolls_back_the_day_and_its_rollups(models_mysql):
+    cursor = models_mysql.connection.cursor.return_value
+    cursor.execute.side_effect = [None, Exception('tabla inexistente')]
+    assert Clima.create(date(2026, 10, 18), **DIA) is None
+    models_mysql.connection.rollback.assert_called_once()
+    models_mysql.connection.commit.assert_not_called()
+
+
+@pytest.mark.unit
+def test_rebuild_aggregates_history_in_one_pass(models_mysql):
+    lectura = models_mysql.cursor_sin_buffer.return_value
+    lectura.fetchmany.side_effect = [[
+        (date(2026, 9, 30), 10, 20, 15, 1, 60, 2, 5),   # martes: semana del 28/09, mes de septiembre
+        (date(2026, 10, 1), 8, 25, 16, 0, 80, 4, 7),    # misma semana, octubre
+        (date(2026, 10, 5), 9, 22, None, 2, 70, 3, 6),  # lunes siguiente
+    ], []]
+    cursor = models_mysql.connection.cursor.return_value
+
+    assert Clima.reconstruir_rollups() == {'clima_rollup_mensual': 2, 'clima_rollup_semanal': 2}
+    lectura.execute.assert_called_once()
+    filas = {c[0][0].split()[2]: c[0][1] for c in cursor.executemany.call_args_list}
+    assert filas['clima_rollup_mensual'][1] == (
+        date(2026, 10, 1), 2, 17.0, 47.0, 16.0, 2.0, 150.0, 7.0, 13.0, 2, 2, 1, 2, 2, 2, 2, 8.0, 25.0)
+    assert filas['clima_rollup_semanal'][0] == (
+        date(2026, 9, 28), 2, 18.0, 45.0, 31.0, 1.0, 140.0, 6.0, 12.0, *[2] * 7, 8.0, 25.0)
+    assert [c[0][0] for c in cursor.execute.call_args_list] == [
+        'DELETE FROM clima_rollup_mensual', 'DELETE FROM clima_rollup_semanal']
+
+
+@pytest.mark.unit
+def test_monthly_summary_reads_the_rollup(models_mysql):
+    cursor = models_mysql.connection.cursor.return_value
+    cursor.fetchone.return_value = None
+    resumen = Clima.get_monthly_summary(2026, 2)
+
+    sql, params = cursor.execute.call_args[0]
+    assert 'FROM clima_rollup_mensual' in sql and params == (date(2026, 2, 1),)
+    assert resumen['total_dias'] == 0 and resumen['temp_promedio'] is None
@@ -0,0 +1,23 @@
+"""Shared SQL builder tests"""
+import sqlite3
+
+import pytest
+
+from proyecto.utils.consultas import ultimo_por_grupo
+
+
+@pytest.mark.unit
+def test_ultimo_por_grupo_returns_one_row_per_group():
+    conexion = sqlite3.connect(':memory:')
+    conexion.execute("CREATE TABLE aforos (id INTEGER PRIMARY KEY, potrero_id INT, fecha TEXT, valor INT)")
+    conexion.executemany("INSERT INTO aforos VALUES (?, ?, ?, ?)", [
+        (1, 1, '2024-01-01', 10),
+        (2, 1, '2024-02-01', 20),
+        (3, 1, '2024-02-01', 30),  # misma fecha: gana el id mayor
+        (4, 2, '2024-01-15', 40),
+    ])
+    sql = ultimo_por_grupo('aforos', 'id, potrero_id, valor') + " ORDER BY potrero_id"
+    assert conexion.execute(sql).fetchall() == [(3, 1, 30), (4, 2, 40)]
+
+    filtrado = ultimo_por_grupo('aforos', 'id, potrero_id', condiciones=" AND fecha < '2024-02-01'")
+    assert sorted(conexion.execute(filtrado).fetchall()) == [(1, 1), (4, 2)]
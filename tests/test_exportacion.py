@@ -0,0 +1,77 @@
+"""Streaming CSV export tests"""
+import sqlite3
+from datetime import date
+from decimal import Decimal
+
+import pytest
+
+from proyecto.utils.exportacion import filas_csv
+
+
+@pytest.mark.unit
+def test_filas_csv_streams_header_then_blocks():
+    conexion = sqlite3.connect(':memory:')
+    conexion.execute("CREATE TABLE clima (id INTEGER, fecha TEXT, lluvia TEXT)")
+    conexion.executemany("INSERT INTO clima VALUES (?, ?, ?)", [(i, f'2024-01-{i:02d}', None) for i in range(1, 6)])
+    cursor = conexion.cursor()
+
+    partes = list(filas_csv(cursor, "SELECT * FROM clima WHERE id > ? ORDER BY id", (0,), tamano_bloque=2))
+
+    assert partes[0] == '\ufeffid,fecha,lluvia\r\n'
+    assert len(partes) == 4  # encabezado + 3 bloques de hasta 2 filas
+    assert partes[1] == '1,2024-01-01,\r\n2,2024-01-02,\r\n'
+
+
+@pytest.mark.unit
+def test_filas_csv_formats_dates_and_decimals():
+    class CursorFalso:
+        description = [('fecha',), ('valor',)]
+        cerrado = False
+
+        def execute(self, query, params):
+            self.filas = [[(date(2024, 5, 1), Decimal('6.50'))]]
+
+        def fetchmany(self, n):
+            return self.filas.pop(0) if self.filas else []
+
+        def close(self):
+            self.cerrado = True
+
+    cursor = CursorFalso()
+    assert ''.join(filas_csv(cursor, 'SELECT', ())).endswith('2024-05-01,6.50\r\n')
+    assert cursor.cerrado
+
+
+@pytest.mark.unit
+def test_export_job_stores_the_compressed_csv_in_the_database(monkeypatch):
+    import gzip
+    from unittest.mock import MagicMock
+
+    from proyecto.utils import tareas
+
+    conexion = sqlite3.connect(':memory:')
+    conexion.execute("CREATE TABLE ph (fecha TEXT, valor REAL)")
+    conexion.executemany("INSERT INTO ph VALUES (?, ?)", [('2024-05-01', 6.5), ('2024-05-02', 6.1)])
+    mysql = MagicMock()
+    mysql.cursor_sin_buffer.return_value = conexion.cursor()
+    cursor = mysql.connection.cursor.return_value
+    cursor.fetchone.return_value = {'total': 2}
+    monkeypatch.setattr(tareas, '_mysql', lambda: mysql)
+    monkeypatch.setitem(tareas.EXPORTACIONES, 'ph', (lambda **filtros: ("SELECT * FROM ph", ()), ()))
+
+    class Avance:
+        trabajo_id = 7
+
+        def __call__(self, progreso, mensaje=None):
+            pass
+
+    resultado = tareas.exportar_csv({'modulo': 'ph'}, Avance())
+
+    sql, (trabajo_id, nombre, contenido) = cursor.execute.call_args[0]
+    assert 'INSERT INTO trabajos_archivos' in sql and trabajo_id == 7
+    assert gzip.decompress(contenido).decode('utf-8').endswith('2024-05-02,6.1\r\n')
+    assert resultado == {'nombre': nombre, 'filas': 2, 'bytes_comprimidos': len(contenido)}
+    mysql.connection.commit.assert_called_once()
+
+    cursor.fetchone.return_value = {'nombre': nombre, 'contenido': contenido}
+    assert tareas.archivo_exportacion(7)[1].startswith('\ufefffecha,valor'.encode('utf-8'))
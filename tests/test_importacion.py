@@ -0,0 +1,74 @@
+"""Bulk aforo import validation tests"""
+import io
+from datetime import date
+from unittest.mock import MagicMock
+
+import pytest
+
+from proyecto.utils.importacion import ErrorImportacion, ImportadorAforos, leer_filas
+
+
+def _mysql_con_potreros(potreros):
+    mysql = MagicMock()
+    mysql.connection.cursor.return_value.fetchall.return_value = potreros
+    return mysql
+
+
+@pytest.mark.unit
+def test_import_groups_samples_and_reports_row_errors():
+    csv = (
+        "Potrero;Fecha;Peso Verde;Peso Seco\n"
+        "1;2024-03-01;120;30\n"
+        "Loma;01/03/2024;100,5;\n"
+        "\n"
+        "9;2024-03-01;100;\n"
+        "1;2024-03-02;-4;\n"
+    ).encode()
+    mysql = _mysql_con_potreros([{'id': 1, 'nombre': 'Norte'}, {'id': 2, 'nombre': 'Loma'}])
+
+    resultado = ImportadorAforos(mysql).importar(leer_filas(io.BytesIO(csv), 'aforos.csv'))
+
+    assert resultado.filas == 4
+    assert (resultado.aforos, resultado.muestras) == (2, 2)
+    assert [fila for fila, _ in resultado.errores] == [5, 6]
+    assert not resultado.insertado  # sin omitir_errores, un error cancela la carga
+    mysql.connection.commit.assert_not_called()
+
+
+@pytest.mark.unit
+def test_import_rejects_missing_columns():
+    with pytest.raises(ErrorImportacion):
+        list(leer_filas(io.BytesIO(b"potrero,peso_verde\n1,10\n"), 'aforos.csv'))
+
+
+@pytest.mark.unit
+def test_new_aforo_ids_come_from_the_multi_row_insert(monkeypatch):
+    from proyecto.utils import importacion
+    monkeypatch.setattr(importacion, 'incrementar_version', MagicMock())
+    monkeypatch.setattr(importacion, 'encolar_recalculo', MagicMock())
+    csv = (
+        "potrero,fecha,peso_verde,peso_seco\n"
+        "2,2024-03-02,100,20\n"
+        "1,2024-03-01,120,30\n"
+        "2,2024-03-02,110,\n"
+    ).encode()
+    mysql = MagicMock()
+    cursor = mysql.connection.cursor.return_value
+    cursor.fetchall.side_effect = [
+        [{'id': 1, 'nombre': 'Norte'}, {'id': 2, 'nombre': 'Loma'}],
+        [{'potrero_id': 1, 'hectareas': 2, 'fecha': None, 'dias_rotacion': None},
+         {'potrero_id': 2, 'hectareas': 3, 'fecha': None, 'dias_rotacion': None}],
+    ]
+    cursor.fetchone.return_value = {'paso': 2}
+    cursor.lastrowid = 41
+
+    resultado = ImportadorAforos(mysql).importar(leer_filas(io.BytesIO(csv), 'aforos.csv'))
+
+    assert resultado.insertado
+    insert = next(c[0] for c in cursor.execute.call_args_list if 'INSERT INTO aforos' in c[0][0])
+    assert insert[0].count('(%s, %s') == 2 and insert[1][:2] == (1, date(2024, 3, 1))
+    # Filas en orden (potrero, fecha): potrero 1 -> 41, potrero 2 -> 43
+    muestras = cursor.executemany.call_args[0][1]
+    assert [m[0] for m in muestras] == [43, 43, 41]
+    mysql.connection.commit.assert_called_once()
+    importacion.encolar_recalculo.assert_called_once_with('resumen_potreros', {'potrero_id': [1, 2]}, cursor)
@@ -0,0 +1,65 @@
+"""MuestraAforo running aggregate tests"""
+from decimal import Decimal
+from unittest.mock import MagicMock
+
+import pytest
+
+from proyecto.models.models import MuestraAforo, _SQL_DERIVADOS_AFORO
+
+
+def _deltas(cursor):
+    """Parámetros (verde, seco, muestras, con_seco, aforo_id) de los UPDATE de aforos"""
+    return [c[0][1] for c in cursor.execute.call_args_list if c[0][0].startswith('UPDATE aforos')]
+
+
+@pytest.mark.unit
+def test_create_adds_the_sample_to_the_running_sums(models_mysql):
+    cursor = models_mysql.connection.cursor.return_value
+    MuestraAforo.create(4, 1, 120, peso_seco=30)
+    MuestraAforo.create(4, 2, 100)
+
+    assert _deltas(cursor) == [(120.0, 30.0, 1, 1, 4), (100.0, 0, 1, 0, 4)]
+    # Sin releer las muestras del aforo
+    assert not any('FROM muestras_aforo' in c[0][0] for c in cursor.execute.call_args_list)
+    assert models_mysql.connection.commit.call_count == 2
+
+
+@pytest.mark.unit
+def test_updates_apply_only_the_difference(models_mysql):
+    cursor = models_mysql.connection.cursor.return_value
+    cursor.rowcount = 1
+    cursor.fetchone.side_effect = [
+        {'aforo_id': 4, 'peso_seco': None},
+        {'aforo_id': 4, 'peso_verde': Decimal('120'), 'peso_seco': Decimal('30')},
+        {'aforo_id': 4, 'peso_verde': Decimal('100'), 'peso_seco': None},
+    ]
+    MuestraAforo.update_peso_seco(8, 25)
+    MuestraAforo.update(7, 110, peso_seco=35)
+    MuestraAforo.update(8, 100)
+
+    assert _deltas(cursor) == [(0, 25.0, 0, 1, 4), (-10.0, 5.0, 0, 0, 4), (0.0, 0, 0, 0, 4)]
+
+
+@pytest.mark.unit
+def test_delete_subtracts_the_sample(models_mysql):
+    cursor = models_mysql.connection.cursor.return_value
+    cursor.rowcount = 1
+    cursor.fetchone.return_value = {'aforo_id': 4, 'peso_verde': Decimal('120'), 'peso_seco': Decimal('30')}
+    assert MuestraAforo.delete(7)
+
+    assert _deltas(cursor) == [(-120.0, -30.0, -1, -1, 4)]
+
+
+@pytest.mark.unit
+def test_derived_columns_follow_the_sums_they_read(models_mysql):
+    # MySQL aplica las asignaciones del UPDATE de izquierda a derecha: cada
+    # columna derivada debe asignarse después de las que usa
+    cursor = MagicMock()
+    MuestraAforo._aplicar_delta(cursor, 4, delta_verde=10)
+    sql = cursor.execute.call_args[0][0]
+    orden = ['suma_peso_verde =', 'suma_peso_seco =', 'num_muestras =', 'muestras_con_peso_seco =',
+             'peso_verde_promedio =', 'peso_seco_promedio =', 'porcentaje_ms_promedio =',
+             'materia_verde =', 'materia_seca =', 'porcentaje_ms =']
+    posiciones = [sql.index(asignacion) for asignacion in orden]
+    assert posiciones == sorted(posiciones)
+    assert _SQL_DERIVADOS_AFORO.strip() in sql
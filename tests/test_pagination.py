@@ -0,0 +1,58 @@
+"""Keyset pagination tests"""
+from datetime import date
+
+import pytest
+
+from proyecto.utils.pagination import (
+    CursorInvalido, codificar_cursor, decodificar_cursor, leer_cursor, paginar
+)
+
+
+class CursorFalso:
+    """Cursor DB-API que devuelve filas predefinidas y registra las consultas"""
+
+    def __init__(self, filas):
+        self.filas = filas
+        self.consultas = []
+
+    def execute(self, query, params=()):
+        self.consultas.append((query, params))
+
+    def fetchall(self):
+        return self.filas
+
+
+def filas(*ids):
+    return [{'id': i, 'fecha': date(2024, 1, i)} for i in ids]
+
+
+@pytest.mark.unit
+def test_cursor_roundtrip_and_invalid_tokens():
+    token = codificar_cursor(date(2024, 3, 5), 42, 'ant')
+    assert decodificar_cursor(token) == ('2024-03-05', 42, 'ant')
+    with pytest.raises(CursorInvalido):
+        decodificar_cursor('no-es-un-cursor')
+    assert leer_cursor('no-es-un-cursor') is None
+
+
+@pytest.mark.unit
+def test_first_page_has_only_next_cursor():
+    db = CursorFalso(filas(9, 8, 7))
+    pagina = paginar(db, "SELECT * FROM aforos a", "aforos a", "a", per_page=2, conteo='ninguno')
+    assert [f['id'] for f in pagina.items] == [9, 8]
+    assert decodificar_cursor(pagina.siguiente) == ('2024-01-08', 8, 'sig')
+    assert pagina.anterior is None
+    assert pagina.total is None
+    assert "OFFSET" not in db.consultas[0][0]
+
+
+@pytest.mark.unit
+def test_previous_page_seeks_ascending_and_restores_order():
+    db = CursorFalso(filas(5, 6, 7))
+    token = codificar_cursor(date(2024, 1, 4), 4, 'ant')
+    pagina = paginar(db, "SELECT * FROM aforos a", "aforos a", "a", per_page=2, cursor=token, conteo='ninguno')
+    query, params = db.consultas[0]
+    assert "a.fecha > %s" in query and "ASC" in query
+    assert params == ('2024-01-04', '2024-01-04', 4, 3)
+    assert [f['id'] for f in pagina.items] == [6, 5]
+    assert pagina.anterior is not None and pagina.siguiente is not None
@@ -0,0 +1,155 @@
+"""Connection pool tests (SQLite stand-in for MySQL)"""
+import sqlite3
+import threading
+
+import pytest
+from flask import Flask
+
+from proyecto.utils.pool import ConnectionPool, PoolTimeout, PooledMySQL
+
+
+def sqlite_connect():
+    return sqlite3.connect(':memory:', check_same_thread=False)
+
+
+@pytest.mark.unit
+def test_pool_reuses_connections():
+    pool = ConnectionPool(sqlite_connect, size=2)
+    conn = pool.acquire()
+    pool.release(conn)
+    assert pool.acquire() is conn
+    assert pool.stats()['created'] == 1
+
+
+@pytest.mark.unit
+def test_pool_times_out_when_exhausted():
+    pool = ConnectionPool(sqlite_connect, size=1, timeout=0.05)
+    pool.acquire()
+    with pytest.raises(PoolTimeout):
+        pool.acquire()
+    assert pool.stats()['timeouts'] == 1
+
+
+@pytest.mark.unit
+def test_pool_waiter_gets_released_connection():
+    pool = ConnectionPool(sqlite_connect, size=1, timeout=2)
+    conn = pool.acquire()
+    threading.Timer(0.05, pool.release, args=(conn,)).start()
+    assert pool.acquire() is conn
+    assert pool.stats()['waits'] == 1
+
+
+@pytest.mark.unit
+def test_pool_replaces_broken_connection_on_checkout():
+    pool = ConnectionPool(sqlite_connect, size=1)
+    conn = pool.acquire()
+    pool.release(conn)
+    conn.close()
+    nueva = pool.acquire()
+    assert nueva is not conn
+    nueva.execute("SELECT 1")
+    assert pool.stats()['discarded'] == 1
+
+
+@pytest.mark.unit
+def test_pool_recycles_connections_past_max_lifetime():
+    pool = ConnectionPool(sqlite_connect, size=1, max_lifetime=0.01)
+    conn = pool.acquire()
+    pool.release(conn)
+    threading.Event().wait(0.02)
+    assert pool.acquire() is not conn
+    assert pool.stats()['recycled'] == 1
+
+
+@pytest.mark.unit
+def test_pooled_mysql_returns_connection_on_teardown():
+    app = Flask(__name__)
+    mysql = PooledMySQL(app, connect=sqlite_connect)
+
+    with app.app_context():
+        conn = mysql.connection
+        assert mysql.connection is conn
+        assert mysql.pool_stats()['in_use'] == 1
+
+    assert mysql.pool_stats()['idle'] == 1
+    with app.app_context():
+        assert mysql.connection is conn
+
+
+@pytest.mark.unit
+def test_pooled_mysql_wraps_connection_and_releases_original():
+    app = Flask(__name__)
+    mysql = PooledMySQL(app, connect=sqlite_connect)
+    mysql.set_envoltorio(lambda conn: ('envuelta', conn))
+
+    with app.app_context():
+        vista = mysql.connection
+        assert vista[0] == 'envuelta'
+
+    assert mysql.pool_stats()['idle'] == 1
+
+
+@pytest.mark.unit
+def test_each_thread_context_gets_its_own_connection():
+    app = Flask(__name__)
+    app.config['MYSQL_POOL_SIZE'] = 4
+    mysql = PooledMySQL(app, connect=sqlite_connect)
+    barrera = threading.Barrier(4)
+    conexiones = []
+
+    def request():
+        with app.app_context():
+            conexiones.append(mysql.connection)
+            barrera.wait(timeout=5)
+
+    hilos = [threading.Thread(target=request) for _ in range(4)]
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join()
+
+    assert len({id(c) for c in conexiones}) == 4
+    assert mysql.pool_stats()['idle'] == 4
+
+
+@pytest.mark.unit
+def test_pymysql_driver_is_selected_by_config(monkeypatch):
+    import sys
+    import types
+
+    conectadas = []
+    pymysql = types.ModuleType('pymysql')
+    pymysql.cursors = types.ModuleType('pymysql.cursors')
+    pymysql.cursors.DictCursor = object()
+    pymysql.connect = lambda **kwargs: conectadas.append(kwargs) or sqlite_connect()
+    monkeypatch.setitem(sys.modules, 'pymysql', pymysql)
+    monkeypatch.setitem(sys.modules, 'pymysql.cursors', pymysql.cursors)
+
+    app = Flask(__name__)
+    app.config.update(MYSQL_DRIVER='pymysql', MYSQL_CURSORCLASS='DictCursor', MYSQL_DB='pastoreo')
+    mysql = PooledMySQL(app)
+    with app.app_context():
+        mysql.connection
+
+    assert conectadas[0]['cursorclass'] is pymysql.cursors.DictCursor
+    assert conectadas[0]['database'] == 'pastoreo'
+
+
+@pytest.mark.unit
+@pytest.mark.parametrize('perfil, threads, pool', [('sync', 1, '2'), ('gthread', 8, '9'), ('gevent', 1, '21')])
+def test_gunicorn_profiles_size_the_pool(monkeypatch, perfil, threads, pool):
+    import os
+    import runpy
+
+    for variable in ('MYSQL_POOL_SIZE', 'MYSQL_DRIVER', 'GUNICORN_WORKERS'):
+        monkeypatch.delenv(variable, raising=False)
+    monkeypatch.setenv('GUNICORN_PROFILE', perfil)
+    monkeypatch.setenv('GUNICORN_THREADS', '8')
+    monkeypatch.setattr(os, 'environ', os.environ.copy())
+
+    config = runpy.run_path(os.path.join(os.path.dirname(os.path.dirname(__file__)), 'gunicorn_config.py'))
+
+    assert config['worker_class'] == perfil
+    assert config['threads'] == threads
+    assert os.environ['MYSQL_POOL_SIZE'] == pool
+    assert (os.environ.get('MYSQL_DRIVER') == 'pymysql') == (perfil == 'gevent')
@@ -0,0 +1,59 @@
+"""potrero_resumen maintenance and listing tests"""
+from unittest.mock import MagicMock
+
+import pytest
+
+from proyecto.models.models import Potrero
+
+
+def _sql(cursor):
+    return ' '.join(cursor.execute.call_args[0][0].split())
+
+
+@pytest.mark.unit
+def test_refresh_one_potrero_filters_its_aforos_and_row():
+    cursor = MagicMock()
+    Potrero.refrescar_resumen(4, cursor)
+
+    sql = _sql(cursor)
+    assert sql.startswith('INSERT INTO potrero_resumen') and 'ON DUPLICATE KEY UPDATE' in sql
+    assert 'WHERE potrero_id IN (%s)' in sql and 'WHERE p.id IN (%s)' in sql
+    assert cursor.execute.call_args[0][1] == (4, 4)
+
+
+@pytest.mark.unit
+def test_refresh_a_list_of_potreros_in_one_statement(models_mysql):
+    cursor = MagicMock()
+    Potrero.refrescar_resumen([2, 7], cursor)
+
+    cursor.execute.assert_called_once()
+    assert 'WHERE p.id IN (%s, %s)' in _sql(cursor)
+    assert cursor.execute.call_args[0][1] == (2, 7, 2, 7)
+    # Con el cursor del llamador no confirma la transacción
+    models_mysql.connection.commit.assert_not_called()
+
+
+@pytest.mark.unit
+def test_refresh_all_potreros_commits_on_its_own_cursor(models_mysql):
+    Potrero.refrescar_resumen()
+
+    cursor = models_mysql.connection.cursor.return_value
+    sql = _sql(cursor)
+    assert 'WHERE 1=1' in sql and 'IN (%s' not in sql
+    assert cursor.execute.call_args[0][1] == ()
+    models_mysql.connection.commit.assert_called_once()
+    cursor.close.assert_called_once()
+
+
+@pytest.mark.unit
+def test_listing_reads_rotation_from_the_summary_table(models_mysql):
+    cursor = models_mysql.connection.cursor.return_value
+    cursor.fetchall.return_value = [{'id': 1, 'nombre': 'Alto', 'dias_rotacion': 21}]
+    cursor.fetchone.return_value = {'total': 1}
+
+    assert Potrero.get_all(page=2, per_page=5) == ([{'id': 1, 'nombre': 'Alto', 'dias_rotacion': 21}], 1)
+    listado = ' '.join(cursor.execute.call_args_list[0][0][0].split())
+    assert 'LEFT JOIN potrero_resumen r ON r.potrero_id = p.id' in listado
+    # Sin recorrer aforos por cada potrero
+    assert 'aforos' not in listado
+    assert cursor.execute.call_args_list[0][0][1] == (5, 5)
@@ -0,0 +1,35 @@
+"""SQL instrumentation tests"""
+import sqlite3
+
+import pytest
+from flask import Flask, g
+
+from proyecto.utils.profiler import ConexionInstrumentada, PerfilSQL, huella
+
+
+@pytest.mark.unit
+def test_huella_replaces_literals_and_collapses_lists():
+    assert huella("SELECT * FROM aforos WHERE id = 15 AND nombre = 'x'") == \
+        "SELECT * FROM aforos WHERE id = ? AND nombre = ?"
+    assert huella("SELECT * FROM potreros WHERE id IN (%s, %s,  %s)") == \
+        "SELECT * FROM potreros WHERE id IN (?+)"
+
+
+@pytest.mark.unit
+def test_repeated_fingerprints_flagged_as_n_plus_one():
+    app = Flask(__name__)
+    perfil = PerfilSQL()
+    perfil.umbral_n1 = 3
+    conexion = ConexionInstrumentada(sqlite3.connect(':memory:'), perfil)
+
+    with app.test_request_context('/'):
+        g._sql_consultas = []
+        cursor = conexion.cursor()
+        for i in range(3):
+            cursor.execute(f"SELECT {i}")
+        cursor.execute("SELECT 1 WHERE 1 = 0")
+        total, _, sospechosas = perfil.resumen_request()
+
+    assert total == 4
+    assert sospechosas == {"SELECT ?": 3}
+    assert perfil.top(1)[0]['ejecuciones'] == 3
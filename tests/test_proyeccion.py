@@ -0,0 +1,47 @@
+"""Forage balance forecast tests"""
+from datetime import date, timedelta
+
+import numpy as np
+import pytest
+
+from proyecto.utils.balance import BalanceForrajero
+from proyecto.utils.proyeccion import ProyeccionForrajera, factores_clima
+
+HOY = date(2024, 3, 1)
+POTREROS = [{'id': 1, 'nombre': 'Norte', 'hectareas': 2}, {'id': 2, 'nombre': 'Sur', 'hectareas': 4},
+            {'id': 3, 'nombre': 'Loma', 'hectareas': 1}]
+AFOROS = [{'potrero_id': 1, 'ms_promedio': 1000, 'ultima_medicion': HOY},
+          {'potrero_id': 2, 'ms_promedio': 1500, 'ultima_medicion': HOY}]
+LOTES = [{'id': 1, 'nombre': 'Vacas', 'numero_animales': 20, 'peso_promedio': 450, 'potrero_actual_id': 1}]
+
+
+def _clima(dias_atras, temperatura, lluvia):
+    return [{'fecha': HOY - timedelta(days=d), 'temperatura_promedio': temperatura, 'lluvia': lluvia}
+            for d in range(1, dias_atras + 1)]
+
+
+@pytest.mark.unit
+def test_steady_climate_keeps_observed_rate():
+    factores = factores_clima(_clima(14, 18, 4), HOY, 30)
+    assert np.allclose(factores, 1)
+    # Un registro futuro frío frena el crecimiento ese día
+    frio = _clima(14, 18, 4) + [{'fecha': HOY + timedelta(days=2), 'temperatura_promedio': 5, 'lluvia': 4}]
+    assert factores_clima(frio, HOY, 30)[2] == 0
+
+
+@pytest.mark.unit
+def test_forecast_grows_and_depletes_potreros():
+    balance = BalanceForrajero(LOTES, POTREROS, AFOROS, consumo_animal=15)
+    tasas = [{'potrero_id': 2, 'tasa': 0.5}]
+    densidades = [{'potrero_id': 1, 'densidad': 100}]
+    proyeccion = ProyeccionForrajera(balance, tasas, densidades, _clima(14, 18, 4), dias=30, hoy=HOY)
+    datos = proyeccion.to_dict()
+
+    assert len(datos['fechas']) == 31 and datos['potreros_sin_datos'] == 1
+    norte, sur = datos['potreros']
+    # Norte: 2000 kg, consume 300 kg/día y crece 0.5 * 100 * 2 = 100 kg/día -> se agota el día 10
+    assert norte['potrero_nombre'] == 'Norte' and norte['dias_hasta_agotar'] == 10
+    assert norte['serie'][1] == 1800 and norte['ms_final'] == 0
+    # Sur: sin lotes, crece 0.5 * 150 * 4 = 300 kg/día (tasa mediana, densidad por defecto)
+    assert sur['dias_hasta_agotar'] is None and sur['ms_final'] == 6000 + 30 * 300
+    assert datos['total_ms'][0] == 8000
@@ -0,0 +1,52 @@
+"""Recorrido growth-rate recomputation tests"""
+from datetime import date
+from unittest.mock import MagicMock
+
+import pytest
+
+
+@pytest.fixture
+def recorrido(monkeypatch):
+    from proyecto.models import models
+    monkeypatch.setattr(models, 'incrementar_version', MagicMock())
+    return models.Recorrido
+
+
+def _sql(cursor, indice=0):
+    return ' '.join(cursor.execute.call_args_list[indice][0][0].split())
+
+
+@pytest.mark.unit
+def test_recompute_uses_lag_and_limits_the_window(recorrido):
+    cursor = MagicMock()
+    recorrido.recompute_growth_rates(7, since=date(2024, 3, 1), cursor=cursor)
+
+    sql = _sql(cursor)
+    assert 'LAG(altura_promedio) OVER w' in sql
+    assert 'WINDOW w AS (PARTITION BY potrero_id ORDER BY fecha, id)' in sql
+    assert sql.endswith('WHERE 1=1 AND r.fecha >= %s')
+    # potrero, recorrido previo a since y filtro de filas actualizadas
+    assert cursor.execute.call_args[0][1] == (7, 7, date(2024, 3, 1), date(2024, 3, 1), date(2024, 3, 1))
+
+
+@pytest.mark.unit
+def test_recompute_everything(recorrido):
+    cursor = MagicMock()
+    recorrido.recompute_growth_rates(cursor=cursor)
+    assert 'potrero_id = %s' not in _sql(cursor)
+    assert cursor.execute.call_args[0][1] == ()
+
+
+@pytest.mark.unit
+def test_moving_a_recorrido_enqueues_both_potreros_from_the_earliest_date(recorrido, monkeypatch):
+    from proyecto.utils import tareas
+    llamadas = []
+    cursor = MagicMock()
+    monkeypatch.setattr(tareas, 'encolar_recalculo',
+                        lambda tipo, parametros, cursor_: llamadas.append((tipo, parametros, cursor_)))
+    recorrido._encolar_tasas_afectadas(
+        cursor, {'potrero_id': 1, 'fecha': date(2024, 5, 1)}, (2, '2024-04-01'), (1, '2024-04-15'), None
+    )
+    # En la transacción de la escritura; el worker recalcula después del commit
+    assert sorted((p['potrero_id'], p['desde']) for _, p, _ in llamadas) == [(1, '2024-04-15'), (2, '2024-04-01')]
+    assert {(tipo, c) for tipo, _, c in llamadas} == {('tasas_crecimiento', cursor)}
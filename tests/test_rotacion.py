@@ -0,0 +1,54 @@
+"""Rotation planner tests"""
+from datetime import date
+
+import numpy as np
+import pytest
+
+from proyecto.utils.balance import BalanceForrajero
+from proyecto.utils.proyeccion import ProyeccionForrajera
+from proyecto.utils.rotacion import PlanRotacion
+
+HOY = date(2024, 3, 1)
+
+
+def _finca(potreros, lotes, semilla=3, cambios=None):
+    rng = np.random.default_rng(semilla)
+    filas_potreros = [{'id': i, 'nombre': f'P{i}', 'hectareas': float(h)}
+                      for i, h in enumerate(rng.uniform(2, 10, potreros).round(1), start=1)]
+    ms_ha = rng.uniform(1200, 3500, potreros)
+    aforos = [{'potrero_id': p['id'], 'ms_promedio': float((cambios or {}).get(p['id'], m)), 'ultima_medicion': HOY}
+              for p, m in zip(filas_potreros, ms_ha)]
+    filas_lotes = [{'id': i, 'nombre': f'L{i}', 'numero_animales': int(n), 'peso_promedio': 400,
+                    'potrero_actual_id': i}
+                   for i, n in enumerate(rng.integers(20, 60, lotes), start=1)]
+    tasas = [{'potrero_id': p['id'], 'tasa': float(t)} for p, t in zip(filas_potreros, rng.uniform(0.2, 0.6, potreros))]
+    balance = BalanceForrajero(filas_lotes, filas_potreros, aforos, consumo_animal=12)
+    return ProyeccionForrajera(balance, tasas, [], [], dias=60, hoy=HOY)
+
+
+@pytest.mark.unit
+def test_plan_moves_lots_to_rested_potreros_only():
+    plan = PlanRotacion(_finca(40, 8), descanso_minimo=15)
+    datos = plan.to_dict()
+    assert datos['movimientos']
+    for movimiento in datos['movimientos']:
+        assert movimiento['ms_ha_destino'] >= plan.entrada_ha
+    # Nunca dos lotes en el mismo potrero a la vez
+    for ubicacion in plan.hist_ubicacion:
+        ubicados = ubicacion[ubicacion >= 0]
+        assert len(ubicados) == len(set(ubicados.tolist()))
+
+
+@pytest.mark.unit
+@pytest.mark.parametrize('potrero_id,ms_ha', [(3, 1300.0), (30, 5000.0), (38, 100.0)])
+def test_incremental_replan_matches_full_plan(potrero_id, ms_ha):
+    plan = PlanRotacion(_finca(40, 8), descanso_minimo=15)
+    nueva = _finca(40, 8, cambios={potrero_id: ms_ha})
+    completo = PlanRotacion(nueva, descanso_minimo=15)
+
+    assert plan.compatible(nueva, descanso_minimo=15)
+    plan.replanificar(plan.cambios(nueva))
+
+    assert plan.movimientos == completo.movimientos
+    assert plan.sin_destino == completo.sin_destino
+    assert np.allclose(plan.hist_ms, completo.hist_ms)
@@ -0,0 +1,45 @@
+"""Chart series downsampling tests"""
+from datetime import date, timedelta
+
+import numpy as np
+import pytest
+
+from proyecto.utils.series import indices_lttb, indices_minmax, reducir_columnas, reducir_filas
+
+
+@pytest.mark.unit
+def test_lttb_keeps_endpoints_and_spike():
+    y = np.sin(np.linspace(0, 20, 5000))
+    y[2500] = 50  # pico aislado
+    elegidos = indices_lttb(np.arange(5000), y, 200)
+    assert len(elegidos) == 200
+    assert elegidos[0] == 0 and elegidos[-1] == 4999
+    assert 2500 in elegidos
+    assert np.all(np.diff(elegidos) > 0)
+
+
+@pytest.mark.unit
+def test_minmax_keeps_envelope():
+    y = np.random.default_rng(1).normal(size=10000)
+    elegidos = indices_minmax(y, 100)
+    assert len(elegidos) <= 100
+    assert y.argmax() in elegidos and y.argmin() in elegidos
+
+
+@pytest.mark.unit
+def test_reducir_columnas_by_group_keeps_columns_aligned():
+    fechas = [(date(2020, 1, 1) + timedelta(days=i)).isoformat() for i in range(1000)]
+    datos = {
+        'fechas': fechas * 2,
+        'alturas': list(range(1000)) + list(range(1000, 0, -1)),
+        'potreros': ['A'] * 1000 + ['B'] * 1000,
+        'titulo': 'no es una columna',
+    }
+    reducidos = reducir_columnas(datos, 50, 'fechas', 'alturas', grupo='potreros')
+    assert reducidos['potreros'].count('A') == 50 and reducidos['potreros'].count('B') == 50
+    assert len(reducidos['fechas']) == len(reducidos['alturas']) == 100
+    assert reducidos['titulo'] == 'no es una columna'
+
+    filas = [{'fecha': f, 'valor': i} for i, f in enumerate(fechas)]
+    assert reducir_filas(filas, 0, 'fecha', 'valor') is filas
+    assert len(reducir_filas(filas, 10, 'fecha', 'valor')) == 10
@@ -0,0 +1,184 @@
+"""Background job queue tests"""
+from unittest.mock import MagicMock
+
+import pytest
+
+from proyecto.utils import trabajos
+from proyecto.utils.trabajos import Cola, TareaDesconocida, Worker, clave_por_defecto
+
+
+@pytest.fixture
+def registro(monkeypatch):
+    tareas = {}
+    monkeypatch.setattr(trabajos, 'TAREAS', tareas)
+    return tareas
+
+
+def _sql(cursor, indice=0):
+    return ' '.join(cursor.execute.call_args_list[indice][0][0].split())
+
+
+@pytest.mark.unit
+def test_same_parameters_share_the_key():
+    assert clave_por_defecto('x', {'a': 1, 'b': 2}) == clave_por_defecto('x', {'b': 2, 'a': 1})
+    assert clave_por_defecto('x', {'a': 1}) != clave_por_defecto('x', {'a': 2})
+    assert clave_por_defecto('x', {'a': 1}) != clave_por_defecto('y', {'a': 1})
+
+
+@pytest.mark.unit
+def test_enqueue_dedups_on_the_pending_key(registro):
+    trabajos.tarea('exportar')(lambda parametros, avance: None)
+    cursor = MagicMock(lastrowid=42)
+    trabajo_id = Cola(MagicMock()).encolar('exportar', {'modulo': 'aforos'}, clave='k', cursor=cursor)
+
+    assert trabajo_id == 42
+    assert 'ON DUPLICATE KEY UPDATE id = LAST_INSERT_ID(id)' in _sql(cursor)
+    assert cursor.execute.call_args[0][1][:2] == ('exportar', 'k')
+
+
+@pytest.mark.unit
+def test_pending_job_keeps_the_earliest_date(registro):
+    trabajos.tarea('tasas')(lambda parametros, avance: None)
+    cursor = MagicMock(lastrowid=7)
+    Cola(MagicMock()).encolar('tasas', {'potrero_id': 3, 'desde': '2024-04-01'}, clave='k', cursor=cursor,
+                              conservar_minimo='desde')
+
+    assert 'parametros = IF(COALESCE(JSON_UNQUOTE(JSON_EXTRACT(VALUES(parametros), %s))' in _sql(cursor)
+    assert cursor.execute.call_args[0][1][-2:] == ('$.desde', '$.desde')
+
+
+@pytest.mark.unit
+def test_recomputes_share_one_key_per_potrero(monkeypatch):
+    from proyecto.utils import tareas
+    encolados = []
+
+    class ColaFalsa:
+        def __init__(self, mysql):
+            pass
+
+        def encolar(self, tipo, parametros, clave=None, cursor=None, conservar_minimo=None):
+            encolados.append((clave or clave_por_defecto(tipo, parametros), parametros, conservar_minimo))
+
+    monkeypatch.setattr(tareas, 'Cola', ColaFalsa)
+    monkeypatch.setattr(tareas, '_mysql', MagicMock())
+    tareas.encolar_recalculo('resumen_potreros', {'potrero_id': [5, '2', 5]}, None)
+    tareas.encolar_recalculo('resumen_potreros', {'potrero_id': [2, 5]}, None)
+    tareas.encolar_recalculo('tasas_crecimiento', {'potrero_id': 2, 'desde': '2024-05-01'}, None)
+    tareas.encolar_recalculo('tasas_crecimiento', {'potrero_id': 2, 'desde': '2024-04-01'}, None)
+
+    (resumen, p1, _), (resumen_2, p2, _), (tasas, _, minimo), (tasas_2, _, _) = encolados
+    assert resumen == resumen_2 and p1 == p2 == {'potrero_id': [2, 5]}
+    assert tasas == tasas_2 and minimo == 'desde'
+
+
+@pytest.mark.unit
+def test_enqueue_rejects_unknown_tasks(registro):
+    with pytest.raises(TareaDesconocida):
+        Cola(MagicMock()).encolar('no_existe', cursor=MagicMock())
+
+
+@pytest.mark.unit
+def test_take_skips_rows_locked_by_other_workers():
+    conexion = MagicMock()
+    cursor = conexion.cursor.return_value
+    cursor.fetchone.return_value = {'id': 5, 'tipo': 't', 'parametros': '{"a": 1}', 'intentos': 0, 'max_intentos': 3}
+
+    trabajo = Cola(MagicMock()).tomar(conexion, 'w1')
+
+    assert 'FOR UPDATE SKIP LOCKED' in _sql(cursor)
+    assert "SET estado = 'en_proceso'" in _sql(cursor, 1)
+    assert trabajo['parametros'] == {'a': 1}
+    assert trabajo['intentos'] == 1
+    conexion.commit.assert_called_once()
+
+
+@pytest.mark.unit
+def test_failure_is_retried_with_exponential_backoff():
+    conexion = MagicMock()
+    cursor = conexion.cursor.return_value
+    cursor.fetchone.return_value = None  # sin otro pendiente con la misma clave
+
+    assert Cola(MagicMock()).fallar(conexion, {'id': 5, 'clave': 'k', 'intentos': 2, 'max_intentos': 3}, 'boom')
+    assert "SET estado = 'pendiente'" in _sql(cursor, 1)
+    assert cursor.execute.call_args[0][1][1] == trabajos.ESPERA_REINTENTO * 2
+
+
+@pytest.mark.unit
+def test_failure_without_attempts_left_is_final():
+    conexion = MagicMock()
+    cursor = conexion.cursor.return_value
+
+    assert not Cola(MagicMock()).fallar(conexion, {'id': 5, 'clave': 'k', 'intentos': 3, 'max_intentos': 3}, 'boom')
+    assert "SET estado = 'error'" in _sql(cursor)
+
+
+@pytest.mark.unit
+def test_retry_is_absorbed_by_a_pending_duplicate():
+    conexion = MagicMock()
+    cursor = conexion.cursor.return_value
+    cursor.fetchone.return_value = {'id': 9}
+
+    assert not Cola(MagicMock()).fallar(conexion, {'id': 5, 'clave': 'k', 'intentos': 1, 'max_intentos': 3}, 'boom')
+    assert "SET estado = 'error'" in _sql(cursor, 1)
+    assert '#9' in cursor.execute.call_args[0][1][0]
+
+
+@pytest.mark.unit
+def test_worker_runs_the_task_and_reports_progress(app, registro, monkeypatch):
+    avances = []
+
+    @trabajos.tarea('sumar')
+    def sumar(parametros, avance):
+        avance(50, 'mitad')
+        return {'total': parametros['a'] + parametros['b']}
+
+    worker = Worker(app, MagicMock())
+    cola = MagicMock()
+    cola.avance.side_effect = lambda conexion, trabajo_id, progreso, mensaje: avances.append((progreso, mensaje))
+    worker.cola = cola
+
+    assert worker.procesar(MagicMock(), {'id': 1, 'tipo': 'sumar', 'parametros': {'a': 2, 'b': 3}, 'intentos': 1})
+    cola.completar.assert_called_once()
+    assert cola.completar.call_args[0][2] == {'total': 5}
+    assert avances == [(50, 'mitad')]
+
+
+@pytest.mark.unit
+def test_worker_rolls_back_and_records_failures(app, registro):
+    @trabajos.tarea('falla')
+    def falla(parametros, avance):
+        raise RuntimeError('sin conexión')
+
+    mysql = MagicMock()
+    worker = Worker(app, mysql)
+    worker.cola = MagicMock()
+
+    trabajo = {'id': 1, 'tipo': 'falla', 'parametros': {}, 'intentos': 1, 'max_intentos': 3}
+    assert not worker.procesar(MagicMock(), trabajo)
+    mysql.connection.rollback.assert_called_once()
+    assert 'RuntimeError: sin conexión' in worker.cola.fallar.call_args[0][2]
+    worker.cola.completar.assert_not_called()
+
+
+@pytest.mark.unit
+def test_exports_download_only_for_their_owner(app, monkeypatch):
+    from types import SimpleNamespace
+
+    from werkzeug.exceptions import Forbidden
+
+    from proyecto.routes import trabajos as rutas
+
+    # Flask-Login guarda el id como str; la columna usuario_id es INT
+    monkeypatch.setattr(rutas, 'current_user', SimpleNamespace(id='5'))
+    guardados = {
+        1: {'id': 1, 'tipo': 'exportar_csv', 'estado': 'completado', 'usuario_id': 5},
+        2: {'id': 2, 'tipo': 'exportar_csv', 'estado': 'completado', 'usuario_id': 6},
+    }
+    monkeypatch.setattr(rutas, 'Cola', lambda mysql: SimpleNamespace(obtener=guardados.get))
+    monkeypatch.setattr(rutas.tareas, 'archivo_exportacion', lambda trabajo_id: ('ph.csv', b'fecha,valor\r\n'))
+
+    with app.test_request_context():
+        respuesta = rutas.descarga.__wrapped__(1)
+        assert respuesta.status_code == 200 and 'ph.csv' in respuesta.headers['Content-Disposition']
+        with pytest.raises(Forbidden):
+            rutas.descarga.__wrapped__(2)
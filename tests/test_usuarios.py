@@ -0,0 +1,93 @@
+"""Cached user loader tests"""
+import time
+from unittest.mock import MagicMock
+
+import pytest
+from flask import Flask
+
+from proyecto.utils.cache import CacheLocal, CacheUsuarios
+
+IDENTIDAD = ('7', 'Ana', 'ana@finca.com', 3, 'La Esperanza')
+
+
+@pytest.fixture
+def entorno():
+    app = Flask(__name__)
+    app.secret_key = 'test'
+    cache = CacheUsuarios(app)
+    cargar = MagicMock(return_value=IDENTIDAD)
+    return app, cache, cargar
+
+
+@pytest.mark.unit
+def test_user_is_slotted_and_keeps_no_password_in_its_identity():
+    from proyecto.models.models import User
+
+    usuario = User({'id': 7, 'nombre': 'Ana', 'email': 'ana@finca.com', 'password': 'hash',
+                    'finca_actual_id': 3, 'finca_actual_nombre': 'La Esperanza'})
+    assert not hasattr(usuario, '__dict__')
+    assert usuario.identidad() == IDENTIDAD
+    copia = User.desde_identidad(usuario.identidad())
+    assert copia == usuario and copia.password is None
+    assert hash(copia) == hash(usuario) and len({copia, usuario}) == 1
+    assert not copia.check_password('lo-que-sea')
+    assert copia.is_authenticated and copia.get_id() == '7'
+
+
+@pytest.mark.unit
+def test_second_lookup_in_the_session_needs_no_query(entorno):
+    app, cache, cargar = entorno
+    with app.test_request_context():
+        assert cache.obtener(7, cargar) == IDENTIDAD
+        cache.backend = CacheLocal()  # otro worker: caché del proceso vacía
+        assert cache.obtener('7', cargar) == IDENTIDAD
+    assert cargar.call_count == 1
+
+
+@pytest.mark.unit
+def test_process_cache_serves_without_a_session(entorno):
+    app, cache, cargar = entorno
+    cache.obtener(7, cargar)
+    cache.obtener(7, cargar)
+    assert cargar.call_count == 1
+    assert cache.hits == 1
+
+
+@pytest.mark.unit
+def test_expired_session_copy_is_reloaded(entorno):
+    app, cache, cargar = entorno
+    with app.test_request_context():
+        from flask import session
+        session[cache.CLAVE_SESION] = list(IDENTIDAD) + [time.time() - cache.ttl - 1]
+        cache.obtener(7, cargar)
+    assert cargar.call_count == 1
+
+
+@pytest.mark.unit
+def test_session_copy_of_another_user_is_ignored(entorno):
+    app, cache, cargar = entorno
+    with app.test_request_context():
+        cache.guardar_en_sesion(IDENTIDAD)
+        cargar.return_value = ('8', 'Luis', 'luis@finca.com', None, None)
+        assert cache.obtener(8, cargar)[1] == 'Luis'
+    assert cargar.call_count == 1
+
+
+@pytest.mark.unit
+def test_invalidation_drops_cache_and_own_session_copy(entorno):
+    app, cache, cargar = entorno
+    with app.test_request_context():
+        cache.obtener(7, cargar)
+        cache.invalidar('7')
+        cargar.return_value = ('7', 'Ana María', 'ana@finca.com', 4, 'El Roble')
+        assert cache.obtener(7, cargar)[3] == 4
+    assert cargar.call_count == 2
+
+
+@pytest.mark.unit
+def test_unknown_users_are_not_cached(entorno):
+    app, cache, cargar = entorno
+    cargar.return_value = None
+    assert cache.obtener(99, cargar) is None
+    assert cache.obtener(99, cargar) is None
+    assert cargar.call_count == 2